@@ -0,0 +1,134 @@
+#!/usr/bin/env python3
+"""
+Preallocated int16 frame buffers for the wake word pipeline.
+Audio is copied once into a fixed buffer and handed to Porcupine
+without building per-frame tuples of Python ints.
+"""
+import ctypes
+
+
+class FrameBuffer:
+    """Fixed buffer holding one or more Porcupine frames of int16 samples"""
+
+    def __init__(self, frame_length, frames_per_read=1):
+        """
+        Initialize frame buffer
+
+        Args:
+            frame_length: Number of samples per frame
+            frames_per_read: Number of frames held (and read) at once
+        """
+        if frame_length <= 0 or frames_per_read <= 0:
+            raise ValueError("frame_length and frames_per_read must be positive")
+
+        self.frame_length = frame_length
+        self.frames_per_read = frames_per_read
+        self.frame_bytes = frame_length * 2
+        self.nbytes = self.frame_bytes * frames_per_read
+
+        # Single allocation, everything else is a view on it
+        self.raw = bytearray(self.nbytes)
+        self.view = memoryview(self.raw)
+        self.samples = self.view.cast("h")
+
+        # Per-frame views: ctypes arrays for the engine, memoryviews for Python code
+        self.frames = [
+            (ctypes.c_short * frame_length).from_buffer(self.raw, i * self.frame_bytes)
+            for i in range(frames_per_read)
+        ]
+        self.frame_views = [
+            self.samples[i * frame_length:(i + 1) * frame_length]
+            for i in range(frames_per_read)
+        ]
+
+    def load(self, data):
+        """
+        Copy raw little-endian int16 bytes into the buffer
+
+        Args:
+            data: bytes-like object, at most nbytes long
+
+        Returns:
+            Number of complete frames now in the buffer
+        """
+        n = len(data)
+        self.view[:n] = data
+        return n // self.frame_bytes
+
+    def readinto(self, source):
+        """
+        Fill the buffer straight from a file-like source
+
+        Args:
+            source: Object with readinto() (raw file, FIFO, socket file)
+
+        Returns:
+            Number of complete frames read (0 on EOF)
+        """
+        got = 0
+        while got < self.nbytes:
+            n = source.readinto(self.view[got:])
+            if not n:
+                break
+            got += n
+        return got // self.frame_bytes
+
+
+class FrameProcessor:
+    """
+    Feeds FrameBuffer frames to a Porcupine handle.
+
+    pvporcupine.Porcupine.process() rebuilds a ctypes array from the
+    sequence it is given on every call. When the engine exposes its
+    native entry point we call it directly with the preallocated ctypes
+    frame, so the per-frame path allocates nothing. Anything else (stub
+    engines, future pvporcupine versions) goes through process() with a
+    memoryview of the frame.
+    """
+
+    def __init__(self, engine, frame_buffer):
+        """
+        Initialize processor
+
+        Args:
+            engine: Porcupine instance (or any object with process(pcm))
+            frame_buffer: FrameBuffer whose frames will be processed
+        """
+        self.engine = engine
+        self.frame_buffer = frame_buffer
+        self._frames = frame_buffer.frames
+        self._views = frame_buffer.frame_views
+        self._result = ctypes.c_int(-1)
+        self._result_ref = ctypes.byref(self._result)
+
+        native = getattr(engine, "_process_func", None)
+        handle = getattr(engine, "_handle", None)
+        if native is not None and handle is not None:
+            self._native = native
+            self._handle = handle
+            # pvporcupine sets restype to its PicovoiceStatuses Enum, whose
+            # members never compare equal to the int 0
+            statuses = getattr(type(engine), "PicovoiceStatuses", None)
+            self._success = statuses.SUCCESS if statuses is not None else 0
+            self.direct = True
+        else:
+            self._native = None
+            self._handle = None
+            self.direct = False
+
+    def process(self, index):
+        """
+        Run the engine on one buffered frame
+
+        Args:
+            index: Frame index within the FrameBuffer
+
+        Returns:
+            keyword_index if detected, -1 otherwise
+        """
+        if self.direct:
+            status = self._native(self._handle, self._frames[index], self._result_ref)
+            if status == self._success:
+                return self._result.value
+            # Failed: let the engine raise its own typed exception
+        return self.engine.process(self._views[index])
@@ -0,0 +1,199 @@
+#!/usr/bin/env python3
+"""
+Fixed-size audio ring buffer and capture thread.
+One producer (the capture thread) and one consumer (the detector) share
+preallocated slots; each side only ever advances its own counter, so the
+data path needs no lock. Overruns are counted instead of silently lost.
+"""
+import sys
+import threading
+import time
+from array import array
+
+
+# PortAudio error code raised by PyAudio on input overflow
+PA_INPUT_OVERFLOWED = -9981
+
+
+class AudioRing:
+    """Single-producer/single-consumer ring of fixed-size PCM slots"""
+
+    def __init__(self, slot_bytes, slots=32):
+        """
+        Initialize ring buffer
+
+        Args:
+            slot_bytes: Size of one slot (one stream read) in bytes
+            slots: Number of slots
+        """
+        if slots < 2:
+            raise ValueError("slots must be >= 2")
+
+        self.slot_bytes = slot_bytes
+        self.slots = slots
+        self._data = bytearray(slot_bytes * slots)
+        self._view = memoryview(self._data)
+        self._slot_views = [
+            self._view[i * slot_bytes:(i + 1) * slot_bytes] for i in range(slots)
+        ]
+        self._lengths = array("I", [0] * slots)
+        self._stamps = array("d", [0.0] * slots)
+
+        # Monotonic counters; producer owns _written, consumer owns _read
+        self._written = 0
+        self._read = 0
+        self._ready = threading.Semaphore(0)
+
+        # Accounting
+        self.overruns = 0
+        self.dropped_bytes = 0
+        self.max_depth = 0
+        self.last_lag = 0.0
+        self.max_lag = 0.0
+        self.last_stamp = 0.0
+
+    @property
+    def depth(self):
+        """Number of filled slots waiting for the consumer"""
+        return self._written - self._read
+
+    def write(self, data, stamp=None):
+        """
+        Producer side: copy one read into the next free slot
+
+        Args:
+            data: bytes-like PCM, at most slot_bytes long
+            stamp: time.monotonic() of capture (default: now)
+
+        Returns:
+            True if stored, False if the ring was full (overrun)
+        """
+        depth = self._written - self._read
+        if depth >= self.slots:
+            self.overruns += 1
+            self.dropped_bytes += len(data)
+            return False
+
+        i = self._written % self.slots
+        n = len(data)
+        if n == self.slot_bytes:
+            self._slot_views[i][:] = data
+        else:
+            start = i * self.slot_bytes
+            self._view[start:start + n] = data
+        self._lengths[i] = n
+        self._stamps[i] = time.monotonic() if stamp is None else stamp
+
+        self._written += 1
+        if depth + 1 > self.max_depth:
+            self.max_depth = depth + 1
+        self._ready.release()
+        return True
+
+    def read_into(self, frame_buffer, timeout=None):
+        """
+        Consumer side: move the oldest slot into a FrameBuffer
+
+        Args:
+            frame_buffer: FrameBuffer with nbytes >= slot_bytes
+            timeout: Seconds to wait for data (None = forever)
+
+        Returns:
+            Number of complete frames loaded, or -1 on timeout
+        """
+        if not self._ready.acquire(timeout=timeout):
+            return -1
+
+        i = self._read % self.slots
+        n = self._lengths[i]
+        if n == self.slot_bytes:
+            count = frame_buffer.load(self._slot_views[i])
+        else:
+            start = i * self.slot_bytes
+            count = frame_buffer.load(self._view[start:start + n])
+        stamp = self._stamps[i]
+        self._read += 1
+        self.last_stamp = stamp
+
+        lag = time.monotonic() - stamp
+        self.last_lag = lag
+        if lag > self.max_lag:
+            self.max_lag = lag
+        return count
+
+    def stats(self):
+        """Return a snapshot of ring counters"""
+        return {
+            "written": self._written,
+            "read": self._read,
+            "depth": self.depth,
+            "max_depth": self.max_depth,
+            "overruns": self.overruns,
+            "dropped_bytes": self.dropped_bytes,
+            "last_lag_ms": self.last_lag * 1000.0,
+            "max_lag_ms": self.max_lag * 1000.0,
+        }
+
+
+class CaptureThread:
+    """Reads a PyAudio-style stream on its own thread into an AudioRing"""
+
+    def __init__(self, stream, ring, read_length):
+        """
+        Initialize capture thread
+
+        Args:
+            stream: Object with read(num_frames, exception_on_overflow)
+            ring: AudioRing to fill
+            read_length: Samples per read
+        """
+        self.stream = stream
+        self.ring = ring
+        self.read_length = read_length
+        self.input_overflows = 0
+        self.reads = 0
+        self.finished = False
+        self._stop_event = threading.Event()
+        self._thread = None
+
+    def start(self):
+        """Start capturing"""
+        if self._thread and self._thread.is_alive():
+            return
+        self._stop_event.clear()
+        self._thread = threading.Thread(target=self._run, name="audio-capture", daemon=True)
+        self._thread.start()
+
+    def stop(self, timeout=2.0):
+        """Stop capturing and wait for the thread to exit"""
+        self._stop_event.set()
+        if self._thread and self._thread.is_alive():
+            self._thread.join(timeout=timeout)
+        self._thread = None
+
+    @property
+    def running(self):
+        return self._thread is not None and self._thread.is_alive()
+
+    def _run(self):
+        """Capture loop"""
+        stream = self.stream
+        ring = self.ring
+        n = self.read_length
+        while not self._stop_event.is_set():
+            try:
+                data = stream.read(n, exception_on_overflow=True)
+            except OSError as e:
+                # Device-level overflow: audio already lost before we saw it
+                if e.errno == PA_INPUT_OVERFLOWED or (e.args and e.args[0] == PA_INPUT_OVERFLOWED):
+                    self.input_overflows += 1
+                    continue
+                print(f"Capture error: {e}", file=sys.stderr)
+                self._stop_event.wait(0.1)
+                continue
+            if not data:
+                # Source exhausted
+                self.finished = True
+                break
+            self.reads += 1
+            ring.write(data)
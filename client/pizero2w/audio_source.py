@@ -0,0 +1,287 @@
+#!/usr/bin/env python3
+"""
+Audio sources for the wake word pipeline.
+Every source delivers mono little-endian int16 PCM through a PyAudio-like
+read(num_frames, exception_on_overflow) call, so WakeWordDetector and
+CaptureThread work the same with a live mic, a file, a FIFO or noise.
+An empty read means the source is exhausted.
+"""
+import os
+import random
+import shutil
+import struct
+import subprocess
+import threading
+import time
+import wave
+
+
+# PortAudio's init, device enumeration and stream open/close are not
+# thread-safe; every PyAudio user in this process holds this around them
+PORTAUDIO_LOCK = threading.Lock()
+
+
+class AudioSource:
+    """Base class for mono int16 PCM sources"""
+
+    # True when read() blocks at the audio rate (live capture)
+    live = False
+
+    def __init__(self, sample_rate, realtime=False):
+        """
+        Initialize source
+
+        Args:
+            sample_rate: Sample rate in Hz
+            realtime: Pace reads at 1x speed (offline sources only)
+        """
+        self.sample_rate = sample_rate
+        self.realtime = realtime
+        self.frames_read = 0
+        self._t0 = None
+
+    def read(self, num_frames, exception_on_overflow=False):
+        """
+        Read up to num_frames samples
+
+        Returns:
+            bytes (2 bytes per sample), b"" when exhausted
+        """
+        data = self._read(num_frames)
+        if data:
+            self.frames_read += len(data) // 2
+            if self.realtime:
+                self._pace()
+        return data
+
+    def close(self):
+        """Release resources"""
+
+    @property
+    def position(self):
+        """Seconds of audio delivered so far"""
+        return self.frames_read / self.sample_rate
+
+    def _read(self, num_frames):
+        raise NotImplementedError
+
+    def _pace(self):
+        """Sleep so that delivered audio does not run ahead of wall time"""
+        now = time.monotonic()
+        if self._t0 is None:
+            self._t0 = now
+        ahead = self._t0 + self.position - now
+        if ahead > 0:
+            time.sleep(ahead)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
+        return False
+
+
+class PyAudioSource(AudioSource):
+    """Live microphone input through PyAudio"""
+
+    live = True
+
+    def __init__(self, sample_rate, frames_per_buffer, device_index=None):
+        """
+        Initialize live input
+
+        Args:
+            sample_rate: Sample rate in Hz
+            frames_per_buffer: PortAudio buffer size in samples
+            device_index: Input device (None = default)
+        """
+        super().__init__(sample_rate)
+        import pyaudio
+
+        with PORTAUDIO_LOCK:
+            self.pa = pyaudio.PyAudio()
+            self.stream = self.pa.open(
+                rate=sample_rate,
+                channels=1,
+                format=pyaudio.paInt16,
+                input=True,
+                input_device_index=device_index,
+                frames_per_buffer=frames_per_buffer
+            )
+
+    def read(self, num_frames, exception_on_overflow=False):
+        # Hot path: no accounting beyond what PyAudio does
+        return self.stream.read(num_frames, exception_on_overflow=exception_on_overflow)
+
+    def close(self):
+        with PORTAUDIO_LOCK:
+            if self.stream:
+                self.stream.stop_stream()
+                self.stream.close()
+                self.stream = None
+            if self.pa:
+                self.pa.terminate()
+                self.pa = None
+
+
+class WavFileSource(AudioSource):
+    """Mono 16-bit WAV file at the detector sample rate"""
+
+    def __init__(self, path, sample_rate=None, realtime=False):
+        """
+        Initialize WAV source
+
+        Args:
+            path: Path to .wav file
+            sample_rate: Required sample rate (None = accept file rate)
+            realtime: Pace reads at 1x speed
+        """
+        self.path = path
+        self._wav = wave.open(path, "rb")
+        rate = self._wav.getframerate()
+        if self._wav.getnchannels() != 1 or self._wav.getsampwidth() != 2:
+            self._wav.close()
+            raise ValueError(f"{path}: need mono 16-bit PCM, use FfmpegSource to convert")
+        if sample_rate is not None and rate != sample_rate:
+            self._wav.close()
+            raise ValueError(f"{path}: rate {rate} != {sample_rate}, use FfmpegSource to resample")
+        super().__init__(rate, realtime)
+
+    def _read(self, num_frames):
+        return self._wav.readframes(num_frames)
+
+    def close(self):
+        self._wav.close()
+
+
+class PcmFifoSource(AudioSource):
+    """Raw s16le mono PCM from a FIFO, pipe or file"""
+
+    def __init__(self, path_or_file, sample_rate, realtime=False):
+        """
+        Initialize raw PCM source
+
+        Args:
+            path_or_file: Path to FIFO/file or an open binary file object
+            sample_rate: Sample rate of the PCM data
+            realtime: Pace reads at 1x speed
+        """
+        super().__init__(sample_rate, realtime)
+        if isinstance(path_or_file, (str, bytes, os.PathLike)):
+            self._file = open(path_or_file, "rb", buffering=0)
+            self._owns_file = True
+        else:
+            self._file = path_or_file
+            self._owns_file = False
+        self._buf = bytearray()
+
+    def _read(self, num_frames):
+        # Pipes return short reads; assemble whole requests
+        want = num_frames * 2
+        chunks = []
+        got = 0
+        while got < want:
+            chunk = self._file.read(want - got)
+            if not chunk:
+                break
+            chunks.append(chunk)
+            got += len(chunk)
+        data = b"".join(chunks)
+        # Never hand out half a sample
+        return data[:len(data) & ~1]
+
+    def close(self):
+        if self._owns_file:
+            self._file.close()
+
+
+class FfmpegSource(PcmFifoSource):
+    """Any file ffmpeg can decode, converted to mono s16le at sample_rate"""
+
+    def __init__(self, path, sample_rate, realtime=False, ffmpeg="ffmpeg"):
+        """
+        Initialize decoded file source
+
+        Args:
+            path: Media file (FLAC, AC-3, WAV, ...)
+            sample_rate: Output sample rate
+            realtime: Pace reads at 1x speed
+            ffmpeg: ffmpeg binary
+        """
+        if shutil.which(ffmpeg) is None:
+            raise RuntimeError(f"{ffmpeg} not found")
+        self.path = path
+        self._proc = subprocess.Popen(
+            [ffmpeg, "-nostdin", "-loglevel", "error", "-i", path,
+             "-ac", "1", "-ar", str(sample_rate), "-f", "s16le", "-"],
+            stdout=subprocess.PIPE
+        )
+        super().__init__(self._proc.stdout, sample_rate, realtime)
+
+    def close(self):
+        if self._proc.poll() is None:
+            self._proc.kill()
+        self._proc.stdout.close()
+        self._proc.wait()
+
+
+class NoiseSource(AudioSource):
+    """Synthetic white noise, for load tests without any audio files"""
+
+    def __init__(self, sample_rate, duration=None, amplitude=1000, seed=0, realtime=False):
+        """
+        Initialize noise source
+
+        Args:
+            sample_rate: Sample rate in Hz
+            duration: Seconds of audio to produce (None = endless)
+            amplitude: Peak amplitude (0..32767)
+            seed: Random seed, so runs are reproducible
+            realtime: Pace reads at 1x speed
+        """
+        super().__init__(sample_rate, realtime)
+        self.total_frames = None if duration is None else int(duration * sample_rate)
+        rng = random.Random(seed)
+        # One second of noise, replayed cyclically
+        samples = [rng.randint(-amplitude, amplitude) for _ in range(sample_rate)]
+        self._block = struct.pack(f"<{sample_rate}h", *samples) * 2
+        self._offset = 0
+
+    def _read(self, num_frames):
+        if self.total_frames is not None:
+            num_frames = min(num_frames, self.total_frames - self.frames_read)
+            if num_frames <= 0:
+                return b""
+        n = num_frames * 2
+        block_len = len(self._block) // 2
+        if n > block_len:
+            reps = n // block_len + 2
+            data = (self._block[:block_len] * reps)[self._offset:self._offset + n]
+        else:
+            data = self._block[self._offset:self._offset + n]
+        self._offset = (self._offset + n) % block_len
+        return data
+
+
+def open_source(path, sample_rate, realtime=False):
+    """
+    Open the cheapest offline source that can play a file
+
+    Args:
+        path: .wav, .pcm/.raw/FIFO, or anything ffmpeg decodes
+        sample_rate: Detector sample rate
+        realtime: Pace reads at 1x speed
+
+    Returns:
+        AudioSource
+    """
+    ext = os.path.splitext(path)[1].lower()
+    if ext == ".wav":
+        try:
+            return WavFileSource(path, sample_rate, realtime)
+        except (ValueError, wave.Error):
+            pass
+    elif ext in (".pcm", ".raw", ".s16le") or not os.path.isfile(path):
+        return PcmFifoSource(path, sample_rate, realtime)
+    return FfmpegSource(path, sample_rate, realtime)
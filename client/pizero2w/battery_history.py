@@ -0,0 +1,182 @@
+#!/usr/bin/env python3
+"""
+Fixed-capacity battery history with runtime estimation.
+Samples are averaged into downsampling tiers stored in array-backed ring
+columns, so memory is allocated once and never grows. Discharge rate and
+time-to-empty are updated incrementally (O(1) per sample).
+"""
+import math
+import time
+from array import array
+from typing import List, Optional, Sequence, Tuple
+
+
+# (resolution seconds, retention seconds): 1 s for an hour, 1 min for a week
+DEFAULT_TIERS = ((1.0, 3600.0), (60.0, 7 * 86400.0))
+
+
+class HistoryTier:
+    """Ring of averaged samples at one resolution"""
+
+    def __init__(self, resolution: float, retention: float):
+        """
+        Initialize tier.
+
+        Args:
+            resolution: Bucket width in seconds
+            retention: How far back the tier reaches in seconds
+        """
+        self.resolution = resolution
+        self.capacity = max(1, int(math.ceil(retention / resolution)))
+        self.t = array("d", bytes(8 * self.capacity))
+        self.voltage = array("d", bytes(8 * self.capacity))
+        self.soc = array("d", bytes(8 * self.capacity))
+        self.power = array("b", bytes(self.capacity))
+        self.count = 0      # samples ever written
+        self._bucket = None
+        self._sum_v = 0.0
+        self._sum_soc = 0.0
+        self._n = 0
+        self._power = 0
+        self._t = 0.0
+
+    def add(self, t: float, voltage: float, soc: float, power: bool):
+        """Accumulate a sample; emits one row per completed bucket."""
+        bucket = int(t // self.resolution)
+        if self._bucket is not None and bucket != self._bucket:
+            self._flush()
+        self._bucket = bucket
+        self._sum_v += voltage
+        self._sum_soc += soc
+        self._n += 1
+        self._power = 1 if power else 0
+        self._t = t
+
+    def _flush(self):
+        if not self._n:
+            return
+        i = self.count % self.capacity
+        self.t[i] = self._t
+        self.voltage[i] = self._sum_v / self._n
+        self.soc[i] = self._sum_soc / self._n
+        self.power[i] = self._power
+        self.count += 1
+        self._sum_v = 0.0
+        self._sum_soc = 0.0
+        self._n = 0
+
+    def __len__(self):
+        return min(self.count, self.capacity)
+
+    def rows(self) -> List[Tuple[float, float, float, bool]]:
+        """Return stored rows oldest first as (t, voltage, soc, power)."""
+        n = len(self)
+        start = self.count - n
+        out = []
+        for k in range(start, self.count):
+            i = k % self.capacity
+            out.append((self.t[i], self.voltage[i], self.soc[i], bool(self.power[i])))
+        return out
+
+    @property
+    def nbytes(self) -> int:
+        return sum(col.itemsize * len(col) for col in (self.t, self.voltage, self.soc, self.power))
+
+
+class BatteryHistory:
+    """
+    Battery samples in downsampling tiers plus running estimates.
+
+    discharge_rate and voltage_rate are exponentially weighted derivatives
+    over time_constant seconds, updated only while running on battery.
+    """
+
+    def __init__(self, tiers: Sequence[Tuple[float, float]] = DEFAULT_TIERS,
+                 time_constant: float = 600.0, empty_soc: float = 0.0):
+        """
+        Initialize history.
+
+        Args:
+            tiers: (resolution, retention) pairs in seconds
+            time_constant: Smoothing time constant for rate estimates in seconds
+            empty_soc: SOC (%) considered empty for time_to_empty
+        """
+        self.tiers = [HistoryTier(r, d) for r, d in tiers]
+        self.time_constant = time_constant
+        self.empty_soc = empty_soc
+
+        self._prev_mono: Optional[float] = None
+        self._prev_soc = 0.0
+        self._prev_voltage = 0.0
+        self._soc_rate: Optional[float] = None       # %/s, positive = discharging
+        self._voltage_rate: Optional[float] = None   # V/s, positive = dropping
+        self._last_soc: Optional[float] = None
+        self._on_battery = False
+
+    def add(self, t: float, voltage: float, soc: float, power: bool, mono: Optional[float] = None):
+        """
+        Add a sample.
+
+        Args:
+            t: Wall-clock timestamp stored with the sample
+            voltage: Battery voltage (V)
+            soc: State of charge (%)
+            power: True if external power is connected
+            mono: Monotonic timestamp for rate estimation (default: now)
+        """
+        for tier in self.tiers:
+            tier.add(t, voltage, soc, power)
+
+        if mono is None:
+            mono = time.monotonic()
+        self._last_soc = soc
+        self._on_battery = not power
+
+        prev = self._prev_mono
+        if power or prev is None:
+            # Rates only describe discharge; restart the estimate on battery
+            if power:
+                self._soc_rate = None
+                self._voltage_rate = None
+            self._prev_mono = None if power else mono
+            self._prev_soc = soc
+            self._prev_voltage = voltage
+            return
+
+        dt = mono - prev
+        if dt <= 0:
+            return
+        soc_rate = (self._prev_soc - soc) / dt
+        voltage_rate = (self._prev_voltage - voltage) / dt
+        alpha = 1.0 - math.exp(-dt / self.time_constant)
+        if self._soc_rate is None:
+            self._soc_rate = soc_rate
+            self._voltage_rate = voltage_rate
+        else:
+            self._soc_rate += alpha * (soc_rate - self._soc_rate)
+            self._voltage_rate += alpha * (voltage_rate - self._voltage_rate)
+        self._prev_mono = mono
+        self._prev_soc = soc
+        self._prev_voltage = voltage
+
+    @property
+    def discharge_rate(self) -> Optional[float]:
+        """Smoothed SOC drop in %/hour (None until two on-battery samples)."""
+        return None if self._soc_rate is None else self._soc_rate * 3600.0
+
+    @property
+    def voltage_rate(self) -> Optional[float]:
+        """Smoothed voltage drop in V/hour (None until two on-battery samples)."""
+        return None if self._voltage_rate is None else self._voltage_rate * 3600.0
+
+    @property
+    def time_to_empty(self) -> Optional[float]:
+        """Seconds until empty_soc at the current rate (None on mains or if not discharging)."""
+        if not self._on_battery or self._soc_rate is None or self._soc_rate <= 0:
+            return None
+        return max(0.0, (self._last_soc - self.empty_soc) / self._soc_rate)
+
+    @property
+    def nbytes(self) -> int:
+        """Bytes held by sample columns (constant after construction)."""
+        return sum(tier.nbytes for tier in self.tiers)
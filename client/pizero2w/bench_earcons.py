@@ -0,0 +1,120 @@
+#!/usr/bin/env python3
+"""
+Earcon latency benchmark: detection-to-first-sample for aplay vs EarconPlayer.
+
+- aplay: fork `aplay clip` per detection, as on_wake_word_detected did.
+  The clip is handed over through a FIFO, so the time until aplay opens it
+  is measured; that is a lower bound (device open and the first write
+  still follow).
+- earcon: EarconPlayer.play() on a warm stream; time until the mixer
+  writes the clip's first block to the output stream.
+
+Without aplay on the box `cat` stands in for the forked player; without
+pyaudio the fake output stream from hal.py paces writes like a device.
+
+Examples:
+  python3 bench_earcons.py
+  python3 bench_earcons.py --rounds 50 --player aplay
+"""
+import argparse
+import math
+import os
+import shutil
+import statistics
+import struct
+import subprocess
+import tempfile
+import time
+import wave
+
+from hal import install_fake_modules
+
+install_fake_modules(["pyaudio"], realtime=True)
+
+from earcons import EarconPlayer
+
+
+def write_clip(path, seconds=0.3, rate=48000, freq=880.0):
+    n = int(seconds * rate)
+    with wave.open(path, "wb") as w:
+        w.setnchannels(1)
+        w.setsampwidth(2)
+        w.setframerate(rate)
+        w.writeframes(struct.pack(f"<{n}h", *(int(6000 * math.sin(2 * math.pi * freq * i / rate)) for i in range(n))))
+
+
+def bench_fork(player, clip, rounds):
+    """Fork player per round; return seconds until it opened the clip"""
+    tmp = tempfile.mkdtemp(prefix="sharm-earcon-")
+    fifo = os.path.join(tmp, "clip.wav")
+    os.mkfifo(fifo)
+    with open(clip, "rb") as f:
+        data = f.read()
+    lat = []
+    for _ in range(rounds):
+        start = time.monotonic()
+        proc = subprocess.Popen([player, fifo], stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+        # Blocks until the child opens the FIFO for reading
+        with open(fifo, "wb") as w:
+            lat.append(time.monotonic() - start)
+            w.write(data)
+        proc.wait()
+    os.unlink(fifo)
+    os.rmdir(tmp)
+    return lat
+
+
+def bench_earcon(clip, rounds):
+    player = EarconPlayer()
+    player.add_clip(clip, name="hello")
+    player.warm_up()
+    lat = []
+    for _ in range(rounds):
+        before = player._latency_count
+        player.play("hello")
+        while player._latency_count == before:
+            time.sleep(0.0005)
+        lat.append(player.last_latency)
+        # Let the clip finish so every round starts from an idle mixer
+        while player.active:
+            time.sleep(0.005)
+    stats = player.get_stats()
+    player.close()
+    return lat, stats
+
+
+def report(name, lat):
+    lat = sorted(lat)
+    print(f"{name:<8} {statistics.median(lat) * 1000:>10.2f} {lat[int(len(lat) * 0.9)] * 1000:>10.2f} "
+          f"{lat[-1] * 1000:>10.2f}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rounds", type=int, default=20)
+    parser.add_argument("--player", default="aplay", help="Forked player command (default: aplay)")
+    args = parser.parse_args()
+
+    player = args.player
+    if shutil.which(player) is None:
+        print(f"{player} not found, using cat as a stand-in for the fork path")
+        player = "cat"
+
+    tmp = tempfile.mkdtemp(prefix="sharm-earcon-")
+    clip = os.path.join(tmp, "hello_1.wav")
+    write_clip(clip)
+
+    print(f"rounds={args.rounds}")
+    print(f"{'path':<8} {'median ms':>10} {'p90 ms':>10} {'max ms':>10}")
+    report(player, bench_fork(player, clip, args.rounds))
+    lat, stats = bench_earcon(clip, args.rounds)
+    report("earcon", lat)
+    print(f"earcon stats: {stats}")
+
+    os.unlink(clip)
+    os.rmdir(tmp)
+    return 0
+
+
+if __name__ == "__main__":
+    exit(main())
@@ -0,0 +1,117 @@
+#!/usr/bin/env python3
+"""
+Rotary encoder decoder benchmark.
+Generates edge sequences for a known series of detents, optionally with
+contact bounce and missed edges, feeds them to RotaryEncoder through a
+fake pigpio and reports edges/sec and decoding accuracy per decoder.
+
+"pin reads" are in-process here; on the Pi each one is a round trip to
+pigpiod, so the buffer decoder's real per-edge cost is much higher.
+"missed" edges change the pin level without a callback; pigpio does not
+normally drop callbacks, but the trace shows how each decoder degrades.
+"""
+import argparse
+import random
+import time
+
+from hal import FakePi, install_fake_modules
+
+install_fake_modules(["pigpio"])
+
+from rotary_encoder import RotaryEncoder
+
+
+PIN_BTN, PIN_A, PIN_B = 23, 27, 22
+
+# Edge order for one detent starting and ending at rest (A=1, B=1)
+CW_EDGES = ((PIN_A, 0), (PIN_B, 0), (PIN_A, 1), (PIN_B, 1))
+CCW_EDGES = ((PIN_B, 0), (PIN_A, 0), (PIN_B, 1), (PIN_A, 1))
+
+
+def make_trace(detents, bounce, missed, seed):
+    """
+    Build an edge trace
+
+    Returns:
+        (edges, expected_position) where edges is a list of
+        (gpio, level, tick, delivered) tuples
+    """
+    rng = random.Random(seed)
+    edges = []
+    tick = 0
+    expected = 0
+    direction = 1
+    for _ in range(detents):
+        # Mostly keep turning the same way, sometimes reverse
+        if rng.random() < 0.1:
+            direction = -direction
+        expected += direction
+        for gpio, level in (CW_EDGES if direction > 0 else CCW_EDGES):
+            tick += rng.randint(300, 3000)
+            if rng.random() < bounce:
+                edges.append((gpio, level, tick, True))
+                edges.append((gpio, 1 - level, tick + 20, True))
+                tick += 40
+            edges.append((gpio, level, tick, rng.random() >= missed))
+    return edges, expected
+
+
+def run(decoder, edges, expected):
+    """Feed a trace through one decoder; return result dict"""
+    pi = FakePi()
+    enc = RotaryEncoder(PIN_BTN, PIN_A, PIN_B, glitch_us=0, decoder=decoder, pi=pi)
+    seen = [0]
+    enc.set_rotation_callback(lambda d, p, deg, rot: seen.__setitem__(0, seen[0] + 1))
+
+    emit = pi.emit
+    levels = pi.levels
+    clock = time.perf_counter
+    start = clock()
+    for gpio, level, tick, delivered in edges:
+        if delivered:
+            emit(gpio, level, tick)
+        else:
+            levels[gpio] = level
+    elapsed = clock() - start
+
+    result = {
+        "decoder": decoder,
+        "edges_per_s": len(edges) / elapsed if elapsed else 0.0,
+        "us_per_edge": elapsed * 1e6 / len(edges),
+        "position": enc.get_position(),
+        "expected": expected,
+        "error": enc.get_position() - expected,
+        "detents": seen[0],
+        "pin_reads": pi.reads,
+        "invalid": enc.get_stats()["invalid"] if decoder == "table" else "-",
+    }
+    enc.cleanup()
+    return result
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--detents", type=int, default=20000)
+    parser.add_argument("--seed", type=int, default=1)
+    args = parser.parse_args()
+
+    scenarios = [
+        ("clean", 0.0, 0.0),
+        ("bounce 10%", 0.10, 0.0),
+        ("bounce 30%", 0.30, 0.0),
+        ("missed 1%", 0.0, 0.01),
+    ]
+    print(f"detents={args.detents}")
+    print(f"{'trace':<12} {'decoder':<8} {'edges/s':>10} {'us/edge':>8} {'pos':>7} {'expect':>7} "
+          f"{'error':>6} {'pin reads':>10} {'invalid':>8}")
+    for name, bounce, missed in scenarios:
+        edges, expected = make_trace(args.detents, bounce, missed, args.seed)
+        for decoder in ("buffer", "table"):
+            r = run(decoder, edges, expected)
+            print(f"{name:<12} {decoder:<8} {r['edges_per_s']:>10.0f} {r['us_per_edge']:>8.2f} "
+                  f"{r['position']:>7} {r['expected']:>7} {r['error']:>6} {r['pin_reads']:>10} {r['invalid']:>8}")
+    return 0
+
+
+if __name__ == "__main__":
+    exit(main())
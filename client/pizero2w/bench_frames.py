@@ -0,0 +1,130 @@
+#!/usr/bin/env python3
+"""
+Wake word frame path micro-benchmark.
+Compares the old struct.unpack_from path with FrameBuffer/FrameProcessor
+using a fake stream and a fake engine shaped like pvporcupine.Porcupine,
+so it runs anywhere (no mic, no access key).
+
+Reports:
+- us/frame: wall time per frame
+- peak B/frame: transient memory high-water mark while handling one frame
+- blocks/frame: net allocated blocks left behind per frame
+"""
+import argparse
+import os
+import struct
+import sys
+import time
+import tracemalloc
+
+from audio_frames import FrameBuffer, FrameProcessor
+from hal import FakePorcupine
+
+
+FRAME_LENGTH = 512
+
+
+class FakeStream:
+    """PyAudio-like input stream returning the same captured block"""
+
+    def __init__(self, nbytes):
+        self._data = os.urandom(nbytes)
+
+    def read(self, num_frames, exception_on_overflow=True):
+        return self._data
+
+
+def make_legacy_step(stream, engine, frame_length):
+    """Build a step function matching the original process_audio body"""
+
+    def step():
+        pcm = stream.read(frame_length, exception_on_overflow=False)
+        pcm = struct.unpack_from("h" * frame_length, pcm)
+        return engine.process(pcm)
+
+    return step
+
+
+def make_buffered_step(stream, engine, frame_length, frames_per_read, direct):
+    """Build a step function matching the new process_audio body"""
+    buf = FrameBuffer(frame_length, frames_per_read)
+    processor = FrameProcessor(engine, buf)
+    processor.direct = processor.direct and direct
+    read_length = frame_length * frames_per_read
+
+    def step():
+        count = buf.load(stream.read(read_length, exception_on_overflow=False))
+        detected = -1
+        for i in range(count):
+            idx = processor.process(i)
+            if idx >= 0:
+                detected = idx
+        return detected
+
+    return step
+
+
+def measure(step, frames_per_step, steps):
+    """Return (us/frame, peak bytes/frame, blocks/frame)"""
+    for _ in range(100):
+        step()
+
+    start = time.perf_counter()
+    for _ in range(steps):
+        step()
+    elapsed = time.perf_counter() - start
+    us_per_frame = elapsed * 1e6 / (steps * frames_per_step)
+
+    blocks_before = sys.getallocatedblocks()
+    for _ in range(steps):
+        step()
+    blocks_per_frame = (sys.getallocatedblocks() - blocks_before) / (steps * frames_per_step)
+
+    tracemalloc.start()
+    peak_total = 0
+    sample_steps = min(steps, 200)
+    for _ in range(sample_steps):
+        tracemalloc.reset_peak()
+        current, _ = tracemalloc.get_traced_memory()
+        step()
+        _, peak = tracemalloc.get_traced_memory()
+        peak_total += peak - current
+    tracemalloc.stop()
+    peak_per_frame = peak_total / (sample_steps * frames_per_step)
+
+    return us_per_frame, peak_per_frame, blocks_per_frame
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--frames", type=int, default=20000, help="frames per measurement")
+    parser.add_argument("--frame-length", type=int, default=FRAME_LENGTH)
+    parser.add_argument("--frames-per-read", type=int, default=4)
+    args = parser.parse_args()
+
+    fl = args.frame_length
+    fpr = args.frames_per_read
+    engine = FakePorcupine(fl)
+
+    cases = [
+        ("legacy unpack_from", make_legacy_step(FakeStream(fl * 2), engine, fl), 1),
+        ("buffer + process()", make_buffered_step(FakeStream(fl * 2), engine, fl, 1, False), 1),
+        ("buffer + direct", make_buffered_step(FakeStream(fl * 2), engine, fl, 1, True), 1),
+        (f"buffer + direct x{fpr}", make_buffered_step(FakeStream(fl * 2 * fpr), engine, fl, fpr, True), fpr),
+    ]
+
+    print(f"frame_length={fl} frames={args.frames}")
+    print(f"{'path':<24} {'us/frame':>10} {'peak B/frame':>14} {'blocks/frame':>14} {'calls/frame':>12}")
+    for name, step, frames_per_step in cases:
+        # Engine calls per frame: 1.00 unless a frame runs through the engine twice
+        calls = engine.frames
+        step()
+        calls = (engine.frames - calls) / frames_per_step
+        us, peak, blocks = measure(step, frames_per_step, max(1, args.frames // frames_per_step))
+        print(f"{name:<24} {us:>10.2f} {peak:>14.0f} {blocks:>14.3f} {calls:>12.2f}")
+
+    return 0
+
+
+if __name__ == "__main__":
+    exit(main())
@@ -0,0 +1,167 @@
+#!/usr/bin/env python3
+"""
+Logging cost on the callback path: print(f"[TAG] {ts()} ...", flush=True)
+(before) against fastlog (after).
+
+Per-call time is measured on the calling thread for:
+- one [ENC] rotation line as in test_ai.py
+- a filtered DEBUG line (level INFO)
+- one encoder edge through RotaryEncoder(debug=True, decoder="buffer")
+  with fake pigpio; "print" replays the old synchronous debug prints
+
+into each sink:
+- null:  /dev/null
+- file:  a file in --dir (SD card on the Pi)
+- stall: /dev/null with a --stall-ms pause every --stall-every writes,
+         like an SD card erase or a busy journald
+
+Examples:
+  python3 bench_log.py
+  python3 bench_log.py --n 20000 --dir /var/tmp --stall-ms 50
+  python3 bench_log.py --interval-us 0 --capacity 1024     # burst: drops
+"""
+import argparse
+import os
+import tempfile
+import time
+
+from hal import FakePi, install_fake_modules
+
+install_fake_modules(["pigpio"])
+
+import fastlog
+from rotary_encoder import RotaryEncoder
+
+
+def ts():
+    """test_ai.py's timestamp before fastlog"""
+    t = time.time()
+    return time.strftime("%Y-%m-%d %H:%M:%S", time.localtime(t)) + f".{int((t % 1)*1000):03d}"
+
+
+class StallingFile:
+    """Text sink that blocks for stall seconds every n-th write"""
+
+    def __init__(self, stream, stall, every):
+        self.stream = stream
+        self.stall = stall
+        self.every = every
+        self.writes = 0
+
+    def write(self, text):
+        self.writes += 1
+        if self.writes % self.every == 0:
+            time.sleep(self.stall)
+        return self.stream.write(text)
+
+    def flush(self):
+        self.stream.flush()
+
+
+class PrintLog:
+    """The old behaviour: format and print(..., flush=True) on the caller's thread"""
+
+    def __init__(self, stream, level=fastlog.INFO):
+        self.stream = stream
+        self.level = level
+
+    def log(self, level, tag, template, *args):
+        if level < self.level:
+            return
+        message = template(*args) if callable(template) else template.format(*args)
+        print(f"[{tag}] {ts()} {message}", file=self.stream, flush=True)
+
+    def debug(self, tag, template, *args):
+        self.log(fastlog.DEBUG, tag, template, *args)
+
+    def info(self, tag, template, *args):
+        self.log(fastlog.INFO, tag, template, *args)
+
+
+def timed(fn, n, interval):
+    """Per-call durations in seconds, sorted; calls are interval seconds apart"""
+    clock = time.perf_counter
+    samples = []
+    for i in range(n):
+        start = clock()
+        fn(i)
+        samples.append(clock() - start)
+        if interval:
+            time.sleep(interval)
+    samples.sort()
+    return samples
+
+
+def summary(samples):
+    n = len(samples)
+    return sum(samples) / n, samples[min(n - 1, int(n * 0.99))], samples[-1]
+
+
+def make_sink(kind, args):
+    if kind == "file":
+        fd, path = tempfile.mkstemp(prefix="bench-log-", dir=args.dir)
+        os.close(fd)
+        return open(path, "w"), path
+    stream = open(os.devnull, "w")
+    if kind == "stall":
+        return StallingFile(stream, args.stall_ms / 1000.0, args.stall_every), None
+    return stream, None
+
+
+def run_case(case, backend, sink, args):
+    if backend == "print":
+        log = PrintLog(sink)
+    else:
+        log = fastlog.FastLog(sink, capacity=args.capacity)
+    if case == "enc line":
+        def call(i):
+            log.info("ENC", "{} rotations={} remainder={:.1f}° (raw={})", "CW", i // 80, (i % 80) * 4.5, i)
+    elif case == "debug filtered":
+        def call(i):
+            log.debug("ENC_DBG", "Handler called: gpio={} A={} B={} encoded={:02b}", 27, 1, 0, 2)
+    else:
+        pi = FakePi()
+        RotaryEncoder(23, 27, 22, glitch_us=0, debug=True, decoder="buffer", pi=pi, log=log)
+        edges = ((27, 0), (22, 0), (27, 1), (22, 1))
+
+        def call(i):
+            gpio, level = edges[i & 3]
+            pi.emit(gpio, level)
+    samples = timed(call, args.n, args.interval_us / 1e6)
+    stats = {}
+    if backend == "fastlog":
+        log.close()
+        stats = log.get_stats()
+    return summary(samples), stats
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--n", type=int, default=2000, help="Calls per case")
+    parser.add_argument("--interval-us", type=float, default=500.0,
+                        help="Pause between calls (0: back to back, a burst)")
+    parser.add_argument("--dir", default=None, help="Directory for the file sink")
+    parser.add_argument("--stall-ms", type=float, default=20.0, help="Pause of the stalling sink")
+    parser.add_argument("--stall-every", type=int, default=500, help="Writes between pauses")
+    parser.add_argument("--capacity", type=int, default=4096, help="fastlog queue capacity")
+    args = parser.parse_args()
+
+    print(f"n={args.n} every {args.interval_us:g} us, stall={args.stall_ms:g} ms every {args.stall_every} writes, capacity={args.capacity}")
+    print(f"{'case':<16} {'sink':<6} {'backend':<8} {'avg us':>8} {'p99 us':>8} {'max us':>9} "
+          f"{'written':>8} {'dropped':>8} {'per batch':>9}")
+    for case in ("enc line", "debug filtered", "debug edge"):
+        for kind in ("null", "file", "stall"):
+            for backend in ("print", "fastlog"):
+                sink, path = make_sink(kind, args)
+                (avg, p99, worst), stats = run_case(case, backend, sink, args)
+                sink.stream.close() if kind == "stall" else sink.close()
+                if path:
+                    os.unlink(path)
+                print(f"{case:<16} {kind:<6} {backend:<8} {avg * 1e6:>8.2f} {p99 * 1e6:>8.2f} {worst * 1e6:>9.0f} "
+                      f"{stats.get('written', ''):>8} {stats.get('dropped', ''):>8} "
+                      f"{stats.get('lines_per_batch', 0.0):>9.1f}")
+    return 0
+
+
+if __name__ == "__main__":
+    exit(main())
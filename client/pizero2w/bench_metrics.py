@@ -0,0 +1,154 @@
+#!/usr/bin/env python3
+"""
+Metrics overhead benchmark.
+Cost per update of Counter/Gauge/Histogram against an empty call and
+against the flushed print(f"[ENC] {ts()} ...") line it replaces, the share
+of one RotaryEncoder edge (fake pigpio) spent on its detent counter, and
+the cost of render(), snapshot() and an HTTP scrape over TCP and a UNIX
+socket with the client's instrumentation loaded.
+
+Examples:
+  python3 bench_metrics.py
+  python3 bench_metrics.py --n 1000000
+"""
+import argparse
+import os
+import socket
+import tempfile
+import time
+
+from hal import FakePi, install_fake_modules
+
+install_fake_modules(["pigpio", "smbus", "pyaudio"])
+
+import metrics
+from rotary_encoder import RotaryEncoder
+
+# Loaded for their metrics only
+import controller  # noqa: F401
+import led_animator  # noqa: F401
+import mpv_player  # noqa: F401
+import ups  # noqa: F401
+import volume  # noqa: F401
+import wake_word_detector  # noqa: F401
+
+
+def ts():
+    """test_ai.py's timestamp"""
+    t = time.time()
+    return time.strftime("%Y-%m-%d %H:%M:%S", time.localtime(t)) + f".{int((t % 1)*1000):03d}"
+
+
+def per_call(fn, n):
+    start = time.perf_counter()
+    for _ in range(n):
+        fn()
+    return (time.perf_counter() - start) / n
+
+
+def bench_updates(n):
+    registry = metrics.Registry()
+    c = registry.counter("c")
+    g = registry.gauge("g")
+    h = registry.histogram("h")
+    clock = time.monotonic
+
+    def noop():
+        pass
+
+    def timed_observe():
+        start = clock()
+        h.observe(clock() - start)
+
+    with open(os.devnull, "w") as devnull:
+        def print_line():
+            print(f"[ENC] {ts()} CW rotations=0 remainder=4.5° (raw=1)", file=devnull, flush=True)
+
+        rows = [
+            ("empty call", noop),
+            ("Counter.inc", c.inc),
+            ("Gauge.set", lambda: g.set(1.5)),
+            ("Histogram.observe", lambda: h.observe(0.0042)),
+            ("monotonic x2 + observe", timed_observe),
+            ("print(ts()) flushed", print_line),
+        ]
+        base = per_call(noop, n)
+        print(f"{'update':<24} {'ns/call':>10} {'over empty':>11}")
+        for name, fn in rows:
+            cost = per_call(fn, n if "print" not in name else n // 20)
+            print(f"{name:<24} {cost * 1e9:>10.0f} {(cost - base) * 1e9:>11.0f}")
+    return per_call(c.inc, n) - base
+
+
+def bench_edge(n, counter_cost):
+    pi = FakePi()
+    enc = RotaryEncoder(23, 27, 22, glitch_us=0, decoder="table", pi=pi)
+    enc.set_rotation_callback(lambda *args: None)
+    edges = ((27, 0), (22, 0), (27, 1), (22, 1))
+    emit = pi.emit
+    start = time.perf_counter()
+    for i in range(n):
+        gpio, level = edges[i & 3]
+        emit(gpio, level)
+    per_edge = (time.perf_counter() - start) / n
+    # One detent (4 edges) increments the counter once
+    share = counter_cost / (per_edge * 4)
+    print(f"\nencoder edge (table decoder, fake pigpio): {per_edge * 1e6:.2f} us/edge, "
+          f"detent counter {counter_cost * 1e9:.0f} ns per 4 edges = {share:.2%} of the edge path")
+
+
+def scrape(address):
+    if address.startswith("/"):
+        sock = socket.socket(socket.AF_UNIX)
+        sock.connect(address)
+    else:
+        host, _, port = address.rpartition(":")
+        sock = socket.create_connection((host, int(port)))
+    with sock:
+        sock.sendall(b"GET /metrics HTTP/1.0\r\n\r\n")
+        return b"".join(iter(lambda: sock.recv(65536), b""))
+
+
+def bench_export(rounds):
+    registry = metrics.REGISTRY
+    for h in [m for m in registry._metrics.values() if m.kind == "histogram"]:
+        for v in (0.0002, 0.003, 0.04):
+            h.observe(v)
+    series = len(registry._metrics)
+    print(f"\n{series} series registered by the client modules")
+    print(f"{'export':<24} {'ms/call':>10} {'bytes':>8}")
+    text = registry.render()
+    print(f"{'render()':<24} {per_call(registry.render, rounds) * 1000:>10.3f} {len(text):>8}")
+    line = registry.snapshot()
+    print(f"{'snapshot()':<24} {per_call(registry.snapshot, rounds) * 1000:>10.3f} {len(line):>8}")
+
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        port = s.getsockname()[1]
+    tmp = tempfile.mkdtemp(prefix="sharm-metrics-")
+    for name, address in (("scrape tcp", f"127.0.0.1:{port}"), ("scrape unix", os.path.join(tmp, "metrics.sock"))):
+        server = metrics.MetricsServer(address)
+        try:
+            body = scrape(address)
+            cost = per_call(lambda: scrape(address), rounds)
+        finally:
+            server.close()
+        print(f"{name:<24} {cost * 1000:>10.3f} {len(body):>8}")
+    os.rmdir(tmp)
+    print(f"\n[METRICS] {line[:160]}{'...' if len(line) > 160 else ''}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--n", type=int, default=200000, help="Updates per measurement")
+    parser.add_argument("--rounds", type=int, default=200, help="Exports per measurement")
+    args = parser.parse_args()
+
+    counter_cost = bench_updates(args.n)
+    bench_edge(args.n, max(counter_cost, 0.0))
+    bench_export(args.rounds)
+    return 0
+
+
+if __name__ == "__main__":
+    exit(main())
@@ -0,0 +1,118 @@
+#!/usr/bin/env python3
+"""
+Radio toggle benchmark: press-to-first-audio latency.
+Serves a generated tone (or --url) from a local HTTP server and measures
+the time from a play request until mpv reports it is feeding audio, for:
+
+- spawn:  a new mpv process per ON, as the old toggle_radio() did
+- resume: one warm mpv, ON is unpause
+- reload: one warm mpv, ON is loadfile (what play() does after resume_window)
+
+Examples:
+  python3 bench_player.py
+  python3 bench_player.py --ao alsa --rounds 10
+  python3 bench_player.py --url https://stream.radioparadise.com/aac-128
+"""
+import argparse
+import math
+import shutil
+import statistics
+import struct
+import sys
+import tempfile
+import time
+import wave
+
+from mpv_player import LocalStreamServer, MpvPlayer
+
+
+def write_tone(path, seconds=30, rate=48000, freq=440.0):
+    """Write a mono 16-bit sine WAV"""
+    period = int(rate / freq * 100)
+    cycle = struct.pack(f"<{period}h", *(int(8000 * math.sin(2 * math.pi * freq * i / rate)) for i in range(period)))
+    frames = cycle * (int(seconds * rate) // period)
+    with wave.open(path, "wb") as w:
+        w.setnchannels(1)
+        w.setsampwidth(2)
+        w.setframerate(rate)
+        w.writeframes(frames)
+
+
+def measure(name, rounds, start, stop):
+    """Run start()/stop() rounds times; start returns latency in seconds or None"""
+    lat = []
+    failed = 0
+    for _ in range(rounds):
+        value = start()
+        if value is None:
+            failed += 1
+        else:
+            lat.append(value)
+        stop()
+        time.sleep(0.2)
+    if lat:
+        print(f"{name:<8} {statistics.median(lat) * 1000:>10.1f} {min(lat) * 1000:>10.1f} "
+              f"{max(lat) * 1000:>10.1f} {failed:>7}")
+    else:
+        print(f"{name:<8} {'-':>10} {'-':>10} {'-':>10} {failed:>7}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--mpv", default="mpv")
+    parser.add_argument("--ao", default="null", help="mpv audio output (default: null)")
+    parser.add_argument("--url", help="Stream to use instead of the local tone")
+    parser.add_argument("--rounds", type=int, default=5)
+    args = parser.parse_args()
+
+    if shutil.which(args.mpv) is None:
+        print(f"{args.mpv} not found", file=sys.stderr)
+        return 1
+
+    server = None
+    url = args.url
+    if url is None:
+        tmp = tempfile.mkdtemp(prefix="sharm-bench-")
+        write_tone(f"{tmp}/tone.wav")
+        server = LocalStreamServer(tmp)
+        url = server.url("tone.wav")
+    mpv_args = [f"--ao={args.ao}"]
+    print(f"url={url} ao={args.ao} rounds={args.rounds}")
+    print(f"{'mode':<8} {'median ms':>10} {'min ms':>10} {'max ms':>10} {'failed':>7}")
+
+    spawned = []
+
+    def spawn_start():
+        stamp = time.monotonic()
+        player = MpvPlayer(mpv=args.mpv, args=mpv_args)
+        spawned.append(player)
+        player.play(url, stamp)
+        return player.wait_for_audio()
+
+    def spawn_stop():
+        spawned.pop().close()
+
+    measure("spawn", args.rounds, spawn_start, spawn_stop)
+
+    for name, window in (("resume", 3600.0), ("reload", 0.0)):
+        player = MpvPlayer(mpv=args.mpv, args=mpv_args, resume_window=window)
+        # First play warms up mpv and the connection
+        player.play(url)
+        player.wait_for_audio()
+        player.pause()
+        time.sleep(0.2)
+
+        def warm_start():
+            player.play(url)
+            return player.wait_for_audio()
+
+        measure(name, args.rounds, warm_start, player.pause)
+        player.close()
+
+    if server:
+        server.close()
+    return 0
+
+
+if __name__ == "__main__":
+    exit(main())
@@ -0,0 +1,134 @@
+#!/usr/bin/env python3
+"""
+Offline wake word benchmark.
+Streams audio files through WakeWordDetector as fast as possible and
+reports throughput, real-time factor, per-frame latency and detections.
+
+With --engine stub (the default) a fake engine is used, so the numbers are
+pure pipeline overhead and no Picovoice key is needed. With --engine
+porcupine the real models are loaded (needs PV_ACCESS_KEY).
+
+Examples:
+  python3 bench_replay.py
+  python3 bench_replay.py --engine porcupine sounds/hello_1.wav
+  python3 bench_replay.py --noise 60
+"""
+import argparse
+import glob
+import os
+import time
+
+from audio_source import NoiseSource, open_source
+from hal import FakePorcupine
+from wake_word_detector import WakeWordDetector
+
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+REPO = os.path.abspath(os.path.join(HERE, "..", ".."))
+DEFAULT_GLOBS = [
+    os.path.join(REPO, "media", "tests", "*.flac"),
+    os.path.join(HERE, "sounds", "*.wav"),
+]
+KEYWORDS = ["hey-pee-dar", "hey-pipi"]
+
+
+class StubEngine(FakePorcupine):
+    """Porcupine stand-in with the real frame size and rate, never detects"""
+
+    def __init__(self, frame_length=512, sample_rate=16000):
+        super().__init__(frame_length, sample_rate)
+
+
+def percentile(sorted_values, p):
+    """Nearest-rank percentile of an already sorted list"""
+    if not sorted_values:
+        return 0.0
+    k = max(0, min(len(sorted_values) - 1, int(round(p / 100.0 * len(sorted_values))) - 1))
+    return sorted_values[k]
+
+
+def run_source(name, source, engine, frames_per_read):
+    """Push one source through a detector and return a result dict"""
+    detections = []
+    detector = WakeWordDetector(KEYWORDS, source=source, engine=engine, frames_per_read=frames_per_read)
+
+    def on_detect(index, keyword):
+        t = detector.frames_processed * detector.frame_length / detector.sample_rate
+        detections.append((t, keyword))
+
+    detector.set_callback(on_detect)
+
+    latencies = []
+    clock = time.perf_counter
+    start = clock()
+    while not detector.eof:
+        t0 = clock()
+        detector.process_audio()
+        latencies.append((clock() - t0) / frames_per_read)
+    elapsed = clock() - start
+
+    frames = detector.frames_processed
+    audio_seconds = frames * detector.frame_length / detector.sample_rate
+    detector.stream.close()
+    latencies.sort()
+    return {
+        "name": name,
+        "frames": frames,
+        "audio_s": audio_seconds,
+        "wall_s": elapsed,
+        "fps": frames / elapsed if elapsed else 0.0,
+        "rtf": elapsed / audio_seconds if audio_seconds else 0.0,
+        "p50_us": percentile(latencies, 50) * 1e6,
+        "p99_us": percentile(latencies, 99) * 1e6,
+        "detections": detections,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("files", nargs="*", help="audio files (default: media/tests and sounds)")
+    parser.add_argument("--engine", choices=["stub", "porcupine"], default="stub")
+    parser.add_argument("--frames-per-read", type=int, default=1)
+    parser.add_argument("--noise", type=float, metavar="SECONDS", help="also run N seconds of synthetic noise")
+    args = parser.parse_args()
+
+    if args.engine == "porcupine":
+        import pvporcupine
+        engine = pvporcupine.create(
+            access_key=os.getenv("PV_ACCESS_KEY", "YOUR_PICOVOICE_ACCESS_KEY"),
+            keyword_paths=[os.path.join(HERE, f"{kw}.ppn") for kw in KEYWORDS]
+        )
+    else:
+        engine = StubEngine()
+
+    files = args.files
+    if not files and args.noise is None:
+        files = sorted(f for pattern in DEFAULT_GLOBS for f in glob.glob(pattern))
+
+    results = []
+    for path in files:
+        try:
+            source = open_source(path, engine.sample_rate)
+        except (OSError, RuntimeError, ValueError) as e:
+            print(f"[SKIP] {os.path.basename(path)}: {e}")
+            continue
+        results.append(run_source(os.path.basename(path), source, engine, args.frames_per_read))
+    if args.noise:
+        source = NoiseSource(engine.sample_rate, duration=args.noise)
+        results.append(run_source(f"noise {args.noise:g}s", source, engine, args.frames_per_read))
+
+    print(f"engine={args.engine} frame_length={engine.frame_length} sample_rate={engine.sample_rate}")
+    print(f"{'source':<40} {'frames':>8} {'audio s':>8} {'frames/s':>10} {'RTF':>8} {'p50 us':>8} {'p99 us':>8}")
+    for r in results:
+        print(f"{r['name'][:40]:<40} {r['frames']:>8} {r['audio_s']:>8.1f} {r['fps']:>10.0f} "
+              f"{r['rtf']:>8.4f} {r['p50_us']:>8.1f} {r['p99_us']:>8.1f}")
+        for t, keyword in r["detections"]:
+            print(f"    {t:8.3f}s  {keyword}")
+
+    if hasattr(engine, "delete"):
+        engine.delete()
+    return 0
+
+
+if __name__ == "__main__":
+    exit(main())
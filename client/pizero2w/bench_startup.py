@@ -0,0 +1,125 @@
+#!/usr/bin/env python3
+"""
+Client startup cost: import time and RSS of each dependency, and the
+[BOOT] timeline of test_ai.py itself.
+
+imports: every module is imported in a fresh interpreter (the client's
+modules with the fakes from hal.py for missing hardware libraries), so
+the numbers show what deferring an import saves. Heavy third party
+modules that are not installed here are listed as such; run this on the
+Pi for the real board/neopixel/pvporcupine/pyaudio numbers.
+
+client: test_ai.py runs for --seconds with fake hardware (and a null
+mixer when neither libasound nor amixer is present), and its startup
+timeline is printed.
+
+Examples:
+  python3 bench_startup.py
+  python3 bench_startup.py --runs 5 --skip-client
+  python3 bench_startup.py --seconds 10
+"""
+import argparse
+import os
+import statistics
+import subprocess
+import sys
+
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+
+THIRD_PARTY = ["board", "neopixel", "pvporcupine", "pyaudio", "numpy", "pigpio", "smbus",
+               "asyncio", "http.server", "multiprocessing", "concurrent.futures"]
+CLIENT = ["startup", "fastlog", "metrics", "controller", "led_animator", "rotary_encoder", "volume",
+          "ups", "earcons", "mpv_player", "wake_word_detector", "wake_word_worker", "vad_gate"]
+
+IMPORT_PROBE = """
+import sys, time
+fake = sys.argv[2] == "1"
+if fake:
+    from hal import install_fake_modules
+    install_fake_modules()
+import startup
+rss = startup.rss_mb()
+start = time.perf_counter()
+try:
+    __import__(sys.argv[1])
+except ImportError as e:
+    print("missing", e)
+    raise SystemExit(0)
+print("ok", time.perf_counter() - start, startup.rss_mb() - rss)
+"""
+
+CLIENT_RUN = """
+import os, runpy, shutil, signal, sys, threading
+from hal import install_fake_modules
+install_fake_modules(realtime=True)
+import ctypes.util, volume
+
+class NullMixer:
+    def get(self):
+        return 50.0
+    def set(self, percent):
+        pass
+    def close(self):
+        pass
+
+if ctypes.util.find_library("asound") is None and shutil.which("amixer") is None:
+    volume.open_mixer = lambda control="Master": NullMixer()
+os.environ.setdefault("METRICS_ADDRESS", "")
+threading.Timer(float(sys.argv[1]), lambda: os.kill(os.getpid(), signal.SIGINT)).start()
+runpy.run_path("test_ai.py", run_name="__main__")
+"""
+
+
+def probe(module, runs):
+    """Median import seconds and RSS growth in MB over runs fresh interpreters, or None if missing"""
+    times = []
+    rss = []
+    fake = "0" if module in THIRD_PARTY else "1"
+    for _ in range(runs):
+        out = subprocess.run([sys.executable, "-c", IMPORT_PROBE, module, fake], cwd=HERE,
+                             capture_output=True, text=True, timeout=120)
+        fields = out.stdout.split()
+        if out.returncode or not fields:
+            return None, out.stderr.strip().splitlines()[-1:] or ["failed"]
+        if fields[0] == "missing":
+            return None, ["not installed"]
+        times.append(float(fields[1]))
+        rss.append(float(fields[2]))
+    return (statistics.median(times), statistics.median(rss)), None
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--runs", type=int, default=3, help="Fresh interpreters per module")
+    parser.add_argument("--seconds", type=float, default=4.0, help="How long the client runs")
+    parser.add_argument("--skip-client", action="store_true", help="Only measure imports")
+    args = parser.parse_args()
+
+    print(f"{'module':<22} {'import ms':>10} {'rss MB':>8}")
+    for group in (THIRD_PARTY, CLIENT):
+        for module in group:
+            result, note = probe(module, args.runs)
+            if result is None:
+                print(f"{module:<22} {'':>10} {'':>8}  {note[0]}")
+            else:
+                print(f"{module:<22} {result[0] * 1000:>10.1f} {result[1]:>8.1f}")
+        print()
+
+    if args.skip_client:
+        return 0
+    out = subprocess.run([sys.executable, "-c", CLIENT_RUN, str(args.seconds)], cwd=HERE,
+                         capture_output=True, text=True, timeout=args.seconds + 60)
+    boot = [line for line in out.stdout.splitlines() if line.startswith("[BOOT]")]
+    if not boot:
+        print("client produced no [BOOT] lines", file=sys.stderr)
+        print(out.stdout[-2000:], out.stderr[-2000:], file=sys.stderr)
+        return 1
+    print("test_ai.py with fake hardware:")
+    for line in boot:
+        print(line)
+    return 0
+
+
+if __name__ == "__main__":
+    exit(main())
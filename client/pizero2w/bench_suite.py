@@ -0,0 +1,415 @@
+#!/usr/bin/env python3
+"""
+Off-device benchmark suite for the Pi Zero client.
+Runs the real UPS, RotaryEncoder, WakeWordDetector, Controller and
+VolumeService code against the fakes in hal.py and reports, in the style
+of pytest-benchmark, the time per operation (min/mean/median/stddev/ops)
+plus component metrics: callback latency, CPU per second of audio and
+event throughput.
+
+Results can be saved as JSON and compared with a saved baseline; the
+exit status is 1 if any benchmark's median got slower than the allowed
+regression, so a change can be gated without a Pi.
+
+Examples:
+  python3 bench_suite.py
+  python3 bench_suite.py -k encoder --rounds 20
+  python3 bench_suite.py --json /tmp/base.json
+  python3 bench_suite.py --compare /tmp/base.json --max-regression 15
+"""
+import argparse
+import asyncio
+import fnmatch
+import json
+import statistics
+import sys
+import threading
+import time
+
+from hal import FakeBus, FakeNeoPixel, FakePi, FakePorcupine, install_fake_modules
+
+install_fake_modules()
+
+from controller import Controller
+from rotary_encoder import RotaryEncoder
+from ups import UPS
+from volume import VolumeService
+from wake_word_detector import WakeWordDetector
+
+
+BENCHMARKS = []
+
+
+def benchmark(name):
+    """Register fn(bench) as a benchmark"""
+    def register(fn):
+        BENCHMARKS.append((name, fn))
+        return fn
+    return register
+
+
+class Bench:
+    """Collects per-round timings and extra metrics for one benchmark"""
+
+    def __init__(self, rounds, warmup):
+        self.rounds = rounds
+        self.warmup = warmup
+        self.times = []
+        self.extra = {}
+
+    def __call__(self, fn, ops=1, setup=None):
+        """
+        Time fn() for each round
+
+        Args:
+            fn: Function doing ops operations per call
+            ops: Operations per call (times are reported per operation)
+            setup: Function() called before each round, outside the timing
+        """
+        clock = time.perf_counter
+        for i in range(self.warmup + self.rounds):
+            if setup:
+                setup()
+            start = clock()
+            fn()
+            elapsed = (clock() - start) / ops
+            if i >= self.warmup:
+                self.times.append(elapsed)
+
+    def result(self):
+        t = sorted(self.times)
+        mean = statistics.fmean(t)
+        return {
+            "min": t[0],
+            "max": t[-1],
+            "mean": mean,
+            "stddev": statistics.stdev(t) if len(t) > 1 else 0.0,
+            "median": statistics.median(t),
+            "ops": 1.0 / mean if mean else 0.0,
+            "rounds": len(t),
+            "extra": self.extra,
+        }
+
+
+def latency_summary(samples):
+    """Return {p50_us, p99_us, max_us} for a list of seconds"""
+    s = sorted(samples)
+    if not s:
+        return {}
+    return {
+        "p50_us": s[len(s) // 2] * 1e6,
+        "p99_us": s[min(len(s) - 1, int(len(s) * 0.99))] * 1e6,
+        "max_us": s[-1] * 1e6,
+    }
+
+
+# Encoder
+
+PIN_BTN, PIN_A, PIN_B = 23, 27, 22
+CW_DETENT = ((PIN_A, 0), (PIN_B, 0), (PIN_A, 1), (PIN_B, 1))
+
+
+def _encoder_bench(bench, decoder):
+    pi = FakePi()
+    enc = RotaryEncoder(PIN_BTN, PIN_A, PIN_B, glitch_us=0, decoder=decoder, pi=pi)
+    detents = 1000
+    latencies = []
+    emitted = [0.0]
+    clock = time.perf_counter
+    enc.set_rotation_callback(lambda *args: latencies.append(clock() - emitted[0]))
+    emit = pi.emit
+
+    def run():
+        tick = 0
+        for _ in range(detents):
+            for i, (gpio, level) in enumerate(CW_DETENT):
+                tick += 500
+                if i == 3:
+                    # Latency is measured from the edge that completes the detent
+                    emitted[0] = clock()
+                emit(gpio, level, tick)
+
+    bench(run, ops=detents * len(CW_DETENT))
+    bench.extra.update(latency_summary(latencies))
+    bench.extra["pin_reads_per_edge"] = pi.reads / max(pi.callbacks_fired, 1)
+    enc.cleanup()
+
+
+@benchmark("encoder_edge[table]")
+def bench_encoder_table(bench):
+    _encoder_bench(bench, "table")
+
+
+@benchmark("encoder_edge[buffer]")
+def bench_encoder_buffer(bench):
+    _encoder_bench(bench, "buffer")
+
+
+# UPS
+
+def _cw2015(bus, voltage, soc):
+    bus.set_word_be(UPS.CW2015_ADDR, UPS.REG_VCELL, int(voltage * 1000 / 0.305))
+    bus.set_word_be(UPS.CW2015_ADDR, UPS.REG_SOC, int(soc * 256))
+
+
+def _ups_bench(bench, **kwargs):
+    pi = FakePi()
+    bus = FakeBus()
+    _cw2015(bus, 3.9, 80.0)
+    ups = UPS(pi=pi, bus=bus, **kwargs)
+    ups.initialize()
+    events = [0]
+    ups.on_battery_change(lambda *args: events.__setitem__(0, events[0] + 1))
+    updates = 500
+    soc = [80.0]
+
+    def run():
+        for _ in range(updates):
+            # Noise around a slow discharge, like the real gauge
+            soc[0] -= 0.002
+            _cw2015(bus, 3.9 + (bus.transactions & 3) * 0.0003, soc[0] + ((bus.transactions & 7) - 4) / 256.0)
+            ups.update()
+
+    bench(run, ops=updates)
+    bench.extra["events_per_update"] = events[0] / max(1, updates * (bench.rounds + bench.warmup))
+    bench.extra["i2c_per_update"] = bus.transactions / max(1, updates * (bench.rounds + bench.warmup))
+    ups.cleanup()
+
+
+@benchmark("ups_update[raw]")
+def bench_ups_raw(bench):
+    _ups_bench(bench)
+
+
+@benchmark("ups_update[deadband]")
+def bench_ups_deadband(bench):
+    _ups_bench(bench, soc_deadband=0.1, voltage_deadband=0.01, hysteresis=1.0)
+
+
+@benchmark("ups_power_edge[dispatch]")
+def bench_ups_power_edge(bench):
+    pi = FakePi()
+    bus = FakeBus()
+    _cw2015(bus, 3.9, 80.0)
+    ups = UPS(pi=pi, bus=bus, dispatch_thread=True)
+    ups.initialize()
+    ups.update()
+    done = threading.Event()
+    ups.on_power_change(lambda connected: done.set())
+    latencies = []
+    level = [pi.levels[UPS.POWER_GPIO]]
+    edges = 200
+
+    def run():
+        for _ in range(edges):
+            level[0] ^= 1
+            done.clear()
+            start = time.perf_counter()
+            pi.emit(UPS.POWER_GPIO, level[0])
+            done.wait(1.0)
+            latencies.append(time.perf_counter() - start)
+
+    bench(run, ops=edges)
+    bench.extra.update(latency_summary(latencies))
+    ups.cleanup()
+
+
+# Wake word
+
+def _wake_bench(bench, threaded):
+    seconds = 10.0
+    state = {}
+    stats = {}
+
+    def setup():
+        engine = FakePorcupine(detect_every=100)
+        detector = WakeWordDetector(["hey-pee-dar", "hey-pipi"], engine=engine, threaded=threaded)
+        detections = [0]
+        detector.set_callback(lambda *args: detections.__setitem__(0, detections[0] + 1))
+        state.update(detector=detector, detections=detections,
+                     frames=int(seconds * detector.sample_rate / detector.frame_length))
+
+    def run():
+        detector = state["detector"]
+        frames = state["frames"]
+        cpu = time.process_time()
+        while detector.frames_processed < frames:
+            detector.process_audio(timeout=1.0)
+        cpu = time.process_time() - cpu
+        detector.cleanup()
+        audio = detector.frames_processed * detector.frame_length / detector.sample_rate
+        stats["cpu_ms_per_audio_s"] = cpu * 1000.0 / audio
+        stats["detections"] = state["detections"][0]
+
+    bench(run, ops=seconds, setup=setup)
+    bench.extra.update(stats)
+
+
+@benchmark("wake_word_audio_s[blocking]")
+def bench_wake_blocking(bench):
+    _wake_bench(bench, threaded=False)
+
+
+@benchmark("wake_word_audio_s[threaded]")
+def bench_wake_threaded(bench):
+    _wake_bench(bench, threaded=True)
+
+
+# Controller
+
+@benchmark("controller_event")
+def bench_controller(bench):
+    count = 2000
+    extra = {}
+
+    def run():
+        controller = Controller(queue_size=count)
+        handled = [0]
+        done = threading.Event()
+
+        async def handler(i):
+            handled[0] += 1
+            if handled[0] == count:
+                done.set()
+
+        controller.on("tick", handler)
+
+        def produce(stop_event):
+            while controller._loop is None:
+                time.sleep(0.001)
+            for i in range(count):
+                controller.post("tick", i)
+            done.wait(5.0)
+            controller.stop()
+
+        controller.add_producer(produce, "bench-producer")
+        asyncio.run(controller.run())
+        stats = controller.get_stats()["tick"]
+        extra["dropped"] = stats["dropped"]
+        extra["avg_dispatch_ms"] = stats["avg_ms"]
+        extra["max_dispatch_ms"] = stats["max_ms"]
+
+    bench(run, ops=count)
+    bench.extra.update(extra)
+
+
+# Volume
+
+class _NullMixer:
+    def __init__(self):
+        self.value = 50.0
+
+    def get(self):
+        return self.value
+
+    def set(self, percent):
+        self.value = percent
+
+    def close(self):
+        pass
+
+
+@benchmark("volume_step")
+def bench_volume(bench):
+    service = VolumeService(mixer=_NullMixer(), initial=50)
+    steps = 1000
+
+    def run():
+        for i in range(steps):
+            service.step(1 if i & 1 else -1)
+
+    bench(run, ops=steps)
+    time.sleep(0.05)
+    bench.extra.update(service.get_stats())
+    service.close()
+
+
+# LEDs
+
+@benchmark("neopixel_fill")
+def bench_neopixel(bench):
+    pixels = FakeNeoPixel(10, 7, brightness=0.2, auto_write=True)
+    fills = 1000
+
+    def run():
+        for i in range(fills):
+            pixels.fill((i & 255, 0, 255 - (i & 255)))
+
+    bench(run, ops=fills)
+    bench.extra["frames"] = pixels.shows
+
+
+def run_benchmarks(pattern, rounds, warmup):
+    results = {}
+    for name, fn in BENCHMARKS:
+        if pattern and not fnmatch.fnmatch(name, f"*{pattern}*"):
+            continue
+        bench = Bench(rounds, warmup)
+        fn(bench)
+        results[name] = bench.result()
+    return results
+
+
+def format_time(seconds):
+    for unit, scale in (("s", 1.0), ("ms", 1e3), ("us", 1e6), ("ns", 1e9)):
+        if seconds * scale >= 1.0 or unit == "ns":
+            return f"{seconds * scale:.2f} {unit}"
+
+
+def print_results(results, baseline=None):
+    print(f"{'name':<30} {'min':>11} {'median':>11} {'mean':>11} {'stddev':>11} {'ops/s':>12} {'rounds':>6}"
+          + ("   vs base" if baseline else ""))
+    for name, r in results.items():
+        line = (f"{name:<30} {format_time(r['min']):>11} {format_time(r['median']):>11} "
+                f"{format_time(r['mean']):>11} {format_time(r['stddev']):>11} {r['ops']:>12.1f} {r['rounds']:>6}")
+        if baseline and name in baseline:
+            change = r["median"] / baseline[name]["median"] - 1.0
+            line += f"   {change * 100:+7.1f}%"
+        print(line)
+    print()
+    for name, r in results.items():
+        if r["extra"]:
+            extra = ", ".join(f"{k}={v:.3f}" if isinstance(v, float) else f"{k}={v}"
+                              for k, v in r["extra"].items())
+            print(f"{name:<30} {extra}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("-k", dest="pattern", help="Only run benchmarks whose name contains this")
+    parser.add_argument("--rounds", type=int, default=10)
+    parser.add_argument("--warmup", type=int, default=1)
+    parser.add_argument("--json", help="Save results to this file")
+    parser.add_argument("--compare", help="Baseline JSON from an earlier --json run")
+    parser.add_argument("--max-regression", type=float, default=20.0,
+                        help="Allowed median slowdown vs baseline in percent (default: 20)")
+    parser.add_argument("--list", action="store_true", help="List benchmark names and exit")
+    args = parser.parse_args()
+
+    if args.list:
+        for name, _ in BENCHMARKS:
+            print(name)
+        return 0
+
+    results = run_benchmarks(args.pattern, args.rounds, args.warmup)
+    baseline = None
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = json.load(f)["benchmarks"]
+    print_results(results, baseline)
+
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump({"created": time.time(), "python": sys.version, "benchmarks": results}, f, indent=2)
+
+    if baseline:
+        failed = [name for name, r in results.items()
+                  if name in baseline and r["median"] > baseline[name]["median"] * (1 + args.max_regression / 100.0)]
+        if failed:
+            print(f"\nRegressions over {args.max_regression:.0f}%: {', '.join(failed)}", file=sys.stderr)
+            return 1
+    return 0
+
+
+if __name__ == "__main__":
+    exit(main())
@@ -0,0 +1,252 @@
+#!/usr/bin/env python3
+"""
+VAD gate benchmark: engine frames skipped and detection recall of
+WakeWordDetector with vad=True against the always-on detector.
+
+A test recording is assembled from room noise with keyword utterances
+inserted at known times (plus short clatter bursts that should not open
+the gate) and streamed through three detectors:
+- always-on:   every frame goes to the engine
+- vad:         VadGate with the default pre-roll
+- vad no-roll: VadGate with preroll_frames=0 (shows what the ring buys)
+
+A second case runs the gate alone on room noise that steps up by
+--step-db of low-frequency noise halfway (a fan or AC switching on) and
+reports how long the gate stays open before the floor catches up.
+
+With --engine stub the utterances are synthetic (a soft fricative onset
+followed by a voiced part) and the engine only fires when it has seen
+both, so frames lost at the onset show up as missed detections. With
+--engine porcupine the given keyword recordings are inserted instead and
+the real models are loaded (needs PV_ACCESS_KEY).
+
+Examples:
+  python3 bench_vad.py
+  python3 bench_vad.py --minutes 30 --keywords 40 --noise-db -55
+  python3 bench_vad.py --engine porcupine hey_pipi_1.wav hey_pipi_2.wav
+"""
+import argparse
+import io
+import os
+import time
+
+import numpy as np
+
+from audio_frames import FrameBuffer
+from audio_source import PcmFifoSource, open_source
+from hal import FakePorcupine
+from vad_gate import VadGate
+from wake_word_detector import WakeWordDetector
+
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+KEYWORDS = ["hey-pee-dar", "hey-pipi"]
+FRAME = 512
+RATE = 16000
+
+
+class SyllableEngine(FakePorcupine):
+    """
+    Stand-in engine that detects the synthetic utterance: at least
+    onset_frames hiss-like frames directly followed by voiced_frames
+    voiced frames. Like Porcupine it needs the start of the word.
+    """
+
+    def __init__(self, onset_frames=4, voiced_frames=10, level=1500):
+        super().__init__(FRAME, RATE)
+        self.onset_frames = onset_frames
+        self.voiced_frames = voiced_frames
+        self.level = level
+        self._hiss = 0
+        self._voiced = 0
+        self._gap = 0
+
+    def _process_func(self, handle, pcm, result_ref):
+        self.frames += 1
+        x = np.frombuffer(pcm, dtype=np.int16).astype(np.float32)
+        rms = float(np.sqrt(np.mean(x * x)))
+        zcr = np.count_nonzero(np.diff(np.signbit(x))) / len(x)
+        hit = False
+        if rms > self.level / 4 and zcr > 0.3:
+            self._hiss = self._hiss + 1 if not self._voiced else 1
+            self._voiced = self._gap = 0
+        elif rms > self.level * 0.8 and zcr < 0.2 and self._hiss >= self.onset_frames:
+            self._voiced += 1
+            if self._voiced == self.voiced_frames:
+                hit = True
+                self._hiss = self._voiced = 0
+        elif self._hiss and not self._voiced and not self._gap:
+            self._gap = 1       # frame straddling onset and vowel
+        else:
+            self._hiss = self._voiced = self._gap = 0
+        result_ref._obj.value = 0 if hit else -1
+        return self.PicovoiceStatuses.SUCCESS
+
+
+def utterance(rng, level=1500):
+    """Synthetic keyword: 0.25 s fricative at -12 dB, then 0.45 s voiced with harmonics"""
+    onset = int(0.25 * RATE)
+    voiced = int(0.45 * RATE)
+    hiss = np.diff(rng.normal(0, level / 4, onset + 1))      # high-passed noise
+    f0 = rng.uniform(110, 220)
+    t = np.arange(voiced) / RATE
+    vowel = sum(np.sin(2 * np.pi * f0 * k * t) / k for k in range(1, 6)) * level * 1.2
+    vowel *= np.minimum(1.0, np.arange(voiced) / (0.05 * RATE))
+    return np.concatenate([hiss, vowel])
+
+
+def build_track(clips, minutes, keywords, noise_db, clatter, seed=0):
+    """
+    Room noise with keyword clips and clatter inserted
+
+    Returns:
+        (int16 array, list of keyword end times in seconds)
+    """
+    rng = np.random.default_rng(seed)
+    n = int(minutes * 60 * RATE)
+    noise = rng.normal(0, 32768 * 10 ** (noise_db / 20), n)
+    # Slow swell so the floor has something to follow
+    noise *= 1.0 + 0.5 * np.sin(2 * np.pi * np.arange(n) / (RATE * 97))
+    track = noise
+    truth = []
+    slots = np.sort(rng.choice(np.arange(2, int(minutes * 60) - 2, 3), size=keywords, replace=False))
+    for i, start_s in enumerate(slots):
+        clip = clips[i % len(clips)] if clips else utterance(rng)
+        start = int(start_s * RATE)
+        end = min(n, start + len(clip))
+        track[start:end] += clip[:end - start]
+        truth.append(end / RATE)
+    for _ in range(clatter):
+        start = rng.integers(0, n - RATE // 10)
+        track[start:start + RATE // 20] += rng.normal(0, 8000, RATE // 20)
+    return np.clip(track, -32768, 32767).astype("<i2"), truth
+
+
+def run(name, track, engine, vad, vad_options=None):
+    detections = []
+    source = PcmFifoSource(io.BytesIO(track.tobytes()), RATE)
+    detector = WakeWordDetector(KEYWORDS, source=source, engine=engine, vad=vad, vad_options=vad_options)
+
+    def on_detect(index, keyword):
+        detections.append(detector.frames_processed * detector.frame_length / detector.sample_rate)
+
+    detector.set_callback(on_detect)
+    engine_frames = getattr(engine, "frames", None)
+    start = time.process_time()
+    while not detector.eof:
+        detector.process_audio()
+    cpu = time.process_time() - start
+    stats = detector.get_stats().get("vad", {})
+    frames = detector.frames_processed
+    calls = frames - stats.get("skipped", 0) + stats.get("replayed", 0)
+    if engine_frames is not None:
+        calls = engine.frames - engine_frames
+    return {"name": name, "frames": frames, "engine_frames": calls, "cpu_s": cpu, "detections": detections,
+            "skipped": stats.get("skipped_fraction", 0.0), "onsets": stats.get("onsets", 0),
+            "floor": stats.get("noise_floor_db")}
+
+
+def noise_step(noise_db, step_db, threshold_db, seconds=120.0, seed=1):
+    """
+    VadGate alone on room noise with low-frequency noise step_db louder
+    added from the middle on
+
+    Returns:
+        (seconds the gate stayed open after the step or None if it never
+        closed, fraction of post-step frames admitted, final floor in dBFS)
+    """
+    rng = np.random.default_rng(seed)
+    n = int(seconds * RATE)
+    half = n // 2
+    track = rng.normal(0, 32768 * 10 ** (noise_db / 20), n)
+    hum = np.convolve(rng.normal(0, 1, n - half), np.ones(32) / 32, mode="same")
+    track[half:] += hum * (32768 * 10 ** ((noise_db + step_db) / 20) / np.std(hum))
+    pcm = np.clip(track, -32768, 32767).astype("<i2")
+
+    gate = VadGate(FakePorcupine(FRAME, RATE), FRAME, threshold_db=threshold_db)
+    buf = FrameBuffer(FRAME, 1)
+    first = -(-half // FRAME)     # first frame entirely after the step
+    frames = n // FRAME
+    last_open = None
+    admitted = 0
+    for i in range(frames):
+        buf.load(pcm[i * FRAME:(i + 1) * FRAME].tobytes())
+        gate.analyze(buf, 1)
+        if gate.admit(0) is not None and i >= first:
+            admitted += 1
+            last_open = i
+    closed = None if last_open == frames - 1 else ((last_open or first) - first + 1) * FRAME / RATE
+    return closed, admitted / (frames - first), gate.floor_db
+
+
+def matched(found, reference, tolerance):
+    """Number of reference times with a detection within tolerance seconds"""
+    return sum(1 for t in reference if any(abs(d - t) <= tolerance for d in found))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("clips", nargs="*", help="keyword recordings (needed with --engine porcupine)")
+    parser.add_argument("--engine", choices=["stub", "porcupine"], default="stub")
+    parser.add_argument("--minutes", type=float, default=10.0, help="Length of the test recording")
+    parser.add_argument("--keywords", type=int, default=20, help="Utterances inserted")
+    parser.add_argument("--noise-db", type=float, default=-60.0, help="Room noise level (dBFS)")
+    parser.add_argument("--clatter", type=int, default=30, help="Short non-speech bursts inserted")
+    parser.add_argument("--threshold", type=float, default=9.0, help="VadGate threshold_db")
+    parser.add_argument("--preroll", type=int, default=16, help="VadGate preroll_frames")
+    parser.add_argument("--step-db", type=float, default=20.0, help="Noise step of the second case (0 = skip)")
+    parser.add_argument("--tolerance", type=float, default=0.5, help="Seconds between matching detections")
+    parser.add_argument("--engine-us", type=float, default=1000.0,
+                        help="Assumed engine CPU per frame for the 'at N us' column")
+    args = parser.parse_args()
+
+    clips = []
+    for path in args.clips:
+        with open_source(path, RATE) as source:
+            data = b"".join(iter(lambda: source.read(RATE), b""))
+        clips.append(np.frombuffer(data, dtype="<i2").astype(float))
+    if args.engine == "porcupine":
+        if not clips:
+            parser.error("--engine porcupine needs keyword recordings")
+        import pvporcupine
+
+        def make_engine():
+            return pvporcupine.create(
+                access_key=os.getenv("PV_ACCESS_KEY", "YOUR_PICOVOICE_ACCESS_KEY"),
+                keyword_paths=[os.path.join(HERE, f"{kw}.ppn") for kw in KEYWORDS])
+    else:
+        make_engine = SyllableEngine
+
+    track, truth = build_track(clips, args.minutes, args.keywords, args.noise_db, args.clatter)
+    audio_s = len(track) / RATE
+    options = {"threshold_db": args.threshold, "preroll_frames": args.preroll}
+    results = [
+        run("always-on", track, make_engine(), vad=False),
+        run("vad", track, make_engine(), vad=True, vad_options=options),
+        run("vad no-roll", track, make_engine(), vad=True, vad_options=dict(options, preroll_frames=0)),
+    ]
+    reference = results[0]["detections"]
+
+    print(f"engine={args.engine} audio={audio_s / 60:.1f} min noise={args.noise_db:g} dBFS "
+          f"keywords={len(truth)} clatter={args.clatter}")
+    print(f"{'':<12} {'engine fr':>10} {'skipped':>8} {'onsets':>7} {'detect':>7} {'recall':>7} "
+          f"{'vs truth':>8} {'cpu ms/s':>9} {f'at {args.engine_us:g} us':>11}")
+    for r in results:
+        recall = matched(r["detections"], reference, args.tolerance) / len(reference) if reference else 0.0
+        truth_recall = matched(r["detections"], truth, args.tolerance) / len(truth) if truth else 0.0
+        print(f"{r['name']:<12} {r['engine_frames']:>10} {r['skipped']:>8.1%} {r['onsets']:>7} "
+              f"{len(r['detections']):>7} {recall:>7.1%} {truth_recall:>8.1%} {r['cpu_s'] * 1000 / audio_s:>9.2f} "
+              f"{(r['cpu_s'] * 1000 + r['engine_frames'] * args.engine_us / 1000) / audio_s:>11.2f}")
+    floor = results[1]["floor"]
+    print(f"\nnoise floor after run: {floor} dBFS; recall is against the always-on detections "
+          f"({len(reference)}), 'vs truth' against the inserted utterances;\n'at N us' adds N us of engine CPU per engine frame to the measured cpu")
+    if args.step_db:
+        closed, admitted, floor = noise_step(args.noise_db, args.step_db, args.threshold)
+        after = "never closed" if closed is None else f"closed {closed:.1f} s after it"
+        print(f"\nnoise step +{args.step_db:g} dB of low-frequency noise at 60 s: gate {after}, "
+              f"{admitted:.1%} of the next 60 s admitted, floor {floor:.1f} dBFS")
+    return 0
+
+
+if __name__ == "__main__":
+    exit(main())
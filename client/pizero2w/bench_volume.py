@@ -0,0 +1,130 @@
+#!/usr/bin/env python3
+"""
+Volume control benchmark: fork-per-detent amixer vs VolumeService.
+Simulates a fast encoder spin (N detents at a given rate) and reports
+mixer changes/sec and knob-to-volume latency for both approaches.
+
+Without amixer on the box, `true` stands in for the forked command and a
+no-op backend for the service, which still measures fork cost vs queueing.
+"""
+import argparse
+import queue
+import shutil
+import subprocess
+import threading
+import time
+
+from volume import AmixerPipe, VolumeService, open_mixer
+
+
+class NullMixer:
+    """Backend that accepts writes and does nothing"""
+
+    def get(self):
+        return 50.0
+
+    def set(self, percent):
+        pass
+
+    def close(self):
+        pass
+
+
+def spin(detents, rate, emit):
+    """Call emit() detents times at rate per second, return list of emit stamps"""
+    stamps = []
+    interval = 1.0 / rate
+    t0 = time.monotonic()
+    for i in range(detents):
+        delay = t0 + i * interval - time.monotonic()
+        if delay > 0:
+            time.sleep(delay)
+        stamps.append(time.monotonic())
+        emit()
+    return stamps
+
+
+def bench_fork(detents, rate, command):
+    """One subprocess per detent, processed serially like the old handler"""
+    q = queue.Queue()
+    done = []
+
+    def worker():
+        while True:
+            stamp = q.get()
+            if stamp is None:
+                return
+            subprocess.run(command, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+            done.append(time.monotonic() - stamp)
+
+    t = threading.Thread(target=worker)
+    t.start()
+    start = time.monotonic()
+    spin(detents, rate, lambda: q.put(time.monotonic()))
+    q.put(None)
+    t.join()
+    wall = time.monotonic() - start
+    return {
+        "writes": len(done),
+        "wall_s": wall,
+        "changes_per_s": len(done) / wall,
+        "settle_ms": done[-1] * 1000.0,
+        "max_latency_ms": max(done) * 1000.0,
+    }
+
+
+def bench_service(detents, rate, mixer):
+    """VolumeService with coalescing"""
+    service = VolumeService(mixer, initial=50.0)
+    start = time.monotonic()
+    spin(detents, rate, lambda: service.step(1))
+    last_request = time.monotonic()
+    final = service.target
+    while service.applied != final:
+        time.sleep(0.0005)
+    settled = time.monotonic()
+    stats = service.get_stats()
+    service.close()
+    wall = settled - start
+    return {
+        "writes": stats["writes"],
+        "wall_s": wall,
+        "changes_per_s": stats["writes"] / wall,
+        "settle_ms": (settled - last_request) * 1000.0,
+        "max_latency_ms": stats["max_latency_ms"],
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--detents", type=int, default=80, help="detents per spin (80 = one turn)")
+    parser.add_argument("--rate", type=float, default=200.0, help="detents per second")
+    parser.add_argument("--backend", choices=["auto", "alsa", "pipe", "null"], default="auto")
+    args = parser.parse_args()
+
+    have_amixer = shutil.which("amixer") is not None
+    fork_cmd = ["amixer", "set", "Master", "1%+"] if have_amixer else ["true"]
+
+    backend = args.backend
+    if backend == "auto":
+        backend = "mixer" if have_amixer else "null"
+    if backend == "null":
+        mixer = NullMixer()
+    elif backend == "pipe":
+        mixer = AmixerPipe()
+    else:
+        mixer = open_mixer()
+
+    print(f"detents={args.detents} rate={args.rate:g}/s fork={' '.join(fork_cmd)} service={type(mixer).__name__}")
+    print(f"{'approach':<16} {'writes':>7} {'changes/s':>10} {'settle ms':>10} {'max lat ms':>11}")
+    for name, result in (
+        ("fork per detent", bench_fork(args.detents, args.rate, fork_cmd)),
+        ("VolumeService", bench_service(args.detents, args.rate, mixer)),
+    ):
+        print(f"{name:<16} {result['writes']:>7} {result['changes_per_s']:>10.1f} "
+              f"{result['settle_ms']:>10.1f} {result['max_latency_ms']:>11.2f}")
+    return 0
+
+
+if __name__ == "__main__":
+    exit(main())
@@ -0,0 +1,154 @@
+#!/usr/bin/env python3
+"""
+Single process vs wake word worker process: encoder callback jitter and
+detection latency.
+
+Each mode runs the Controller with:
+- a pigpio callback thread stand-in feeding quadrature edges to
+  RotaryEncoder (fake pigpio) every --edge-ms; jitter is how late each
+  edge callback runs against its schedule
+- wake word detection on real-time noise with a stub engine that burns
+  --cost-us of CPU per frame while holding the GIL and "detects" every
+  --detect-every frames; latency is capture stamp to the controller's
+  wake handler
+single: WakeWordDetector(threaded=True) in this process (as test_ai.py)
+worker: WakeWordWorker, capture + inference in a child process
+
+On a single core the worker still competes for the CPU, so the gain shows
+on multi-core boards like the Pi Zero 2 W.
+
+Examples:
+  python3 bench_worker.py
+  python3 bench_worker.py --seconds 30 --cost-us 8000 --edge-ms 1
+"""
+import argparse
+import functools
+import os
+import time
+
+from hal import FakePi, FakePorcupine, install_fake_modules
+
+install_fake_modules(["pigpio"])
+
+from audio_source import NoiseSource
+from controller import Controller
+from rotary_encoder import RotaryEncoder
+from wake_word_detector import WakeWordDetector
+from wake_word_worker import WakeWordWorker
+
+
+KEYWORDS = ["hey-pee-dar", "hey-pipi"]
+PIN_BTN, PIN_A, PIN_B = 23, 27, 22
+CW_EDGES = ((PIN_A, 0), (PIN_B, 0), (PIN_A, 1), (PIN_B, 1))
+
+
+def percentile(sorted_values, p):
+    """Nearest-rank percentile of an already sorted list"""
+    if not sorted_values:
+        return 0.0
+    k = max(0, min(len(sorted_values) - 1, int(round(p / 100.0 * len(sorted_values))) - 1))
+    return sorted_values[k]
+
+
+def run(mode, args):
+    controller = Controller()
+    pi = FakePi()
+    encoder = RotaryEncoder(PIN_BTN, PIN_A, PIN_B, glitch_us=0, decoder="table", pi=pi)
+    encoder.set_rotation_callback(lambda *a: controller.post("rotate", *a))
+    controller.on("rotate", lambda *a: None)
+
+    engine_factory = functools.partial(FakePorcupine, 512, 16000, args.detect_every, args.cost_us)
+    source_factory = functools.partial(NoiseSource, 16000, duration=args.seconds, realtime=True)
+    if mode == "single":
+        detector = WakeWordDetector(KEYWORDS, threaded=True, source=source_factory(), engine=engine_factory())
+
+        def stamp():
+            return detector.ring.last_stamp
+    else:
+        detector = WakeWordWorker(KEYWORDS, source_factory=source_factory, engine_factory=engine_factory)
+
+        def stamp():
+            return detector.last_stamp
+
+    controller.add_detector(detector)
+    detector.set_callback(lambda index, name: controller.post("wake", index, name, stamp()))
+    latencies = []
+
+    async def on_wake(index, name, captured):
+        latencies.append(time.monotonic() - captured)
+
+    controller.on("wake", on_wake)
+
+    lateness = []
+
+    def edges(stop_event):
+        period = args.edge_ms / 1000.0
+        due = time.monotonic()
+        k = 0
+        while not stop_event.is_set() and not detector.eof:
+            due += period
+            delay = due - time.monotonic()
+            if delay > 0:
+                time.sleep(delay)
+            lateness.append(time.monotonic() - due)
+            gpio, level = CW_EDGES[k % 4]
+            pi.emit(gpio, level)
+            k += 1
+
+    def stopper(stop_event):
+        deadline = time.monotonic() + args.seconds + 10.0
+        while not detector.eof and time.monotonic() < deadline and not stop_event.wait(0.1):
+            pass
+        controller.stop()
+
+    controller.add_producer(edges, "pigpio-callbacks")
+    controller.add_producer(stopper, "stopper")
+    # Single mode starts capture lazily; give both modes the same head start
+    if hasattr(detector, "start"):
+        detector.start()
+    controller.run_forever()
+
+    stats = detector.get_stats()
+    detector.cleanup()
+    encoder.cleanup()
+    lateness.sort()
+    latencies.sort()
+    rotate = controller.get_stats().get("rotate", {})
+    return {
+        "mode": mode,
+        "edges": len(lateness),
+        "jitter_p50_us": percentile(lateness, 50) * 1e6,
+        "jitter_p99_us": percentile(lateness, 99) * 1e6,
+        "jitter_max_us": (lateness[-1] if lateness else 0.0) * 1e6,
+        "rotate_max_ms": rotate.get("max_ms", 0.0),
+        "detections": len(latencies),
+        "wake_avg_ms": sum(latencies) / len(latencies) * 1000.0 if latencies else 0.0,
+        "wake_max_ms": (latencies[-1] if latencies else 0.0) * 1000.0,
+        "restarts": stats.get("restarts", 0),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--seconds", type=float, default=10.0, help="Audio per mode")
+    parser.add_argument("--cost-us", type=float, default=4000.0, help="Stub inference CPU per 32 ms frame")
+    parser.add_argument("--detect-every", type=int, default=25, help="Stub detection period in frames")
+    parser.add_argument("--edge-ms", type=float, default=2.0, help="Encoder edge period")
+    parser.add_argument("--modes", default="single,worker")
+    args = parser.parse_args()
+
+    print(f"cpus={os.cpu_count()} cost={args.cost_us:g} us/frame edge every {args.edge_ms:g} ms "
+          f"audio={args.seconds:g}s")
+    print(f"{'mode':<8} {'edges':>7} {'jit p50':>9} {'jit p99':>9} {'jit max':>9} {'rot max':>9} "
+          f"{'wakes':>6} {'wake avg':>9} {'wake max':>9} {'restarts':>8}")
+    print(f"{'':<8} {'':>7} {'us':>9} {'us':>9} {'us':>9} {'ms':>9} {'':>6} {'ms':>9} {'ms':>9}")
+    for mode in args.modes.split(","):
+        r = run(mode, args)
+        print(f"{r['mode']:<8} {r['edges']:>7} {r['jitter_p50_us']:>9.0f} {r['jitter_p99_us']:>9.0f} "
+              f"{r['jitter_max_us']:>9.0f} {r['rotate_max_ms']:>9.2f} {r['detections']:>6} "
+              f"{r['wake_avg_ms']:>9.2f} {r['wake_max_ms']:>9.2f} {r['restarts']:>8}")
+    return 0
+
+
+if __name__ == "__main__":
+    exit(main())
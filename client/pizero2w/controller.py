@@ -0,0 +1,249 @@
+#!/usr/bin/env python3
+"""
+Asyncio controller for the Pi Zero client.
+Hardware threads (audio capture, pigpio callbacks, UPS polling) only post
+events; an asyncio loop dispatches them from a bounded queue and runs each
+action as its own task, so slow actions never stall capture or each other.
+"""
+import asyncio
+import inspect
+import sys
+import threading
+import time
+from collections import defaultdict
+
+import metrics
+
+
+class EventStats:
+    """Dispatch latency accounting for one event kind"""
+
+    __slots__ = ("count", "dropped", "total_latency", "max_latency", "last_latency")
+
+    def __init__(self):
+        self.count = 0
+        self.dropped = 0
+        self.total_latency = 0.0
+        self.max_latency = 0.0
+        self.last_latency = 0.0
+
+    def record(self, latency):
+        self.count += 1
+        self.total_latency += latency
+        self.last_latency = latency
+        if latency > self.max_latency:
+            self.max_latency = latency
+
+    def as_dict(self):
+        avg = self.total_latency / self.count if self.count else 0.0
+        return {
+            "count": self.count,
+            "dropped": self.dropped,
+            "avg_ms": avg * 1000.0,
+            "max_ms": self.max_latency * 1000.0,
+            "last_ms": self.last_latency * 1000.0,
+        }
+
+
+class Controller:
+    """
+    Event loop with a bounded action queue.
+
+    Producers call post(kind, *args) from any thread. Handlers registered
+    with on(kind, handler) may be coroutine functions (run as tasks on the
+    loop) or plain functions (run in the default executor).
+    """
+
+    def __init__(self, queue_size=64):
+        """
+        Initialize controller
+
+        Args:
+            queue_size: Maximum number of pending events; extra events are dropped and counted
+        """
+        self.queue_size = queue_size
+        self._handlers = defaultdict(list)
+        self._stats = defaultdict(EventStats)
+        self._dispatch_hist = {}
+        self._action_hist = {}
+        self._loop = None
+        self._queue = None
+        self._tasks = set()
+        self._stopping = None
+        self._producers = []
+        self._threads = []
+        self._stop_event = None
+        self._producers_lock = threading.Lock()
+
+    # Registration
+    def on(self, kind, handler):
+        """
+        Register a handler for an event kind
+
+        Args:
+            kind: Event name, e.g. "wake", "rotate", "button", "battery"
+            handler: Function(*args) or async function(*args)
+        """
+        self._handlers[kind].append(handler)
+
+    def add_producer(self, target, name=None):
+        """
+        Run a blocking producer loop on its own thread while the controller runs
+
+        May be called while running (e.g. for a component that finished
+        initializing late); the thread then starts right away.
+
+        Args:
+            target: Function(stop_event) that loops until stop_event is set
+            name: Thread name
+        """
+        with self._producers_lock:
+            self._producers.append((target, name))
+            if self._stop_event is not None:
+                self._start_producer(target, name)
+
+    def _start_producer(self, target, name):
+        t = threading.Thread(target=self._run_producer, args=(target, self._stop_event), name=name, daemon=True)
+        t.start()
+        self._threads.append(t)
+
+    def add_detector(self, detector, timeout=0.5):
+        """
+        Drive a WakeWordDetector from a capture thread, posting "wake" events
+
+        Args:
+            detector: WakeWordDetector instance
+            timeout: process_audio() wait so the thread notices stop requests
+        """
+        detector.set_callback(lambda index, name: self.post("wake", index, name))
+
+        def capture(stop_event):
+            while not stop_event.is_set() and not detector.eof:
+                detector.process_audio(timeout)
+
+        self.add_producer(capture, "wake-capture")
+
+    # Producers
+    def post(self, kind, *args):
+        """
+        Queue an event; safe to call from any thread
+
+        Returns:
+            False if the controller is not running
+        """
+        loop = self._loop
+        if loop is None or loop.is_closed():
+            return False
+        stamp = time.monotonic()
+        try:
+            loop.call_soon_threadsafe(self._enqueue, kind, args, stamp)
+        except RuntimeError:
+            # Loop closed between the check and the call
+            return False
+        return True
+
+    def _enqueue(self, kind, args, stamp):
+        try:
+            self._queue.put_nowait((kind, args, stamp))
+        except asyncio.QueueFull:
+            self._stats[kind].dropped += 1
+
+    # Loop
+    async def run(self):
+        """Dispatch events until stop() is called"""
+        self._loop = asyncio.get_running_loop()
+        self._queue = asyncio.Queue(maxsize=self.queue_size)
+        self._stopping = asyncio.Event()
+        with self._producers_lock:
+            self._stop_event = threading.Event()
+            for target, name in self._producers:
+                self._start_producer(target, name)
+
+        dispatcher = asyncio.create_task(self._dispatch())
+        try:
+            await self._stopping.wait()
+        finally:
+            with self._producers_lock:
+                self._stop_event.set()
+                self._stop_event = None
+                threads, self._threads = self._threads, []
+            dispatcher.cancel()
+            for task in list(self._tasks):
+                task.cancel()
+            await asyncio.gather(dispatcher, *self._tasks, return_exceptions=True)
+            for t in threads:
+                await self._loop.run_in_executor(None, t.join, 2.0)
+            self._loop = None
+
+    def run_forever(self):
+        """
+        Blocking entry point; returns after stop() or KeyboardInterrupt
+
+        Returns:
+            True if interrupted by KeyboardInterrupt, False after stop()
+        """
+        try:
+            asyncio.run(self.run())
+        except KeyboardInterrupt:
+            return True
+        return False
+
+    def stop(self):
+        """Request shutdown; safe to call from any thread"""
+        loop = self._loop
+        if loop is not None and not loop.is_closed():
+            loop.call_soon_threadsafe(self._stopping.set)
+
+    def create_task(self, coro):
+        """Start a background task owned by the controller (cancelled on stop)"""
+        task = asyncio.ensure_future(coro)
+        self._tasks.add(task)
+        task.add_done_callback(self._task_done)
+        return task
+
+    async def _dispatch(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            kind, args, stamp = await self._queue.get()
+            latency = time.monotonic() - stamp
+            self._stats[kind].record(latency)
+            dispatch = self._dispatch_hist.get(kind)
+            if dispatch is None:
+                dispatch = self._dispatch_hist[kind] = metrics.histogram(
+                    "event_dispatch_seconds", "post() to handler start", {"kind": kind})
+                self._action_hist[kind] = metrics.histogram(
+                    "event_action_seconds", "post() to handler done (wake-to-action for kind=wake)", {"kind": kind})
+            dispatch.observe(latency)
+            action = self._action_hist[kind]
+            for handler in self._handlers.get(kind, ()):
+                if inspect.iscoroutinefunction(handler):
+                    task = self.create_task(handler(*args))
+                else:
+                    task = self.create_task(loop.run_in_executor(None, handler, *args))
+                task.add_done_callback(lambda _, s=stamp, h=action: h.observe(time.monotonic() - s))
+
+    def _run_producer(self, target, stop_event):
+        try:
+            target(stop_event)
+        except Exception as e:
+            print(f"Producer error: {e}", file=sys.stderr)
+
+    def _task_done(self, task):
+        self._tasks.discard(task)
+        if not task.cancelled() and task.exception() is not None:
+            print(f"Action error: {task.exception()!r}", file=sys.stderr)
+
+    # Reporting
+    def get_stats(self):
+        """
+        Get per-event dispatch statistics
+
+        Returns:
+            dict kind -> {count, dropped, avg_ms, max_ms, last_ms}
+        """
+        return {kind: s.as_dict() for kind, s in self._stats.items()}
+
+    @property
+    def pending(self):
+        """Number of events waiting for dispatch"""
+        return self._queue.qsize() if self._queue else 0
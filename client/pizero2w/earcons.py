@@ -0,0 +1,337 @@
+#!/usr/bin/env python3
+"""
+Earcon player: short feedback sounds from memory through one warm stream.
+WAV files are decoded once at startup into PCM in the output format; a
+mixer thread writes them to a single PyAudio stream that stays open, so
+playing a clip is a queue append instead of forking aplay.
+
+Overlap and priority:
+- a clip with higher priority than everything playing cuts the others
+- a clip with lower priority than something playing is dropped
+- at equal priority the clip replaces voices of the same group, or mixes
+  with them when overlap=True; at most max_voices play at once
+"""
+import glob
+import os
+import random
+import sys
+import threading
+import time
+import wave
+from array import array
+from collections import defaultdict
+
+from audio_source import PORTAUDIO_LOCK
+
+
+class Clip:
+    """Decoded PCM (int16, interleaved) in the player's output format"""
+
+    def __init__(self, name, group, pcm, frames):
+        self.name = name
+        self.group = group
+        self.pcm = pcm
+        self.frames = frames
+
+
+class _Voice:
+    def __init__(self, clip, priority, stamp):
+        self.clip = clip
+        self.priority = priority
+        self.stamp = stamp
+        self.offset = 0     # bytes
+
+
+def _group_name(path):
+    """hello_2.wav -> hello"""
+    stem = os.path.splitext(os.path.basename(path))[0]
+    head, sep, tail = stem.rpartition("_")
+    return head if sep and tail.isdigit() else stem
+
+
+class EarconPlayer:
+    """Plays preloaded clips through one persistent output stream"""
+
+    def __init__(self, sample_rate=48000, channels=2, block_frames=480, max_voices=4,
+                 device_index=None, pa=None, device=None):
+        """
+        Initialize player (the output stream is opened on first play and kept open)
+
+        Args:
+            sample_rate: Output sample rate; clips are converted to it on load
+            channels: Output channels (1 or 2)
+            block_frames: Frames per stream write (480 = 10 ms at 48 kHz)
+            max_voices: Maximum clips mixed at once
+            device_index: PyAudio output device (None = default)
+            pa: PyAudio instance to use (optional)
+            device: Output device by name instead of index, e.g. "default" for
+                    the ALSA default PCM that aplay plays to (with the pulse
+                    plugin it needs XDG_RUNTIME_DIR in this process's
+                    environment before PyAudio is first created)
+        """
+        self.sample_rate = sample_rate
+        self.channels = channels
+        self.block_frames = block_frames
+        self.block_bytes = block_frames * channels * 2
+        self.max_voices = max_voices
+        self.device_index = device_index
+        self.device = device
+
+        self.clips = {}
+        self.groups = defaultdict(list)
+        self._pa = pa
+        self._stream = None
+        self._voices = []
+        self._cond = threading.Condition()
+        self._running = True
+        self._silence = bytes(self.block_bytes)
+
+        # Counters
+        self.plays = 0
+        self.dropped = 0
+        self.preempted = 0
+        self.blocks = 0
+        self.last_latency = None
+        self.max_latency = 0.0
+        self._latency_sum = 0.0
+        self._latency_count = 0
+
+        self._thread = threading.Thread(target=self._run, name="earcons", daemon=True)
+        self._thread.start()
+
+    # Loading
+    def load(self, pattern):
+        """
+        Decode WAV files matching a glob pattern
+
+        Returns:
+            Number of clips loaded
+        """
+        count = 0
+        for path in sorted(glob.glob(pattern)):
+            try:
+                self.add_clip(path)
+                count += 1
+            except (wave.Error, EOFError, ValueError) as e:
+                print(f"Earcon {path} skipped: {e}", file=sys.stderr)
+        return count
+
+    def add_clip(self, path, name=None, group=None):
+        """Decode one 16-bit WAV file and store it under name (default: file stem)"""
+        with wave.open(path, "rb") as w:
+            if w.getsampwidth() != 2:
+                raise ValueError("only 16-bit PCM is supported")
+            rate = w.getframerate()
+            channels = w.getnchannels()
+            raw = w.readframes(w.getnframes())
+        pcm = self._convert(raw, rate, channels)
+        name = name or os.path.splitext(os.path.basename(path))[0]
+        group = group or _group_name(path)
+        clip = Clip(name, group, pcm, len(pcm) // (2 * self.channels))
+        self.clips[name] = clip
+        if clip not in self.groups[group]:
+            self.groups[group].append(clip)
+        return clip
+
+    def _convert(self, raw, rate, channels):
+        """Convert int16 PCM to the output channel count and rate"""
+        samples = array("h")
+        samples.frombytes(raw)
+        if sys.byteorder == "big":
+            samples.byteswap()
+        if channels != self.channels:
+            frames = len(samples) // channels
+            if channels == 1:
+                out = array("h", bytes(2 * frames * self.channels))
+                for c in range(self.channels):
+                    out[c::self.channels] = samples
+            else:
+                # Keep the first channel (downmix is not worth it for earcons)
+                mono = samples[::channels]
+                out = array("h", bytes(2 * frames * self.channels))
+                for c in range(self.channels):
+                    out[c::self.channels] = mono
+            samples = out
+        if rate != self.sample_rate:
+            # Nearest-sample resampling; done once at load time
+            ch = self.channels
+            frames = len(samples) // ch
+            new_frames = int(frames * self.sample_rate / rate)
+            step = rate / self.sample_rate
+            out = array("h", bytes(2 * new_frames * ch))
+            for i in range(new_frames):
+                src = int(i * step) * ch
+                out[i * ch:(i + 1) * ch] = samples[src:src + ch]
+            samples = out
+        if sys.byteorder == "big":
+            samples.byteswap()
+        return samples.tobytes()
+
+    # Playback (any thread, never blocks)
+    def play(self, name, priority=0, overlap=False):
+        """
+        Play a clip, or a random clip of a group
+
+        Args:
+            name: Clip name or group name
+            priority: Higher cuts lower; lower than anything playing is dropped
+            overlap: Mix with same-priority voices of the same group instead of replacing them
+
+        Returns:
+            True if the clip was scheduled
+        """
+        clip = self.clips.get(name)
+        if clip is None:
+            group = self.groups.get(name)
+            if not group:
+                return False
+            clip = random.choice(group)
+
+        voice = _Voice(clip, priority, time.monotonic())
+        with self._cond:
+            top = max((v.priority for v in self._voices), default=None)
+            if top is not None and priority < top:
+                self.dropped += 1
+                return False
+            if top is not None and priority > top:
+                self.preempted += len(self._voices)
+                self._voices = []
+            elif not overlap:
+                kept = [v for v in self._voices if v.clip.group != clip.group]
+                self.preempted += len(self._voices) - len(kept)
+                self._voices = kept
+            if len(self._voices) >= self.max_voices:
+                self._voices.pop(0)
+                self.preempted += 1
+            self._voices.append(voice)
+            self.plays += 1
+            self._cond.notify()
+        return True
+
+    def stop_all(self):
+        with self._cond:
+            self._voices = []
+
+    @property
+    def active(self):
+        """Number of clips currently playing"""
+        return len(self._voices)
+
+    def get_stats(self):
+        """
+        Get playback counters
+
+        Returns:
+            dict with plays, dropped and preempted clips, blocks written and
+            play()-to-first-write latency (last/avg/max, ms)
+        """
+        n = self._latency_count
+        return {
+            "clips": len(self.clips),
+            "plays": self.plays,
+            "dropped": self.dropped,
+            "preempted": self.preempted,
+            "blocks": self.blocks,
+            "last_latency_ms": self.last_latency * 1000.0 if self.last_latency is not None else None,
+            "avg_latency_ms": self._latency_sum * 1000.0 / n if n else None,
+            "max_latency_ms": self.max_latency * 1000.0,
+        }
+
+    def close(self):
+        """Stop the mixer thread and close the stream"""
+        with self._cond:
+            self._running = False
+            self._cond.notify()
+        self._thread.join(timeout=2.0)
+        with PORTAUDIO_LOCK:
+            if self._stream:
+                self._stream.stop_stream()
+                self._stream.close()
+                self._stream = None
+            if self._pa:
+                self._pa.terminate()
+                self._pa = None
+
+    def warm_up(self):
+        """Open the output stream now instead of on the first play"""
+        with self._cond:
+            if self._stream is None:
+                self._open()
+                self._stream.write(self._silence)
+
+    # Mixer thread
+    def _open(self):
+        import pyaudio
+        with PORTAUDIO_LOCK:
+            if self._pa is None:
+                self._pa = pyaudio.PyAudio()
+            if self.device is not None and self.device_index is None:
+                self.device_index = self._find_device(self.device)
+            self._stream = self._pa.open(
+                rate=self.sample_rate,
+                channels=self.channels,
+                format=pyaudio.paInt16,
+                output=True,
+                output_device_index=self.device_index,
+                frames_per_buffer=self.block_frames
+            )
+
+    def _find_device(self, name):
+        """Index of the output device called name, None (PortAudio default) if there is none"""
+        for i in range(self._pa.get_device_count()):
+            info = self._pa.get_device_info_by_index(i)
+            if info.get("name") == name and info.get("maxOutputChannels", 0) > 0:
+                return i
+        print(f"Earcon output device '{name}' not found, using the PortAudio default", file=sys.stderr)
+        return None
+
+    def _next_block(self):
+        """Mix the next block from active voices; caller holds _cond"""
+        size = self.block_bytes
+        starts = [v.stamp for v in self._voices if v.offset == 0]
+
+        if len(self._voices) == 1:
+            # Common case: a plain slice, no per-sample work
+            v = self._voices[0]
+            block = v.clip.pcm[v.offset:v.offset + size]
+            v.offset += size
+        else:
+            mix = array("i", bytes(4 * (size // 2)))
+            for v in self._voices:
+                chunk = array("h")
+                chunk.frombytes(v.clip.pcm[v.offset:v.offset + size])
+                v.offset += size
+                for i, s in enumerate(chunk):
+                    mix[i] += s
+            block = array("h", (32767 if s > 32767 else -32768 if s < -32768 else s for s in mix)).tobytes()
+
+        self._voices = [v for v in self._voices if v.offset < len(v.clip.pcm)]
+        if len(block) < size:
+            block += self._silence[len(block):]
+        return block, starts
+
+    def _run(self):
+        while True:
+            with self._cond:
+                while self._running and not self._voices:
+                    self._cond.wait()
+                if not self._running:
+                    return
+                block, starts = self._next_block()
+            try:
+                if self._stream is None:
+                    self._open()
+                now = time.monotonic()
+                for stamp in starts:
+                    latency = now - stamp
+                    self.last_latency = latency
+                    self._latency_sum += latency
+                    self._latency_count += 1
+                    if latency > self.max_latency:
+                        self.max_latency = latency
+                self._stream.write(block)
+                self.blocks += 1
+            except Exception as e:
+                print(f"Earcon output error: {e}", file=sys.stderr)
+                self._stream = None
+                time.sleep(0.5)
@@ -0,0 +1,210 @@
+#!/usr/bin/env python3
+"""
+Asynchronous buffered log for callback threads.
+A call checks the level, then appends (monotonic time, level, tag,
+template, args) to a bounded queue; nothing is formatted or written on
+the caller's thread. A writer thread formats batches as
+
+    [TAG] 2025-01-31 12:00:00.123 message
+
+and writes each batch with one write() and one flush(). When the queue is
+full new records are dropped and counted, so a stalled SD card or
+journald never blocks a pigpio callback.
+
+Templates use str.format ("{} rotations={:.1f}"), or are a function
+called with the args on the writer thread. Args are formatted later, so
+pass snapshots (tuple(buffer)) rather than objects that keep changing.
+"""
+import atexit
+import collections
+import os
+import sys
+import threading
+import time
+
+
+DEBUG = 10
+INFO = 20
+WARNING = 30
+ERROR = 40
+LEVELS = {"DEBUG": DEBUG, "INFO": INFO, "WARNING": WARNING, "ERROR": ERROR}
+
+
+class FastLog:
+    """Bounded record queue drained by a background writer"""
+
+    def __init__(self, stream=None, level=INFO, capacity=4096, flush_interval=0.1, batch=256):
+        """
+        Initialize log and start the writer
+
+        Args:
+            stream: Text stream to write to (default: sys.stdout)
+            level: Minimum level recorded
+            capacity: Queued records before new ones are dropped
+            flush_interval: Seconds the writer waits to collect a batch
+            batch: Records per write; this many queued wakes the writer early
+        """
+        self.stream = stream if stream is not None else sys.stdout
+        self.level = level
+        self.capacity = capacity
+        self.flush_interval = flush_interval
+        self.batch = batch
+
+        self._queue = collections.deque()
+        self._wake = threading.Event()
+        self._flush_now = threading.Event()
+        self._closed = False
+        # Wall clock = monotonic + offset; stamps stay ordered if NTP steps the clock
+        self._offset = time.time() - time.monotonic()
+        self._second = None
+        self._second_text = ""
+
+        self.dropped = 0
+        self.written = 0
+        self.batches = 0
+        self.max_depth = 0
+        self.write_errors = 0
+        self._reported_drops = 0
+
+        self._thread = threading.Thread(target=self._run, name="fastlog", daemon=True)
+        self._thread.start()
+        atexit.register(self.close)
+
+    def enabled(self, level):
+        return level >= self.level
+
+    def log(self, level, tag, template, *args):
+        """
+        Queue one record (cheap; safe from any thread)
+
+        Args:
+            level: DEBUG, INFO, WARNING or ERROR
+            tag: Line prefix without brackets, e.g. "ENC"
+            template: str.format template or function(*args) -> str
+            args: Values for the template
+        """
+        if level < self.level:
+            return
+        queue = self._queue
+        depth = len(queue)
+        if depth >= self.capacity or self._closed:
+            self.dropped += 1
+            return
+        queue.append((time.monotonic(), level, tag, template, args))
+        if not depth:
+            self._wake.set()
+        elif depth >= self.batch or level >= WARNING:
+            self._flush_now.set()
+
+    def debug(self, tag, template, *args):
+        if DEBUG >= self.level:
+            self.log(DEBUG, tag, template, *args)
+
+    def info(self, tag, template, *args):
+        if INFO >= self.level:
+            self.log(INFO, tag, template, *args)
+
+    def warning(self, tag, template, *args):
+        self.log(WARNING, tag, template, *args)
+
+    def error(self, tag, template, *args):
+        self.log(ERROR, tag, template, *args)
+
+    def _timestamp(self, stamp):
+        wall = stamp + self._offset
+        second = int(wall)
+        if second != self._second:
+            self._second = second
+            self._second_text = time.strftime("%Y-%m-%d %H:%M:%S", time.localtime(second))
+        return f"{self._second_text}.{int((wall - second) * 1000):03d}"
+
+    def _format(self, record):
+        stamp, level, tag, template, args = record
+        try:
+            message = template(*args) if callable(template) else (template.format(*args) if args else template)
+        except Exception as e:
+            message = f"<format error {e!r}: {template!r} {args!r}>"
+        return f"[{tag}] {self._timestamp(stamp)} {message}\n"
+
+    def _drain(self):
+        queue = self._queue
+        depth = len(queue)
+        if depth > self.max_depth:
+            self.max_depth = depth
+        while True:
+            # At most one batch per write so the GIL is handed back between batches
+            lines = [self._format(queue.popleft()) for _ in range(min(len(queue), self.batch))]
+            if self.dropped != self._reported_drops:
+                lines.append(f"[LOG] {self._timestamp(time.monotonic())} "
+                             f"{self.dropped - self._reported_drops} records dropped (queue full)\n")
+                self._reported_drops = self.dropped
+            if not lines:
+                return
+            try:
+                self.stream.write("".join(lines))
+                self.stream.flush()
+            except (OSError, ValueError) as e:
+                self.write_errors += 1
+                print(f"fastlog: write failed: {e}", file=sys.stderr)
+            self.written += len(lines)
+            self.batches += 1
+
+    def _run(self):
+        while not self._closed:
+            # Idle timeout bounds how long a record appended while draining can wait
+            self._wake.wait(1.0)
+            self._wake.clear()
+            if self._flush_now.wait(self.flush_interval):
+                self._flush_now.clear()
+            self._drain()
+        self._drain()
+
+    def flush(self, timeout=1.0):
+        """Ask the writer to write everything queued so far and wait for it"""
+        deadline = time.monotonic() + timeout
+        self._wake.set()
+        self._flush_now.set()
+        while self._queue and time.monotonic() < deadline:
+            time.sleep(0.005)
+
+    def close(self):
+        """Write what is queued and stop the writer"""
+        if self._closed:
+            return
+        self._closed = True
+        self._wake.set()
+        self._flush_now.set()
+        self._thread.join(timeout=2.0)
+
+    def get_stats(self):
+        """Get writer statistics"""
+        return {
+            "written": self.written,
+            "dropped": self.dropped,
+            "batches": self.batches,
+            "lines_per_batch": self.written / self.batches if self.batches else 0.0,
+            "queued": len(self._queue),
+            "max_depth": self.max_depth,
+            "write_errors": self.write_errors,
+        }
+
+
+_default = None
+_default_lock = threading.Lock()
+
+
+def get(level=None):
+    """
+    Process-wide log on stdout, created on first use
+
+    Args:
+        level: Lower the level to at least this (the LOG_LEVEL env var sets the initial one)
+    """
+    global _default
+    if _default is None:
+        with _default_lock:
+            if _default is None:
+                _default = FastLog(level=LEVELS.get(os.getenv("LOG_LEVEL", "INFO").upper(), INFO))
+    if level is not None and level < _default.level:
+        _default.level = level
+    return _default
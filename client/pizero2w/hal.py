@@ -0,0 +1,554 @@
+#!/usr/bin/env python3
+"""
+In-memory hardware fakes for running the client off-device.
+
+- FakePi: scripted pigpio.pi with edge callbacks, a microsecond tick
+  counter and pigpio-style glitch filtering
+- FakeBus: register-map smbus.SMBus
+- FakePyAudio: pyaudio.PyAudio whose input streams are fed from a file
+  (or a noise source) and whose output streams count written frames
+- FakePorcupine: pvporcupine handle shaped like the real one
+- FakeNeoPixel: neopixel.NeoPixel recording every frame it shows
+
+install_fake_modules() registers modules named after the real ones, so
+ups, rotary_encoder, wake_word_detector and test_ai.py import unchanged.
+Real modules are kept when installed unless force=True.
+"""
+import ctypes
+import enum
+import sys
+import threading
+import time
+import types
+from collections import defaultdict, deque
+
+
+TICK_MASK = 0xFFFFFFFF
+
+
+# pigpio
+
+class _CallbackHandle:
+    def __init__(self, cancel):
+        self.cancel = cancel
+
+
+class FakePi:
+    """Stand-in pigpio.pi; edges are delivered synchronously on the caller's thread"""
+
+    connected = True
+
+    def __init__(self, *args, **kwargs):
+        self.levels = defaultdict(lambda: 1)
+        self.handlers = defaultdict(list)
+        self.glitch = {}
+        self.watchdogs = {}
+        self.tick = 0
+        self.reads = 0
+        self.callbacks_fired = 0
+
+    def set_mode(self, gpio, mode):
+        pass
+
+    def set_pull_up_down(self, gpio, pud):
+        pass
+
+    def set_glitch_filter(self, gpio, steady):
+        self.glitch[gpio] = steady
+
+    def set_watchdog(self, gpio, timeout):
+        self.watchdogs[gpio] = timeout
+
+    def get_current_tick(self):
+        return self.tick
+
+    def read(self, gpio):
+        self.reads += 1
+        return self.levels[gpio]
+
+    def write(self, gpio, level):
+        self.emit(gpio, level)
+
+    def callback(self, gpio, edge=2, func=None):
+        handlers = self.handlers[gpio]
+        handlers.append(func)
+        return _CallbackHandle(lambda: func in handlers and handlers.remove(func))
+
+    def stop(self):
+        pass
+
+    def advance(self, us):
+        """Move the tick counter forward by us microseconds"""
+        self.tick = (self.tick + int(us)) & TICK_MASK
+
+    def emit(self, gpio, level, tick=None):
+        """Set a level and deliver the edge to registered callbacks (no filtering)"""
+        if tick is None:
+            tick = self.tick
+        if level < 2:
+            self.levels[gpio] = level
+        for func in self.handlers.get(gpio, ()):
+            self.callbacks_fired += 1
+            func(gpio, level, tick)
+
+    def script(self, steps):
+        """
+        Play a list of edges, applying glitch filters like pigpiod does
+
+        A level change on a filtered pin is reported only if the pin then
+        stays at that level for the configured steady time; the reported
+        tick is that of the change. Filtered-out changes still move the
+        pin level, so reads see them.
+
+        Args:
+            steps: Iterable of (delay_us, gpio, level)
+
+        Returns:
+            Number of edges delivered to callbacks
+        """
+        timeline = []
+        tick = self.tick
+        for delay, gpio, level in steps:
+            tick += int(delay)
+            timeline.append((tick, gpio, level))
+
+        # Time until the next change on the same pin decides whether an edge survives
+        stable_until = [None] * len(timeline)
+        last_index = {}
+        for i in range(len(timeline) - 1, -1, -1):
+            gpio = timeline[i][1]
+            j = last_index.get(gpio)
+            stable_until[i] = timeline[j][0] if j is not None else None
+            last_index[gpio] = i
+
+        delivered = 0
+        reported = {}
+        for i, (t, gpio, level) in enumerate(timeline):
+            self.tick = t & TICK_MASK
+            steady = self.glitch.get(gpio, 0)
+            if steady:
+                last = reported.setdefault(gpio, self.levels[gpio])
+                self.levels[gpio] = level
+                end = stable_until[i]
+                if (end is not None and end - t < steady) or level == last:
+                    # Too short, or a glitch back to the reported level
+                    continue
+                reported[gpio] = level
+            self.emit(gpio, level, self.tick)
+            delivered += 1
+        return delivered
+
+
+# smbus
+
+class FakeBus:
+    """Stand-in smbus.SMBus backed by a 256-byte register map per address"""
+
+    def __init__(self, bus=None, latency=0.0):
+        """
+        Initialize bus
+
+        Args:
+            bus: Bus number (ignored)
+            latency: Seconds to sleep per transaction, to model bus time
+        """
+        self.regs = defaultdict(lambda: bytearray(256))
+        self.latency = latency
+        self.transactions = 0
+        self.writes = []
+
+    def _transaction(self):
+        self.transactions += 1
+        if self.latency:
+            time.sleep(self.latency)
+
+    def set_word_be(self, addr, reg, value):
+        """Store a big-endian 16-bit register pair (e.g. CW2015 VCELL/SOC)"""
+        regs = self.regs[addr]
+        regs[reg] = (value >> 8) & 0xFF
+        regs[reg + 1] = value & 0xFF
+
+    def read_byte_data(self, addr, reg):
+        self._transaction()
+        return self.regs[addr][reg]
+
+    def write_byte_data(self, addr, reg, value):
+        self._transaction()
+        self.regs[addr][reg] = value & 0xFF
+        self.writes.append((addr, reg, value))
+
+    def read_word_data(self, addr, reg):
+        # SMBus words are little-endian: low byte from reg, high byte from reg + 1
+        self._transaction()
+        regs = self.regs[addr]
+        return regs[reg] | (regs[(reg + 1) & 0xFF] << 8)
+
+    def write_word_data(self, addr, reg, value):
+        self._transaction()
+        regs = self.regs[addr]
+        regs[reg] = value & 0xFF
+        regs[(reg + 1) & 0xFF] = (value >> 8) & 0xFF
+        self.writes.append((addr, reg, value))
+
+    def read_i2c_block_data(self, addr, reg, length=32):
+        self._transaction()
+        return list(self.regs[addr][reg:reg + length])
+
+    def write_i2c_block_data(self, addr, reg, data):
+        self._transaction()
+        self.regs[addr][reg:reg + len(data)] = bytes(data)
+        self.writes.append((addr, reg, list(data)))
+
+    def close(self):
+        pass
+
+
+# pyaudio
+
+paInt16 = 8
+paInputOverflowed = -9981
+
+
+class FakeInputStream:
+    """PyAudio input stream reading from an AudioSource, looping or padding with silence"""
+
+    def __init__(self, open_source, loop=True):
+        """
+        Initialize input stream
+
+        Args:
+            open_source: Function() -> AudioSource, called again to loop
+            loop: Restart the source at EOF instead of padding with silence
+        """
+        self._open = open_source
+        self.source = open_source()
+        self.loop = loop
+        self.frames_read = 0
+        self.exhausted = False
+        self._active = True
+
+    def read(self, num_frames, exception_on_overflow=True):
+        want = num_frames * 2
+        data = self.source.read(num_frames)
+        while len(data) < want:
+            if self.loop and not self.exhausted:
+                self.source.close()
+                self.source = self._open()
+                more = self.source.read((want - len(data)) // 2)
+                if more:
+                    data += more
+                    continue
+            # End of input (or an empty file): pad with silence from now on
+            self.exhausted = True
+            data += bytes(want - len(data))
+        self.frames_read += num_frames
+        return data
+
+    def is_active(self):
+        return self._active
+
+    def stop_stream(self):
+        self._active = False
+
+    def start_stream(self):
+        self._active = True
+
+    def close(self):
+        self._active = False
+        self.source.close()
+
+
+class FakeOutputStream:
+    """PyAudio output stream that counts frames and optionally paces like a device"""
+
+    def __init__(self, rate, channels, realtime=False):
+        self.rate = rate
+        self.channels = channels
+        self.realtime = realtime
+        self.frames_written = 0
+        self.writes = 0
+        self._active = True
+        self._start = None
+
+    def write(self, data, num_frames=None, exception_on_underflow=False):
+        frames = len(data) // (2 * self.channels) if num_frames is None else num_frames
+        if self._start is None:
+            self._start = time.monotonic()
+        self.frames_written += frames
+        self.writes += 1
+        if self.realtime:
+            delay = self._start + self.frames_written / self.rate - time.monotonic()
+            if delay > 0:
+                time.sleep(delay)
+
+    def get_write_available(self):
+        return 1 << 16
+
+    def is_active(self):
+        return self._active
+
+    def stop_stream(self):
+        self._active = False
+
+    def start_stream(self):
+        self._active = True
+
+    def close(self):
+        self._active = False
+
+
+class FakePyAudio:
+    """
+    Stand-in pyaudio.PyAudio
+
+    Input streams read input_path (any format audio_source.open_source
+    accepts); without a path they produce low-level noise.
+    """
+
+    input_path = None
+    realtime = False
+    loop = True
+
+    def __init__(self):
+        self.streams = []
+
+    def get_sample_size(self, fmt):
+        return 2
+
+    # One device, like ALSA's "default" PCM
+    def get_device_count(self):
+        return 1
+
+    def get_device_info_by_index(self, index):
+        return {"index": 0, "name": "default", "maxInputChannels": 2, "maxOutputChannels": 2,
+                "defaultSampleRate": 48000.0}
+
+    def open(self, rate, channels=1, format=paInt16, input=False, output=False,
+             frames_per_buffer=1024, input_device_index=None, output_device_index=None, **kwargs):
+        if input:
+            from audio_source import NoiseSource, open_source
+            path, realtime = self.input_path, self.realtime
+            if path:
+                stream = FakeInputStream(lambda: open_source(path, rate, realtime=realtime), loop=self.loop)
+            else:
+                stream = FakeInputStream(lambda: NoiseSource(rate, realtime=realtime), loop=self.loop)
+        else:
+            stream = FakeOutputStream(rate, channels, realtime=self.realtime)
+        self.streams.append(stream)
+        return stream
+
+    def terminate(self):
+        for stream in self.streams:
+            stream.close()
+        self.streams = []
+
+
+# pvporcupine
+
+class FakePorcupine:
+    """
+    Mimics pvporcupine.Porcupine.process() including the ctypes copy; like
+    the real handle, _process_func returns a PicovoiceStatuses member, not an int
+
+    Args:
+        frame_length: Samples per frame
+        sample_rate: Sample rate in Hz
+        detect_every: Report keyword 0 every N frames (0 = never)
+        cost_us: Busy-wait per frame to stand in for inference time (holds the GIL)
+    """
+
+    class PicovoiceStatuses(enum.Enum):
+        SUCCESS = 0
+        OUT_OF_MEMORY = 1
+        IO_ERROR = 2
+        INVALID_ARGUMENT = 3
+
+    def __init__(self, frame_length=512, sample_rate=16000, detect_every=0, cost_us=0.0):
+        self.frame_length = frame_length
+        self.sample_rate = sample_rate
+        self.detect_every = detect_every
+        self.cost_us = cost_us
+        self.frames = 0
+        self._handle = ctypes.c_void_p(1)
+
+    def _process_func(self, handle, pcm, result_ref):
+        self.frames += 1
+        if self.cost_us:
+            end = time.perf_counter() + self.cost_us / 1e6
+            while time.perf_counter() < end:
+                pass
+        hit = self.detect_every and self.frames % self.detect_every == 0
+        result_ref._obj.value = 0 if hit else -1
+        return self.PicovoiceStatuses.SUCCESS
+
+    def process(self, pcm):
+        if len(pcm) != self.frame_length:
+            raise ValueError("Invalid frame length")
+        result = ctypes.c_int()
+        status = self._process_func(self._handle, (ctypes.c_short * len(pcm))(*pcm), ctypes.byref(result))
+        if status is not self.PicovoiceStatuses.SUCCESS:
+            raise RuntimeError(f"process failed: {status}")
+        return result.value
+
+    def delete(self):
+        pass
+
+
+# neopixel / board
+
+RGB = "RGB"
+GRB = "GRB"
+
+
+class FakeNeoPixel:
+    """Stand-in neopixel.NeoPixel; show() records the brightness-scaled frame"""
+
+    def __init__(self, pin, n, *, bpp=3, brightness=1.0, auto_write=True, pixel_order=None,
+                 history=1024, write_us_per_pixel=0.0):
+        """
+        Initialize strip
+
+        Args:
+            pin: board pin (ignored)
+            n: Number of pixels
+            brightness: 0.0-1.0 scale applied on show()
+            auto_write: show() after every change, like the real driver
+            history: Frames kept in self.frames
+            write_us_per_pixel: Simulated wire time per pixel (WS2812 ~30 us)
+        """
+        self.pin = pin
+        self.n = n
+        self.bpp = bpp
+        self.auto_write = auto_write
+        self.pixel_order = pixel_order
+        self.write_us_per_pixel = write_us_per_pixel
+        self._brightness = brightness
+        self._buf = [(0,) * bpp] * n
+        self.frames = deque(maxlen=history)
+        self.shows = 0
+
+    def __len__(self):
+        return self.n
+
+    def __getitem__(self, index):
+        return self._buf[index]
+
+    def __setitem__(self, index, value):
+        if isinstance(index, slice):
+            self._buf[index] = [tuple(v) for v in value]
+        else:
+            self._buf[index] = tuple(value)
+        if self.auto_write:
+            self.show()
+
+    @property
+    def brightness(self):
+        return self._brightness
+
+    @brightness.setter
+    def brightness(self, value):
+        self._brightness = min(max(value, 0.0), 1.0)
+        if self.auto_write:
+            self.show()
+
+    def fill(self, color):
+        self._buf = [tuple(color)] * self.n
+        if self.auto_write:
+            self.show()
+
+    def show(self):
+        b = self._brightness
+        self.frames.append((time.monotonic(), tuple(tuple(int(c * b) for c in px) for px in self._buf)))
+        self.shows += 1
+        if self.write_us_per_pixel:
+            time.sleep(self.write_us_per_pixel * self.n / 1e6)
+
+    def deinit(self):
+        pass
+
+
+# Module installation
+
+_install_lock = threading.Lock()
+
+
+def _module(name, **attrs):
+    mod = types.ModuleType(name)
+    mod.__dict__.update(attrs)
+    mod.__fake__ = True
+    return mod
+
+
+def _pigpio_module():
+    return _module(
+        "pigpio", pi=FakePi, INPUT=0, OUTPUT=1, PUD_OFF=0, PUD_DOWN=1, PUD_UP=2,
+        RISING_EDGE=0, FALLING_EDGE=1, EITHER_EDGE=2, TIMEOUT=2,
+        tickDiff=lambda t1, t2: (t2 - t1) & TICK_MASK,
+    )
+
+
+def _smbus_module():
+    return _module("smbus", SMBus=FakeBus)
+
+
+def _pyaudio_module():
+    return _module("pyaudio", PyAudio=FakePyAudio, paInt16=paInt16, paInputOverflowed=paInputOverflowed)
+
+
+def _pvporcupine_module():
+    def create(access_key=None, keywords=None, keyword_paths=None, sensitivities=None, **kwargs):
+        return FakePorcupine()
+    return _module("pvporcupine", create=create, KEYWORDS=set())
+
+
+def _board_module():
+    pins = {f"D{i}": i for i in range(28)}
+    pins.update(MOSI=10, MISO=9, SCK=11, SCL=3, SDA=2)
+    return _module("board", **pins)
+
+
+def _neopixel_module():
+    return _module("neopixel", NeoPixel=FakeNeoPixel, RGB=RGB, GRB=GRB)
+
+
+FAKE_MODULES = {
+    "pigpio": _pigpio_module,
+    "smbus": _smbus_module,
+    "pyaudio": _pyaudio_module,
+    "pvporcupine": _pvporcupine_module,
+    "board": _board_module,
+    "neopixel": _neopixel_module,
+}
+
+
+def install_fake_modules(names=None, force=False, audio_path=None, realtime=False):
+    """
+    Register fake hardware modules in sys.modules
+
+    Args:
+        names: Modules to install (default: all in FAKE_MODULES)
+        force: Replace real modules even when they import
+        audio_path: File fed to FakePyAudio input streams (None = noise)
+        realtime: Pace fake audio streams at the sample rate
+
+    Returns:
+        List of module names that were faked
+    """
+    FakePyAudio.input_path = audio_path
+    FakePyAudio.realtime = realtime
+    installed = []
+    with _install_lock:
+        for name in names or FAKE_MODULES:
+            if not force:
+                if name in sys.modules:
+                    if getattr(sys.modules[name], "__fake__", False):
+                        installed.append(name)
+                    continue
+                try:
+                    __import__(name)
+                    continue
+                except ImportError:
+                    pass
+            sys.modules[name] = FAKE_MODULES[name]()
+            installed.append(name)
+    return installed
@@ -0,0 +1,414 @@
+#!/usr/bin/env python3
+"""
+Record and replay pigpio / smbus traffic.
+
+On the Pi, `record` wraps the real pigpio and SMBus handles given to
+RotaryEncoder and UPS and writes every edge callback, pin read, I2C read
+and class output to a JSON-lines trace. Anywhere, `replay` feeds that
+trace into the unmodified classes through stand-in handles, at 1x or as
+fast as possible, and compares their outputs with the recorded ones.
+
+Trace lines (t = seconds since start of recording):
+  {"k": "header", "version": 1, ...}
+  {"k": "edge", "t": .., "gpio": 27, "level": 0, "tick": 123456}
+  {"k": "read", "t": .., "gpio": 4, "value": 1}
+  {"k": "i2c", "t": .., "op": "word", "addr": 98, "reg": 2, "value": 4660}
+  {"k": "i2c", "t": .., "op": "block", "addr": 98, "reg": 2, "value": [..]}
+  {"k": "out", "t": .., "name": "rotate", "args": [..]}
+
+Examples:
+  python3 hw_trace.py record /tmp/enc.jsonl --decoder table
+  python3 hw_trace.py replay /tmp/enc.jsonl --target encoder --speed 0
+  python3 hw_trace.py replay /tmp/ups.jsonl --target ups --speed 1
+"""
+import argparse
+import json
+import threading
+import time
+from collections import defaultdict, deque
+
+from hal import FakePi, install_fake_modules
+
+
+TRACE_VERSION = 1
+
+
+# Recording
+
+class TraceWriter:
+    """Thread-safe JSON-lines trace writer"""
+
+    def __init__(self, path, **header):
+        self._file = open(path, "w")
+        self._lock = threading.Lock()
+        self._t0 = time.monotonic()
+        self.events = 0
+        self.write("header", version=TRACE_VERSION, created=time.time(), **header)
+
+    def now(self):
+        return time.monotonic() - self._t0
+
+    def write(self, kind, **fields):
+        fields["k"] = kind
+        if kind != "header":
+            fields["t"] = round(self.now(), 6)
+        line = json.dumps(fields, separators=(",", ":"))
+        with self._lock:
+            self._file.write(line + "\n")
+            self.events += 1
+
+    def output(self, name, callback=None):
+        """Wrap a class output callback so its calls are recorded"""
+        def wrapper(*args):
+            self.write("out", name=name, args=[_plain(a) for a in args])
+            if callback:
+                callback(*args)
+        return wrapper
+
+    def close(self):
+        with self._lock:
+            self._file.close()
+
+
+class RecordingPi:
+    """pigpio.pi proxy recording callbacks and pin reads"""
+
+    def __init__(self, pi, writer):
+        self._pi = pi
+        self._writer = writer
+
+    def __getattr__(self, name):
+        return getattr(self._pi, name)
+
+    def read(self, gpio):
+        value = self._pi.read(gpio)
+        self._writer.write("read", gpio=gpio, value=value)
+        return value
+
+    def callback(self, gpio, edge, func):
+        writer = self._writer
+
+        def recorded(g, level, tick):
+            writer.write("edge", gpio=g, level=level, tick=tick)
+            func(g, level, tick)
+
+        return self._pi.callback(gpio, edge, recorded)
+
+
+class RecordingBus:
+    """smbus.SMBus proxy recording reads"""
+
+    def __init__(self, bus, writer):
+        self._bus = bus
+        self._writer = writer
+
+    def __getattr__(self, name):
+        return getattr(self._bus, name)
+
+    def read_word_data(self, addr, reg):
+        value = self._bus.read_word_data(addr, reg)
+        self._writer.write("i2c", op="word", addr=addr, reg=reg, value=value)
+        return value
+
+    def read_i2c_block_data(self, addr, reg, length=32):
+        value = self._bus.read_i2c_block_data(addr, reg, length)
+        self._writer.write("i2c", op="block", addr=addr, reg=reg, value=list(value))
+        return value
+
+
+def _plain(value):
+    """JSON-friendly form of a callback argument"""
+    if isinstance(value, (int, float, str, bool)) or value is None:
+        return value
+    return getattr(value, "value", str(value))
+
+
+# Replay
+
+class ReplayBus:
+    """Stand-in SMBus serving recorded reads in recorded order"""
+
+    def __init__(self, *args, **kwargs):
+        self._queues = defaultdict(deque)
+        self._last = {}
+
+    def load(self, op, addr, reg, value):
+        self._queues[(op, addr, reg)].append(value)
+
+    def _next(self, key):
+        q = self._queues.get(key)
+        if q:
+            self._last[key] = q.popleft()
+        if key not in self._last:
+            raise OSError(f"No recorded I2C data for {key}")
+        return self._last[key]
+
+    def read_word_data(self, addr, reg):
+        return self._next(("word", addr, reg))
+
+    def read_i2c_block_data(self, addr, reg, length=32):
+        return list(self._next(("block", addr, reg)))[:length]
+
+    def write_word_data(self, addr, reg, value):
+        pass
+
+    def close(self):
+        pass
+
+
+def load_trace(path):
+    """Return (header, events) from a trace file"""
+    header = {}
+    events = []
+    with open(path) as f:
+        for line in f:
+            if not line.strip():
+                continue
+            ev = json.loads(line)
+            if ev["k"] == "header":
+                header = ev
+            else:
+                events.append(ev)
+    events.sort(key=lambda e: e["t"])
+    return header, events
+
+
+class Replayer:
+    """Feeds trace events into FakePi/ReplayBus and collects outputs"""
+
+    def __init__(self, events, pi, bus, trigger=None, poll=None):
+        """
+        Initialize replayer
+
+        Args:
+            events: Trace events (sorted by t)
+            pi: hal.FakePi
+            bus: ReplayBus (recorded reads are preloaded)
+            trigger: Function(event) -> bool marking the I2C read that starts a poll
+            poll: Function() called at each trigger (e.g. ups.update)
+        """
+        self.events = events
+        self.pi = pi
+        self.bus = bus
+        self.trigger = trigger
+        self.poll = poll
+        self.outputs = []
+        self.now = 0.0
+        for ev in events:
+            if ev["k"] == "i2c":
+                bus.load(ev["op"], ev["addr"], ev["reg"], ev["value"])
+            elif ev["k"] == "read" and ev["gpio"] not in pi.levels:
+                # Pin levels as first seen (constructor reads)
+                pi.levels[ev["gpio"]] = ev["value"]
+
+    def output(self, name):
+        """Callback factory recording replayed class outputs"""
+        def record(*args):
+            self.outputs.append({"t": self.now, "name": name, "args": [_plain(a) for a in args]})
+        return record
+
+    def run(self, speed=0.0):
+        """
+        Replay all events
+
+        Args:
+            speed: 1.0 = real time, 2.0 = twice as fast, 0 = as fast as possible
+
+        Returns:
+            dict with event count, wall time and throughput
+        """
+        pi = self.pi
+        start = time.monotonic()
+        for ev in self.events:
+            self.now = ev["t"]
+            if speed > 0:
+                delay = start + ev["t"] / speed - time.monotonic()
+                if delay > 0:
+                    time.sleep(delay)
+            kind = ev["k"]
+            if kind == "edge":
+                pi.emit(ev["gpio"], ev["level"], ev["tick"])
+            elif kind == "read":
+                pi.levels[ev["gpio"]] = ev["value"]
+            elif kind == "i2c" and self.poll and self.trigger and self.trigger(ev):
+                self.poll()
+        wall = time.monotonic() - start
+        duration = self.events[-1]["t"] if self.events else 0.0
+        return {
+            "events": len(self.events),
+            "wall_s": wall,
+            "events_per_s": len(self.events) / wall if wall else 0.0,
+            "trace_s": duration,
+            "speedup": duration / wall if wall else 0.0,
+        }
+
+
+def compare_outputs(recorded, replayed, names=None):
+    """
+    Compare recorded and replayed outputs per output name
+
+    Args:
+        recorded: Output events from the trace
+        replayed: Replayer.outputs
+        names: Output names to compare (default: all seen)
+
+    Returns:
+        dict name -> {recorded, replayed, mismatched, first_mismatch, max_dt_ms}
+    """
+    report = {}
+    if names is None:
+        names = {o["name"] for o in recorded} | {o["name"] for o in replayed}
+    for name in sorted(names):
+        a = [o for o in recorded if o["name"] == name]
+        b = [o for o in replayed if o["name"] == name]
+        mismatched = abs(len(a) - len(b))
+        first = None
+        max_dt = 0.0
+        for i, (x, y) in enumerate(zip(a, b)):
+            if x["args"] != y["args"]:
+                mismatched += 1
+                if first is None:
+                    first = {"index": i, "t": x["t"], "recorded": x["args"], "replayed": y["args"]}
+            max_dt = max(max_dt, abs(x["t"] - y["t"]))
+        if first is None and len(a) != len(b):
+            i = min(len(a), len(b))
+            first = {"index": i, "t": (a or b)[i]["t"], "recorded": a[i]["args"] if i < len(a) else None,
+                     "replayed": b[i]["args"] if i < len(b) else None}
+        report[name] = {
+            "recorded": len(a),
+            "replayed": len(b),
+            "mismatched": mismatched,
+            "first_mismatch": first,
+            "max_dt_ms": max_dt * 1000.0,
+        }
+    return report
+
+
+def replay_encoder(events, header, decoder=None):
+    """Replay a trace into RotaryEncoder"""
+    install_fake_modules(["pigpio", "smbus"])
+    from rotary_encoder import RotaryEncoder
+
+    cfg = header.get("encoder", {})
+    pi = FakePi()
+    replayer = Replayer(events, pi, ReplayBus())
+    enc = RotaryEncoder(
+        pin_btn=cfg.get("pin_btn", 23), pin_enc_a=cfg.get("pin_enc_a", 27), pin_enc_b=cfg.get("pin_enc_b", 22),
+        glitch_us=cfg.get("glitch_us", 100), pulses_per_rotation=cfg.get("pulses_per_rotation", 80),
+        decoder=decoder or cfg.get("decoder", "buffer"), pi=pi
+    )
+    enc.set_rotation_callback(replayer.output("rotate"))
+    enc.set_button_callback(replayer.output("button"))
+    return replayer, enc.cleanup
+
+
+def replay_ups(events, header):
+    """Replay a trace into UPS"""
+    install_fake_modules(["pigpio", "smbus"])
+    from ups import UPS
+
+    pi = FakePi()
+    bus = ReplayBus()
+    ups = UPS(pi=pi, bus=bus)
+    replayer = Replayer(events, pi, bus,
+                        trigger=lambda ev: ev["addr"] == UPS.CW2015_ADDR and ev["reg"] == UPS.REG_VCELL,
+                        poll=ups.update)
+    ups.initialize()
+    ups.on_battery_change(replayer.output("battery"))
+    ups.on_power_change(replayer.output("power"))
+    ups.on_low_battery(replayer.output("low_battery"))
+    return replayer, ups.cleanup
+
+
+def cmd_record(args):
+    import pigpio
+    import smbus
+    from rotary_encoder import RotaryEncoder
+    from ups import UPS
+
+    writer = TraceWriter(args.trace, encoder={
+        "pin_btn": 23, "pin_enc_a": 27, "pin_enc_b": 22, "glitch_us": args.glitch_us,
+        "pulses_per_rotation": 80, "decoder": args.decoder,
+    })
+    pi = RecordingPi(pigpio.pi(), writer)
+    if not pi.connected:
+        raise RuntimeError("pigpiod is not running! Start it with: sudo pigpiod")
+
+    enc = RotaryEncoder(pin_btn=23, pin_enc_a=27, pin_enc_b=22, glitch_us=args.glitch_us,
+                        decoder=args.decoder, pi=pi)
+    enc.set_rotation_callback(writer.output("rotate"))
+    enc.set_button_callback(writer.output("button"))
+
+    ups = UPS(auto_update=True, update_interval=args.ups_interval,
+              pi=RecordingPi(pigpio.pi(), writer), bus=RecordingBus(smbus.SMBus(UPS.I2C_BUS_NUM), writer))
+    ups.initialize()
+    ups.on_battery_change(writer.output("battery"))
+    ups.on_power_change(writer.output("power"))
+    ups.on_low_battery(writer.output("low_battery"))
+
+    print(f"[TRACE] Recording to {args.trace} (Ctrl+C to stop)", flush=True)
+    try:
+        deadline = time.monotonic() + args.duration if args.duration else None
+        while deadline is None or time.monotonic() < deadline:
+            time.sleep(0.5)
+    except KeyboardInterrupt:
+        pass
+    finally:
+        ups.cleanup()
+        enc.cleanup()
+        writer.close()
+    print(f"[TRACE] {writer.events} events written", flush=True)
+    return 0
+
+
+def cmd_replay(args):
+    header, events = load_trace(args.trace)
+    if args.target == "encoder":
+        replayer, cleanup = replay_encoder(events, header, args.decoder)
+        names = ("rotate", "button")
+    else:
+        replayer, cleanup = replay_ups(events, header)
+        names = ("battery", "power", "low_battery")
+
+    stats = replayer.run(args.speed)
+    cleanup()
+
+    recorded = [{"t": e["t"], "name": e["name"], "args": e["args"]} for e in events if e["k"] == "out"]
+    print(f"events={stats['events']} trace={stats['trace_s']:.1f}s wall={stats['wall_s']:.3f}s "
+          f"rate={stats['events_per_s']:.0f} ev/s speedup={stats['speedup']:.1f}x")
+    report = compare_outputs(recorded, replayer.outputs, names)
+    diverged = False
+    for name, r in report.items():
+        print(f"{name:<12} recorded={r['recorded']} replayed={r['replayed']} "
+              f"mismatched={r['mismatched']} max_dt={r['max_dt_ms']:.1f}ms")
+        if r["first_mismatch"]:
+            diverged = True
+            print(f"    first divergence: {r['first_mismatch']}")
+    return 1 if diverged else 0
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    rec = sub.add_parser("record", help="record encoder and UPS traffic on the Pi")
+    rec.add_argument("trace")
+    rec.add_argument("--duration", type=float, default=0, help="seconds (0 = until Ctrl+C)")
+    rec.add_argument("--decoder", choices=["buffer", "table"], default="buffer")
+    rec.add_argument("--glitch-us", type=int, default=100)
+    rec.add_argument("--ups-interval", type=float, default=1.0)
+    rec.set_defaults(func=cmd_record)
+
+    rep = sub.add_parser("replay", help="replay a trace into RotaryEncoder or UPS")
+    rep.add_argument("trace")
+    rep.add_argument("--target", choices=["encoder", "ups"], required=True)
+    rep.add_argument("--speed", type=float, default=0.0, help="1 = real time, 0 = as fast as possible")
+    rep.add_argument("--decoder", choices=["buffer", "table"], help="override recorded decoder")
+    rep.set_defaults(func=cmd_replay)
+
+    args = parser.parse_args()
+    return args.func(args)
+
+
+if __name__ == "__main__":
+    exit(main())
@@ -0,0 +1,324 @@
+#!/usr/bin/env python3
+"""
+NeoPixel animation engine.
+One thread owns the strip and renders layered effects into a framebuffer
+at a capped frame rate. The strip is only written (one SPI transfer) when
+the rendered frame differs from the last one written, and the thread
+sleeps until the next effect arrives when nothing is animating.
+
+Callers add effects from any thread and return immediately; an effect
+replaces whatever was on its layer, so the newest flash wins.
+"""
+import math
+import sys
+import threading
+import time
+from collections import deque
+
+import metrics
+
+
+OFF = (0, 0, 0)
+
+_RENDER_SECONDS = metrics.histogram("led_render_seconds", "Time to render one frame")
+_WRITE_SECONDS = metrics.histogram("led_write_seconds", "Time to push one frame to the strip")
+
+
+def _mix(frame, i, color, alpha):
+    """Blend color over frame[i] with alpha 0.0-1.0"""
+    if alpha >= 1.0:
+        frame[i] = color
+    elif alpha > 0.0:
+        r, g, b = frame[i]
+        frame[i] = (r + (color[0] - r) * alpha, g + (color[1] - g) * alpha, b + (color[2] - b) * alpha)
+
+
+class Effect:
+    """
+    Base class for effects
+
+    render(now, frame) draws over frame (a list of (r, g, b) floats) and
+    returns False once the effect has finished. Lower z is drawn first.
+    """
+
+    layer = "effect"
+    z = 0
+
+    def __init__(self, duration=None):
+        """
+        Args:
+            duration: Seconds until the effect ends (None = until replaced or cleared)
+        """
+        self.duration = duration
+        self.started = None
+
+    def start(self, now):
+        self.started = now
+
+    def elapsed(self, now):
+        return now - self.started
+
+    def done(self, now):
+        return self.duration is not None and now - self.started >= self.duration
+
+    def render(self, now, frame):
+        raise NotImplementedError
+
+
+class Flash(Effect):
+    """Whole strip in one color, optionally fading out over the last fade seconds"""
+
+    layer = "flash"
+    z = 30
+
+    def __init__(self, color, duration=1.0, fade=0.0):
+        super().__init__(duration)
+        self.color = tuple(color)
+        self.fade = fade
+
+    def render(self, now, frame):
+        if self.done(now):
+            return False
+        alpha = 1.0
+        left = self.duration - self.elapsed(now)
+        if self.fade and left < self.fade:
+            alpha = left / self.fade
+        for i in range(len(frame)):
+            _mix(frame, i, self.color, alpha)
+        return True
+
+
+class Pulse(Effect):
+    """Whole strip breathing between off and color"""
+
+    layer = "pulse"
+    z = 10
+
+    def __init__(self, color, period=2.0, duration=None, floor=0.05):
+        super().__init__(duration)
+        self.color = tuple(color)
+        self.period = period
+        self.floor = floor
+
+    def render(self, now, frame):
+        if self.done(now):
+            return False
+        phase = (self.elapsed(now) % self.period) / self.period
+        alpha = self.floor + (1.0 - self.floor) * 0.5 * (1.0 - math.cos(2.0 * math.pi * phase))
+        for i in range(len(frame)):
+            _mix(frame, i, self.color, alpha)
+        return True
+
+
+class Bar(Effect):
+    """Level bar: pixels lit in proportion to value (0-100), partial last pixel"""
+
+    layer = "bar"
+    z = 20
+
+    def __init__(self, value, color, duration=1.5, fade=0.5):
+        super().__init__(duration)
+        self.value = value
+        self.color = tuple(color)
+        self.fade = fade
+
+    def color_for(self, value):
+        return self.color
+
+    def render(self, now, frame):
+        if self.done(now):
+            return False
+        alpha = 1.0
+        if self.duration is not None and self.fade:
+            left = self.duration - self.elapsed(now)
+            if left < self.fade:
+                alpha = left / self.fade
+        n = len(frame)
+        level = max(0.0, min(100.0, self.value)) * n / 100.0
+        color = self.color_for(self.value)
+        for i in range(n):
+            # Unlit pixels are drawn dark so the bar reads over other layers
+            lit = min(1.0, max(0.0, level - i))
+            _mix(frame, i, (color[0] * lit, color[1] * lit, color[2] * lit), alpha)
+        return True
+
+
+class VolumeBar(Bar):
+    """Volume level, shown briefly after each change"""
+
+    layer = "volume"
+
+    def __init__(self, percent, color=(0, 64, 128), duration=1.5, fade=0.5):
+        super().__init__(percent, color, duration, fade)
+
+
+class BatteryGauge(Bar):
+    """Battery level colored red/yellow/green by SOC"""
+
+    layer = "battery"
+    z = 5
+
+    def __init__(self, soc, duration=3.0, fade=0.5, low=15.0, mid=40.0):
+        super().__init__(soc, (0, 128, 0), duration, fade)
+        self.low = low
+        self.mid = mid
+
+    def color_for(self, value):
+        if value < self.low:
+            return (128, 0, 0)
+        if value < self.mid:
+            return (128, 96, 0)
+        return (0, 128, 0)
+
+
+class LedAnimator:
+    """Owns a NeoPixel strip and renders effects on its own thread"""
+
+    def __init__(self, pixels, fps=30.0):
+        """
+        Initialize animator
+
+        Args:
+            pixels: neopixel.NeoPixel (switched to auto_write=False)
+            fps: Frame rate cap while effects are active
+        """
+        self.pixels = pixels
+        self.pixels.auto_write = False
+        self.n = len(pixels)
+        self.frame_interval = 1.0 / fps
+
+        self._commands = deque()
+        self._wake = threading.Event()
+        self._running = True
+        self._layers = {}
+        self._last_written = None
+
+        # Counters
+        self.frames_rendered = 0
+        self.frames_written = 0
+        self.render_time = 0.0
+        self.max_render_time = 0.0
+        self.write_time = 0.0
+
+        self._thread = threading.Thread(target=self._run, name="leds", daemon=True)
+        self._thread.start()
+
+    # Callers (any thread, never block)
+    def add(self, effect):
+        """Show an effect, replacing the effect on the same layer"""
+        self._commands.append((effect.layer, effect))
+        self._wake.set()
+
+    def clear(self, layer=None):
+        """Remove one layer, or all layers if layer is None"""
+        self._commands.append((layer, None))
+        self._wake.set()
+
+    def flash(self, color, duration=1.0, fade=0.0):
+        self.add(Flash(color, duration, fade))
+
+    def pulse(self, color, period=2.0, duration=None):
+        self.add(Pulse(color, period, duration))
+
+    def volume(self, percent, duration=1.5):
+        self.add(VolumeBar(percent, duration=duration))
+
+    def battery(self, soc, duration=3.0):
+        self.add(BatteryGauge(soc, duration=duration))
+
+    def get_stats(self):
+        """
+        Get render counters
+
+        Returns:
+            dict with frames rendered and written to the strip, frames
+            skipped as unchanged, render time per frame and write time
+        """
+        rendered = self.frames_rendered
+        return {
+            "rendered": rendered,
+            "written": self.frames_written,
+            "skipped": rendered - self.frames_written,
+            "avg_render_us": self.render_time * 1e6 / rendered if rendered else 0.0,
+            "max_render_us": self.max_render_time * 1e6,
+            "avg_write_us": self.write_time * 1e6 / self.frames_written if self.frames_written else 0.0,
+            "layers": len(self._layers),
+        }
+
+    def close(self, blank=True):
+        """Stop the render thread and optionally turn the strip off"""
+        self._running = False
+        self._wake.set()
+        self._thread.join(timeout=2.0)
+        if blank:
+            self.pixels.fill(OFF)
+            self.pixels.show()
+
+    # Render thread
+    def _apply_commands(self, now):
+        commands = self._commands
+        layers = self._layers
+        while commands:
+            layer, effect = commands.popleft()
+            if effect is not None:
+                effect.start(now)
+                layers[layer] = effect
+            elif layer is None:
+                layers.clear()
+            else:
+                layers.pop(layer, None)
+
+    def _render(self, now):
+        frame = [OFF] * self.n
+        finished = []
+        for layer, effect in sorted(self._layers.items(), key=lambda item: item[1].z):
+            if not effect.render(now, frame):
+                finished.append(layer)
+        for layer in finished:
+            del self._layers[layer]
+        return tuple((int(r), int(g), int(b)) for r, g, b in frame)
+
+    def _run(self):
+        clock = time.monotonic
+        next_frame = clock()
+        while self._running:
+            now = clock()
+            self._apply_commands(now)
+
+            start = time.perf_counter()
+            frame = self._render(now)
+            elapsed = time.perf_counter() - start
+            _RENDER_SECONDS.observe(elapsed)
+            self.frames_rendered += 1
+            self.render_time += elapsed
+            if elapsed > self.max_render_time:
+                self.max_render_time = elapsed
+
+            if frame != self._last_written:
+                start = time.perf_counter()
+                try:
+                    self.pixels[:] = frame
+                    self.pixels.show()
+                except Exception as e:
+                    print(f"LED write error: {e}", file=sys.stderr)
+                elapsed = time.perf_counter() - start
+                _WRITE_SECONDS.observe(elapsed)
+                self.write_time += elapsed
+                self.frames_written += 1
+                self._last_written = frame
+
+            if not self._layers and not self._commands:
+                # Nothing animating: sleep until the next effect arrives
+                self._wake.wait()
+                self._wake.clear()
+                next_frame = clock()
+                continue
+
+            # New effects are picked up on the next frame, keeping the rate capped
+            next_frame += self.frame_interval
+            delay = next_frame - clock()
+            if delay > 0:
+                time.sleep(delay)
+            else:
+                # Running late: don't try to catch up with a burst of frames
+                next_frame = clock()
@@ -0,0 +1,375 @@
+#!/usr/bin/env python3
+"""
+Small metrics registry: counters, gauges and fixed-bucket histograms.
+Updates are a few attribute operations (histograms add one C bisect) and
+take no lock, so they are safe to call from pigpio callbacks and the
+audio path; a concurrent update can rarely lose an increment, which is
+accepted for metrics. Metrics are created once at import or init time
+and kept as module attributes, never looked up per event.
+
+Output:
+- Prometheus text format from render(), served by MetricsServer on a
+  local TCP port or UNIX socket (GET /metrics)
+- one compact line from snapshot(), e.g. for the log every minute
+"""
+import os
+import sys
+import threading
+import time
+from bisect import bisect_left
+
+
+# Seconds; 100 us .. 5 s covers edge handling up to mixer writes and mpv replies
+LATENCY_BUCKETS = (0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1,
+                   0.25, 0.5, 1.0, 2.5, 5.0)
+
+
+def _label_text(labels):
+    if not labels:
+        return ""
+    return "{" + ",".join(f'{k}="{v}"' for k, v in labels) + "}"
+
+
+class Counter:
+    """Monotonically increasing count"""
+
+    __slots__ = ("name", "labels", "value")
+    kind = "counter"
+
+    def __init__(self, name, labels=()):
+        self.name = name
+        self.labels = labels
+        self.value = 0
+
+    def inc(self, n=1):
+        self.value += n
+
+    def samples(self):
+        yield self.name + "_total", self.labels, self.value
+
+    def take(self):
+        """Value since the last take(), resetting it"""
+        value, self.value = self.value, 0
+        return value
+
+    def merge(self, value):
+        self.value += value
+
+
+class Gauge:
+    """Value that goes up and down, or a function read at scrape time"""
+
+    __slots__ = ("name", "labels", "value", "fn")
+    kind = "gauge"
+
+    def __init__(self, name, labels=(), fn=None):
+        self.name = name
+        self.labels = labels
+        self.value = 0.0
+        self.fn = fn
+
+    def set(self, value):
+        self.value = value
+
+    def get(self):
+        if self.fn is None:
+            return self.value
+        try:
+            return self.fn()
+        except Exception:
+            return float("nan")
+
+    def samples(self):
+        yield self.name, self.labels, self.get()
+
+
+class Histogram:
+    """Fixed upper-bound buckets plus sum, count and max"""
+
+    __slots__ = ("name", "labels", "bounds", "counts", "sum", "count", "max")
+    kind = "histogram"
+
+    def __init__(self, name, labels=(), buckets=LATENCY_BUCKETS):
+        self.name = name
+        self.labels = labels
+        self.bounds = tuple(buckets)
+        self.counts = [0] * (len(self.bounds) + 1)    # last one is +Inf
+        self.sum = 0.0
+        self.count = 0
+        self.max = 0.0
+
+    def observe(self, value):
+        self.counts[bisect_left(self.bounds, value)] += 1
+        self.sum += value
+        self.count += 1
+        if value > self.max:
+            self.max = value
+
+    def quantile(self, q):
+        """Upper bound of the bucket holding the q quantile (max for the +Inf bucket)"""
+        if not self.count:
+            return 0.0
+        rank = q * self.count
+        seen = 0
+        for i, n in enumerate(self.counts):
+            seen += n
+            if seen >= rank and n:
+                return self.bounds[i] if i < len(self.bounds) else self.max
+        return self.max
+
+    def take(self):
+        """(counts, sum, count, max) since the last take(), resetting them"""
+        state = (self.counts, self.sum, self.count, self.max)
+        self.counts = [0] * (len(self.bounds) + 1)
+        self.sum = 0.0
+        self.count = 0
+        self.max = 0.0
+        return state
+
+    def merge(self, state):
+        """Add observations taken from a histogram with the same buckets"""
+        counts, total, count, peak = state
+        for i, n in enumerate(counts):
+            self.counts[i] += n
+        self.sum += total
+        self.count += count
+        if peak > self.max:
+            self.max = peak
+
+    def samples(self):
+        cumulative = 0
+        for bound, n in zip(self.bounds, self.counts):
+            cumulative += n
+            yield self.name + "_bucket", self.labels + (("le", f"{bound:g}"),), cumulative
+        yield self.name + "_bucket", self.labels + (("le", "+Inf"),), self.count
+        yield self.name + "_sum", self.labels, self.sum
+        yield self.name + "_count", self.labels, self.count
+
+
+class Registry:
+    """Named metrics; creating an existing name + labels returns the same object"""
+
+    def __init__(self, prefix="sharm_"):
+        """
+        Initialize registry
+
+        Args:
+            prefix: Prepended to every exported name
+        """
+        self.prefix = prefix
+        self._metrics = {}
+        self._help = {}
+        self._lock = threading.Lock()
+        self.started = time.monotonic()
+
+    def _get(self, cls, name, help, labels, **kwargs):
+        key = (name, tuple(sorted((labels or {}).items())))
+        metric = self._metrics.get(key)
+        if metric is None:
+            with self._lock:
+                metric = self._metrics.get(key)
+                if metric is None:
+                    metric = cls(self.prefix + name, key[1], **kwargs)
+                    # Help first: render() may look it up as soon as the metric is listed
+                    self._help.setdefault(self.prefix + name, (cls.kind, help))
+                    self._metrics[key] = metric
+        return metric
+
+    def counter(self, name, help="", labels=None):
+        return self._get(Counter, name, help, labels)
+
+    def gauge(self, name, help="", labels=None, fn=None):
+        gauge = self._get(Gauge, name, help, labels)
+        if fn is not None:
+            gauge.fn = fn
+        return gauge
+
+    def histogram(self, name, help="", labels=None, buckets=LATENCY_BUCKETS):
+        return self._get(Histogram, name, help, labels, buckets=buckets)
+
+    def take(self, prefix=""):
+        """
+        Counter and histogram data recorded since the last take(), for
+        merge() in another process (e.g. a worker's heartbeat); resets them,
+        so call it from the thread that updates them
+
+        Args:
+            prefix: Only metrics whose name (without the registry prefix) starts with this
+
+        Returns:
+            list of (kind, name, labels, state)
+        """
+        taken = []
+        for (name, labels), metric in list(self._metrics.items()):
+            if metric.kind != "gauge" and name.startswith(prefix):
+                taken.append((metric.kind, name, dict(labels), metric.take()))
+        return taken
+
+    def merge(self, taken):
+        """Add data from another registry's take() to the metrics of the same name"""
+        for kind, name, labels, state in taken:
+            if kind == "counter":
+                self.counter(name, labels=labels).merge(state)
+            else:
+                self.histogram(name, labels=labels).merge(state)
+
+    def render(self):
+        """Prometheus text exposition format (0.0.4)"""
+        lines = []
+        described = set()
+        for metric in sorted(list(self._metrics.values()), key=lambda m: (m.name, m.labels)):
+            if metric.name not in described:
+                described.add(metric.name)
+                kind, help = self._help[metric.name]
+                if help:
+                    lines.append(f"# HELP {metric.name} {help}")
+                lines.append(f"# TYPE {metric.name} {kind}")
+            for name, labels, value in metric.samples():
+                lines.append(f"{name}{_label_text(labels)} {value:g}" if isinstance(value, float)
+                             else f"{name}{_label_text(labels)} {value}")
+        return "\n".join(lines) + "\n"
+
+    def snapshot(self):
+        """
+        One compact line of everything that has data
+
+        Counters and gauges as name=value, histograms as
+        name=count/p50/p99/max with times in ms
+        """
+        parts = [f"up={time.monotonic() - self.started:.0f}s"]
+        strip = len(self.prefix)
+        for metric in sorted(list(self._metrics.values()), key=lambda m: (m.name, m.labels)):
+            name = metric.name[strip:]
+            if metric.labels:
+                name += "{" + ",".join(str(v) for _, v in metric.labels) + "}"
+            if metric.kind == "histogram":
+                if metric.count:
+                    parts.append(f"{name}={metric.count}/{metric.quantile(0.5) * 1000:.3g}/"
+                                 f"{metric.quantile(0.99) * 1000:.3g}/{metric.max * 1000:.3g}ms")
+            elif metric.kind == "counter":
+                if metric.value:
+                    parts.append(f"{name}={metric.value}")
+            else:
+                value = metric.get()
+                parts.append(f"{name}={value:.4g}" if isinstance(value, float) else f"{name}={value}")
+        return " ".join(parts)
+
+    def reporter(self, interval, write=None):
+        """
+        Producer for Controller.add_producer printing snapshot() every interval seconds
+
+        Args:
+            interval: Seconds between lines
+            write: Function(snapshot) (default: print "[METRICS] snapshot" to stdout)
+        """
+        def run(stop_event):
+            while not stop_event.wait(interval):
+                if write:
+                    write(self.snapshot())
+                else:
+                    print("[METRICS] " + self.snapshot(), flush=True)
+        return run
+
+
+REGISTRY = Registry()
+counter = REGISTRY.counter
+gauge = REGISTRY.gauge
+histogram = REGISTRY.histogram
+
+
+def _server_classes(registry):
+    """Handler and UNIX server classes; http.server is imported only when serving"""
+    import http.server
+    import socketserver
+
+    class Handler(http.server.BaseHTTPRequestHandler):
+        def do_GET(self):
+            if self.path.split("?")[0] not in ("/", "/metrics"):
+                self.send_error(404)
+                return
+            body = registry.render().encode()
+            self.send_response(200)
+            self.send_header("Content-Type", "text/plain; version=0.0.4")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def address_string(self):
+            # UNIX socket peers have no (host, port)
+            return str(self.client_address[0]) if self.client_address else "unix"
+
+        def log_message(self, format, *args):
+            pass
+
+    class UnixHTTPServer(socketserver.ThreadingMixIn, socketserver.UnixStreamServer):
+        daemon_threads = True
+
+        def get_request(self):
+            request, _ = super().get_request()
+            return request, ("unix", 0)
+
+    return http.server, Handler, UnixHTTPServer
+
+
+class MetricsServer:
+    """Serves registry.render() at /metrics on a background thread"""
+
+    def __init__(self, address="127.0.0.1:9101", registry=None):
+        """
+        Start server
+
+        Args:
+            address: "host:port" for TCP or a filesystem path for a UNIX socket
+            registry: Registry to expose (default: REGISTRY)
+        """
+        http_server, handler, unix_server = _server_classes(registry or REGISTRY)
+        self.address = address
+        if address.startswith("/") or address.startswith("."):
+            if os.path.exists(address):
+                os.unlink(address)
+            self._server = unix_server(address, handler)
+        else:
+            host, _, port = address.rpartition(":")
+            self._server = http_server.ThreadingHTTPServer((host or "127.0.0.1", int(port)), handler)
+            self._server.daemon_threads = True
+        self._thread = threading.Thread(target=self._server.serve_forever, name="metrics-http", daemon=True)
+        self._thread.start()
+
+    def close(self):
+        """Stop serving"""
+        self._server.shutdown()
+        self._server.server_close()
+        if self.address.startswith(("/", ".")):
+            try:
+                os.unlink(self.address)
+            except OSError:
+                pass
+
+
+def main():
+    import argparse
+    import socket
+
+    parser = argparse.ArgumentParser(description="Fetch /metrics from a running client")
+    parser.add_argument("address", nargs="?", default="127.0.0.1:9101", help="host:port or UNIX socket path")
+    args = parser.parse_args()
+    request = b"GET /metrics HTTP/1.0\r\n\r\n"
+    if args.address.startswith(("/", ".")):
+        sock = socket.socket(socket.AF_UNIX)
+        sock.connect(args.address)
+    else:
+        host, _, port = args.address.rpartition(":")
+        sock = socket.create_connection((host or "127.0.0.1", int(port)), timeout=5)
+    with sock:
+        sock.sendall(request)
+        data = b"".join(iter(lambda: sock.recv(65536), b""))
+    head, _, body = data.partition(b"\r\n\r\n")
+    if not head.startswith(b"HTTP/1.0 200") and not head.startswith(b"HTTP/1.1 200"):
+        print(head.decode(errors="replace"), file=sys.stderr)
+        return 1
+    sys.stdout.write(body.decode())
+    return 0
+
+
+if __name__ == "__main__":
+    exit(main())
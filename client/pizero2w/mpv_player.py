@@ -0,0 +1,419 @@
+#!/usr/bin/env python3
+"""
+Persistent mpv player controlled over its JSON IPC socket.
+One mpv runs with --idle for the lifetime of the client; play/pause are
+IPC commands instead of a process spawn and kill per toggle. Commands are
+queued and sent from any thread without waiting for mpv, playback state
+comes from observed property events, and a dead socket or process is
+reconnected/restarted in the background.
+
+"First audio" is the first core-idle=false after a play request, i.e.
+when mpv actually starts feeding the audio output.
+"""
+import json
+import os
+import socket
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from collections import deque
+from concurrent.futures import Future
+from functools import partial
+
+import metrics
+
+
+_COMMAND_SECONDS = metrics.histogram("mpv_command_seconds", "IPC command to mpv reply")
+_FIRST_AUDIO_SECONDS = metrics.histogram("mpv_first_audio_seconds", "Play request to first audio",
+                                         buckets=(0.1, 0.25, 0.5, 1.0, 2.0, 3.0, 5.0, 10.0))
+
+
+def _observe_reply(sent, future):
+    if not future.cancelled() and future.exception() is None:
+        _COMMAND_SECONDS.observe(time.monotonic() - sent)
+
+
+class MpvPlayer:
+    """Warm mpv instance driven through --input-ipc-server"""
+
+    OBSERVED = ("pause", "idle-active", "core-idle", "path", "media-title")
+
+    def __init__(self, socket_path=None, mpv="mpv", args=(), env=None,
+                 resume_window=30.0, connect_timeout=5.0):
+        """
+        Initialize player and start mpv
+
+        Args:
+            socket_path: IPC socket path (default: per-process file in the temp dir)
+            mpv: mpv binary
+            args: Extra mpv arguments, e.g. ("--ao=alsa",)
+            env: Environment for the mpv process
+            resume_window: Seconds a paused stream may be resumed with unpause;
+                           after that play() reloads it so a live stream
+                           doesn't resume from stale buffered audio
+            connect_timeout: Seconds to wait for the IPC socket after starting mpv
+        """
+        self.socket_path = socket_path or os.path.join(tempfile.gettempdir(), f"sharm-mpv-{os.getpid()}.sock")
+        self.mpv = mpv
+        self.args = list(args)
+        self.env = env
+        self.resume_window = resume_window
+        self.connect_timeout = connect_timeout
+
+        self.state = {}
+        self.url = None
+        self._wanted = False
+        self._paused_at = None
+        self._play_stamp = None
+
+        self._proc = None
+        self._sock = None
+        self._lock = threading.Lock()
+        self._cond = threading.Condition(self._lock)
+        self._pending = {}
+        self._outbox = deque()
+        self._next_id = 1
+        self._running = True
+
+        # Counters
+        self.commands = 0
+        self.restarts = 0
+        self.reconnects = 0
+        self.latencies = deque(maxlen=100)
+
+        self._on_state = None
+        self._on_first_audio = None
+        self._thread = threading.Thread(target=self._run, name="mpv-ipc", daemon=True)
+        self._thread.start()
+
+    # Subscriptions
+    def on_state(self, callback):
+        """Subscribe to observed property changes. Callback: (name, value), IPC thread"""
+        self._on_state = callback
+
+    def on_first_audio(self, callback):
+        """Subscribe to play latency. Callback: (seconds from play request to first audio)"""
+        self._on_first_audio = callback
+
+    # Commands (any thread, never block)
+    def command(self, *args):
+        """
+        Queue an mpv command
+
+        Returns:
+            concurrent.futures.Future resolved with the reply data
+        """
+        future = Future()
+        future.add_done_callback(partial(_observe_reply, time.monotonic()))
+        with self._lock:
+            request_id = self._next_id
+            self._next_id += 1
+            payload = (json.dumps({"command": list(args), "request_id": request_id}) + "\n").encode()
+            self.commands += 1
+            if self._sock is None:
+                self._outbox.append((request_id, payload, future))
+                return future
+            self._pending[request_id] = future
+            try:
+                self._sock.sendall(payload)
+            except OSError:
+                # Resent after reconnect
+                del self._pending[request_id]
+                self._outbox.append((request_id, payload, future))
+                self._drop_socket()
+        return future
+
+    def set_property(self, name, value):
+        return self.command("set_property", name, value)
+
+    def play(self, url=None, stamp=None):
+        """
+        Start or resume playback
+
+        Args:
+            url: Stream or file to play (default: the current one)
+            stamp: time.monotonic() of the user action, for first-audio latency
+        """
+        url = url or self.url
+        if url is None:
+            raise ValueError("No URL to play")
+        now = time.monotonic()
+        self._play_stamp = stamp if stamp is not None else now
+        self._wanted = True
+        stale = self._paused_at is not None and now - self._paused_at > self.resume_window
+        if url != self.url or stale or self.state.get("idle-active", True):
+            self.url = url
+            self.command("loadfile", url, "replace")
+        self.set_property("pause", False)
+        self._paused_at = None
+
+    def pause(self):
+        """Pause playback (keeps the stream loaded for a quick resume)"""
+        self._wanted = False
+        self._play_stamp = None
+        self._paused_at = time.monotonic()
+        self.set_property("pause", True)
+
+    def stop(self):
+        """Stop and unload the current stream"""
+        self._wanted = False
+        self._play_stamp = None
+        self._paused_at = None
+        self.command("stop")
+
+    def toggle(self, url=None, stamp=None):
+        """
+        Pause if playing, otherwise play
+
+        Returns:
+            True if playback was requested, False if it was paused
+        """
+        if self._wanted:
+            self.pause()
+            return False
+        self.play(url, stamp)
+        return True
+
+    @property
+    def playing(self):
+        """True while playback is requested and mpv hasn't reported pause/idle"""
+        return self._wanted
+
+    @property
+    def audio_active(self):
+        """True while mpv is feeding the audio output (from core-idle events)"""
+        return self.state.get("core-idle") is False
+
+    def wait_for_audio(self, timeout=10.0):
+        """Block until the current play request reaches first audio; return latency or None"""
+        deadline = time.monotonic() + timeout
+        with self._cond:
+            while self._play_stamp is not None:
+                left = deadline - time.monotonic()
+                if left <= 0:
+                    return None
+                self._cond.wait(left)
+        return self.latencies[-1] if self.latencies else None
+
+    def get_stats(self):
+        """
+        Get IPC counters and first-audio latency
+
+        Returns:
+            dict with commands sent, reconnects, mpv restarts and
+            last/avg/max latency from play request to first audio
+        """
+        lat = list(self.latencies)
+        return {
+            "commands": self.commands,
+            "reconnects": self.reconnects,
+            "restarts": self.restarts,
+            "last_latency_ms": lat[-1] * 1000.0 if lat else None,
+            "avg_latency_ms": sum(lat) * 1000.0 / len(lat) if lat else None,
+            "max_latency_ms": max(lat) * 1000.0 if lat else None,
+        }
+
+    def close(self):
+        """Quit mpv and stop the IPC thread"""
+        self._running = False
+        if self._sock is not None:
+            try:
+                self.command("quit").result(timeout=1.0)
+            except Exception:
+                pass
+        with self._lock:
+            self._drop_socket()
+        if self._proc and self._proc.poll() is None:
+            self._proc.terminate()
+            try:
+                self._proc.wait(timeout=2)
+            except subprocess.TimeoutExpired:
+                self._proc.kill()
+        self._thread.join(timeout=2.0)
+        try:
+            os.unlink(self.socket_path)
+        except OSError:
+            pass
+
+    # IPC thread
+    def _start_process(self):
+        self.state = {}
+        try:
+            os.unlink(self.socket_path)
+        except OSError:
+            pass
+        self._proc = subprocess.Popen(
+            [self.mpv, "--idle=yes", "--no-video", "--no-terminal", "--pause",
+             f"--input-ipc-server={self.socket_path}"] + self.args,
+            stdin=subprocess.DEVNULL, env=self.env
+        )
+
+    def _connect(self):
+        deadline = time.monotonic() + self.connect_timeout
+        while self._running and time.monotonic() < deadline:
+            if self._proc.poll() is not None:
+                return None
+            sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+            try:
+                sock.connect(self.socket_path)
+                return sock
+            except OSError:
+                sock.close()
+                time.sleep(0.02)
+        return None
+
+    def _drop_socket(self):
+        """Close the socket; caller holds _lock"""
+        if self._sock is not None:
+            try:
+                self._sock.close()
+            except OSError:
+                pass
+            self._sock = None
+
+    def _run(self):
+        first = True
+        while self._running:
+            if self._proc is None or self._proc.poll() is not None:
+                if self._proc is not None:
+                    self.restarts += 1
+                    print(f"mpv exited ({self._proc.returncode}), restarting", file=sys.stderr)
+                try:
+                    self._start_process()
+                except OSError as e:
+                    print(f"Cannot start mpv: {e}", file=sys.stderr)
+                    time.sleep(5.0)
+                    continue
+
+            sock = self._connect()
+            if sock is None:
+                if self._running:
+                    time.sleep(0.5)
+                continue
+            if not first:
+                self.reconnects += 1
+            first = False
+            self._attach(sock)
+            self._read(sock)
+
+            with self._lock:
+                if self._sock is sock:
+                    self._drop_socket()
+                pending = list(self._pending.values())
+                self._pending.clear()
+            for future in pending:
+                if not future.done():
+                    future.set_exception(ConnectionError("mpv IPC connection lost"))
+            if self._running:
+                time.sleep(0.2)
+
+    def _attach(self, sock):
+        """Observe properties, flush queued commands and restore playback"""
+        restore = self._wanted and self.url is not None and self.state.get("path") != self.url
+        with self._lock:
+            self._sock = sock
+            lines = [(json.dumps({"command": ["observe_property", i + 1, name]}) + "\n").encode()
+                     for i, name in enumerate(self.OBSERVED)]
+            try:
+                sock.sendall(b"".join(lines))
+                while self._outbox:
+                    request_id, payload, future = self._outbox[0]
+                    self._pending[request_id] = future
+                    sock.sendall(payload)
+                    self._outbox.popleft()
+            except OSError:
+                self._drop_socket()
+                return
+        if restore:
+            # mpv was restarted while playing: pick the stream up again
+            self.command("loadfile", self.url, "replace")
+            self.set_property("pause", False)
+
+    def _read(self, sock):
+        buf = b""
+        while self._running:
+            try:
+                data = sock.recv(65536)
+            except OSError:
+                return
+            if not data:
+                return
+            buf += data
+            while b"\n" in buf:
+                line, buf = buf.split(b"\n", 1)
+                try:
+                    msg = json.loads(line)
+                except ValueError:
+                    continue
+                self._handle(msg)
+
+    def _handle(self, msg):
+        if "request_id" in msg:
+            with self._lock:
+                future = self._pending.pop(msg["request_id"], None)
+            if future is not None and not future.done():
+                if msg.get("error") == "success":
+                    future.set_result(msg.get("data"))
+                else:
+                    future.set_exception(RuntimeError(msg.get("error")))
+            return
+        if msg.get("event") != "property-change":
+            return
+
+        name = msg.get("name")
+        value = msg.get("data")
+        previous = self.state.get(name)
+        self.state[name] = value
+        if name == "core-idle" and value is False and self._play_stamp is not None:
+            latency = time.monotonic() - self._play_stamp
+            _FIRST_AUDIO_SECONDS.observe(latency)
+            with self._cond:
+                self._play_stamp = None
+                self.latencies.append(latency)
+                self._cond.notify_all()
+            if self._on_first_audio:
+                self._on_first_audio(latency)
+        elif name in ("idle-active", "pause") and value is True and previous is False and self._wanted:
+            # Stream ended, failed to load or was paused outside this class
+            self._wanted = False
+            with self._cond:
+                self._play_stamp = None
+                self._cond.notify_all()
+        if self._on_state:
+            self._on_state(name, value)
+
+
+class LocalStreamServer:
+    """Serves a directory over HTTP on localhost, as a stand-in for a radio stream"""
+
+    def __init__(self, directory, host="127.0.0.1", port=0):
+        """
+        Start server
+
+        Args:
+            directory: Directory to serve
+            host: Bind address
+            port: Port (0 = pick a free one)
+        """
+        # Only benches serve files; keep http.server out of the client's startup
+        import http.server
+
+        class QuietHandler(http.server.SimpleHTTPRequestHandler):
+            def log_message(self, format, *args):
+                pass
+
+        handler = partial(QuietHandler, directory=directory)
+        self.server = http.server.ThreadingHTTPServer((host, port), handler)
+        self.host, self.port = self.server.server_address[:2]
+        self._thread = threading.Thread(target=self.server.serve_forever, name="http-stream", daemon=True)
+        self._thread.start()
+
+    def url(self, name):
+        """URL for a file in the served directory"""
+        return f"http://{self.host}:{self.port}/{name}"
+
+    def close(self):
+        self.server.shutdown()
+        self.server.server_close()
@@ -0,0 +1,107 @@
+#!/usr/bin/env python3
+"""
+Table-driven quadrature decoder.
+State is two ints (current AB state and a transition accumulator); each
+edge is one table lookup, so the per-edge path allocates nothing.
+"""
+
+# Transition value for index (prev_ab << 2) | curr_ab
+#   +1: one quarter step CW, -1: one quarter step CCW,
+#    0: no change, INVALID: both inputs changed (missed edge / glitch)
+INVALID = 2
+TRANSITIONS = (
+    #  to: 00       01       10       11
+    0,       -1,      +1,      INVALID,   # from 00
+    +1,      0,       INVALID, -1,        # from 01
+    -1,      INVALID, 0,       +1,        # from 10
+    INVALID, +1,      -1,      0,         # from 11
+)
+
+# Detent rest position of the encoder (both inputs pulled up)
+REST_STATE = 0b11
+
+# Quarter steps needed between rests to count a detent; 2 tolerates one
+# missed edge while still rejecting contact bounce around the rest state
+DETENT_THRESHOLD = 2
+
+# pigpio ticks are microseconds in a wrapping 32-bit counter
+TICK_MASK = 0xFFFFFFFF
+
+
+class QuadratureDecoder:
+    """Full-step decoder for a detented A/B encoder"""
+
+    def __init__(self, initial_state=REST_STATE, velocity_alpha=0.3):
+        """
+        Initialize decoder
+
+        Args:
+            initial_state: AB state at start, (A << 1) | B
+            velocity_alpha: Smoothing factor for velocity (1.0 = no smoothing)
+        """
+        self.state = initial_state
+        self.accum = 0
+        self.position = 0
+        self.edges = 0
+        self.invalid = 0
+        self.velocity = 0.0
+        self.velocity_alpha = velocity_alpha
+        self._last_detent_tick = None
+
+    def update(self, state, tick):
+        """
+        Feed a new AB state
+
+        Args:
+            state: (A << 1) | B after the edge
+            tick: pigpio tick (microseconds, wraps at 2**32)
+
+        Returns:
+            +1 for a CW detent, -1 for a CCW detent, 0 otherwise
+        """
+        self.edges += 1
+        step = TRANSITIONS[(self.state << 2) | state]
+        self.state = state
+        if step == INVALID:
+            self.invalid += 1
+            return 0
+        self.accum += step
+
+        if state != REST_STATE:
+            return 0
+        accum = self.accum
+        self.accum = 0
+        if accum >= DETENT_THRESHOLD:
+            direction = 1
+        elif accum <= -DETENT_THRESHOLD:
+            direction = -1
+        else:
+            return 0
+
+        self.position += direction
+        last = self._last_detent_tick
+        self._last_detent_tick = tick
+        if last is not None:
+            dt = (tick - last) & TICK_MASK
+            if dt:
+                v = direction * 1e6 / dt
+                self.velocity += self.velocity_alpha * (v - self.velocity)
+        return direction
+
+    def edge_a(self, level, tick):
+        """Feed an edge on input A (level 0/1)"""
+        return self.update((level << 1) | (self.state & 1), tick)
+
+    def edge_b(self, level, tick):
+        """Feed an edge on input B (level 0/1)"""
+        return self.update((self.state & 2) | level, tick)
+
+    def reset(self, state=REST_STATE):
+        """Reset position and counters"""
+        self.state = state
+        self.accum = 0
+        self.position = 0
+        self.edges = 0
+        self.invalid = 0
+        self.velocity = 0.0
+        self._last_detent_tick = None
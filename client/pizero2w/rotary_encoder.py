@@ -3,12 +3,25 @@ import pigpio
 import time
 import sys
 
+import fastlog
+import metrics
+from quadrature import QuadratureDecoder
+
+
+_DETENTS = metrics.counter("encoder_detents", "Detents decoded")
+
+
+def _states_line(label, states):
+    """Debug line for a state buffer, formatted on the log writer thread"""
+    return f"{label}: {[f'{s:02b}' for s in states]}"
+
 
 class RotaryEncoder:
     """Rotary encoder with button using pigpio"""
     
     def __init__(self, pin_btn=23, pin_enc_a=27, pin_enc_b=22, 
-                 watchdog_ms=0, glitch_us=100, pulses_per_rotation=80, debug=False):
+                 watchdog_ms=0, glitch_us=100, pulses_per_rotation=80, debug=False,
+                 decoder="buffer", pi=None, log=None):
         """
         Initialize rotary encoder
         
@@ -19,8 +32,17 @@ class RotaryEncoder:
             watchdog_ms: Watchdog timeout in milliseconds
             glitch_us: Glitch filter in microseconds
             pulses_per_rotation: Number of pulses per full rotation
-            debug: Enable debug logging
+            debug: Enable debug logging (lowers the log to DEBUG)
+            decoder: 'buffer' (state buffer, reads pins on every edge) or
+                     'table' (transition table fed from callback levels, no
+                     per-edge allocation or pin reads)
+            pi: Connected pigpio.pi instance (optional, created if omitted;
+                a given one is left running by cleanup())
+            log: fastlog.FastLog for debug lines (default: fastlog.get())
         """
+        if decoder not in ("buffer", "table"):
+            raise ValueError(f"Unknown decoder: {decoder}")
+        
         self.pin_btn = pin_btn
         self.pin_enc_a = pin_enc_a
         self.pin_enc_b = pin_enc_b
@@ -28,6 +50,12 @@ class RotaryEncoder:
         self.glitch_us = glitch_us
         self.pulses_per_rotation = pulses_per_rotation
         self.debug = debug
+        self.log = log
+        if debug:
+            self.log = log if log is not None else fastlog.get()
+            self.log.level = min(self.log.level, fastlog.DEBUG)
+        self.decoder = decoder
+        self.degrees_per_step = 360.0 / pulses_per_rotation
         
         # Callbacks
         self.button_callback = None
@@ -40,7 +68,8 @@ class RotaryEncoder:
         self.state_buffer = []
         
         # Initialize pigpio
-        self.pi = pigpio.pi()
+        self._own_pi = pi is None
+        self.pi = pi if pi is not None else pigpio.pi()
         if not self.pi.connected:
             raise RuntimeError("pigpiod is not running! Start it with: sudo pigpiod")
         
@@ -62,11 +91,16 @@ class RotaryEncoder:
         enc_a_initial = self.pi.read(self.pin_enc_a)
         enc_b_initial = self.pi.read(self.pin_enc_b)
         self.last_encoded = (enc_a_initial << 1) | enc_b_initial
+        self.quadrature = QuadratureDecoder(self.last_encoded)
         
         # Set up callbacks
         self.cb_btn = self.pi.callback(self.pin_btn, pigpio.EITHER_EDGE, self._btn_handler)
-        self.cb_enc_a = self.pi.callback(self.pin_enc_a, pigpio.EITHER_EDGE, self._enc_handler)
-        self.cb_enc_b = self.pi.callback(self.pin_enc_b, pigpio.EITHER_EDGE, self._enc_handler)
+        if decoder == "table":
+            self.cb_enc_a = self.pi.callback(self.pin_enc_a, pigpio.EITHER_EDGE, self._enc_a_handler)
+            self.cb_enc_b = self.pi.callback(self.pin_enc_b, pigpio.EITHER_EDGE, self._enc_b_handler)
+        else:
+            self.cb_enc_a = self.pi.callback(self.pin_enc_a, pigpio.EITHER_EDGE, self._enc_handler)
+            self.cb_enc_b = self.pi.callback(self.pin_enc_b, pigpio.EITHER_EDGE, self._enc_handler)
     
     def set_button_callback(self, callback):
         """
@@ -94,6 +128,44 @@ class RotaryEncoder:
             inverted_level = (1 - level) if level < 2 else level
             self.button_callback(inverted_level, tick)
     
+    def _enc_a_handler(self, gpio, level, tick):
+        """Table decoder: edge on encoder A"""
+        if level < 2:
+            q = self.quadrature
+            invalid = q.invalid
+            direction = q.edge_a(level, tick)
+            if direction:
+                self._detent(direction)
+            elif q.invalid != invalid:
+                self._resync()
+    
+    def _enc_b_handler(self, gpio, level, tick):
+        """Table decoder: edge on encoder B"""
+        if level < 2:
+            q = self.quadrature
+            invalid = q.invalid
+            direction = q.edge_b(level, tick)
+            if direction:
+                self._detent(direction)
+            elif q.invalid != invalid:
+                self._resync()
+    
+    def _resync(self):
+        """Table decoder: an edge was missed, re-read both pins (rare path)"""
+        self.quadrature.state = (self.pi.read(self.pin_enc_a) << 1) | self.pi.read(self.pin_enc_b)
+    
+    def _detent(self, direction):
+        """Table decoder: report a completed detent"""
+        q = self.quadrature
+        self.encoder_pos = q.position
+        _DETENTS.inc()
+        if self.debug:
+            self.log.debug("ENC_DBG", "detent pos={} velocity={:.1f}/s edges={} invalid={}",
+                           q.position, q.velocity, q.edges, q.invalid)
+        if self.rotation_callback:
+            rotations, steps = divmod(q.position, self.pulses_per_rotation)
+            self.rotation_callback('CW' if direction > 0 else 'CCW', q.position, steps * self.degrees_per_step, rotations)
+    
     def _enc_handler(self, gpio, level, tick):
         """Internal encoder event handler"""
         a = self.pi.read(self.pin_enc_a)
@@ -101,18 +173,18 @@ class RotaryEncoder:
         encoded = (a << 1) | b
         
         if self.debug:
-            print(f"[ENC_DBG] Handler called: gpio={gpio} A={a} B={b} encoded={encoded:02b}", flush=True)
+            self.log.debug("ENC_DBG", "Handler called: gpio={} A={} B={} encoded={:02b}", gpio, a, b, encoded)
         
         # Add state to buffer
         self.state_buffer.append(encoded)
         
         if self.debug:
-            print(f"[ENC_DBG] Buffer: {[f'{s:02b}' for s in self.state_buffer]}", flush=True)
+            self.log.debug("ENC_DBG", _states_line, "Buffer", tuple(self.state_buffer))
         
         # Process buffer only when both A=1 and B=1 (stable state)
         if encoded == 0b11:
             if self.debug:
-                print(f"[ENC_DBG] A=1 B=1 detected, processing buffer...", flush=True)
+                self.log.debug("ENC_DBG", "A=1 B=1 detected, processing buffer...")
             
             # Remove duplicates while preserving order
             unique_states = []
@@ -121,7 +193,7 @@ class RotaryEncoder:
                     unique_states.append(state)
             
             if self.debug:
-                print(f"[ENC_DBG] Unique states: {[f'{s:02b}' for s in unique_states]}", flush=True)
+                self.log.debug("ENC_DBG", _states_line, "Unique states", unique_states)
             
             # Need at least 2 states to determine direction
             if len(unique_states) >= 2:
@@ -133,21 +205,21 @@ class RotaryEncoder:
                 sum_val = (prev_state << 2) | encoded
                 
                 if self.debug:
-                    print(f"[ENC_DBG] prev_state={prev_state:02b} current={encoded:02b} sum_val={sum_val:04b}", flush=True)
+                    self.log.debug("ENC_DBG", "prev_state={:02b} current={:02b} sum_val={:04b}", prev_state, encoded, sum_val)
                 
                 if sum_val in (0b0001, 0b0111, 0b1110, 0b1000):
                     self.encoder_pos -= 1
                     direction = 'CCW'
                     if self.debug:
-                        print(f"[ENC_DBG] CCW detected, pos={self.encoder_pos}", flush=True)
+                        self.log.debug("ENC_DBG", "CCW detected, pos={}", self.encoder_pos)
                 elif sum_val in (0b0010, 0b1011, 0b1101, 0b0100):
                     self.encoder_pos += 1
                     direction = 'CW'
                     if self.debug:
-                        print(f"[ENC_DBG] CW detected, pos={self.encoder_pos}", flush=True)
+                        self.log.debug("ENC_DBG", "CW detected, pos={}", self.encoder_pos)
                 else:
                     if self.debug:
-                        print(f"[ENC_DBG] No valid direction, clearing buffer", flush=True)
+                        self.log.debug("ENC_DBG", "No valid direction, clearing buffer")
                     # Clear buffer and update last state
                     self.state_buffer = []
                     self.last_encoded = encoded
@@ -161,7 +233,7 @@ class RotaryEncoder:
                     self.rotation_callback(direction, self.encoder_pos, remainder, rotations)
             else:
                 if self.debug:
-                    print(f"[ENC_DBG] Not enough unique states ({len(unique_states)}), skipping", flush=True)
+                    self.log.debug("ENC_DBG", "Not enough unique states ({}), skipping", len(unique_states))
             
             # Clear buffer and update last state
             self.state_buffer = []
@@ -178,6 +250,17 @@ class RotaryEncoder:
     def reset_position(self):
         """Reset encoder position to 0"""
         self.encoder_pos = 0
+        self.quadrature.position = 0
+    
+    def get_stats(self):
+        """
+        Get table decoder counters
+        
+        Returns:
+            dict with edges, invalid transitions and velocity (detents/s, signed)
+        """
+        q = self.quadrature
+        return {"edges": q.edges, "invalid": q.invalid, "velocity": q.velocity}
     
     def cleanup(self):
         """Clean up resources"""
@@ -189,5 +272,6 @@ class RotaryEncoder:
             self.cb_enc_b.cancel()
         if hasattr(self, 'pi'):
             self.pi.set_watchdog(self.pin_btn, 0)
-            self.pi.stop()
+            if self._own_pi:
+                self.pi.stop()
 
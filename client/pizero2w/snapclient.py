@@ -0,0 +1,758 @@
+#!/usr/bin/env python3
+"""
+Snapcast stream client playing one channel of a multichannel stream.
+Speaks the snapcast binary protocol (v2) to snapserver on SNAPSERVER_PORT,
+keeps its clock in sync with the server, decodes FLAC (libFLAC through
+ctypes) or PCM chunks and plays the configured channel of the 48000:16:6
+"Surround" stream through one persistent PyAudio output. It is an
+alternative to the `snapclient --player file | ffplay -af pan=mono|c0=c2`
+pipeline in run.sh (which is left as is), in one process on the Pi.
+
+Channel extraction never loops over samples: PCM chunks are viewed as a
+(frames, channels) NumPy array and the wanted column is copied out; FLAC
+frames are already planar, so only the wanted channel plane is converted.
+
+StandinServer replays a raw s16le / WAV file, or a message recording made
+with --record, as a local snapserver for testing without the server.
+
+Examples:
+  python3 snapclient.py --host sharm.local --channel C
+  python3 snapclient.py --host sharm.local --record /tmp/surround.snap --duration 30
+  python3 snapclient.py --standin /tmp/surround.snap --channel FL --duration 20
+"""
+import argparse
+import ctypes
+import ctypes.util
+import json
+import os
+import platform
+import socket
+import statistics
+import struct
+import sys
+import threading
+import time
+import uuid
+from collections import deque
+
+import numpy as np
+
+
+# Message types
+MSG_BASE = 0
+MSG_CODEC_HEADER = 1
+MSG_WIRE_CHUNK = 2
+MSG_SERVER_SETTINGS = 3
+MSG_TIME = 4
+MSG_HELLO = 5
+MSG_CLIENT_INFO = 7
+
+# type, id, refersTo, sent.sec, sent.usec, received.sec, received.usec, size
+HEADER = struct.Struct("<HHHiiiiI")
+
+# 5.1 channel order of the Surround FIFO (ffmpeg/ALSA default layout)
+CHANNELS = {"FL": 0, "FR": 1, "C": 2, "LFE": 3, "RL": 4, "RR": 5}
+
+PROTOCOL_VERSION = 2
+
+
+def _split_time(t):
+    sec = int(t)
+    return sec, int(round((t - sec) * 1e6))
+
+
+def pack_message(kind, payload, sent, msg_id=0, refers_to=0):
+    """Build a snapcast message (header + payload); sent is seconds on the sender's clock"""
+    sec, usec = _split_time(sent)
+    return HEADER.pack(kind, msg_id, refers_to, sec, usec, 0, 0, len(payload)) + payload
+
+
+def _recv_exact(sock, n):
+    buf = bytearray(n)
+    view = memoryview(buf)
+    got = 0
+    while got < n:
+        r = sock.recv_into(view[got:], n - got)
+        if not r:
+            raise ConnectionError("connection closed")
+        got += r
+    return bytes(buf)
+
+
+def read_message(sock):
+    """
+    Read one message
+
+    Returns:
+        (kind, msg_id, refers_to, sent_seconds, raw_header, payload)
+    """
+    raw = _recv_exact(sock, HEADER.size)
+    kind, msg_id, refers_to, sec, usec, _, _, size = HEADER.unpack(raw)
+    payload = _recv_exact(sock, size) if size else b""
+    return kind, msg_id, refers_to, sec + usec / 1e6, raw, payload
+
+
+def _json_payload(obj):
+    data = json.dumps(obj).encode()
+    return struct.pack("<I", len(data)) + data
+
+
+def _parse_json_payload(payload):
+    (size,) = struct.unpack_from("<I", payload)
+    return json.loads(payload[4:4 + size])
+
+
+# Decoders
+
+class PcmDecoder:
+    """codec=pcm: header is a RIFF/WAVE header, chunks are interleaved s16le"""
+
+    def __init__(self, header, channel):
+        if header[:4] != b"RIFF":
+            raise ValueError("PCM codec header is not RIFF")
+        fmt = header.find(b"fmt ")
+        _, self.channels, self.sample_rate = struct.unpack_from("<HHI", header, fmt + 8)
+        if channel >= self.channels:
+            raise ValueError(f"stream has {self.channels} channels, channel {channel} requested")
+        self.channel = channel
+        self._frame_bytes = 2 * self.channels
+
+    def decode(self, data):
+        """Return the selected channel of a chunk as a contiguous int16 array"""
+        usable = len(data) - len(data) % self._frame_bytes
+        frames = np.frombuffer(data, dtype="<i2", count=usable // 2).reshape(-1, self.channels)
+        # Strided column view, then one copy of 1/channels of the data
+        return np.ascontiguousarray(frames[:, self.channel])
+
+
+class _FrameHeader(ctypes.Structure):
+    _fields_ = [("blocksize", ctypes.c_uint32), ("sample_rate", ctypes.c_uint32), ("channels", ctypes.c_uint32)]
+
+
+_READ_CB = ctypes.CFUNCTYPE(ctypes.c_int, ctypes.c_void_p, ctypes.POINTER(ctypes.c_ubyte),
+                            ctypes.POINTER(ctypes.c_size_t), ctypes.c_void_p)
+_WRITE_CB = ctypes.CFUNCTYPE(ctypes.c_int, ctypes.c_void_p, ctypes.POINTER(_FrameHeader),
+                             ctypes.POINTER(ctypes.POINTER(ctypes.c_int32)), ctypes.c_void_p)
+_ERROR_CB = ctypes.CFUNCTYPE(None, ctypes.c_void_p, ctypes.c_int, ctypes.c_void_p)
+
+_READ_CONTINUE = 0
+_READ_ABORT = 2
+_WRITE_CONTINUE = 0
+
+
+class FlacDecoder:
+    """codec=flac: libFLAC stream decoder fed from memory"""
+
+    def __init__(self, header, channel):
+        name = ctypes.util.find_library("FLAC")
+        if name is None:
+            raise RuntimeError("libFLAC not found")
+        lib = ctypes.CDLL(name)
+        self._lib = lib
+        lib.FLAC__stream_decoder_new.restype = ctypes.c_void_p
+        lib.FLAC__stream_decoder_init_stream.argtypes = [
+            ctypes.c_void_p, _READ_CB, ctypes.c_void_p, ctypes.c_void_p, ctypes.c_void_p,
+            ctypes.c_void_p, _WRITE_CB, ctypes.c_void_p, _ERROR_CB, ctypes.c_void_p]
+        for fn in ("process_single", "process_until_end_of_metadata", "flush", "finish", "delete"):
+            getattr(lib, f"FLAC__stream_decoder_{fn}").argtypes = [ctypes.c_void_p]
+
+        self.channel = channel
+        self.channels = None
+        self.sample_rate = None
+        self.errors = 0
+        self._data = b""
+        self._pos = 0
+        self._out = []
+
+        # Keep references to the callbacks for the decoder's lifetime
+        self._read_cb = _READ_CB(self._read)
+        self._write_cb = _WRITE_CB(self._write)
+        self._error_cb = _ERROR_CB(self._error)
+        self._decoder = lib.FLAC__stream_decoder_new()
+        rc = lib.FLAC__stream_decoder_init_stream(self._decoder, self._read_cb, None, None, None, None,
+                                                  self._write_cb, None, self._error_cb, None)
+        if rc != 0:
+            raise RuntimeError(f"FLAC__stream_decoder_init_stream failed: {rc}")
+
+        self._feed(header)
+        lib.FLAC__stream_decoder_process_until_end_of_metadata(self._decoder)
+        # STREAMINFO: after "fLaC" + 4-byte block header, 10 bytes in, 20 bits rate, 3 bits channels-1
+        info = header[8:8 + 34]
+        packed = int.from_bytes(info[10:13], "big")
+        self.sample_rate = packed >> 4
+        self.channels = ((packed & 0x0E) >> 1) + 1
+
+    def _feed(self, data):
+        self._data = data
+        self._pos = 0
+
+    def _read(self, decoder, buffer, size_ptr, client):
+        left = len(self._data) - self._pos
+        if left <= 0:
+            size_ptr[0] = 0
+            return _READ_ABORT
+        n = min(size_ptr[0], left)
+        ctypes.memmove(buffer, self._data[self._pos:self._pos + n], n)
+        self._pos += n
+        size_ptr[0] = n
+        return _READ_CONTINUE
+
+    def _write(self, decoder, frame, buffer, client):
+        blocksize = frame[0].blocksize
+        plane = np.ctypeslib.as_array(buffer[self.channel], shape=(blocksize,))
+        self._out.append(plane.astype("<i2"))
+        return _WRITE_CONTINUE
+
+    def _error(self, decoder, status, client):
+        self.errors += 1
+
+    def decode(self, data):
+        """Decode one chunk of complete FLAC frames; return the selected channel"""
+        self._feed(data)
+        self._out = []
+        lib = self._lib
+        while self._pos < len(self._data):
+            if not lib.FLAC__stream_decoder_process_single(self._decoder):
+                # Truncated frame: drop decoder state and carry on with the next chunk
+                self.errors += 1
+                lib.FLAC__stream_decoder_flush(self._decoder)
+                break
+        if not self._out:
+            return np.zeros(0, dtype="<i2")
+        return self._out[0] if len(self._out) == 1 else np.concatenate(self._out)
+
+    def close(self):
+        if self._decoder:
+            self._lib.FLAC__stream_decoder_finish(self._decoder)
+            self._lib.FLAC__stream_decoder_delete(self._decoder)
+            self._decoder = None
+
+
+def make_decoder(codec, header, channel):
+    if codec == "pcm":
+        return PcmDecoder(header, channel)
+    if codec == "flac":
+        return FlacDecoder(header, channel)
+    raise ValueError(f"Unsupported codec: {codec}")
+
+
+# Time sync
+
+class TimeSync:
+    """Server clock offset from request/reply pairs (median of recent samples)"""
+
+    def __init__(self, window=50):
+        self._diffs = deque(maxlen=window)
+        self.diff = None
+
+    def add(self, c2s, s2c):
+        """
+        Add one measurement
+
+        Args:
+            c2s: Server receive time minus client send time (from the reply payload)
+            s2c: Client receive time minus server send time
+        """
+        self._diffs.append((c2s - s2c) / 2.0)
+        self.diff = statistics.median(self._diffs)
+
+    @property
+    def samples(self):
+        return len(self._diffs)
+
+    def to_local(self, server_time):
+        return server_time - self.diff
+
+    def to_server(self, local_time):
+        return local_time + self.diff
+
+
+# Client
+
+class SnapClient:
+    """Plays one channel of a snapcast stream"""
+
+    def __init__(self, host="localhost", port=1704, channel="C", latency_ms=0, block_frames=480,
+                 tolerance_ms=5.0, pa=None, device_index=None, record=None):
+        """
+        Initialize client
+
+        Args:
+            host: snapserver host
+            port: snapserver stream port (SNAPSERVER_PORT)
+            channel: FL/FR/C/LFE/RL/RR or a channel index
+            latency_ms: Extra output latency to compensate for (like snapclient --latency)
+            block_frames: Frames per output write
+            tolerance_ms: Sync error left uncorrected; beyond it frames are dropped or silence inserted
+            pa: PyAudio instance to use (optional)
+            device_index: PyAudio output device (None = default)
+            record: Path to save every received message to, for StandinServer
+        """
+        self.host = host
+        self.port = port
+        self.channel = CHANNELS[channel] if isinstance(channel, str) else int(channel)
+        self.latency = latency_ms / 1000.0
+        self.block_frames = block_frames
+        self.tolerance = tolerance_ms / 1000.0
+        self.device_index = device_index
+        self.record = record
+
+        self.sync = TimeSync()
+        self.decoder = None
+        self.sample_rate = 48000
+        self.buffer_s = 1.0
+        self.settings = {}
+
+        self._pa = pa
+        self._stream = None
+        self._sock = None
+        self._send_lock = threading.Lock()
+        self._next_id = 1
+        self._queue = deque()
+        self._queued = 0
+        self._cond = threading.Condition()
+        self._running = False
+        self._threads = []
+        self._record_file = None
+
+        # Counters
+        self.chunks = 0
+        self.decoded_frames = 0
+        self.decode_cpu = 0.0
+        self.played_frames = 0
+        self.dropped_frames = 0
+        self.silence_frames = 0
+        self.underruns = 0
+        self.sync_error = 0.0
+        self._sync_abs_sum = 0.0
+        self._sync_count = 0
+        self._cpu_start = None
+
+    # Lifecycle
+    def start(self):
+        """Connect and start receiver, sync and player threads"""
+        self._sock = socket.create_connection((self.host, self.port), timeout=5.0)
+        self._sock.settimeout(None)
+        self._sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        if self.record:
+            self._record_file = open(self.record, "wb")
+        self._running = True
+        self._cpu_start = (time.process_time(), self.played_frames)
+        self._send(MSG_HELLO, _json_payload(self._hello()))
+        for target, name in ((self._receive, "snap-recv"), (self._sync_loop, "snap-sync"),
+                             (self._play, "snap-play")):
+            t = threading.Thread(target=target, name=name, daemon=True)
+            t.start()
+            self._threads.append(t)
+
+    def stop(self):
+        self._running = False
+        with self._cond:
+            self._cond.notify_all()
+        if self._sock:
+            try:
+                self._sock.shutdown(socket.SHUT_RDWR)
+            except OSError:
+                pass
+            self._sock.close()
+        for t in self._threads:
+            t.join(timeout=2.0)
+        self._threads = []
+        if self._stream:
+            self._stream.stop_stream()
+            self._stream.close()
+            self._stream = None
+        if self._pa:
+            self._pa.terminate()
+            self._pa = None
+        if self.decoder and hasattr(self.decoder, "close"):
+            self.decoder.close()
+        if self._record_file:
+            self._record_file.close()
+            self._record_file = None
+
+    def get_stats(self):
+        """
+        Get playback statistics
+
+        Returns:
+            dict with buffered audio (ms), last and mean absolute sync error
+            (ms), server clock offset, frames played/dropped/silence,
+            underruns, decode CPU and whole-process CPU per second of audio
+        """
+        rate = self.sample_rate
+        played_s = self.played_frames / rate
+        decoded_s = self.decoded_frames / rate
+        cpu = None
+        if self._cpu_start and played_s:
+            cpu_used = time.process_time() - self._cpu_start[0]
+            cpu = cpu_used * 1000.0 / played_s
+        return {
+            "buffer_ms": self._queued * 1000.0 / rate,
+            "sync_error_ms": self.sync_error * 1000.0,
+            "avg_abs_sync_error_ms": self._sync_abs_sum * 1000.0 / self._sync_count if self._sync_count else None,
+            "time_diff_ms": self.sync.diff * 1000.0 if self.sync.diff is not None else None,
+            "time_samples": self.sync.samples,
+            "chunks": self.chunks,
+            "played_s": played_s,
+            "dropped_ms": self.dropped_frames * 1000.0 / rate,
+            "silence_ms": self.silence_frames * 1000.0 / rate,
+            "underruns": self.underruns,
+            "decode_cpu_ms_per_s": self.decode_cpu * 1000.0 / decoded_s if decoded_s else None,
+            "cpu_ms_per_s": cpu,
+        }
+
+    # Protocol
+    def _hello(self):
+        mac = ":".join(f"{(uuid.getnode() >> s) & 0xFF:02x}" for s in range(40, -8, -8))
+        return {
+            "Arch": platform.machine(),
+            "ClientName": "sharm",
+            "HostName": socket.gethostname(),
+            "ID": f"{mac}#{self.channel}",
+            "Instance": self.channel + 1,
+            "MAC": mac,
+            "OS": platform.system(),
+            "SnapStreamProtocolVersion": PROTOCOL_VERSION,
+            "Version": "0.31.0",
+        }
+
+    def _send(self, kind, payload):
+        with self._send_lock:
+            msg_id = self._next_id
+            self._next_id = (self._next_id + 1) & 0xFFFF
+            self._sock.sendall(pack_message(kind, payload, time.monotonic(), msg_id))
+        return msg_id
+
+    def _sync_loop(self):
+        # A burst of quick requests to converge, then one per second
+        sent = 0
+        while self._running:
+            try:
+                self._send(MSG_TIME, struct.pack("<ii", 0, 0))
+            except OSError:
+                return
+            sent += 1
+            time.sleep(0.02 if sent < 20 else 1.0)
+
+    def _receive(self):
+        try:
+            while self._running:
+                kind, msg_id, refers_to, sent, raw, payload = read_message(self._sock)
+                received = time.monotonic()
+                if self._record_file and kind in (MSG_CODEC_HEADER, MSG_WIRE_CHUNK, MSG_SERVER_SETTINGS):
+                    self._record_file.write(raw + payload)
+                if kind == MSG_TIME:
+                    sec, usec = struct.unpack_from("<ii", payload)
+                    self.sync.add(sec + usec / 1e6, received - sent)
+                elif kind == MSG_WIRE_CHUNK:
+                    self._on_chunk(payload)
+                elif kind == MSG_CODEC_HEADER:
+                    self._on_codec_header(payload)
+                elif kind == MSG_SERVER_SETTINGS:
+                    self.settings = _parse_json_payload(payload)
+                    self.buffer_s = self.settings.get("bufferMs", 1000) / 1000.0
+        except (ConnectionError, OSError) as e:
+            if self._running:
+                print(f"Snapcast connection lost: {e}", file=sys.stderr)
+                self._running = False
+                with self._cond:
+                    self._cond.notify_all()
+
+    def _on_codec_header(self, payload):
+        (n,) = struct.unpack_from("<I", payload)
+        codec = payload[4:4 + n].decode()
+        (size,) = struct.unpack_from("<I", payload, 4 + n)
+        header = payload[8 + n:8 + n + size]
+        if self.decoder and hasattr(self.decoder, "close"):
+            self.decoder.close()
+        self.decoder = make_decoder(codec, header, self.channel)
+        self.sample_rate = self.decoder.sample_rate
+        with self._cond:
+            self._queue.clear()
+            self._queued = 0
+
+    def _on_chunk(self, payload):
+        if self.decoder is None:
+            return
+        sec, usec, size = struct.unpack_from("<iiI", payload)
+        start = time.thread_time()
+        samples = self.decoder.decode(payload[12:12 + size])
+        self.decode_cpu += time.thread_time() - start
+        self.chunks += 1
+        if not len(samples):
+            return
+        self.decoded_frames += len(samples)
+        # Server time at which this chunk is due, kept in server time until sync is known
+        due = sec + usec / 1e6 + self.buffer_s - self.latency
+        with self._cond:
+            self._queue.append([due, samples, 0])
+            self._queued += len(samples)
+            self._cond.notify()
+
+    # Output
+    def _open(self):
+        import pyaudio
+        if self._pa is None:
+            self._pa = pyaudio.PyAudio()
+        self._stream = self._pa.open(
+            rate=self.sample_rate,
+            channels=1,
+            format=pyaudio.paInt16,
+            output=True,
+            output_device_index=self.device_index,
+            frames_per_buffer=self.block_frames
+        )
+        get_latency = getattr(self._stream, "get_output_latency", None)
+        self._output_latency = get_latency() if get_latency else 0.0
+
+    def _take(self, frames):
+        """Pop up to frames samples from the queue head; caller holds _cond"""
+        parts = []
+        need = frames
+        while need and self._queue:
+            entry = self._queue[0]
+            due, samples, offset = entry
+            n = min(need, len(samples) - offset)
+            parts.append(samples[offset:offset + n])
+            need -= n
+            if offset + n >= len(samples):
+                self._queue.popleft()
+            else:
+                entry[2] = offset + n
+        taken = frames - need
+        self._queued -= taken
+        return parts, taken
+
+    def _play(self):
+        rate = self.sample_rate
+        block = self.block_frames
+        silence = bytes(2 * block)
+        started = False
+        while self._running:
+            with self._cond:
+                while self._running and (not self._queue or self.sync.diff is None):
+                    if started:
+                        break
+                    self._cond.wait(0.1)
+                if not self._running:
+                    return
+                if self._stream is None:
+                    self._open()
+                    rate = self.sample_rate
+                audible = self.sync.to_server(time.monotonic() + self._output_latency)
+
+                if not self._queue:
+                    out = silence
+                    self.underruns += 1
+                    self.silence_frames += block
+                else:
+                    due, samples, offset = self._queue[0]
+                    error = audible - (due + offset / rate)
+                    if error > self.tolerance:
+                        # Late: skip ahead
+                        _, dropped = self._take(int(error * rate))
+                        self.dropped_frames += dropped
+                        continue
+                    if error < -self.tolerance:
+                        # Early: play silence until the chunk is due
+                        gap = min(block, int(-error * rate))
+                        out = bytes(2 * gap)
+                        self.silence_frames += gap
+                    else:
+                        parts, taken = self._take(block)
+                        out = b"".join(p.tobytes() for p in parts)
+                        self.played_frames += taken
+                        self.sync_error = error
+                        self._sync_abs_sum += abs(error)
+                        self._sync_count += 1
+                        started = True
+            try:
+                self._stream.write(out)
+            except Exception as e:
+                print(f"Snapcast output error: {e}", file=sys.stderr)
+                self._stream = None
+                time.sleep(0.5)
+
+
+# Stand-in server
+
+class StandinServer:
+    """
+    Local snapserver stand-in
+
+    Serves a raw interleaved s16le file (like the FIFO) or WAV as codec=pcm,
+    or replays a SnapClient --record file with chunks re-timestamped to
+    now. Chunks are paced in real time; Time requests are answered on a
+    clock offset from the local one, so clients have to sync for real.
+    """
+
+    def __init__(self, path, port=0, sample_rate=48000, channels=6, chunk_ms=20,
+                 buffer_ms=1000, clock_offset=1000.0, loop=True):
+        self.path = path
+        self.sample_rate = sample_rate
+        self.channels = channels
+        self.chunk_ms = chunk_ms
+        self.buffer_ms = buffer_ms
+        self.clock_offset = clock_offset
+        self.loop = loop
+        self._messages = self._load(path)
+
+        self._listener = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        self._listener.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+        self._listener.bind(("127.0.0.1", port))
+        self._listener.listen(4)
+        self.port = self._listener.getsockname()[1]
+        self._running = True
+        self._thread = threading.Thread(target=self._accept, name="snap-standin", daemon=True)
+        self._thread.start()
+
+    def now(self):
+        return time.monotonic() + self.clock_offset
+
+    def _load(self, path):
+        """Return (codec_header_payload, [(duration, chunk_data)])"""
+        with open(path, "rb") as f:
+            data = f.read()
+        if data[:4] == b"RIFF":
+            fmt = data.find(b"fmt ")
+            _, self.channels, self.sample_rate = struct.unpack_from("<HHI", data, fmt + 8)
+            pos = data.find(b"data")
+            data = data[pos + 8:]
+        elif len(data) >= HEADER.size and HEADER.unpack_from(data)[0] == MSG_CODEC_HEADER:
+            return self._load_recording(data)
+
+        frame_bytes = 2 * self.channels
+        chunk_frames = self.sample_rate * self.chunk_ms // 1000
+        step = chunk_frames * frame_bytes
+        chunks = [(chunk_frames / self.sample_rate, data[i:i + step])
+                  for i in range(0, len(data) - step + 1, step)]
+        return self._pcm_header(), chunks
+
+    def _load_recording(self, data):
+        header = None
+        chunks = []
+        stamps = []
+        pos = 0
+        while pos + HEADER.size <= len(data):
+            kind, _, _, _, _, _, _, size = HEADER.unpack_from(data, pos)
+            payload = data[pos + HEADER.size:pos + HEADER.size + size]
+            pos += HEADER.size + size
+            if kind == MSG_CODEC_HEADER and header is None:
+                header = payload
+            elif kind == MSG_WIRE_CHUNK:
+                sec, usec, n = struct.unpack_from("<iiI", payload)
+                stamps.append(sec + usec / 1e6)
+                chunks.append(payload[12:12 + n])
+        durations = [b - a for a, b in zip(stamps, stamps[1:])]
+        durations.append(durations[-1] if durations else self.chunk_ms / 1000.0)
+        return header, list(zip(durations, chunks))
+
+    def _pcm_header(self):
+        codec = b"pcm"
+        riff = struct.pack("<4sI4s4sIHHIIHH4sI", b"RIFF", 36, b"WAVE", b"fmt ", 16, 1, self.channels,
+                           self.sample_rate, self.sample_rate * 2 * self.channels, 2 * self.channels, 16,
+                           b"data", 0)
+        return struct.pack("<I", len(codec)) + codec + struct.pack("<I", len(riff)) + riff
+
+    def close(self):
+        self._running = False
+        self._listener.close()
+
+    def _accept(self):
+        while self._running:
+            try:
+                conn, _ = self._listener.accept()
+            except OSError:
+                return
+            conn.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+            threading.Thread(target=self._serve, args=(conn,), name="snap-standin-client", daemon=True).start()
+
+    def _serve(self, conn):
+        lock = threading.Lock()
+        alive = [True]
+
+        def send(kind, payload, refers_to=0):
+            with lock:
+                conn.sendall(pack_message(kind, payload, self.now(), refers_to=refers_to))
+
+        def answer():
+            try:
+                while alive[0]:
+                    kind, msg_id, _, sent, _, payload = read_message(conn)
+                    if kind == MSG_TIME:
+                        latency = self.now() - sent
+                        sec, usec = _split_time(latency)
+                        send(MSG_TIME, struct.pack("<ii", sec, usec), refers_to=msg_id)
+            except (ConnectionError, OSError):
+                alive[0] = False
+
+        try:
+            read_message(conn)   # Hello
+            threading.Thread(target=answer, daemon=True).start()
+            send(MSG_SERVER_SETTINGS, _json_payload({"bufferMs": self.buffer_ms, "latency": 0,
+                                                     "muted": False, "volume": 100}))
+            header, chunks = self._messages
+            send(MSG_CODEC_HEADER, header)
+            next_send = time.monotonic()
+            while alive[0] and self._running:
+                for duration, data in chunks:
+                    delay = next_send - time.monotonic()
+                    if delay > 0:
+                        time.sleep(delay)
+                    sec, usec = _split_time(self.now())
+                    send(MSG_WIRE_CHUNK, struct.pack("<iiI", sec, usec, len(data)) + data)
+                    next_send += duration
+                    if not alive[0]:
+                        break
+                if not self.loop:
+                    break
+        except (ConnectionError, OSError):
+            pass
+        finally:
+            alive[0] = False
+            conn.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--host", default="localhost")
+    parser.add_argument("--port", type=int, default=int(os.getenv("SNAPSERVER_PORT", "1704")))
+    parser.add_argument("--channel", default="C", help="FL, FR, C, LFE, RL, RR or an index")
+    parser.add_argument("--latency", type=float, default=0.0, help="Output latency to compensate (ms)")
+    parser.add_argument("--record", help="Save received stream messages to this file")
+    parser.add_argument("--standin", help="Serve this recording / s16le / WAV file locally and play it")
+    parser.add_argument("--fake-output", action="store_true", help="Use the hal.py output stream (no sound card)")
+    parser.add_argument("--duration", type=float, default=0.0, help="Stop after this many seconds (0 = run until Ctrl+C)")
+    parser.add_argument("--interval", type=float, default=5.0, help="Stats print interval")
+    args = parser.parse_args()
+
+    if args.fake_output:
+        from hal import install_fake_modules
+        install_fake_modules(["pyaudio"], force=True, realtime=True)
+
+    server = None
+    host, port = args.host, args.port
+    if args.standin:
+        server = StandinServer(args.standin)
+        host, port = "127.0.0.1", server.port
+
+    channel = args.channel if args.channel in CHANNELS else int(args.channel)
+    client = SnapClient(host, port, channel=channel, latency_ms=args.latency, record=args.record)
+    client.start()
+    start = time.monotonic()
+    try:
+        while client._running and (not args.duration or time.monotonic() - start < args.duration):
+            time.sleep(min(args.interval, args.duration or args.interval))
+            print(json.dumps({k: round(v, 3) if isinstance(v, float) else v
+                              for k, v in client.get_stats().items()}), flush=True)
+    except KeyboardInterrupt:
+        pass
+    client.stop()
+    if server:
+        server.close()
+    return 0
+
+
+if __name__ == "__main__":
+    exit(main())
@@ -0,0 +1,161 @@
+#!/usr/bin/env python3
+"""
+Startup timeline for the client.
+Runs independent initializers on their own threads and records when each
+step started and how long it took, with the process RSS after it, so slow
+imports, model loads and device enumeration show up in one report:
+
+    [BOOT] +   0.0 ms     91.2 ms  interpreter          rss  9.8 MB
+    [BOOT] +  91.2 ms     63.4 ms  imports              rss 14.1 MB
+    [BOOT] + 160.1 ms    412.0 ms  leds                 rss 18.6 MB
+    ...
+"""
+import os
+import threading
+import time
+from concurrent.futures import Future
+
+
+def _proc_status():
+    """VmRSS and VmHWM in kB from /proc/self/status (zeros elsewhere)"""
+    values = {"VmRSS": 0, "VmHWM": 0}
+    try:
+        with open("/proc/self/status") as f:
+            for line in f:
+                key, _, rest = line.partition(":")
+                if key in values:
+                    values[key] = int(rest.split()[0])
+    except OSError:
+        pass
+    return values
+
+
+def rss_mb():
+    """Resident set size of this process in MB"""
+    return _proc_status()["VmRSS"] / 1024.0
+
+
+def process_age():
+    """Seconds since this process was exec'd (interpreter startup included), or None"""
+    try:
+        with open("/proc/self/stat") as f:
+            # Field 22 (starttime) comes after the ")" closing the command name
+            start_ticks = int(f.read().rsplit(")", 1)[1].split()[19])
+        with open("/proc/uptime") as f:
+            uptime = float(f.read().split()[0])
+        return max(0.0, uptime - start_ticks / os.sysconf("SC_CLK_TCK"))
+    except (OSError, ValueError, IndexError):
+        return None
+
+
+class Startup:
+    """Records the startup timeline; steps may run concurrently"""
+
+    def __init__(self, started=None):
+        """
+        Initialize timeline
+
+        Args:
+            started: time.monotonic() taken as early as possible in the main
+                     script (default: now); when /proc is available offsets
+                     count from exec and the time before started is shown
+                     as "interpreter"
+        """
+        self.started = started if started is not None else time.monotonic()
+        self.origin = self.started
+        self._lock = threading.Lock()
+        self._last_mark = self.started
+        self.steps = []     # (name, offset from origin s, duration s, rss MB, error)
+        age = process_age()
+        if age is not None:
+            # Age is measured now; shift it back to `started`
+            interpreter = age - (time.monotonic() - self.started)
+            if interpreter > 0:
+                self.origin = self.started - interpreter
+                self.steps.append(("interpreter", 0.0, interpreter, rss_mb(), None))
+
+    def _record(self, name, start, end, error=None):
+        with self._lock:
+            self.steps.append((name, start - self.origin, end - start, rss_mb(), error))
+
+    def mark(self, name):
+        """Record a step from the previous mark (or the start) to now, e.g. "imports" """
+        now = time.monotonic()
+        with self._lock:
+            start, self._last_mark = self._last_mark, now
+        self._record(name, start, now)
+
+    def step(self, name, fn, *args, **kwargs):
+        """Run fn(*args, **kwargs) on this thread as a timed step and return its result"""
+        start = time.monotonic()
+        try:
+            result = fn(*args, **kwargs)
+        except BaseException as e:
+            self._record(name, start, time.monotonic(), e)
+            raise
+        self._record(name, start, time.monotonic())
+        return result
+
+    def start(self, name, fn, *args, **kwargs):
+        """
+        Run fn(*args, **kwargs) on its own thread as a timed step
+
+        Returns:
+            concurrent.futures.Future with fn's result or exception
+        """
+        future = Future()
+
+        def run():
+            try:
+                future.set_result(self.step(name, fn, *args, **kwargs))
+            except BaseException as e:
+                future.set_exception(e)
+
+        threading.Thread(target=run, name=f"init-{name}", daemon=True).start()
+        return future
+
+    def wait_for(self, name, predicate, stop_event=None, timeout=60.0, interval=0.01):
+        """
+        Poll predicate() and record name when it first returns true, as a
+        step from the origin (e.g. time to the first detection frame)
+
+        Returns:
+            True if it did before timeout (or stop_event)
+        """
+        deadline = time.monotonic() + timeout
+        while not predicate():
+            if time.monotonic() > deadline or (stop_event is not None and stop_event.is_set()):
+                return False
+            time.sleep(interval)
+        now = time.monotonic()
+        self._record(name, self.origin, now)
+        return True
+
+    def report(self):
+        """
+        Timeline lines in order of completion, then a memory summary
+
+        Returns:
+            list of str (without tag or timestamp)
+        """
+        with self._lock:
+            steps = sorted(self.steps, key=lambda s: s[1] + s[2])
+        lines = []
+        for name, offset, duration, rss, error in steps:
+            line = f"+{offset * 1000:8.1f} ms {duration * 1000:9.1f} ms  {name:<20} rss {rss:5.1f} MB"
+            if error is not None:
+                line += f"  FAILED: {error!r}"
+            lines.append(line)
+        status = _proc_status()
+        lines.append(f"rss {status['VmRSS'] / 1024.0:.1f} MB, peak {status['VmHWM'] / 1024.0:.1f} MB, "
+                     f"{threading.active_count()} threads")
+        return lines
+
+    def get_stats(self):
+        """Step durations in ms by name, plus current and peak RSS in MB"""
+        with self._lock:
+            stats = {name: duration * 1000.0 for name, _, duration, _, _ in self.steps}
+        status = _proc_status()
+        stats["rss_mb"] = status["VmRSS"] / 1024.0
+        stats["peak_rss_mb"] = status["VmHWM"] / 1024.0
+        return stats
@@ -1,94 +1,95 @@
 #!/usr/bin/env python3
-import os
 import time
-import subprocess
-import random
-import glob
+_STARTED = time.monotonic()
+
+import os
 import getpass
-import board
-import neopixel
+from concurrent.futures import FIRST_COMPLETED, wait
+
+import startup
+boot = startup.Startup(_STARTED)
 
-from wake_word_detector import WakeWordDetector
+import fastlog
+import metrics
+from controller import Controller
+from led_animator import LedAnimator
 from rotary_encoder import RotaryEncoder
-from ups import UPS, BatteryStatus
+from volume import VolumeService
+# board/neopixel, pvporcupine/pyaudio, mpv, earcons and the UPS are
+# imported by their init functions below, on the init threads
+
+boot.mark("imports")
 
 
-# Initialize NeoPixel
-LED_PIN = board.D10
 LED_COUNT = 7
 BRIGHTNESS = 0.2
-pixels = neopixel.NeoPixel(LED_PIN, LED_COUNT, brightness=BRIGHTNESS, auto_write=True, pixel_order=neopixel.GRB)
 
-# Global MPV process and state
-mpv_process = None
-radio_is_playing = False
+RADIO_URL = "https://stream.radioparadise.com/aac-128"
+
+battery_soc = None
+
+controller = Controller()
 
+VOLUME_STEP = 5  # % per detent
 
-def ts():
-    """Generate timestamp string"""
-    t = time.time()
-    return time.strftime("%Y-%m-%d %H:%M:%S", time.localtime(t)) + f".{int((t % 1)*1000):03d}"
+
+# Lines are formatted and written on a background thread (LOG_LEVEL=DEBUG for more)
+log = fastlog.get()
+
+# Components; the ones started in the background stay None until they are up
+pixels = leds = encoder = volume = None
+detector = player = earcons = ups = None
+
+
+AUDIO_RUNTIME_DIR = '/tmp/xdg_runtime'
+
+# In-process PortAudio (earcons) opens ALSA's default PCM like aplay did; its
+# pulse plugin finds the server through XDG_RUNTIME_DIR in this process's own
+# environment, so set it before any init thread creates a PyAudio instance
+os.environ['XDG_RUNTIME_DIR'] = AUDIO_RUNTIME_DIR
 
 
 def get_audio_env():
     """Get environment with PulseAudio settings"""
     env = os.environ.copy()
-    env['XDG_RUNTIME_DIR'] = '/tmp/xdg_runtime'
+    env['XDG_RUNTIME_DIR'] = AUDIO_RUNTIME_DIR
     return env
 
 
 def flash_pixels(color, duration=1):
-    """Flash pixels with given color for duration seconds"""
-    pixels.fill(color)
-    time.sleep(duration)
-    pixels.fill((0, 0, 0))
-
-
-def stop_mpv():
-    """Stop MPV if it's running"""
-    global mpv_process
-    if mpv_process and mpv_process.poll() is None:
-        mpv_process.terminate()
-        try:
-            mpv_process.wait(timeout=2)
-        except subprocess.TimeoutExpired:
-            mpv_process.kill()
-        print(f"[MPV] {ts()} Stopped")
-        mpv_process = None
-        return True
-    return False
+    """Flash pixels with given color for duration seconds (non-blocking, newest flash wins)"""
+    leds.flash(color, duration)
 
 
 def toggle_radio():
-    """Toggle radio playback on/off"""
-    global mpv_process, radio_is_playing
-    
-    if radio_is_playing:
-        # Radio is playing, stop it
-        stop_mpv()
-        radio_is_playing = False
-        print(f"[RADIO] {ts()} OFF")
+    """Toggle radio playback on/off (queues an mpv command, never blocks)"""
+    if player is None:
+        log.info("RADIO", "Player not ready yet")
         flash_pixels((128, 0, 0), 0.1)
-    else:
-        # Radio is not playing, start it
-        mpv_process = subprocess.Popen(["mpv", "https://stream.radioparadise.com/aac-128"], env=get_audio_env())
-        radio_is_playing = True
-        print(f"[RADIO] {ts()} ON")
+        return
+    if player.toggle(RADIO_URL, time.monotonic()):
+        log.info("RADIO", "ON")
         flash_pixels((128, 0, 128))
+    else:
+        log.info("RADIO", "OFF")
+        flash_pixels((128, 0, 0), 0.1)
+
+
+# Radio first audio handler
+def on_radio_audio(latency):
+    """Handler for the first audio after a radio ON"""
+    log.info("RADIO", "Audio started ({:.0f} ms after toggle)", latency * 1000)
 
 
 # Wake word detection handler
-def on_wake_word_detected(keyword_index, keyword_name):
+async def on_wake_word_detected(keyword_index, keyword_name):
     """Handler for wake word detection"""
-    print(f"[WAKE] {ts()} Wake word detected: {keyword_name}")
+    log.info("WAKE", "Wake word detected: {}", keyword_name)
     
     if keyword_index == 0:
         # Keyword 0: Play sound and light up blue
-        sounds_dir = os.path.join(os.path.dirname(__file__), "sounds")
-        hello_files = glob.glob(os.path.join(sounds_dir, "hello_*.wav"))
-        if hello_files:
-            random_sound = random.choice(hello_files)
-            subprocess.Popen(["aplay", random_sound], env=get_audio_env())
+        if earcons is not None:
+            earcons.play("hello", priority=1)
         flash_pixels((0, 0, 128))
     elif keyword_index == 1:
         # Keyword 1: Toggle radio
@@ -96,27 +97,26 @@ def on_wake_word_detected(keyword_index, keyword_name):
 
 
 # Encoder rotation handler
-def on_encoder_rotation(direction, position, degrees, rotations):
-    """Handler for encoder rotation"""
-    print(f"[ENC] {ts()} {direction} rotations={rotations} remainder={degrees:.1f}° (raw={position})", flush=True)
+async def on_encoder_rotation(direction, position, degrees, rotations, stamp):
+    """Handler for encoder rotation (stamp: time of the detent's last edge)"""
+    log.info("ENC", "{} rotations={} remainder={:.1f}° (raw={})", direction, rotations, degrees, position)
     
-    # Adjust volume using amixer
-    try:
-        if direction == "CW":
-            subprocess.run(["amixer", "set", "Master", "5%+"], stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
-        elif direction == "CCW":
-            subprocess.run(["amixer", "set", "Master", "5%-"], stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
-            
-        print(f"[VOL] {ts()} Volume {direction}", flush=True)
-    except Exception as e:
-        print(f"[VOL] {ts()} Error adjusting volume: {e}", flush=True)
+    # Only moves the target; VolumeService writes the latest value on its own thread
+    volume.step(VOLUME_STEP if direction == "CW" else -VOLUME_STEP, stamp)
+
+
+# Volume applied handler (volume thread)
+def on_volume_applied(percent, latency):
+    """Handler for mixer writes"""
+    log.info("VOL", "Volume {:.0f}% ({:.1f} ms)", percent, latency * 1000)
+    leds.volume(percent)
 
 
 # Button press handler
-def on_button_press(level, tick):
+async def on_button_press(level, tick):
     """Handler for button events"""
     if level == 0:
-      print(f"[BTN] {ts()} level={level} tick={tick}", flush=True)
+      log.info("BTN", "level={} tick={}", level, tick)
       # Toggle radio
       toggle_radio()
 
@@ -124,58 +124,215 @@ def on_button_press(level, tick):
 # UPS battery change handler
 def on_battery_change(voltage, soc, status):
     """Handler for battery state changes"""
-    print(f"[UPS] {ts()} Battery: {voltage:.2f}V {soc:.1f}% [{status.value}]", flush=True)
+    global battery_soc
+    battery_soc = soc
+    log.info("UPS", "Battery: {:.2f}V {:.1f}% [{}]", voltage, soc, status.value)
 
 
 # UPS power change handler
 def on_power_change(is_connected):
     """Handler for power adapter connection changes"""
     state = "CONNECTED" if is_connected else "DISCONNECTED"
-    print(f"[UPS] {ts()} Power adapter: {state}", flush=True)
+    log.info("UPS", "Power adapter: {}", state)
+    if battery_soc is not None:
+        leds.battery(battery_soc)
 
 
 # UPS low battery alert handler
 def on_low_battery(voltage, soc):
     """Handler for low battery alert"""
-    print(f"[UPS] {ts()} ⚠️  LOW BATTERY ALERT! {voltage:.2f}V {soc:.1f}%", flush=True)
+    log.warning("UPS", "⚠️  LOW BATTERY ALERT! {:.2f}V {:.1f}%", voltage, soc)
+    leds.pulse((128, 0, 0), period=2.0, duration=10.0)
 
 
-# Initialize components
-keywords = ["hey-pee-dar", "hey-pipi"]
-detector = WakeWordDetector(keywords)
-detector.set_callback(on_wake_word_detected)
+# UPS runtime estimate handler
+def on_runtime_estimate(time_to_empty, rate, on_mains):
+    """Handler for time-to-empty estimate changes"""
+    if on_mains:
+        log.info("UPS", "Runtime: on mains")
+    elif time_to_empty is None:
+        log.info("UPS", "Runtime: estimating…")
+    else:
+        log.info("UPS", "Runtime: ~{:.0f} min left ({:.1f}%/h)", time_to_empty / 60, rate)
+
 
-encoder = RotaryEncoder(pin_btn=23, pin_enc_a=27, pin_enc_b=22)
-encoder.set_button_callback(on_button_press)
-encoder.set_rotation_callback(on_encoder_rotation)
+# Component init (each runs on its own thread via boot.start)
+keywords = ["hey-pee-dar", "hey-pipi"]
 
-ups = UPS(auto_update=True, update_interval=10.0)
-ups.initialize()
-ups.on_battery_change(on_battery_change)
-ups.on_power_change(on_power_change)
-ups.on_low_battery(on_low_battery)
 
-print(f"Running as user: {getpass.getuser()}")
-print("Listening... Say:", ", ".join(keywords))
-print("[RUN] Encoder callbacks armed")
-print("[RUN] UPS monitoring started")
+def init_leds():
+    """NeoPixel strip and animator"""
+    import board
+    import neopixel
+
+    strip = neopixel.NeoPixel(board.D10, LED_COUNT, brightness=BRIGHTNESS, auto_write=False,
+                              pixel_order=neopixel.GRB)
+    return strip, LedAnimator(strip)
+
+
+def init_encoder():
+    """Encoder with callbacks armed; hardware callbacks only post events"""
+    enc = RotaryEncoder(pin_btn=23, pin_enc_a=27, pin_enc_b=22)
+    enc.set_button_callback(lambda level, tick: controller.post("button", level, tick))
+    enc.set_rotation_callback(lambda *args: controller.post("rotate", *args, time.monotonic()))
+    return enc
+
+
+def init_volume():
+    service = VolumeService()
+    service.on_applied(on_volume_applied)
+    return service
+
+
+def init_detector():
+    """Porcupine model load and PortAudio device enumeration (the slow part)"""
+    # WAKE_VAD=1 skips Porcupine on silent frames (saves battery when the room is quiet)
+    # WAKE_WORKER=1 runs capture + Porcupine in a child process, off this process's GIL
+    if os.getenv("WAKE_WORKER") == "1":
+        from wake_word_worker import WakeWordWorker
+        return WakeWordWorker(keywords, options={"vad": os.getenv("WAKE_VAD") == "1"})
+    from wake_word_detector import WakeWordDetector
+    return WakeWordDetector(keywords, threaded=True, vad=os.getenv("WAKE_VAD") == "1")
+
+
+def init_player():
+    from mpv_player import MpvPlayer
+
+    mpv = MpvPlayer(env=get_audio_env())
+    mpv.on_first_audio(lambda latency: controller.post("radio_audio", latency))
+    return mpv
+
+
+def init_earcons():
+    """Decode feedback sounds once and keep the output stream open"""
+    from earcons import EarconPlayer
+
+    sounds = EarconPlayer(device="default")
+    sounds.load(os.path.join(os.path.dirname(__file__), "sounds", "*.wav"))
+    sounds.warm_up()
+    return sounds
+
+
+def init_ups():
+    from ups import UPS
+
+    battery = UPS(auto_update=True, update_interval=10.0, adaptive=True,
+                  soc_deadband=0.5, voltage_deadband=0.02, hysteresis=1.0)
+    battery.initialize()
+    battery.on_battery_change(lambda *args: controller.post("battery", *args))
+    battery.on_power_change(lambda *args: controller.post("power", *args))
+    battery.on_low_battery(lambda *args: controller.post("low_battery", *args))
+    battery.on_runtime_estimate(lambda *args: controller.post("runtime", *args))
+    return battery
+
+
+def attach(name, component):
+    """Publish a component that finished initializing to the handlers"""
+    global detector, player, earcons, ups
+    if name == "wake":
+        detector = component
+    elif name == "player":
+        player = component
+    elif name == "earcons":
+        earcons = component
+    elif name == "ups":
+        ups = component
+
+
+def finish_startup(stop_event):
+    """Producer: attach background components as they come up, then report the timeline"""
+    waiting = dict(background)
+    while waiting and not stop_event.is_set():
+        done, _ = wait(list(waiting.values()), timeout=0.5, return_when=FIRST_COMPLETED)
+        for name in [n for n, f in waiting.items() if f in done]:
+            try:
+                attach(name, waiting.pop(name).result())
+            except Exception as e:
+                log.error("BOOT", "{} failed: {!r}", name, e)
+                continue
+            if name == "wake":
+                controller.add_detector(detector)
+                log.info("RUN", "Listening... Say: {}", ", ".join(keywords))
+            elif name == "ups":
+                log.info("RUN", "UPS monitoring started")
+    leds.clear("pulse")
+    if detector is not None:
+        boot.wait_for("first frame", lambda: detector.frames_processed > 0, stop_event)
+    for line in boot.report():
+        log.info("BOOT", "{}", line)
+
+
+# Encoder, volume and LEDs first so the knob works while the rest loads
+first = {name: boot.start(name, fn) for name, fn in
+         (("leds", init_leds), ("encoder", init_encoder), ("volume", init_volume))}
+pixels, leds = first["leds"].result()
+leds.pulse((0, 0, 32), period=1.5)
+encoder = first["encoder"].result()
+volume = first["volume"].result()
+log.info("RUN", "Encoder callbacks armed")
+
+background = {name: boot.start(name, fn) for name, fn in
+              (("wake", init_detector), ("player", init_player), ("earcons", init_earcons), ("ups", init_ups))}
+
+controller.on("wake", on_wake_word_detected)
+controller.on("radio_audio", on_radio_audio)
+controller.on("button", on_button_press)
+controller.on("rotate", on_encoder_rotation)
+controller.on("battery", on_battery_change)
+controller.on("power", on_power_change)
+controller.on("low_battery", on_low_battery)
+controller.on("runtime", on_runtime_estimate)
+controller.add_producer(finish_startup, "startup")
+
+# Prometheus text on METRICS_ADDRESS (host:port or UNIX socket path, empty to disable),
+# plus a compact [METRICS] line every METRICS_INTERVAL seconds
+metrics_server = None
+if os.getenv("METRICS_ADDRESS", "127.0.0.1:9101"):
+    metrics_server = boot.step("metrics", metrics.MetricsServer, os.getenv("METRICS_ADDRESS", "127.0.0.1:9101"))
+controller.add_producer(metrics.REGISTRY.reporter(float(os.getenv("METRICS_INTERVAL", "60")),
+                                                  lambda line: log.info("METRICS", "{}", line)), "metrics")
+
+log.info("RUN", "Running as user: {}", getpass.getuser())
 
 # Main loop
 try:
-    while True:
-        detector.process_audio()
-except KeyboardInterrupt:
-    print("\n[EXIT] KeyboardInterrupt", flush=True)
+    if controller.run_forever():
+        log.info("EXIT", "KeyboardInterrupt")
+    else:
+        log.info("EXIT", "Controller stopped")
 finally:
-    stop_mpv()
-    radio_is_playing = False
-    pixels.fill((0, 0, 0))
+    # Components that came up after the loop stopped still need closing
+    for name, future in background.items():
+        if future.done() and future.exception() is None:
+            attach(name, future.result())
+    if player is not None:
+        log.info("RADIO", "Player stats: {}", player.get_stats())
+        player.close()
+    log.info("LED", "Render stats: {}", leds.get_stats())
+    leds.close()
     try:
         pixels.deinit()
     except Exception:
         pass
-    ups.cleanup()
+    if ups is not None:
+        log.info("UPS", "Bus stats: {}", ups.get_bus_stats())
+        log.info("UPS", "Event stats: {}", ups.get_event_stats())
+        ups.cleanup()
     encoder.cleanup()
-    detector.cleanup()
-    print("[CLEANUP] All resources cleaned up", flush=True)
-
+    if earcons is not None:
+        log.info("SND", "Earcon stats: {}", earcons.get_stats())
+        earcons.close()
+    log.info("VOL", "Mixer stats: {}", volume.get_stats())
+    volume.close()
+    if detector is not None:
+        log.info("WAKE", "Capture stats: {}", detector.get_stats())
+    log.info("CTRL", "Dispatch stats: {}", controller.get_stats())
+    log.info("METRICS", "{}", metrics.REGISTRY.snapshot())
+    log.info("BOOT", "Startup: {}", boot.get_stats())
+    if metrics_server:
+        metrics_server.close()
+    if detector is not None:
+        detector.cleanup()
+    log.info("CLEANUP", "All resources cleaned up")
+    log.info("LOG", "Writer stats: {}", log.get_stats())
+    log.close()
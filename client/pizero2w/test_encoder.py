@@ -2,14 +2,12 @@
 import time
 import sys
 import os
+import fastlog
 from rotary_encoder import RotaryEncoder
 
-def ts():
-    t = time.time()
-    return time.strftime("%Y-%m-%d %H:%M:%S", time.localtime(t)) + f".{int((t % 1)*1000):03d}"
-
 def main():
-    print(f"[INIT] Python={sys.version.split()[0]} argv={sys.argv} cwd={os.getcwd()}", flush=True)
+    log = fastlog.get(fastlog.DEBUG)
+    log.info("INIT", "Python={} argv={} cwd={}", sys.version.split()[0], sys.argv, os.getcwd())
     
     # Create encoder instance
     encoder = RotaryEncoder(
@@ -19,35 +17,37 @@ def main():
         watchdog_ms=1000,
         glitch_us=0,
         pulses_per_rotation=80,
-        debug=True
+        debug=True,
+        log=log
     )
     
-    print(f"[INIT] RotaryEncoder initialized", flush=True)
-    print(f"[CFG] BTN PIN 23, ENC_A PIN 27, ENC_B PIN 22", flush=True)
+    log.info("INIT", "RotaryEncoder initialized")
+    log.info("CFG", "BTN PIN 23, ENC_A PIN 27, ENC_B PIN 22")
 
     def button_callback(level, tick):
         # level: 0 falling, 1 rising, 2 watchdog timeout
         if level == 2:
-            print(f"[WD]  {ts()} watchdog timeout", flush=True)
+            log.info("WD", "watchdog timeout")
             return
-        print(f"[BTN] {ts()} level={level} tick={tick}", flush=True)
+        log.info("BTN", "level={} tick={}", level, tick)
 
     def rotation_callback(direction, position, degrees, rotations):
-        print(f"[ENC] {ts()} {direction} rotations={rotations} remainder={degrees:.1f}° (raw={position})", flush=True)
+        log.info("ENC", "{} rotations={} remainder={:.1f}° (raw={})", direction, rotations, degrees, position)
     
     encoder.set_button_callback(button_callback)
     encoder.set_rotation_callback(rotation_callback)
     
-    print("[RUN] Callbacks armed (Ctrl+C to exit)", flush=True)
+    log.info("RUN", "Callbacks armed (Ctrl+C to exit)")
 
     try:
         while True:
             time.sleep(1)
     except KeyboardInterrupt:
-        print("\n[EXIT] KeyboardInterrupt", flush=True)
+        log.info("EXIT", "KeyboardInterrupt")
     finally:
         encoder.cleanup()
-        print("[CLEANUP] encoder cleaned up", flush=True)
+        log.info("CLEANUP", "encoder cleaned up, log: {}", log.get_stats())
+        log.close()
 
 if __name__ == "__main__":
     main()
@@ -30,9 +30,13 @@ def main():
     print("\nUPS HAT Event Monitor")
     print("Press Ctrl+C to exit.\n")
     
+    ups = None
     try:
         # auto_update=True - класс сам вызывает update() в фоне
-        with UPS(auto_update=True, update_interval=1.0) as ups:
+        # Ignore sub-LSB noise: report 0.1% SOC / 10 mV steps, at most every 5 s
+        with UPS(auto_update=True, update_interval=1.0,
+                 soc_deadband=0.1, voltage_deadband=0.01, hysteresis=1.0,
+                 min_event_interval=5.0, coalesce=True, dispatch_thread=True) as ups:
             # Subscribe to events
             ups.on_battery_change(on_battery_changed)
             ups.on_power_change(on_power_changed)
@@ -46,6 +50,8 @@ def main():
     
     except KeyboardInterrupt:
         print("\nExiting...")
+        if ups is not None:
+            print(f"Event stats: {ups.get_event_stats()}")
     except Exception as e:
         print(f"ERROR: {e}")
         return 1
@@ -4,15 +4,21 @@ UPS HAT Battery Monitor - Reusable class for Raspberry Pi
 Provides event-driven interface for CW2015 fuel gauge and power monitoring.
 """
 import sys
-import struct
 import threading
 import time
+from collections import deque
 from enum import Enum
-from typing import Callable, Optional
+from typing import Callable, Optional, Tuple
 
 import smbus
 import pigpio
 
+import metrics
+from battery_history import BatteryHistory
+
+
+_I2C_READ_SECONDS = metrics.histogram("ups_i2c_read_seconds", "CW2015 register read time")
+
 
 class BatteryStatus(Enum):
     """Battery charge status."""
@@ -21,6 +27,78 @@ class BatteryStatus(Enum):
     LOW = "LOW"
 
 
+class _EventDispatcher:
+    """Delivers callbacks on its own thread so slow subscribers don't delay sampling"""
+    
+    def __init__(self, coalesce: bool = False):
+        """
+        Initialize dispatcher (the thread runs between start() and stop()).
+        
+        Args:
+            coalesce: Keep only the latest pending call per event name
+        """
+        self.coalesce = coalesce
+        self.coalesced = 0
+        self.delivered = 0
+        self.max_pending = 0
+        self._cond = threading.Condition()
+        self._queue = deque()
+        self._latest = {}
+        self._running = False
+        self._thread: Optional[threading.Thread] = None
+    
+    def start(self):
+        """Start the thread if it is not running (again after stop())."""
+        with self._cond:
+            if self._thread is not None and self._thread.is_alive():
+                return
+            self._running = True
+            self._thread = threading.Thread(target=self._run, name="ups-events", daemon=True)
+            self._thread.start()
+    
+    @property
+    def pending(self) -> int:
+        return len(self._queue) + len(self._latest)
+    
+    def submit(self, name: str, callback: Callable, args: tuple):
+        with self._cond:
+            if self.coalesce:
+                if name in self._latest:
+                    self.coalesced += 1
+                    # Move to the end so ordering follows the latest submit
+                    del self._latest[name]
+                self._latest[name] = (callback, args)
+            else:
+                self._queue.append((callback, args))
+            self.max_pending = max(self.max_pending, self.pending)
+            self._cond.notify()
+    
+    def stop(self):
+        with self._cond:
+            self._running = False
+            self._cond.notify()
+        if self._thread is not None and self._thread is not threading.current_thread():
+            self._thread.join(timeout=2.0)
+    
+    def _run(self):
+        while True:
+            with self._cond:
+                while self._running and not self._queue and not self._latest:
+                    self._cond.wait()
+                if not self._queue and not self._latest:
+                    return
+                if self._queue:
+                    callback, args = self._queue.popleft()
+                else:
+                    name = next(iter(self._latest))
+                    callback, args = self._latest.pop(name)
+                self.delivered += 1
+            try:
+                callback(*args)
+            except Exception as e:
+                print(f"Event callback error: {e}", file=sys.stderr)
+
+
 class UPS:
     """
     UPS HAT monitor with event subscription support.
@@ -29,6 +107,16 @@ class UPS:
     - on_battery_change: Called when battery voltage/SOC changes
     - on_power_change: Called when power adapter connection changes
     - on_low_battery: Called when battery drops below threshold
+    - on_runtime_estimate: Called when the time-to-empty estimate changes
+    
+    Power changes are delivered from a GPIO edge callback as soon as they
+    happen; battery registers are read in a single I2C block transaction.
+    
+    Battery changes can be filtered: deadbands are measured against the last
+    delivered values, thresholds use hysteresis, and min_event_interval
+    rate-limits deliveries (with coalesce=True the latest held-back state is
+    delivered once the interval has passed). Status changes, power changes
+    and low battery alerts are never filtered.
     """
     
     # CW2015 I2C configuration
@@ -39,22 +127,48 @@ class UPS:
     
     # GPIO and I2C settings
     POWER_GPIO = 4
+    POWER_GLITCH_US = 5000
     I2C_BUS_NUM = 1
     
     # Battery thresholds
     LOW_BATTERY_THRESHOLD = 5.0   # %
     FULL_BATTERY_THRESHOLD = 100.0  # %
     
-    def __init__(self, auto_update: bool = False, update_interval: float = 1.0):
+    # Adaptive polling (seconds)
+    NEAR_LOW_MARGIN = 10.0        # % above LOW_BATTERY_THRESHOLD polled fastest
+    NEAR_LOW_INTERVAL = 1.0
+    DISCHARGE_INTERVAL = 5.0
+    FULL_ON_MAINS_INTERVAL = 60.0
+    
+    def __init__(self, auto_update: bool = False, update_interval: float = 1.0,
+                 pi: Optional[pigpio.pi] = None, bus: Optional[smbus.SMBus] = None,
+                 adaptive: bool = False, history: Optional[BatteryHistory] = None,
+                 voltage_deadband: float = 0.0, soc_deadband: float = 0.0,
+                 hysteresis: float = 0.0, min_event_interval: float = 0.0,
+                 coalesce: bool = False, dispatch_thread: bool = False):
         """
         Initialize UPS monitor.
         
         Args:
             auto_update: If True, automatically call update() in background thread
             update_interval: Interval in seconds for auto updates (default: 1.0)
+            pi: Connected pigpio.pi to use instead of creating one (optional)
+            bus: Open SMBus to use instead of opening I2C_BUS_NUM (optional)
+            adaptive: Poll faster when discharging or near LOW_BATTERY_THRESHOLD and
+                      back off to FULL_ON_MAINS_INTERVAL when full on mains
+            history: BatteryHistory to record samples into (default: new one
+                     with the default tiers)
+            voltage_deadband: Minimum voltage change (V) for on_battery_change
+            soc_deadband: Minimum SOC change (%) for on_battery_change
+            hysteresis: SOC margin (%) required to leave LOW or FULL status
+            min_event_interval: Minimum seconds between on_battery_change deliveries
+            coalesce: Hold back rate-limited changes and deliver only the latest;
+                      with dispatch_thread, also collapse queued calls per event
+            dispatch_thread: Run callbacks on a dispatcher thread instead of the
+                             sampling thread / GPIO callback thread
         """
-        self._bus: Optional[smbus.SMBus] = None
-        self._pi: Optional[pigpio.pi] = None
+        self._bus: Optional[smbus.SMBus] = bus
+        self._pi: Optional[pigpio.pi] = pi
         self._initialized = False
         
         # Auto update configuration
@@ -62,11 +176,49 @@ class UPS:
         self._update_interval = update_interval
         self._update_thread: Optional[threading.Thread] = None
         self._stop_event = threading.Event()
+        self._wake_event = threading.Event()
+        self._adaptive = adaptive
+        self._current_interval = update_interval
+        
+        # Power edge callback
+        self._power_cb = None
+        self._power_lock = threading.Lock()
+        
+        # Bus accounting
+        self._i2c_transactions = 0
+        self._gpio_reads = 0
+        self._stats_start = time.monotonic()
+        self._window_start = self._stats_start
+        self._window_count = 0
+        self._last_window_rate: Optional[float] = None
         
         # Event callbacks
         self._on_battery_change: Optional[Callable] = None
         self._on_power_change: Optional[Callable] = None
         self._on_low_battery: Optional[Callable] = None
+        self._on_runtime_estimate: Optional[Callable] = None
+        
+        # Event filtering
+        self.voltage_deadband = voltage_deadband
+        self.soc_deadband = soc_deadband
+        self.hysteresis = hysteresis
+        self.min_event_interval = min_event_interval
+        self.coalesce = coalesce
+        self._status: Optional[BatteryStatus] = None
+        self._delivered: Optional[Tuple[float, float, BatteryStatus]] = None
+        self._delivered_at = 0.0
+        self._held: Optional[Tuple[float, float, BatteryStatus]] = None
+        self._dispatcher = _EventDispatcher(coalesce) if dispatch_thread else None
+        
+        # Event counters
+        self._events_delivered = 0
+        self._suppressed_deadband = 0
+        self._suppressed_rate = 0
+        self._coalesced = 0
+        
+        # Sample history and runtime estimate
+        self.history = history if history is not None else BatteryHistory()
+        self._last_estimate_key: Optional[Tuple] = None
         
         # State tracking for events
         self._last_power_state: Optional[bool] = None
@@ -80,26 +232,36 @@ class UPS:
             return
         
         # Initialize pigpio
-        self._pi = pigpio.pi()
+        if self._pi is None:
+            self._pi = pigpio.pi()
         if not self._pi.connected:
             raise RuntimeError("pigpiod is not running! Start it with: sudo pigpiod")
         
         # Setup GPIO
         self._pi.set_mode(self.POWER_GPIO, pigpio.INPUT)
         self._pi.set_pull_up_down(self.POWER_GPIO, pigpio.PUD_UP)
+        self._pi.set_glitch_filter(self.POWER_GPIO, self.POWER_GLITCH_US)
         
         # Initialize I2C
-        try:
-            self._bus = smbus.SMBus(self.I2C_BUS_NUM)
-        except FileNotFoundError:
-            raise RuntimeError("I2C bus /dev/i2c-1 not found. Enable I2C in raspi-config.")
-        except PermissionError:
-            raise PermissionError("Permission denied. Run with sudo or add user to 'i2c' group.")
+        if self._bus is None:
+            try:
+                self._bus = smbus.SMBus(self.I2C_BUS_NUM)
+            except FileNotFoundError:
+                raise RuntimeError("I2C bus /dev/i2c-1 not found. Enable I2C in raspi-config.")
+            except PermissionError:
+                raise PermissionError("Permission denied. Run with sudo or add user to 'i2c' group.")
         
         # Quick start fuel gauge
         self._quick_start()
         self._initialized = True
         
+        # Power state: one read now, edges afterwards
+        self._power_cb = self._pi.callback(self.POWER_GPIO, pigpio.EITHER_EDGE, self._power_handler)
+        
+        # Callbacks thread (stopped by cleanup, so started again here)
+        if self._dispatcher:
+            self._dispatcher.start()
+        
         # Start auto-update thread if enabled
         if self._auto_update:
             self._start_auto_update()
@@ -109,8 +271,19 @@ class UPS:
         # Stop auto-update thread
         if self._update_thread and self._update_thread.is_alive():
             self._stop_event.set()
+            self._wake_event.set()
             self._update_thread.join(timeout=2.0)
         
+        if self._dispatcher:
+            self._dispatcher.stop()
+        
+        if self._power_cb:
+            try:
+                self._power_cb.cancel()
+            except Exception:
+                pass
+            self._power_cb = None
+        
         if self._bus:
             try:
                 self._bus.close()
@@ -140,6 +313,18 @@ class UPS:
         """Subscribe to low battery alerts. Callback: (voltage, soc)"""
         self._on_low_battery = callback
     
+    def on_runtime_estimate(self, callback: Callable[[Optional[float], Optional[float], bool], None]):
+        """
+        Subscribe to runtime estimates. Callback: (time_to_empty_s, discharge_rate, on_mains)
+        
+        Fired when the estimate changes by at least a minute, becomes
+        available/unavailable or the power source changes. time_to_empty_s
+        is None on mains power, and also on battery until two samples give
+        a discharge rate (or while the rate is not positive); on_mains
+        tells the two apart.
+        """
+        self._on_runtime_estimate = callback
+    
     # Reading methods
     def read_voltage(self) -> float:
         """Return battery voltage in volts."""
@@ -157,13 +342,84 @@ class UPS:
         w = self._read_word_swapped(self.REG_SOC)
         return w / 256.0
     
+    def read_state(self) -> Tuple[float, float]:
+        """Return (voltage, soc) from a single I2C block read of VCELL..SOC."""
+        if not self._initialized:
+            raise RuntimeError("UPS not initialized. Call initialize() first.")
+        
+        # 0x02 VCELL MSB, 0x03 VCELL LSB, 0x04 SOC MSB, 0x05 SOC LSB
+        start = time.monotonic()
+        b = self._bus.read_i2c_block_data(self.CW2015_ADDR, self.REG_VCELL, 4)
+        _I2C_READ_SECONDS.observe(time.monotonic() - start)
+        self._count_i2c()
+        voltage = (((b[0] << 8) | b[1]) * 0.305) / 1000.0
+        soc = ((b[2] << 8) | b[3]) / 256.0
+        return voltage, soc
+    
     def is_power_connected(self) -> bool:
         """Check if external power adapter is connected."""
         if not self._initialized:
             raise RuntimeError("UPS not initialized. Call initialize() first.")
         
+        self._gpio_reads += 1
         return self._pi.read(self.POWER_GPIO) == 1
     
+    @property
+    def discharge_rate(self) -> Optional[float]:
+        """Smoothed discharge rate in %/hour, None until known."""
+        return self.history.discharge_rate
+    
+    @property
+    def time_to_empty(self) -> Optional[float]:
+        """Estimated seconds until empty, None on mains or until known."""
+        return self.history.time_to_empty
+    
+    @property
+    def current_interval(self) -> float:
+        """Interval in seconds the auto-update thread is currently using."""
+        return self._current_interval
+    
+    def get_bus_stats(self) -> dict:
+        """
+        Get bus usage counters.
+        
+        Returns:
+            dict with total I2C transactions and GPIO reads, the lifetime
+            I2C rate and the rate over the last complete minute (per minute)
+        """
+        elapsed = max(time.monotonic() - self._stats_start, 1e-9)
+        return {
+            "i2c_transactions": self._i2c_transactions,
+            "gpio_reads": self._gpio_reads,
+            "i2c_per_minute": self._i2c_transactions * 60.0 / elapsed,
+            "i2c_last_minute": self._last_window_rate,
+            "interval": self._current_interval,
+        }
+    
+    def get_event_stats(self) -> dict:
+        """
+        Get event delivery counters.
+        
+        Returns:
+            dict with delivered callbacks, battery changes suppressed by the
+            deadband or by min_event_interval, held-back states replaced by a
+            newer one (coalesced) and dispatcher queue figures
+        """
+        delivered = self._events_delivered
+        if self._dispatcher:
+            delivered += self._dispatcher.delivered
+        stats = {
+            "delivered": delivered,
+            "suppressed_deadband": self._suppressed_deadband,
+            "suppressed_rate": self._suppressed_rate,
+            "coalesced": self._coalesced,
+        }
+        if self._dispatcher:
+            stats["dispatch_coalesced"] = self._dispatcher.coalesced
+            stats["dispatch_pending"] = self._dispatcher.pending
+            stats["dispatch_max_pending"] = self._dispatcher.max_pending
+        return stats
+    
     def get_battery_status(self, soc: float) -> BatteryStatus:
         """Get battery status based on SOC."""
         if soc >= self.FULL_BATTERY_THRESHOLD:
@@ -181,28 +437,28 @@ class UPS:
         if not self._initialized:
             raise RuntimeError("UPS not initialized. Call initialize() first.")
         
-        voltage = self.read_voltage()
-        soc = self.read_soc()
-        power_connected = self.is_power_connected()
-        status = self.get_battery_status(soc)
+        voltage, soc = self.read_state()
+        status = self._classify(soc)
         
         # Check for battery changes
         if (self._last_voltage != voltage or self._last_soc != soc):
-            if self._on_battery_change:
-                self._on_battery_change(voltage, soc, status)
+            self._offer_battery(voltage, soc, status)
             self._last_voltage = voltage
             self._last_soc = soc
+        self._flush_held()
+        
+        # Power adapter changes arrive through _power_handler; poll only
+        # when no edge has been seen yet (first update)
+        if self._last_power_state is None:
+            self._set_power_state(self.is_power_connected())
         
-        # Check for power adapter changes
-        if self._last_power_state != power_connected:
-            if self._on_power_change:
-                self._on_power_change(power_connected)
-            self._last_power_state = power_connected
+        # History and runtime estimate
+        self.history.add(time.time(), voltage, soc, bool(self._last_power_state))
+        self._check_runtime_estimate()
         
         # Check for low battery
         if status == BatteryStatus.LOW and not self._low_battery_notified:
-            if self._on_low_battery:
-                self._on_low_battery(voltage, soc)
+            self._emit("low_battery", self._on_low_battery, voltage, soc)
             self._low_battery_notified = True
         elif status != BatteryStatus.LOW:
             self._low_battery_notified = False
@@ -210,13 +466,120 @@ class UPS:
     # Private methods
     def _read_word_swapped(self, reg: int) -> int:
         """Read a 16-bit word and swap bytes."""
+        start = time.monotonic()
         raw = self._bus.read_word_data(self.CW2015_ADDR, reg)
-        return struct.unpack("<H", struct.pack(">H", raw))[0]
+        _I2C_READ_SECONDS.observe(time.monotonic() - start)
+        self._count_i2c()
+        return ((raw & 0xFF) << 8) | (raw >> 8)
+    
+    def _count_i2c(self):
+        """Account one I2C transaction."""
+        self._i2c_transactions += 1
+        self._window_count += 1
+        now = time.monotonic()
+        if now - self._window_start >= 60.0:
+            self._last_window_rate = self._window_count * 60.0 / (now - self._window_start)
+            self._window_start = now
+            self._window_count = 0
+    
+    def _check_runtime_estimate(self):
+        """Fire on_runtime_estimate when the rounded estimate changes."""
+        tte = self.history.time_to_empty
+        on_mains = bool(self._last_power_state)
+        key = (None if tte is None else int(tte // 60), on_mains)
+        if key == self._last_estimate_key:
+            return
+        self._last_estimate_key = key
+        self._emit("runtime", self._on_runtime_estimate, tte, self.history.discharge_rate, on_mains)
+    
+    def _power_handler(self, gpio, level, tick):
+        """pigpio edge callback on POWER_GPIO."""
+        if level < 2:
+            self._set_power_state(level == 1)
+            # Re-evaluate the polling interval right away
+            self._wake_event.set()
+    
+    def _set_power_state(self, connected: bool):
+        """Record power state and fire on_power_change if it changed."""
+        with self._power_lock:
+            if self._last_power_state == connected:
+                return
+            self._last_power_state = connected
+        self._emit("power", self._on_power_change, connected)
+    
+    def _classify(self, soc: float) -> BatteryStatus:
+        """Battery status with hysteresis around the LOW/FULL thresholds."""
+        status = self.get_battery_status(soc)
+        previous = self._status
+        if previous == BatteryStatus.LOW and soc < self.LOW_BATTERY_THRESHOLD + self.hysteresis:
+            status = BatteryStatus.LOW
+        elif previous == BatteryStatus.FULL and soc >= self.FULL_BATTERY_THRESHOLD - self.hysteresis:
+            status = BatteryStatus.FULL
+        self._status = status
+        return status
+    
+    def _offer_battery(self, voltage: float, soc: float, status: BatteryStatus):
+        """Apply deadband and rate limit to a battery change."""
+        delivered = self._delivered
+        if delivered is not None and status == delivered[2]:
+            if (abs(voltage - delivered[0]) <= self.voltage_deadband and
+                    abs(soc - delivered[1]) <= self.soc_deadband):
+                self._suppressed_deadband += 1
+                # Back within the band: nothing left to deliver
+                self._held = None
+                return
+            if time.monotonic() - self._delivered_at < self.min_event_interval:
+                if not self.coalesce:
+                    self._suppressed_rate += 1
+                elif self._held is not None:
+                    self._coalesced += 1
+                self._held = (voltage, soc, status) if self.coalesce else None
+                return
+        self._deliver_battery(voltage, soc, status)
+    
+    def _flush_held(self):
+        """Deliver a coalesced battery change once min_event_interval has passed."""
+        if self._held is not None and self._held_due() <= 0:
+            self._deliver_battery(*self._held)
+    
+    def _held_due(self) -> float:
+        """Seconds until a held battery change may be delivered."""
+        return self._delivered_at + self.min_event_interval - time.monotonic()
+    
+    def _deliver_battery(self, voltage: float, soc: float, status: BatteryStatus):
+        self._held = None
+        self._delivered = (voltage, soc, status)
+        self._delivered_at = time.monotonic()
+        self._emit("battery", self._on_battery_change, voltage, soc, status)
+    
+    def _emit(self, name: str, callback: Optional[Callable], *args):
+        """Run a subscriber callback, directly or on the dispatcher thread."""
+        if callback is None:
+            return
+        if self._dispatcher:
+            # Counted by the dispatcher when it runs, after coalescing
+            self._dispatcher.submit(name, callback, args)
+        else:
+            self._events_delivered += 1
+            callback(*args)
+    
+    def _next_interval(self, soc: Optional[float]) -> float:
+        """Pick the next auto-update interval."""
+        if not self._adaptive or soc is None:
+            return self._update_interval
+        if self._last_power_state:
+            if soc >= self.FULL_BATTERY_THRESHOLD:
+                return max(self._update_interval, self.FULL_ON_MAINS_INTERVAL)
+            return self._update_interval
+        if soc < self.LOW_BATTERY_THRESHOLD + self.NEAR_LOW_MARGIN:
+            return min(self._update_interval, self.NEAR_LOW_INTERVAL)
+        return min(self._update_interval, self.DISCHARGE_INTERVAL)
     
     def _quick_start(self):
         """Wake CW2015 and force quick-start fuel gauge estimation."""
         try:
             self._bus.write_word_data(self.CW2015_ADDR, self.REG_MODE, 0x30)
+            self._count_i2c()
         except Exception as e:
             print(f"QuickStart warning: {e}", file=sys.stderr)
     
@@ -237,7 +600,17 @@ class UPS:
             except Exception as e:
                 print(f"Auto-update error: {e}", file=sys.stderr)
             
-            self._stop_event.wait(self._update_interval)
+            self._current_interval = self._next_interval(self._last_soc)
+            deadline = time.monotonic() + self._current_interval
+            while not self._stop_event.is_set():
+                timeout = deadline - time.monotonic()
+                if self._held is not None:
+                    timeout = min(timeout, max(self._held_due(), 0.0))
+                if self._wake_event.wait(max(timeout, 0.0)) or time.monotonic() >= deadline:
+                    break
+                # Woke early only to release a coalesced battery change
+                self._flush_held()
+            self._wake_event.clear()
     
     def __enter__(self):
         """Context manager entry."""
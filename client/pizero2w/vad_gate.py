@@ -0,0 +1,176 @@
+#!/usr/bin/env python3
+"""
+Voice activity gate in front of the wake word engine.
+Per frame it computes the energy and zero-crossing rate with numpy
+(no Python loop over samples) and compares the energy to an adaptive
+noise floor. While the gate is closed frames are only copied into a
+pre-roll ring; on speech onset the ring is replayed into the engine
+before the current frame, so the soft start of the keyword still
+reaches Porcupine. The gate stays open for a hangover after the last
+voiced frame.
+"""
+import math
+
+import numpy as np
+
+from audio_frames import FrameBuffer, FrameProcessor
+
+
+class VadGate:
+    """Energy + zero-crossing gate with adaptive noise floor and pre-roll"""
+
+    def __init__(self, engine, frame_length, frames_per_read=1, threshold_db=9.0, min_level_db=-60.0,
+                 max_zcr=0.35, preroll_frames=16, hangover_frames=31, floor_rise_db=0.02,
+                 floor_fall=0.2, initial_floor_db=-50.0):
+        """
+        Initialize gate
+
+        Args:
+            engine: Wake word engine (replayed frames go to it through a FrameProcessor)
+            frame_length: Samples per engine frame
+            frames_per_read: Frames analyzed per call to analyze()
+            threshold_db: Energy above the noise floor that counts as voice
+            min_level_db: Absolute level (dBFS) below which a frame never opens the gate
+            max_zcr: Zero crossings per sample above which a frame is treated as hiss
+            preroll_frames: Frames kept and replayed on onset (16 x 32 ms = 0.5 s)
+            hangover_frames: Frames the gate stays open after the last voiced frame
+            floor_rise_db: Noise floor rise per frame while the level is above it,
+                           voiced or not, so steady noise (a fan) closes the gate again
+            floor_fall: Fraction of the gap closed per frame while the level is below the floor
+            initial_floor_db: Noise floor before any audio was seen
+        """
+        self.frame_length = frame_length
+        self.threshold_db = threshold_db
+        self.min_level_db = min_level_db
+        self.max_zcr = max_zcr
+        self.hangover_frames = hangover_frames
+        self.floor_rise_db = floor_rise_db
+        self.floor_fall = floor_fall
+        self.floor_db = initial_floor_db
+
+        # Scratch for one read, reused on every call
+        self._work = np.empty((frames_per_read, frame_length), dtype=np.float32)
+        self._energy = np.empty(frames_per_read, dtype=np.float32)
+        self._signs = np.empty((frames_per_read, frame_length), dtype=bool)
+        self._flips = np.empty((frames_per_read, frame_length - 1), dtype=bool)
+        self.level_db = np.full(frames_per_read, -120.0)
+        self.zcr = np.zeros(frames_per_read)
+        self._scale = 1.0 / (32768.0 * 32768.0 * frame_length)
+
+        # Pre-roll ring: a FrameBuffer so replayed frames take the same direct engine path
+        self.preroll_frames = preroll_frames
+        self.ring = FrameBuffer(frame_length, max(1, preroll_frames))
+        self._ring_samples = np.frombuffer(self.ring.raw, dtype="<i2").reshape(-1, frame_length)
+        self.processor = FrameProcessor(engine, self.ring)
+        self._ring_pos = 0
+        self._ring_fill = 0
+        self._samples = None
+
+        self.open = False
+        self._hang = 0
+
+        self.frames = 0
+        self.skipped = 0
+        self.onsets = 0
+        self.replayed = 0
+
+    def analyze(self, frame_buffer, count):
+        """
+        Compute level and zero-crossing rate of the frames of one read
+
+        Args:
+            frame_buffer: FrameBuffer just loaded by the detector
+            count: Complete frames in it
+        """
+        if self._samples is None or self._samples.base is not frame_buffer.raw:
+            self._samples = np.frombuffer(frame_buffer.raw, dtype="<i2").reshape(-1, self.frame_length)
+        if count == 0:
+            return
+        x = self._samples[:count]
+        work = self._work[:count]
+        np.copyto(work, x, casting="unsafe")
+        np.einsum("ij,ij->i", work, work, out=self._energy[:count])
+        np.log10(np.maximum(self._energy[:count] * self._scale, 1e-12), out=self.level_db[:count])
+        self.level_db[:count] *= 10.0
+        np.signbit(x, out=self._signs[:count])
+        np.not_equal(self._signs[:count, 1:], self._signs[:count, :-1], out=self._flips[:count])
+        self.zcr[:count] = np.count_nonzero(self._flips[:count], axis=1)
+        self.zcr[:count] /= self.frame_length
+
+    def admit(self, index):
+        """
+        Decide whether frame index of the analyzed read goes to the engine
+
+        Returns:
+            None to skip the frame, otherwise the number of pre-roll frames
+            to replay (see replay()) before processing it
+        """
+        self.frames += 1
+        level = self.level_db[index]
+        voiced = (level >= self.min_level_db and level - self.floor_db >= self.threshold_db
+                  and self.zcr[index] <= self.max_zcr)
+
+        if voiced:
+            self._hang = self.hangover_frames
+        # Fall fast, rise slowly; a word barely moves the floor, steady noise lifts it
+        if level < self.floor_db:
+            self.floor_db += (level - self.floor_db) * self.floor_fall
+        else:
+            self.floor_db = min(level, self.floor_db + self.floor_rise_db)
+
+        if self.open:
+            if voiced:
+                return 0
+            self._hang -= 1
+            if self._hang > 0:
+                return 0
+            self.open = False
+
+        if not voiced:
+            self._store(index)
+            self.skipped += 1
+            return None
+
+        self.open = True
+        self.onsets += 1
+        pending = self._ring_fill
+        self._ring_fill = 0
+        self.replayed += pending
+        return pending
+
+    def replay(self, pending):
+        """
+        Pre-roll ring slots in chronological order
+
+        Args:
+            pending: Value returned by admit()
+        """
+        if not pending:
+            return ()
+        start = (self._ring_pos - pending) % self.preroll_frames
+        return [(start + k) % self.preroll_frames for k in range(pending)]
+
+    def _store(self, index):
+        if not self.preroll_frames:
+            return
+        self._ring_samples[self._ring_pos] = self._samples[index]
+        self._ring_pos = (self._ring_pos + 1) % self.preroll_frames
+        self._ring_fill = min(self._ring_fill + 1, self.preroll_frames)
+
+    def get_stats(self):
+        """
+        Get gate counters
+
+        Returns:
+            dict with frames, skipped, skipped_fraction, onsets, replayed,
+            open and noise_floor_db
+        """
+        return {
+            "frames": self.frames,
+            "skipped": self.skipped,
+            "skipped_fraction": self.skipped / self.frames if self.frames else 0.0,
+            "onsets": self.onsets,
+            "replayed": self.replayed,
+            "open": self.open,
+            "noise_floor_db": round(self.floor_db, 1) if math.isfinite(self.floor_db) else None,
+        }
@@ -0,0 +1,285 @@
+#!/usr/bin/env python3
+"""
+Volume service with a persistent mixer handle.
+Callers set an absolute target (or step it); a worker thread writes only
+the latest target, so a fast spin of the encoder coalesces into a few
+mixer writes instead of one forked amixer per detent.
+
+Backends:
+- AlsaMixer: libasound through ctypes, fully in-process
+- AmixerPipe: one long-lived `amixer -s` reading commands from stdin
+"""
+import ctypes
+import ctypes.util
+import re
+import subprocess
+import sys
+import threading
+import time
+
+import metrics
+
+
+_APPLY_SECONDS = metrics.histogram("volume_apply_seconds",
+                                   "Volume request (encoder edge when stamped) to mixer write")
+_MIXER_SECONDS = metrics.histogram("volume_mixer_write_seconds", "Time of one mixer write")
+
+
+class AlsaMixer:
+    """Playback volume of one simple mixer element through libasound"""
+
+    def __init__(self, control="Master", card="default"):
+        """
+        Initialize ALSA mixer
+
+        Args:
+            control: Simple mixer element name
+            card: Mixer device name
+        """
+        name = ctypes.util.find_library("asound")
+        if name is None:
+            raise RuntimeError("libasound not found")
+        lib = ctypes.CDLL(name)
+        self._lib = lib
+        lib.snd_mixer_selem_id_sizeof.restype = ctypes.c_size_t
+        lib.snd_mixer_find_selem.restype = ctypes.c_void_p
+
+        self._handle = ctypes.c_void_p()
+        self._check(lib.snd_mixer_open(ctypes.byref(self._handle), 0), "snd_mixer_open")
+        self._check(lib.snd_mixer_attach(self._handle, card.encode()), "snd_mixer_attach")
+        self._check(lib.snd_mixer_selem_register(self._handle, None, None), "snd_mixer_selem_register")
+        self._check(lib.snd_mixer_load(self._handle), "snd_mixer_load")
+
+        # snd_mixer_selem_id_t is opaque; allocate it ourselves
+        self._sid = ctypes.create_string_buffer(lib.snd_mixer_selem_id_sizeof())
+        lib.snd_mixer_selem_id_set_index(self._sid, 0)
+        lib.snd_mixer_selem_id_set_name(self._sid, control.encode())
+        self._elem = ctypes.c_void_p(lib.snd_mixer_find_selem(self._handle, self._sid))
+        if not self._elem:
+            self.close()
+            raise RuntimeError(f"Mixer control '{control}' not found")
+
+        vmin = ctypes.c_long()
+        vmax = ctypes.c_long()
+        lib.snd_mixer_selem_get_playback_volume_range(self._elem, ctypes.byref(vmin), ctypes.byref(vmax))
+        self._min = vmin.value
+        self._max = vmax.value
+        self._raw = ctypes.c_long()
+
+    def _check(self, rc, what):
+        if rc < 0:
+            raise RuntimeError(f"{what} failed: {rc}")
+
+    def get(self):
+        """Return current volume in percent (channel 0)"""
+        self._lib.snd_mixer_handle_events(self._handle)
+        self._lib.snd_mixer_selem_get_playback_volume(self._elem, 0, ctypes.byref(self._raw))
+        span = self._max - self._min
+        return 100.0 * (self._raw.value - self._min) / span if span else 0.0
+
+    def set(self, percent):
+        """Set all playback channels to percent"""
+        raw = self._min + int(round((self._max - self._min) * percent / 100.0))
+        self._check(self._lib.snd_mixer_selem_set_playback_volume_all(self._elem, ctypes.c_long(raw)),
+                    "snd_mixer_selem_set_playback_volume_all")
+
+    def close(self):
+        if self._handle:
+            self._lib.snd_mixer_close(self._handle)
+            self._handle = ctypes.c_void_p()
+
+
+class AmixerPipe:
+    """Long-lived `amixer -s` process fed one command per line"""
+
+    def __init__(self, control="Master", command=("amixer",)):
+        """
+        Initialize amixer pipe
+
+        Args:
+            control: Simple mixer element name
+            command: amixer binary (and leading args)
+        """
+        self.control = control
+        self.command = list(command)
+        self._proc = None
+        self._start()
+
+    def _start(self):
+        self._proc = subprocess.Popen(
+            self.command + ["-q", "-s"],
+            stdin=subprocess.PIPE, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL,
+            text=True, bufsize=1
+        )
+
+    def get(self):
+        """Return current volume in percent (one-off query, not for the hot path)"""
+        out = subprocess.run(self.command + ["get", self.control],
+                             capture_output=True, text=True).stdout
+        m = re.search(r"\[(\d+)%\]", out)
+        return float(m.group(1)) if m else 0.0
+
+    def set(self, percent):
+        """Set volume to percent"""
+        line = f"sset {self.control} {int(round(percent))}%\n"
+        try:
+            self._proc.stdin.write(line)
+            self._proc.stdin.flush()
+        except (BrokenPipeError, ValueError):
+            # amixer died; restart once and retry
+            self._start()
+            self._proc.stdin.write(line)
+            self._proc.stdin.flush()
+
+    def close(self):
+        if self._proc:
+            try:
+                self._proc.stdin.close()
+                self._proc.wait(timeout=1.0)
+            except Exception:
+                self._proc.kill()
+            self._proc = None
+
+
+def open_mixer(control="Master"):
+    """Open the best available mixer backend"""
+    try:
+        return AlsaMixer(control)
+    except (OSError, RuntimeError) as e:
+        print(f"ALSA mixer unavailable ({e}), using amixer pipe", file=sys.stderr)
+        return AmixerPipe(control)
+
+
+class VolumeService:
+    """Coalescing volume setter running on its own thread"""
+
+    # Mixer write retries back off from the first to the last delay (seconds)
+    RETRY_DELAY = 0.1
+    MAX_RETRY_DELAY = 5.0
+
+    def __init__(self, mixer=None, initial=None, min_percent=0.0, max_percent=100.0):
+        """
+        Initialize volume service
+
+        Args:
+            mixer: Backend with get()/set(percent)/close() (default: open_mixer())
+            initial: Starting target in percent (default: read from mixer)
+            min_percent: Lower clamp for targets
+            max_percent: Upper clamp for targets
+        """
+        self.mixer = mixer if mixer is not None else open_mixer()
+        self.min_percent = min_percent
+        self.max_percent = max_percent
+
+        self._cond = threading.Condition()
+        self._target = self.mixer.get() if initial is None else float(initial)
+        self._applied = None
+        self._request_stamp = time.monotonic()
+        self._running = True
+
+        # Counters
+        self.requests = 0
+        self.writes = 0
+        self.last_latency = 0.0
+        self.max_latency = 0.0
+        self.errors = 0
+        self._failures = 0      # consecutive failed writes
+
+        self._on_applied = None
+        self._thread = threading.Thread(target=self._run, name="volume", daemon=True)
+        self._thread.start()
+
+    def on_applied(self, callback):
+        """Subscribe to applied volume. Callback: (percent, latency_seconds)"""
+        self._on_applied = callback
+
+    @property
+    def target(self):
+        """Latest requested volume in percent"""
+        return self._target
+
+    @property
+    def applied(self):
+        """Last volume written to the mixer, None before the first write"""
+        return self._applied
+
+    def set(self, percent):
+        """Request an absolute volume in percent"""
+        with self._cond:
+            self._target = min(self.max_percent, max(self.min_percent, float(percent)))
+            self._request_stamp = time.monotonic()
+            self.requests += 1
+            self._cond.notify()
+
+    def step(self, delta, stamp=None):
+        """
+        Move the target by delta percent (relative to the target, not the mixer)
+
+        Args:
+            delta: Percent to add
+            stamp: time.monotonic() of the originating input (e.g. the encoder
+                   edge), for request-to-applied latency (default: now)
+        """
+        with self._cond:
+            self._target = min(self.max_percent, max(self.min_percent, self._target + delta))
+            self._request_stamp = time.monotonic() if stamp is None else stamp
+            self.requests += 1
+            self._cond.notify()
+
+    def get_stats(self):
+        """Return request/write counters and latency"""
+        return {
+            "requests": self.requests,
+            "writes": self.writes,
+            "coalesced": max(0, self.requests - self.writes),
+            "errors": self.errors,
+            "last_latency_ms": self.last_latency * 1000.0,
+            "max_latency_ms": self.max_latency * 1000.0,
+        }
+
+    def close(self):
+        """Stop the worker and release the mixer"""
+        with self._cond:
+            self._running = False
+            self._cond.notify()
+        self._thread.join(timeout=2.0)
+        self.mixer.close()
+
+    def _run(self):
+        while True:
+            with self._cond:
+                while self._running and self._target == self._applied:
+                    self._cond.wait()
+                if not self._running:
+                    return
+                target = self._target
+                stamp = self._request_stamp
+
+            start = time.monotonic()
+            try:
+                self.mixer.set(target)
+            except Exception as e:
+                # Report only the first failure of a run, and retry less and less often
+                self.errors += 1
+                if not self._failures:
+                    print(f"Volume error: {e} (retrying)", file=sys.stderr)
+                delay = min(self.MAX_RETRY_DELAY, self.RETRY_DELAY * 2 ** self._failures)
+                self._failures += 1
+                with self._cond:
+                    self._cond.wait_for(lambda: not self._running, timeout=delay)
+                continue
+            if self._failures:
+                print(f"Volume mixer recovered after {self._failures} failed writes", file=sys.stderr)
+                self._failures = 0
+
+            now = time.monotonic()
+            _MIXER_SECONDS.observe(now - start)
+            latency = now - stamp
+            _APPLY_SECONDS.observe(latency)
+            self._applied = target
+            self.writes += 1
+            self.last_latency = latency
+            if latency > self.max_latency:
+                self.max_latency = latency
+            if self._on_applied:
+                self._on_applied(target, latency)
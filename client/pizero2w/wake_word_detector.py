@@ -1,14 +1,24 @@
 #!/usr/bin/env python3
-import pvporcupine
-import pyaudio
-import struct
 import os
+import time
+
+import metrics
+from audio_frames import FrameBuffer, FrameProcessor
+from audio_ring import AudioRing, CaptureThread
+from audio_source import PyAudioSource
+
+
+_READ_SECONDS = metrics.histogram("wake_read_seconds", "Engine (and gate) time per read")
+_FRAME_LATENCY = metrics.histogram("wake_frame_latency_seconds", "Capture to end of processing (threaded mode)")
+_DETECTIONS = metrics.counter("wake_detections", "Wake words detected")
 
 
 class WakeWordDetector:
     """Wake word detection using Picovoice Porcupine"""
     
-    def __init__(self, keywords, keyword_paths=None, access_key=None):
+    def __init__(self, keywords, keyword_paths=None, access_key=None, frames_per_read=1,
+                 threaded=False, ring_slots=32, source=None, engine=None, vad=False, vad_options=None,
+                 ring=None, capture=True):
         """
         Initialize wake word detector
         
@@ -16,6 +26,19 @@ class WakeWordDetector:
             keywords: List of keyword names
             keyword_paths: List of paths to .ppn files (optional, will auto-generate from keywords)
             access_key: Picovoice access key (optional, will use PV_ACCESS_KEY env var)
+            frames_per_read: Number of Porcupine frames fetched per stream read
+            threaded: Capture on a dedicated thread into a ring buffer so stalls
+                      in callbacks are buffered (and counted) instead of lost
+            ring_slots: Number of reads the ring buffer can hold in threaded mode
+            source: AudioSource to read from (optional, defaults to live PyAudio input)
+            engine: Porcupine-compatible engine with frame_length, sample_rate and
+                    process(pcm) (optional, defaults to pvporcupine.create)
+            vad: Skip the engine on frames without voice activity (see vad_gate.py)
+            vad_options: Extra VadGate keyword arguments (threshold_db, preroll_frames, ...)
+            ring: Ring to consume instead of a private AudioRing (implies threaded),
+                  e.g. a ShmRing filled by another process
+            capture: Open a source and run the capture thread; False when
+                     another party writes the ring
         """
         self.keywords = keywords
         
@@ -29,22 +52,49 @@ class WakeWordDetector:
             ]
         
         self.keyword_paths = keyword_paths
-        self.porcupine = pvporcupine.create(
-            access_key=access_key, 
-            keyword_paths=keyword_paths
-        )
-        
-        self.pa = pyaudio.PyAudio()
-        self.stream = self.pa.open(
-            rate=self.porcupine.sample_rate,
-            channels=1,
-            format=pyaudio.paInt16,
-            input=True,
-            frames_per_buffer=self.porcupine.frame_length
-        )
+        if engine is None:
+            import pvporcupine
+            engine = pvporcupine.create(
+                access_key=access_key, 
+                keyword_paths=keyword_paths
+            )
+        self.porcupine = engine
+        self.sample_rate = self.porcupine.sample_rate
+        
+        self.frame_length = self.porcupine.frame_length
+        self.frames_per_read = frames_per_read
+        self.read_length = self.frame_length * frames_per_read
+        self.frame_buffer = FrameBuffer(self.frame_length, frames_per_read)
+        self.processor = FrameProcessor(self.porcupine, self.frame_buffer)
+        
+        if source is None and capture:
+            source = PyAudioSource(self.sample_rate, self.read_length)
+        self.stream = source
+        self.frames_processed = 0
+        self.eof = False
+        
+        self.gate = None
+        if vad:
+            from vad_gate import VadGate
+            self.gate = VadGate(self.porcupine, self.frame_length, frames_per_read, **(vad_options or {}))
+        
+        self.threaded = threaded or ring is not None
+        self.ring = None
+        self.capture = None
+        self._capture_started = False
+        if self.threaded:
+            self.ring = ring if ring is not None else AudioRing(self.read_length * 2, ring_slots)
+            if self.stream is not None:
+                self.capture = CaptureThread(self.stream, self.ring, self.read_length)
         
         self.callback = None
     
+    def start(self):
+        """Start the capture thread (threaded mode only, also done on first process_audio)"""
+        if self.capture and not self._capture_started:
+            self.capture.start()
+            self._capture_started = True
+    
     def set_callback(self, callback):
         """
         Set callback function to be called when wake word is detected
@@ -54,32 +104,97 @@ class WakeWordDetector:
         """
         self.callback = callback
     
-    def process_audio(self):
+    def process_audio(self, timeout=1.0):
         """
-        Process one frame of audio and check for wake word
+        Process one read of audio (frames_per_read frames) and check for wake word
+        
+        In threaded mode this consumes the oldest buffered read instead of
+        reading the stream, waiting up to timeout seconds for one.
+        
+        Args:
+            timeout: Seconds to wait for captured audio (threaded mode only)
         
         Returns:
-            keyword_index if detected, -1 otherwise
+            keyword_index of the last detection in this read, -1 otherwise.
+            Sets eof when an offline source is exhausted.
         """
-        pcm = self.stream.read(
-            self.porcupine.frame_length, 
-            exception_on_overflow=False
-        )
-        pcm = struct.unpack_from("h" * self.porcupine.frame_length, pcm)
-        idx = self.porcupine.process(pcm)
-        
-        if idx >= 0 and self.callback:
-            self.callback(idx, self.keywords[idx])
+        if self.ring:
+            if not self._capture_started:
+                self.start()
+            count = self.ring.read_into(self.frame_buffer, timeout)
+            if count < 0:
+                finished = self.capture.finished if self.capture else getattr(self.ring, "finished", False)
+                if finished and self.ring.depth == 0:
+                    self.eof = True
+                return -1
+        else:
+            pcm = self.stream.read(
+                self.read_length, 
+                exception_on_overflow=False
+            )
+            if not pcm:
+                self.eof = True
+            count = self.frame_buffer.load(pcm)
+        
+        start = time.monotonic()
+        gate = self.gate
+        if gate is not None:
+            gate.analyze(self.frame_buffer, count)
+        
+        detected = -1
+        for i in range(count):
+            if gate is not None:
+                pending = gate.admit(i)
+                if pending is None:
+                    self.frames_processed += 1
+                    continue
+                for slot in gate.replay(pending):
+                    idx = gate.processor.process(slot)
+                    if idx >= 0:
+                        detected = self._detected(idx)
+            idx = self.processor.process(i)
+            self.frames_processed += 1
+            if idx >= 0:
+                detected = self._detected(idx)
         
+        if count:
+            now = time.monotonic()
+            _READ_SECONDS.observe(now - start)
+            if self.ring:
+                _FRAME_LATENCY.observe(now - self.ring.last_stamp)
+        return detected
+    
+    def _detected(self, idx):
+        _DETECTIONS.inc()
+        if self.callback:
+            self.callback(idx, self.keywords[idx])
         return idx
     
+    def get_stats(self):
+        """
+        Get capture and gate counters
+        
+        Returns:
+            dict with ring counters (overruns, depth, max_depth, lag) and
+            device-level input_overflows in threaded mode, plus the gate
+            counters under "vad" when the VAD gate is on
+        """
+        stats = {}
+        if self.ring:
+            stats = self.ring.stats()
+            if self.capture:
+                stats["reads"] = self.capture.reads
+                stats["input_overflows"] = self.capture.input_overflows
+        if self.gate:
+            stats["vad"] = self.gate.get_stats()
+        return stats
+    
     def cleanup(self):
         """Clean up resources"""
+        if self.capture:
+            self.capture.stop()
         if self.stream:
-            self.stream.stop_stream()
             self.stream.close()
-        if self.pa:
-            self.pa.terminate()
-        if self.porcupine:
+        if self.porcupine and hasattr(self.porcupine, "delete"):
             self.porcupine.delete()
 
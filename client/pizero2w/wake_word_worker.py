@@ -0,0 +1,500 @@
+#!/usr/bin/env python3
+"""
+Wake word detection in a separate process.
+Capture and Porcupine inference run in a worker process with its own
+interpreter and GIL, so pigpio callbacks, the UPS thread and LED writes in
+the main process no longer wait for inference. Audio goes through a
+ShmRing (AudioRing on multiprocessing.shared_memory) owned by the parent,
+detections and heartbeats come back over a pipe.
+
+WakeWordWorker has the detector interface the controller uses
+(set_callback, process_audio, eof, get_stats, cleanup), so
+controller.add_detector() drives it unchanged: process_audio() waits on
+the pipe instead of the audio, and restarts the worker when it dies or
+stops sending heartbeats. The worker's wake_* metrics are recorded in its
+own registry; each heartbeat carries what was added since the last one
+and the parent merges it into metrics.REGISTRY.
+
+Workers are forked from a forkserver that preloads only this module, and
+the main script is hidden from the child's preparation, so it is never
+re-run and restarts are fast. Factories therefore must not be defined in
+the main script.
+"""
+import multiprocessing
+import os
+import signal
+import struct
+import sys
+import time
+from multiprocessing import forkserver, shared_memory
+
+import metrics
+
+
+class ShmRing:
+    """
+    AudioRing with its slots and counters in shared memory.
+
+    One producer and one consumer, possibly in different processes. Each
+    side only advances its own counter; a process-shared semaphore signals
+    filled slots (and orders the data stores before the consumer's loads).
+    """
+
+    # written, read, overruns, dropped_bytes, finished, max_depth
+    _HEADER = struct.Struct("<6Q")
+
+    def __init__(self, slot_bytes, slots=32, name=None, ready=None):
+        """
+        Create a ring, or attach to an existing one
+
+        Args:
+            slot_bytes: Size of one slot (one stream read) in bytes
+            slots: Number of slots
+            name: Shared memory name to attach to (None = create)
+            ready: Semaphore of the ring being attached to
+        """
+        if slots < 2:
+            raise ValueError("slots must be >= 2")
+        self.slot_bytes = slot_bytes
+        self.slots = slots
+        size = self._HEADER.size + slots * (4 + 8) + slot_bytes * slots
+        self.owner = name is None
+        if self.owner:
+            self._shm = shared_memory.SharedMemory(create=True, size=size)
+            self._shm.buf[:size] = bytes(size)
+            self._ready = multiprocessing.get_context("forkserver").Semaphore(0)
+        else:
+            self._shm = shared_memory.SharedMemory(name=name)
+            self._ready = ready
+        self.name = self._shm.name
+
+        buf = self._shm.buf
+        offset = self._HEADER.size
+        self._counters = buf[:offset].cast("Q")
+        self._lengths = buf[offset:offset + 4 * slots].cast("I")
+        offset += 4 * slots
+        self._stamps = buf[offset:offset + 8 * slots].cast("d")
+        offset += 8 * slots
+        self._view = buf[offset:offset + slot_bytes * slots]
+        self._slot_views = [self._view[i * slot_bytes:(i + 1) * slot_bytes] for i in range(slots)]
+
+        self.last_lag = 0.0
+        self.max_lag = 0.0
+        self.last_stamp = 0.0
+
+    def spec(self):
+        """Arguments that attach another process to this ring"""
+        return self.slot_bytes, self.slots, self.name, self._ready
+
+    @property
+    def depth(self):
+        """Number of filled slots waiting for the consumer"""
+        return self._counters[0] - self._counters[1]
+
+    @property
+    def finished(self):
+        """Producer has no more audio"""
+        return bool(self._counters[4])
+
+    def finish(self):
+        """Producer side: mark end of audio and wake the consumer"""
+        self._counters[4] = 1
+        self._ready.release()
+
+    def write(self, data, stamp=None):
+        """
+        Producer side: copy one read into the next free slot
+
+        Args:
+            data: bytes-like PCM, at most slot_bytes long
+            stamp: time.monotonic() of capture (default: now)
+
+        Returns:
+            True if stored, False if the ring was full (overrun)
+        """
+        counters = self._counters
+        written = counters[0]
+        depth = written - counters[1]
+        if depth >= self.slots:
+            counters[2] += 1
+            counters[3] += len(data)
+            return False
+
+        i = written % self.slots
+        n = len(data)
+        if n == self.slot_bytes:
+            self._slot_views[i][:] = data
+        else:
+            start = i * self.slot_bytes
+            self._view[start:start + n] = data
+        self._lengths[i] = n
+        self._stamps[i] = time.monotonic() if stamp is None else stamp
+
+        counters[0] = written + 1
+        if depth + 1 > counters[5]:
+            counters[5] = depth + 1
+        self._ready.release()
+        return True
+
+    def read_into(self, frame_buffer, timeout=None):
+        """
+        Consumer side: move the oldest slot into a FrameBuffer
+
+        Args:
+            frame_buffer: FrameBuffer with nbytes >= slot_bytes
+            timeout: Seconds to wait for data (None = forever)
+
+        Returns:
+            Number of complete frames loaded, or -1 on timeout or end of audio
+        """
+        if not self._ready.acquire(timeout=timeout):
+            return -1
+        counters = self._counters
+        read = counters[1]
+        if read == counters[0]:
+            # Woken by finish()
+            return -1
+
+        i = read % self.slots
+        n = self._lengths[i]
+        if n == self.slot_bytes:
+            count = frame_buffer.load(self._slot_views[i])
+        else:
+            start = i * self.slot_bytes
+            count = frame_buffer.load(self._view[start:start + n])
+        stamp = self._stamps[i]
+        counters[1] = read + 1
+        self.last_stamp = stamp
+
+        lag = time.monotonic() - stamp
+        self.last_lag = lag
+        if lag > self.max_lag:
+            self.max_lag = lag
+        return count
+
+    def stats(self):
+        """Return a snapshot of ring counters"""
+        c = self._counters
+        return {
+            "written": c[0],
+            "read": c[1],
+            "depth": c[0] - c[1],
+            "max_depth": c[5],
+            "overruns": c[2],
+            "dropped_bytes": c[3],
+            "last_lag_ms": self.last_lag * 1000.0,
+            "max_lag_ms": self.max_lag * 1000.0,
+        }
+
+    def close(self):
+        """Detach; the creating process also removes the segment"""
+        for view in self._slot_views:
+            view.release()
+        for view in (self._view, self._stamps, self._lengths, self._counters):
+            view.release()
+        self._slot_views = []
+        self._shm.close()
+        if self.owner:
+            self._shm.unlink()
+
+
+def _worker_main(conn, ring_spec, keywords, options, source_factory, engine_factory, stop_event,
+                 heartbeat):
+    """Worker process: capture + inference, detections and heartbeats to conn"""
+    # Ctrl-C belongs to the main process, which stops us through stop_event
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    parent = os.getppid()
+    ring = ShmRing(*ring_spec)
+    detector = None
+    try:
+        from wake_word_detector import WakeWordDetector
+
+        source = source_factory() if source_factory else None
+        engine = engine_factory() if engine_factory else None
+        detector = WakeWordDetector(keywords, engine=engine, source=source, ring=ring, **options)
+        if detector.read_length * 2 > ring.slot_bytes:
+            raise ValueError(f"ring slot {ring.slot_bytes} B < read of {detector.read_length * 2} B")
+        detector.set_callback(
+            lambda index, name: conn.send(("wake", index, name, ring.last_stamp, time.monotonic())))
+        detector.start()
+        conn.send(("ready", os.getpid()))
+
+        next_beat = time.monotonic() + heartbeat
+        while not stop_event.is_set() and not detector.eof:
+            detector.process_audio(heartbeat / 2)
+            now = time.monotonic()
+            if now >= next_beat:
+                if os.getppid() != parent:
+                    break
+                conn.send(("stats", detector.get_stats(), detector.frames_processed,
+                           metrics.REGISTRY.take("wake_")))
+                next_beat = now + heartbeat
+        conn.send(("exit", detector.get_stats(), detector.frames_processed, detector.eof,
+                   metrics.REGISTRY.take("wake_")))
+    except (BrokenPipeError, EOFError):
+        pass
+    except Exception as e:
+        try:
+            conn.send(("error", f"{type(e).__name__}: {e}"))
+        except OSError:
+            pass
+        raise
+    finally:
+        if detector is not None:
+            detector.cleanup()
+        ring.close()
+        conn.close()
+
+
+class WakeWordWorker:
+    """WakeWordDetector running in a child process, driven like a detector"""
+
+    def __init__(self, keywords, frame_length=512, frames_per_read=1, ring_slots=32, options=None,
+                 source_factory=None, engine_factory=None, heartbeat=1.0, watchdog=5.0,
+                 restart_delay=0.5, max_restart_delay=30.0, max_restarts=None):
+        """
+        Initialize worker (the process starts on start() or the first process_audio)
+
+        Args:
+            keywords: List of keyword names
+            frame_length: Engine frame length (Porcupine: 512), sizes the ring slots
+            frames_per_read: Frames per capture read
+            ring_slots: Reads the shared ring can hold
+            options: Extra WakeWordDetector keyword arguments (access_key, vad, ...)
+            source_factory: Picklable callable returning an AudioSource, run in the
+                            worker (None = live PyAudio input; pass capture=False in
+                            options to feed the ring from this process with feed())
+            engine_factory: Picklable callable returning an engine, run in the worker
+                            (None = pvporcupine.create)
+            heartbeat: Seconds between worker stats messages
+            watchdog: Restart the worker after this long without any message
+            restart_delay: First delay before a restart, doubled per consecutive failure
+            max_restart_delay: Upper bound of the restart delay
+            max_restarts: Give up (eof) after this many restarts (None = never)
+        """
+        self.keywords = keywords
+        self.options = dict(options or {}, frames_per_read=frames_per_read)
+        self.source_factory = source_factory
+        self.engine_factory = engine_factory
+        self.heartbeat = heartbeat
+        self.watchdog = watchdog
+        self.restart_delay = restart_delay
+        self.max_restart_delay = max_restart_delay
+        self.max_restarts = max_restarts
+
+        ctx = multiprocessing.get_context("forkserver")
+        ctx.set_forkserver_preload([__name__])
+        self._ctx = ctx
+        self.ring = ShmRing(frame_length * frames_per_read * 2, ring_slots)
+        self._stop_event = ctx.Event()
+        self._process = None
+        self._conn = None
+        self._last_message = 0.0
+        self._started_at = 0.0
+        self._retry_at = 0.0
+        self._failures = 0
+
+        self.callback = None
+        self.eof = False
+        self.pid = None
+        self.frames_processed = 0
+        self.restarts = 0
+        self.errors = []
+        self.worker_stats = {}
+        self.detections = 0
+        self.total_latency = 0.0
+        self.max_latency = 0.0
+        self.last_latency = 0.0
+        self.last_stamp = 0.0
+
+    def set_callback(self, callback):
+        """
+        Set callback function to be called when wake word is detected
+
+        Args:
+            callback: Function(keyword_index, keyword_name), called on the
+                      thread running process_audio()
+        """
+        self.callback = callback
+
+    # Lifecycle
+    def start(self):
+        """Start the worker process if it is not running"""
+        if self._process is not None and self._process.is_alive():
+            return
+        self._stop_event.clear()
+        parent_conn, child_conn = self._ctx.Pipe(duplex=False)
+        self._process = self._ctx.Process(
+            target=_worker_main, name="wake-worker", daemon=True,
+            args=(child_conn, self.ring.spec(), self.keywords, self.options, self.source_factory,
+                  self.engine_factory, self._stop_event, self.heartbeat))
+        # multiprocessing re-runs the main script in the child when __main__ has a
+        # __file__; test_ai.py is a flat script, so that would start a second client
+        forkserver.ensure_running()
+        main = sys.modules["__main__"]
+        main_file = main.__dict__.pop("__file__", None)
+        try:
+            self._process.start()
+        finally:
+            if main_file is not None:
+                main.__file__ = main_file
+        child_conn.close()
+        self._conn = parent_conn
+        self._started_at = self._last_message = time.monotonic()
+
+    def _reap(self, reason):
+        """Stop a dead or hung worker and schedule a restart"""
+        process = self._process
+        if process is not None:
+            if process.is_alive():
+                process.terminate()
+                process.join(1.0)
+                if process.is_alive():
+                    process.kill()
+            process.join(1.0)
+            process.close()
+        if self._conn is not None:
+            self._conn.close()
+        self._process = None
+        self._conn = None
+        self.pid = None
+
+        # Back off while the worker keeps failing fast, reset after a stable run
+        if time.monotonic() - self._started_at > self.max_restart_delay:
+            self._failures = 0
+        delay = min(self.max_restart_delay, self.restart_delay * (2 ** self._failures))
+        self._failures += 1
+        print(f"Wake worker {reason}, restarting in {delay:.1f}s", file=sys.stderr)
+        if self.max_restarts is not None and self.restarts >= self.max_restarts:
+            self.eof = True
+            return
+        self._retry_at = time.monotonic() + delay
+
+    # Detector interface
+    def process_audio(self, timeout=1.0):
+        """
+        Handle worker messages for up to timeout seconds
+
+        Starts the worker on first use, restarts it when it exits
+        unexpectedly or misses heartbeats.
+
+        Returns:
+            keyword_index of the last detection handled, -1 otherwise.
+            Sets eof when the worker's source is exhausted.
+        """
+        if self.eof:
+            return -1
+        if self._process is None:
+            now = time.monotonic()
+            if now < self._retry_at:
+                time.sleep(min(timeout, self._retry_at - now))
+                return -1
+            if self._retry_at:
+                self.restarts += 1
+            self.start()
+
+        detected = -1
+        try:
+            ready = self._conn.poll(timeout)
+            while ready:
+                detected = max(detected, self._handle(self._conn.recv()))
+                if self.eof or self._conn is None:
+                    return detected
+                ready = self._conn.poll(0)
+        except (EOFError, OSError):
+            # Pipe closed: the worker is gone, exit code tells why
+            self._process.join(1.0)
+            if not self.eof:
+                self._reap(f"exited with code {self._process.exitcode}")
+            return detected
+
+        if time.monotonic() - self._last_message > self.watchdog:
+            self._reap(f"silent for {self.watchdog:.0f}s")
+        return detected
+
+    def _handle(self, message):
+        kind = message[0]
+        now = time.monotonic()
+        self._last_message = now
+        if kind == "wake":
+            _, index, name, stamp, _ = message
+            latency = now - stamp
+            self.detections += 1
+            self.total_latency += latency
+            self.last_latency = latency
+            self.last_stamp = stamp
+            self.max_latency = max(self.max_latency, latency)
+            if self.callback:
+                self.callback(index, name)
+            return index
+        if kind == "ready":
+            self.pid = message[1]
+        elif kind == "stats":
+            self.worker_stats, self.frames_processed = message[1], message[2]
+            metrics.REGISTRY.merge(message[3])
+        elif kind == "exit":
+            self.worker_stats, self.frames_processed = message[1], message[2]
+            metrics.REGISTRY.merge(message[4])
+            if message[3]:
+                self.eof = True
+            if self.eof or self._stop_event.is_set():
+                self._process.join(2.0)
+                self._conn.close()
+                self._process = self._conn = None
+        elif kind == "error":
+            self.errors.append(message[1])
+            print(f"Wake worker error: {message[1]}", file=sys.stderr)
+        return -1
+
+    def feed(self, data, stamp=None):
+        """Write captured audio into the ring (when the worker runs with capture=False)"""
+        return self.ring.write(data, stamp)
+
+    def finish(self):
+        """Signal end of fed audio; the worker drains the ring and exits"""
+        self.ring.finish()
+
+    def get_stats(self):
+        """
+        Get worker counters
+
+        Returns:
+            dict with pid, restarts, errors, detections, detection latency
+            (capture stamp to handled here), ring counters and the worker's
+            last reported detector stats under "worker"
+        """
+        avg = self.total_latency / self.detections if self.detections else 0.0
+        stats = self.ring.stats()
+        stats.update({
+            "pid": self.pid,
+            "restarts": self.restarts,
+            "errors": len(self.errors),
+            "frames": self.frames_processed,
+            "detections": self.detections,
+            "latency_avg_ms": avg * 1000.0,
+            "latency_max_ms": self.max_latency * 1000.0,
+            "worker": self.worker_stats,
+        })
+        return stats
+
+    def cleanup(self, timeout=2.0):
+        """Stop the worker and release the shared ring"""
+        self._stop_event.set()
+        self.eof = True
+        if self._process is not None:
+            deadline = time.monotonic() + timeout
+            while self._process is not None and time.monotonic() < deadline:
+                try:
+                    if self._conn.poll(0.1):
+                        self._handle(self._conn.recv())
+                except (EOFError, OSError):
+                    break
+            if self._process is not None:
+                self._process.join(0.5)
+                if self._process.is_alive():
+                    self._process.terminate()
+                    self._process.join(1.0)
+                self._process.close()
+                self._conn.close()
+                self._process = self._conn = None
+        self.ring.close()
@@ -0,0 +1,243 @@
+#!/usr/bin/env python3
+"""
+Downmix benchmark: CPU of MPD rendering two FIFO outputs vs one + downmix_tee.py.
+
+- mix:  Downmix.process (fixed point) vs a float matrix product, per block
+- tee:  downmix_tee.py as a child process fed as fast as possible, CPU per
+        second of audio
+- mpd:  (needs mpd) MPD playing a generated 6 channel WAV in real time with
+        "Fifo 6 channels" + "Fifo 2 channels" (as in mpd.conf) vs only the
+        6 channel FIFO feeding the tee; CPU of mpd (+ tee) per second of audio
+
+Examples:
+  python3 bench_downmix.py
+  python3 bench_downmix.py --seconds 30 --matrix six2lr
+"""
+import argparse
+import os
+import resource
+import shutil
+import socket
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import wave
+
+import numpy as np
+
+from downmix_tee import Downmix, parse_matrix
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+RATE = 48000
+CHANNELS = 6
+
+MPD_CONF = """music_directory "{music}"
+db_file "{work}/database"
+state_file "{work}/state"
+pid_file "{work}/pid"
+log_file "{work}/log"
+bind_to_address "127.0.0.1"
+port "{port}"
+audio_output {{
+    type "fifo"
+    name "Fifo 6 channels"
+    path "{fifo6}"
+    format "48000:16:6"
+    mixer_type "software"
+}}
+{stereo}
+"""
+
+MPD_STEREO = """audio_output {{
+    type "fifo"
+    name "Fifo 2 channels"
+    path "{fifo2}"
+    format "48000:16:2"
+    mixer_type "software"
+}}
+"""
+
+
+def generate(seconds):
+    rng = np.random.default_rng(0)
+    frames = int(seconds * RATE)
+    t = np.arange(frames) / RATE
+    audio = np.empty((frames, CHANNELS), dtype="<i2")
+    for c in range(CHANNELS):
+        audio[:, c] = 6000 * np.sin(2 * np.pi * (220 * (c + 1)) * t) + rng.normal(0, 500, frames)
+    return audio
+
+
+def bench_mix(audio, matrix, block):
+    mix = Downmix(matrix, block)
+    coefs = matrix.T
+    blocks = [audio[i:i + block] for i in range(0, len(audio) - block + 1, block)]
+    audio_s = len(blocks) * block / RATE
+
+    start = time.process_time()
+    for b in blocks:
+        mix.process(b)
+    fixed = time.process_time() - start
+
+    start = time.process_time()
+    for b in blocks:
+        np.clip(np.rint(b @ coefs), -32768, 32767).astype("<i2")
+    ref = time.process_time() - start
+
+    print(f"{'int32 fixed':<16} {fixed * 1e6 / len(blocks):>10.1f} {fixed * 1000 / audio_s:>10.2f}")
+    print(f"{'float64':<16} {ref * 1e6 / len(blocks):>10.1f} {ref * 1000 / audio_s:>10.2f}")
+
+
+def drain(path):
+    with open(path, "rb", buffering=0) as f:
+        while f.read(65536):
+            pass
+
+
+def feed(path, data):
+    with open(path, "wb", buffering=0) as f:
+        f.write(data)
+
+
+def child_cpu():
+    r = resource.getrusage(resource.RUSAGE_CHILDREN)
+    return r.ru_utime + r.ru_stime
+
+
+def bench_tee(audio, matrix, tmp):
+    fifo_in, surround, stereo = (os.path.join(tmp, n) for n in ("in", "surround", "stereo"))
+    for p in (fifo_in, surround, stereo):
+        os.mkfifo(p)
+    before = child_cpu()
+    start = time.monotonic()
+    proc = subprocess.Popen([sys.executable, os.path.join(HERE, "downmix_tee.py"), "--input", fifo_in,
+                             "--surround", surround, "--stereo", stereo, "--matrix", matrix, "--policy", "block",
+                             "--no-follow"], stdout=subprocess.DEVNULL)
+    threads = [threading.Thread(target=drain, args=(p,), daemon=True) for p in (surround, stereo)]
+    threads.append(threading.Thread(target=feed, args=(fifo_in, audio.tobytes()), daemon=True))
+    for t in threads:
+        t.start()
+    proc.wait()
+    elapsed = time.monotonic() - start
+    for t in threads:
+        t.join(timeout=10)
+    cpu = child_cpu() - before
+    audio_s = len(audio) / RATE
+    print(f"{'tee':<16} {elapsed:>10.2f} {audio_s / elapsed:>10.1f} {cpu * 1000 / audio_s:>10.2f}")
+    for p in (fifo_in, surround, stereo):
+        os.unlink(p)
+
+
+def mpd_command(port, *lines):
+    with socket.create_connection(("127.0.0.1", port), timeout=5) as s:
+        f = s.makefile("rwb")
+        f.readline()    # OK MPD version
+        for line in lines:
+            f.write(line.encode() + b"\n")
+            f.flush()
+            reply = f.readline()
+            while reply and not reply.startswith((b"OK", b"ACK")):
+                reply = f.readline()
+            if reply.startswith(b"ACK"):
+                raise RuntimeError(reply.decode().strip())
+
+
+def proc_cpu(pid):
+    """utime + stime of a process from /proc (seconds)"""
+    with open(f"/proc/{pid}/stat") as f:
+        fields = f.read().rsplit(")", 1)[1].split()
+    return (int(fields[11]) + int(fields[12])) / os.sysconf("SC_CLK_TCK")
+
+
+def bench_mpd(mpd, audio, matrix, tmp, seconds):
+    music = os.path.join(tmp, "music")
+    os.makedirs(music, exist_ok=True)
+    with wave.open(os.path.join(music, "surround.wav"), "wb") as w:
+        w.setnchannels(CHANNELS)
+        w.setsampwidth(2)
+        w.setframerate(RATE)
+        w.writeframes(audio.tobytes())
+
+    for name, with_tee in (("mpd 6ch+2ch", False), ("mpd 6ch + tee", True)):
+        work = tempfile.mkdtemp(dir=tmp)
+        fifo6, fifo2 = os.path.join(work, "fifo6"), os.path.join(work, "fifo2")
+        port = 16600 + with_tee
+        stereo = "" if with_tee else MPD_STEREO.format(fifo2=fifo2)
+        conf = os.path.join(work, "mpd.conf")
+        with open(conf, "w") as f:
+            f.write(MPD_CONF.format(music=music, work=work, port=port, fifo6=fifo6, stereo=stereo))
+
+        tee = None
+        readers = []
+        if with_tee:
+            surround, stereo_out = os.path.join(work, "surround"), os.path.join(work, "stereo")
+            for p in (surround, stereo_out):
+                os.mkfifo(p)
+            tee = subprocess.Popen([sys.executable, os.path.join(HERE, "downmix_tee.py"), "--input", fifo6,
+                                    "--surround", surround, "--stereo", stereo_out, "--matrix", matrix],
+                                   stdout=subprocess.DEVNULL)
+            readers = [surround, stereo_out]
+        else:
+            readers = [fifo6, fifo2]
+            for p in readers:
+                os.mkfifo(p)
+        for p in readers:
+            threading.Thread(target=drain, args=(p,), daemon=True).start()
+
+        proc = subprocess.Popen([mpd, "--no-daemon", conf], stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+        try:
+            for _ in range(50):
+                try:
+                    mpd_command(port, "update")
+                    break
+                except OSError:
+                    time.sleep(0.1)
+            time.sleep(1.0)
+            mpd_command(port, "add surround.wav", "play")
+            start = (proc_cpu(proc.pid), proc_cpu(tee.pid) if tee else 0.0)
+            time.sleep(seconds)
+            mpd_cpu = proc_cpu(proc.pid) - start[0]
+            tee_cpu = proc_cpu(tee.pid) - start[1] if tee else 0.0
+        finally:
+            proc.terminate()
+            proc.wait()
+            if tee:
+                tee.terminate()
+                tee.wait()
+        total = (mpd_cpu + tee_cpu) * 1000 / seconds
+        print(f"{name:<16} {mpd_cpu * 1000 / seconds:>10.2f} {tee_cpu * 1000 / seconds:>10.2f} {total:>10.2f}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--seconds", type=float, default=20.0, help="Audio length")
+    parser.add_argument("--matrix", default="itu-norm")
+    parser.add_argument("--block", type=int, default=1024)
+    parser.add_argument("--mpd", default="mpd")
+    args = parser.parse_args()
+
+    audio = generate(args.seconds)
+    tmp = tempfile.mkdtemp(prefix="sharm-downmix-")
+
+    print(f"matrix={args.matrix} audio={args.seconds:.0f}s block={args.block}")
+    print(f"\n{'mix':<16} {'us/block':>10} {'cpu ms/s':>10}")
+    bench_mix(audio, parse_matrix(args.matrix), args.block)
+
+    print(f"\n{'':<16} {'wall s':>10} {'x rt':>10} {'cpu ms/s':>10}")
+    bench_tee(audio, args.matrix, tmp)
+
+    mpd = shutil.which(args.mpd)
+    if mpd:
+        print(f"\n{'real time':<16} {'mpd ms/s':>10} {'tee ms/s':>10} {'total':>10}")
+        bench_mpd(mpd, audio, args.matrix, tmp, min(args.seconds, 15.0))
+    else:
+        print(f"\n{args.mpd} not found, skipping the MPD dual-output comparison")
+
+    shutil.rmtree(tmp, ignore_errors=True)
+    return 0
+
+
+if __name__ == "__main__":
+    exit(main())
@@ -0,0 +1,148 @@
+#!/usr/bin/env python3
+"""
+Media index benchmark: media_index.py vs one ffprobe per file.
+
+Builds a synthetic library (FLAC STREAMINFO headers and AC-3 syncframes in
+nested album directories, bodies are padding) unless --library is given,
+then times:
+- cold:    first index of the tree (parse every header, write the index)
+- warm:    rescan with nothing changed (stat only)
+- touched: rescan after touching 1% of the files
+- load:    reading the on-disk index into memory
+- query:   "all 6-channel 48 kHz tracks" from memory
+- ffprobe: (needs ffprobe) one process per file on a sample, extrapolated
+           to the whole tree; the sample is also checked against the index
+
+Examples:
+  python3 bench_media_index.py
+  python3 bench_media_index.py --files 50000 --ffprobe-sample 100
+  python3 bench_media_index.py --library ../media
+"""
+import argparse
+import json
+import os
+import random
+import shutil
+import struct
+import subprocess
+import tempfile
+import time
+
+from media_index import MediaIndex, duration
+
+# (rate, bits, channels) for FLAC; AC-3 is 5.1 48 kHz 448 kbps
+FLAC_FORMATS = [(48000, 16, 6), (48000, 24, 6), (44100, 16, 6), (44100, 16, 2), (96000, 24, 2)]
+AC3_FRAME = 448 * 4     # bytes per frame at 48 kHz
+
+
+def flac_header(rate, bits, channels, samples):
+    packed = (rate << 44) | ((channels - 1) << 41) | ((bits - 1) << 36) | samples
+    info = struct.pack(">HH", 4096, 4096) + b"\0" * 6 + packed.to_bytes(8, "big") + b"\0" * 16
+    return b"fLaC" + bytes([0x80, 0, 0, 34]) + info
+
+
+def ac3_frame():
+    # sync, crc1, fscod=0 frmsizecod=26 (448 kbps), bsid=8 bsmod=0, acmod=7 cmixlev surmixlev lfeon=1
+    header = b"\x0b\x77\x00\x00" + bytes([26, 8 << 3, (7 << 5) | 1, 0])
+    return header + b"\0" * (AC3_FRAME - len(header))
+
+
+def build_library(root, files, body):
+    rng = random.Random(0)
+    frame = ac3_frame()
+    for i in range(files):
+        album = os.path.join(root, f"artist{i // 192:03d}", f"album{i // 12:05d}")
+        if i % 12 == 0:
+            os.makedirs(album, exist_ok=True)
+        if i % 5 == 4:
+            with open(os.path.join(album, f"{i % 12:02d}.ac3"), "wb") as f:
+                f.write(frame * max(1, body // AC3_FRAME))
+        else:
+            rate, bits, channels = rng.choice(FLAC_FORMATS)
+            with open(os.path.join(album, f"{i % 12:02d}.flac"), "wb") as f:
+                f.write(flac_header(rate, bits, channels, rate * rng.randint(120, 420)) + b"\0" * body)
+
+
+def ffprobe(path, exe):
+    out = subprocess.run([exe, "-v", "error", "-select_streams", "a:0", "-show_entries",
+                          "stream=sample_rate,channels:format=duration", "-of", "json", path],
+                         capture_output=True, text=True).stdout
+    info = json.loads(out or "{}")
+    stream = (info.get("streams") or [{}])[0]
+    return int(stream.get("sample_rate", 0)), stream.get("channels", 0), float(
+        info.get("format", {}).get("duration", 0))
+
+
+def timed(fn):
+    start = time.perf_counter()
+    result = fn()
+    return time.perf_counter() - start, result
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--files", type=int, default=20000, help="Synthetic library size")
+    parser.add_argument("--body", type=int, default=16384, help="Bytes of padding per synthetic file")
+    parser.add_argument("--library", help="Index this directory instead of a synthetic one")
+    parser.add_argument("--ffprobe", default="ffprobe")
+    parser.add_argument("--ffprobe-sample", type=int, default=200, help="Files probed with ffprobe")
+    args = parser.parse_args()
+
+    tmp = tempfile.mkdtemp(prefix="sharm-index-")
+    try:
+        if args.library:
+            root = os.path.abspath(args.library)
+        else:
+            root = os.path.join(tmp, "media")
+            elapsed, _ = timed(lambda: build_library(root, args.files, args.body))
+            print(f"built {args.files} files in {elapsed:.1f}s")
+        index_path = os.path.join(tmp, "index")
+
+        index = MediaIndex(root, index_path)
+        print(f"\n{'':<10} {'seconds':>10} {'us/file':>10} {'parsed':>8}")
+
+        def row(name, elapsed, files, parsed=""):
+            print(f"{name:<10} {elapsed:>10.3f} {elapsed * 1e6 / max(files, 1):>10.1f} {parsed:>8}")
+
+        elapsed, stats = timed(index.update)
+        files = stats["files"]
+        row("cold", elapsed, files, stats["parsed"])
+        elapsed, stats = timed(index.update)
+        row("warm", elapsed, files, stats["parsed"])
+
+        paths = sorted(index.tracks)
+        for rel in random.Random(1).sample(paths, len(paths) // 100):
+            os.utime(os.path.join(root, rel))
+        elapsed, stats = timed(index.update)
+        row("touched", elapsed, files, stats["parsed"])
+
+        elapsed, loaded = timed(lambda: MediaIndex(root, index_path))
+        row("load", elapsed, files, len(loaded.tracks))
+        elapsed, tracks = timed(lambda: loaded.query(channels=6, rate=48000))
+        row("query", elapsed, files, len(tracks))
+        print(f"\nindex file {os.path.getsize(index_path) / 1024:.0f} KiB, {len(tracks)} 6ch 48k tracks, "
+              f"{stats['failed']} unreadable")
+
+        exe = shutil.which(args.ffprobe)
+        if not exe:
+            print(f"{args.ffprobe} not found, skipping the ffprobe-per-file baseline")
+            return 0
+        sample = random.Random(2).sample(paths, min(args.ffprobe_sample, len(paths)))
+        mismatches = 0
+        start = time.perf_counter()
+        for rel in sample:
+            rate, channels, seconds = ffprobe(os.path.join(root, rel), exe)
+            t = index.tracks[rel]
+            if (rate, channels) != (t.rate, t.channels) or abs(seconds - duration(t)) > 0.1:
+                mismatches += 1
+        elapsed = time.perf_counter() - start
+        per_file = elapsed / len(sample)
+        print(f"\nffprobe    {per_file * 1e6:>10.1f} us/file, {per_file * files:.1f}s extrapolated to {files} files "
+              f"({mismatches}/{len(sample)} disagree with the index)")
+    finally:
+        shutil.rmtree(tmp, ignore_errors=True)
+    return 0
+
+
+if __name__ == "__main__":
+    exit(main())
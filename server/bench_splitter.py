@@ -0,0 +1,200 @@
+#!/usr/bin/env python3
+"""
+Splitter benchmark: splitter.py vs the ffmpeg channelsplit graph of split.sh.
+
+The 5.1 test files from media/tests are decoded once to raw s16le (needs
+ffmpeg and the real files, not LFS pointers); otherwise a generated 6
+channel signal is used. Each splitter runs as a child process reading an
+input FIFO fed from here and writing six FIFOs drained by reader threads;
+wall time and child CPU are reported per second of audio.
+
+- throughput: input written as fast as possible, lossless (--policy block
+  for the Python splitter, which is what ffmpeg does)
+- stall:      input paced at real time like mpd, reader --slow sleeps
+  between reads; shows whether the other channels keep up (ffmpeg and
+  --policy block: all of them wait)
+
+Examples:
+  python3 bench_splitter.py
+  python3 bench_splitter.py --seconds 120 --slow 3 --policy silence
+"""
+import argparse
+import glob
+import json
+import os
+import resource
+import shutil
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+
+import numpy as np
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+MEDIA = os.path.join(HERE, "..", "media", "tests")
+RATE = 48000
+CHANNELS = 6
+
+
+def is_lfs_pointer(path):
+    with open(path, "rb") as f:
+        return f.read(40).startswith(b"version https://git-lfs")
+
+
+def make_input(path, seconds):
+    """Write raw 48k/16/6 audio; return a description of the source"""
+    ffmpeg = shutil.which("ffmpeg")
+    files = [f for f in sorted(glob.glob(os.path.join(MEDIA, "*.flac"))) if not is_lfs_pointer(f)]
+    if ffmpeg and files:
+        with open(path, "wb") as out:
+            for name in files:
+                subprocess.run([ffmpeg, "-v", "error", "-i", name, "-ac", str(CHANNELS), "-ar", str(RATE),
+                                "-f", "s16le", "-"], stdout=out, check=True)
+        size = os.path.getsize(path)
+        # Repeat the decoded files up to the requested length
+        frame = 2 * CHANNELS
+        want = int(seconds * RATE) * frame
+        if 0 < size < want:
+            with open(path, "rb") as f:
+                data = f.read()
+            with open(path, "wb") as f:
+                for _ in range(want // size + 1):
+                    f.write(data)
+        return f"media/tests ({len(files)} files)"
+    rng = np.random.default_rng(0)
+    frames = int(seconds * RATE)
+    t = np.arange(frames) / RATE
+    audio = np.empty((frames, CHANNELS), dtype="<i2")
+    for c in range(CHANNELS):
+        audio[:, c] = 4000 * np.sin(2 * np.pi * (220 * (c + 1)) * t) + rng.normal(0, 300, frames)
+    audio.tofile(path)
+    return "generated"
+
+
+def feed(fifo, raw, pace):
+    """Write raw into the input FIFO, optionally at real time"""
+    chunk = RATE // 50 * 2 * CHANNELS
+    start = time.monotonic()
+    sent = 0
+    with open(raw, "rb") as src, open(fifo, "wb", buffering=0) as out:
+        while True:
+            data = src.read(chunk)
+            if not data:
+                return
+            try:
+                out.write(data)
+            except BrokenPipeError:
+                return
+            sent += len(data)
+            if pace:
+                delay = start + sent / (2 * CHANNELS * RATE) - time.monotonic()
+                if delay > 0:
+                    time.sleep(delay)
+
+
+def drain(path, slow, counts, index):
+    """Read a FIFO until EOF; slow readers sleep between reads"""
+    with open(path, "rb", buffering=0) as f:
+        while True:
+            data = f.read(65536 if not slow else 4096)
+            if not data:
+                return
+            counts[index] += len(data)
+            if slow:
+                time.sleep(slow)
+
+
+def run(name, cmd, fifo, raw, pace, outputs, slow_index, slow_delay, audio_s):
+    counts = [0] * len(outputs)
+    before = resource.getrusage(resource.RUSAGE_CHILDREN)
+    start = time.monotonic()
+    proc = subprocess.Popen(cmd, stdout=subprocess.PIPE, stderr=subprocess.DEVNULL)
+    writer = threading.Thread(target=feed, args=(fifo, raw, pace), daemon=True)
+    writer.start()
+    readers = [threading.Thread(target=drain, args=(p, slow_delay if i == slow_index else 0, counts, i),
+                                daemon=True) for i, p in enumerate(outputs)]
+    for r in readers:
+        r.start()
+    out, _ = proc.communicate()
+    elapsed = time.monotonic() - start
+    writer.join(timeout=60)
+    for r in readers:
+        r.join(timeout=60)
+    after = resource.getrusage(resource.RUSAGE_CHILDREN)
+    cpu = (after.ru_utime - before.ru_utime) + (after.ru_stime - before.ru_stime)
+
+    expected = audio_s * RATE * 2
+    delivered = " ".join(f"{c / expected * 100:5.1f}" for c in counts)
+    print(f"{name:<16} {elapsed:>8.2f} {audio_s / elapsed:>8.1f} {cpu * 1000 / audio_s:>9.2f}   {delivered}")
+    if proc.returncode != 0:
+        print(f"  {name} exited with {proc.returncode}", file=sys.stderr)
+    lines = out.decode().strip().splitlines()
+    if lines:
+        stats = json.loads(lines[-1])
+        xruns = [c["xruns"] for c in stats["outputs"]]
+        print(f"  xruns per channel: {xruns}, blocked {stats['blocked_s']:.2f}s")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--seconds", type=float, default=60.0, help="Audio length for the generated input")
+    parser.add_argument("--policy", default="drop", choices=("drop", "silence", "block"))
+    parser.add_argument("--slow", type=int, default=0, help="1-based channel whose reader is slow (0 = none)")
+    parser.add_argument("--slow-delay", type=float, default=0.1, help="Sleep per 4 KB read of the slow reader")
+    parser.add_argument("--stall-seconds", type=float, default=5.0, help="Length of the real-time stall run")
+    args = parser.parse_args()
+
+    tmp = tempfile.mkdtemp(prefix="sharm-split-")
+    raw = os.path.join(tmp, "input.raw")
+    source = make_input(raw, args.seconds)
+    audio_s = os.path.getsize(raw) / (2 * CHANNELS * RATE)
+    fifo = os.path.join(tmp, "snap_fifo")
+    os.mkfifo(fifo)
+    outputs = [os.path.join(tmp, f"snap_ch{i + 1}") for i in range(CHANNELS)]
+    for p in outputs:
+        os.mkfifo(p)
+
+    ffmpeg = shutil.which("ffmpeg")
+    graph = "[0:a]channelsplit=channel_layout=5.1" + "".join(f"[ch{i + 1}]" for i in range(CHANNELS))
+    ffmpeg_cmd = [ffmpeg, "-v", "error", "-y", "-f", "s16le", "-ac", str(CHANNELS), "-ar", str(RATE),
+                  "-i", fifo, "-filter_complex", graph]
+    for i, p in enumerate(outputs):
+        ffmpeg_cmd += ["-map", f"[ch{i + 1}]", "-f", "s16le", p]
+
+    def splitter(policy):
+        return [sys.executable, os.path.join(HERE, "splitter.py"), "--input", fifo, "--no-follow",
+                "--policy", policy, "--outputs"] + outputs
+
+    print(f"input={source} audio={audio_s:.1f}s")
+    header = f"{'splitter':<16} {'wall s':>8} {'x rt':>8} {'cpu ms/s':>9}   delivered % per channel"
+
+    print(f"\nthroughput\n{header}")
+    run("python/block", splitter("block"), fifo, raw, False, outputs, -1, 0, audio_s)
+    if ffmpeg:
+        run("ffmpeg", ffmpeg_cmd, fifo, raw, False, outputs, -1, 0, audio_s)
+
+    if args.slow:
+        # Real-time pacing: keep the stall run short
+        stall_s = min(audio_s, args.stall_seconds)
+        with open(raw, "r+b") as f:
+            f.truncate(int(stall_s * RATE) * 2 * CHANNELS)
+        print(f"\nstall: channel {args.slow} reader sleeps {args.slow_delay * 1000:.0f} ms per 4 KB, "
+              f"{stall_s:.0f}s real time\n{header}")
+        run(f"python/{args.policy}", splitter(args.policy), fifo, raw, True, outputs, args.slow - 1,
+            args.slow_delay, stall_s)
+        if ffmpeg:
+            run("ffmpeg", ffmpeg_cmd, fifo, raw, True, outputs, args.slow - 1, args.slow_delay, stall_s)
+
+    if not ffmpeg:
+        print("ffmpeg not found, skipping split.sh comparison")
+
+    for p in outputs + [fifo, raw]:
+        os.unlink(p)
+    os.rmdir(tmp)
+    return 0
+
+
+if __name__ == "__main__":
+    exit(main())
@@ -0,0 +1,229 @@
+#!/usr/bin/env python3
+"""
+Downmix tee: one 6-channel FIFO in, Surround and Stereo FIFOs out.
+MPD renders only "Fifo 6 channels" (into FIFO_PATH_MPD); the tee passes it
+through to FIFO_PATH for the Surround stream and derives FIFO_PATH_STEREO
+with a downmix matrix, so MPD no longer converts and mixes every track a
+second time for "Fifo 2 channels".
+
+Channel order is MPD's (FLAC/WAV): FL FR C LFE RL RR. The downmix is fixed
+point: Q-format int32 coefficients, one int32 matrix product per block,
+rounding shift and clipping to int16, in buffers preallocated for one
+block.
+
+Presets:
+  itu-norm itu scaled by 1/2.414 so a row can never exceed full scale
+           (default; 7.7 dB quieter than itu, never clips)
+  itu      L = FL + 0.707 C + 0.707 RL, R = FR + 0.707 C + 0.707 RR (LFE dropped);
+           unity front level, but a row gain of 2.414 clips loud multichannel
+           material (counted in clipped_blocks / clipped_samples). MPD's own
+           "Fifo 2 channels" render never clipped, so only choose itu when the
+           surround channels are known to leave that headroom
+  six2lr   front pair only, like pcm.six2lr in asound.conf
+  six2six  identity, like pcm.six2six (for --surround-matrix)
+A custom matrix is given as rows separated by ';', e.g. "1,0,.5,0,.5,0;0,1,.5,0,0,.5".
+
+Examples:
+  python3 downmix_tee.py
+  python3 downmix_tee.py --matrix six2lr --policy silence --stats 60
+"""
+import argparse
+import json
+import os
+import threading
+import time
+
+import numpy as np
+
+from splitter import POLICIES, ChannelSplitter, FifoOutput
+
+
+_H = 0.7071
+
+_ITU = [[1, 0, _H, 0, _H, 0],
+        [0, 1, _H, 0, 0, _H]]
+
+PRESETS = {
+    "itu-norm": (np.array(_ITU) / (1 + 2 * _H)).tolist(),
+    "itu": _ITU,
+    "six2lr": [[1, 0, 0, 0, 0, 0],
+               [0, 1, 0, 0, 0, 0]],
+    "six2six": np.eye(6).tolist(),
+}
+
+
+def parse_matrix(spec):
+    """Preset name or "a,b,...;c,d,..." rows -> float matrix (outputs x inputs)"""
+    if spec in PRESETS:
+        return np.array(PRESETS[spec], dtype=float)
+    return np.array([[float(v) for v in row.split(",")] for row in spec.split(";")], dtype=float)
+
+
+class Downmix:
+    """Fixed-point matrix mix of interleaved int16 blocks"""
+
+    def __init__(self, matrix, block_frames):
+        """
+        Args:
+            matrix: outputs x inputs coefficients
+            block_frames: Largest block to be processed (buffers are preallocated)
+        """
+        self.matrix = np.asarray(matrix, dtype=float)
+        self.outputs, self.inputs = self.matrix.shape
+        self.identity = self.matrix.shape[0] == self.matrix.shape[1] and np.array_equal(
+            self.matrix, np.eye(self.inputs))
+
+        # Largest Q format whose worst-case output still fits int32
+        gain = max(np.abs(self.matrix).sum(axis=1).max(), 1e-9)
+        self.shift = min(16, int(np.floor(np.log2((2 ** 31 - 1) / (32768 * gain)))))
+        self._coefs = np.rint(self.matrix.T * (1 << self.shift)).astype(np.int32)
+        self._rounding = 1 << self.shift >> 1
+
+        self._wide = np.empty((block_frames, self.inputs), dtype=np.int32)
+        self._acc = np.empty((block_frames, self.outputs), dtype=np.int32)
+        self._out = np.empty((block_frames, self.outputs), dtype="<i2")
+        self.clipped_blocks = 0
+        self.clipped_samples = 0
+
+    def process(self, frames):
+        """
+        Mix one block
+
+        Args:
+            frames: (n, inputs) int16 array
+        Returns:
+            (n, outputs) int16 array, valid until the next call
+        """
+        n = len(frames)
+        wide = self._wide[:n]
+        acc = self._acc[:n]
+        out = self._out[:n]
+        np.copyto(wide, frames)
+        np.matmul(wide, self._coefs, out=acc)
+        acc += self._rounding
+        np.right_shift(acc, self.shift, out=acc)
+        if acc.max() > 32767 or acc.min() < -32768:
+            self.clipped_samples += int(np.count_nonzero((acc > 32767) | (acc < -32768)))
+            np.clip(acc, -32768, 32767, out=acc)
+            self.clipped_blocks += 1
+        np.copyto(out, acc, casting="unsafe")
+        return out
+
+
+class DownmixTee(ChannelSplitter):
+    """Passes a multichannel stream through and writes a downmix of it"""
+
+    def __init__(self, source, surround, stereo, matrix="itu-norm", surround_matrix=None, channels=6,
+                 sample_rate=48000, block_frames=1024, queue_blocks=16, policy="drop", follow=True,
+                 mkfifo=True, pipe_size=None):
+        """
+        Initialize tee
+
+        Args:
+            source: Interleaved input written by MPD
+            surround: Pass-through output (None to skip)
+            stereo: Downmix output (None to skip)
+            matrix: Downmix preset name, "a,b;c,d" string or matrix
+            surround_matrix: Optional matrix for the pass-through (None = bytes unchanged)
+            channels: Channels in the input
+            sample_rate: Input sample rate (for lag in ms)
+            block_frames: Frames per read
+            queue_blocks: Blocks queued per output before the policy applies
+            policy: drop, silence or block (see splitter.py)
+            follow: Reopen the input at EOF instead of stopping
+            mkfifo: Create missing output FIFOs
+            pipe_size: Capacity of the output pipes (None = kernel default)
+        """
+        def load(m):
+            return parse_matrix(m) if isinstance(m, str) else np.asarray(m, dtype=float)
+
+        self.downmix = Downmix(load(matrix), block_frames)
+        self.surround_mix = None
+        if surround_matrix is not None:
+            mix = Downmix(load(surround_matrix), block_frames)
+            self.surround_mix = None if mix.identity else mix
+        for mix in (self.downmix, self.surround_mix):
+            if mix is not None and mix.inputs != channels:
+                raise ValueError(f"matrix has {mix.inputs} inputs, stream has {channels} channels")
+        super().__init__(source, [surround, stereo], channels=channels, sample_rate=sample_rate,
+                         block_frames=block_frames, queue_blocks=queue_blocks, policy=policy,
+                         follow=follow, mkfifo=mkfifo, pipe_size=pipe_size)
+
+    def _make_outputs(self, paths, queue_blocks, policy, mkfifo, pipe_size):
+        surround, stereo = paths
+        surround_channels = self.surround_mix.outputs if self.surround_mix else self.channels
+        return [
+            FifoOutput(surround, queue_blocks, policy, mkfifo, surround_channels, pipe_size) if surround else None,
+            FifoOutput(stereo, queue_blocks, policy, mkfifo, self.downmix.outputs, pipe_size) if stereo else None,
+        ]
+
+    def _split(self, nbytes):
+        surround, stereo = self.outputs
+        frames = np.frombuffer(self._buf, dtype="<i2", count=nbytes // 2).reshape(-1, self.channels)
+        if surround is not None:
+            if self.surround_mix is None:
+                surround.push(self._view[:nbytes].tobytes())
+            else:
+                surround.push(self.surround_mix.process(frames).tobytes())
+        if stereo is not None:
+            stereo.push(self.downmix.process(frames).tobytes())
+        self.frames_out += len(frames)
+        self.blocks += 1
+
+    def get_stats(self):
+        stats = super().get_stats()
+        stats["clipped_blocks"] = self.downmix.clipped_blocks
+        stats["clipped_samples"] = self.downmix.clipped_samples
+        return stats
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--input", default=os.getenv("FIFO_PATH_MPD", "/tmp/fifo_mpd_5.1.pcm"))
+    parser.add_argument("--surround", default=os.getenv("FIFO_PATH", "/tmp/fifo_5.1.pcm"))
+    parser.add_argument("--stereo", default=os.getenv("FIFO_PATH_STEREO", "/tmp/fifo_2.0.pcm"))
+    parser.add_argument("--matrix", default="itu-norm",
+                        help="Stereo downmix: itu-norm, itu, six2lr or rows 'a,b,..;c,d,..'")
+    parser.add_argument("--surround-matrix", help="Matrix for the pass-through (default: unchanged)")
+    parser.add_argument("--channels", type=int, default=6)
+    parser.add_argument("--rate", type=int, default=48000)
+    parser.add_argument("--block", type=int, default=1024, help="Frames per read")
+    parser.add_argument("--queue", type=int, default=16, help="Blocks queued per output")
+    parser.add_argument("--pipe-size", type=int, help="Output pipe capacity in bytes (default: kernel default)")
+    parser.add_argument("--policy", choices=POLICIES, default="drop")
+    parser.add_argument("--no-follow", action="store_true", help="Stop at end of input instead of reopening")
+    parser.add_argument("--stats", type=float, default=0.0, help="Print stats every N seconds (0 = at exit only)")
+    args = parser.parse_args()
+
+    if not os.path.exists(args.input):
+        os.mkfifo(args.input)
+        os.chmod(args.input, 0o666)
+
+    tee = DownmixTee(args.input, args.surround, args.stereo, matrix=args.matrix,
+                     surround_matrix=args.surround_matrix, channels=args.channels, sample_rate=args.rate,
+                     block_frames=args.block, queue_blocks=args.queue, policy=args.policy,
+                     follow=not args.no_follow, pipe_size=args.pipe_size)
+
+    def print_stats():
+        print(json.dumps(tee.get_stats()), flush=True)
+
+    if args.stats:
+        def report():
+            while True:
+                time.sleep(args.stats)
+                print_stats()
+
+        threading.Thread(target=report, name="stats", daemon=True).start()
+
+    try:
+        tee.run()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        print_stats()
+        tee.close()
+    return 0
+
+
+if __name__ == "__main__":
+    exit(main())
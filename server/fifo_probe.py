@@ -0,0 +1,465 @@
+#!/usr/bin/env python3
+"""
+Named pipe capacity tuning and FIFO latency probe.
+
+Every hop of the server path (MPD -> FIFO_PATH -> snapserver, the tee and
+splitter FIFOs) is a pipe whose buffer is hidden latency: the default
+64 KiB holds ~114 ms of 48000:16:6 audio. A pipe's capacity belongs to the
+open pipe, not the path, so create_fifo() / `create --hold` keep the FIFO
+open with an explicit F_SETPIPE_SZ for as long as the service runs.
+Only hold FIFOs whose writer can't set the capacity itself (MPD's): a held
+FIFO always has a reader, so a writer like the tee can no longer tell that
+nobody is listening and fills the pipe with audio the next reader gets late.
+
+The probe runs a chain of FIFOs between local stand-ins:
+  writer (paced like MPD's fifo output, blocking writes)
+  -> relay (reads whatever is there, like splitter.py / downmix_tee.py) ...
+  -> reader (fixed chunks on its own clock, like snapserver's pipe stream)
+The writer injects a short chirp every --interval into low-level noise and
+logs when each one entered the pipe; every stand-in logs its reads. Per hop
+latency comes from the read logs, end-to-end latency from cross-correlating
+the received audio with the chirp at the reader. Reader stalls (--stall)
+emulate scheduling hiccups: small pipes turn them into dropouts, big pipes
+into latency. One report line per capacity.
+
+Examples:
+  python3 fifo_probe.py probe
+  python3 fifo_probe.py probe --sizes 4096 16384 65536 262144 --hops 2 --stall 60
+  python3 fifo_probe.py create --size 16384 --hold $FIFO_PATH_MPD
+"""
+import argparse
+import bisect
+import errno
+import fcntl
+import os
+import signal
+import statistics
+import sys
+import tempfile
+import threading
+import time
+
+import numpy as np
+
+F_SETPIPE_SZ = getattr(fcntl, "F_SETPIPE_SZ", 1031)
+F_GETPIPE_SZ = getattr(fcntl, "F_GETPIPE_SZ", 1032)
+
+
+# Library
+
+def get_pipe_size(fd):
+    return fcntl.fcntl(fd, F_GETPIPE_SZ)
+
+
+def set_pipe_size(fd, size):
+    """
+    Set a pipe's capacity
+
+    The kernel rounds up to a power-of-two number of pages; unprivileged
+    processes are limited by /proc/sys/fs/pipe-max-size.
+
+    Returns:
+        Capacity actually set (bytes)
+    """
+    try:
+        return fcntl.fcntl(fd, F_SETPIPE_SZ, size)
+    except OSError as e:
+        if e.errno == errno.EPERM:
+            print(f"Pipe size {size} above pipe-max-size, keeping {get_pipe_size(fd)}", file=sys.stderr)
+            return get_pipe_size(fd)
+        raise
+
+
+def create_fifo(path, size=None, mode=0o666):
+    """
+    Create (or reuse) a FIFO and open it with the given capacity
+
+    The returned descriptor is opened read-write, which neither blocks nor
+    consumes data as long as nothing reads from it; keep it open for the
+    capacity to stay in effect (and so readers don't see EOF between writers).
+    While it is open, non-blocking writers never get ENXIO for a missing reader.
+
+    Returns:
+        (fd, capacity)
+    """
+    if not os.path.exists(path):
+        os.mkfifo(path)
+    os.chmod(path, mode)
+    fd = os.open(path, os.O_RDWR | os.O_NONBLOCK)
+    capacity = set_pipe_size(fd, size) if size else get_pipe_size(fd)
+    return fd, capacity
+
+
+class FifoKeeper:
+    """Holds a set of FIFOs open at a fixed capacity"""
+
+    def __init__(self, paths, size=None):
+        self.fds = {}
+        self.capacity = {}
+        for path in paths:
+            self.fds[path], self.capacity[path] = create_fifo(path, size)
+
+    def close(self):
+        for fd in self.fds.values():
+            os.close(fd)
+        self.fds = {}
+
+
+# Probe stand-ins
+
+def chirp(rate, ms=5.0, f0=1000.0, f1=8000.0, amplitude=8000):
+    """Hann-windowed linear chirp used as the marker"""
+    n = int(rate * ms / 1000)
+    t = np.arange(n) / rate
+    phase = 2 * np.pi * (f0 * t + (f1 - f0) * t * t / (2 * t[-1]))
+    return (amplitude * np.hanning(n) * np.sin(phase)).astype(np.int16)
+
+
+class _Log:
+    """(time, stream byte offset after the operation) pairs"""
+
+    def __init__(self):
+        self.times = []
+        self.offsets = []
+
+    def add(self, t, offset):
+        self.times.append(t)
+        self.offsets.append(offset)
+
+    def time_of(self, byte):
+        """When byte first got past this point (None if it never did)"""
+        i = bisect.bisect_right(self.offsets, byte)
+        return self.times[i] if i < len(self.times) else None
+
+
+class ProbeWriter(threading.Thread):
+    """Real-time writer: noise with a chirp every interval, blocking writes"""
+
+    def __init__(self, path, capacity, rate, channels, duration, block_ms=10.0, interval=0.25, prefill_ms=0.0):
+        super().__init__(name="probe-writer", daemon=True)
+        self.path = path
+        self.capacity = capacity
+        self.rate = rate
+        self.channels = channels
+        self.duration = duration
+        self.block = int(rate * block_ms / 1000)
+        self.interval = int(rate * interval)
+        self.prefill = int(rate * prefill_ms / 1000)
+        self.marker = chirp(rate)
+        self.markers = []           # (sample offset, time it entered the pipe)
+        self.log = _Log()
+        self.late = 0               # blocks written more than one block behind schedule
+        self.blocked = 0.0          # seconds spent in write()
+
+    def _signal(self, start, n, rng):
+        block = rng.normal(0, 30, (n, self.channels)).astype(np.int16)
+        first = -(-start // self.interval) * self.interval
+        for m in range(first, start + n, self.interval):
+            lo = m - start
+            hi = min(n, lo + len(self.marker))
+            block[lo:hi] += self.marker[:hi - lo, None]
+        return block
+
+    def run(self):
+        rng = np.random.default_rng(0)
+        frame = 2 * self.channels
+        total = int(self.duration * self.rate)
+        fd = os.open(self.path, os.O_WRONLY)
+        self.capacity = set_pipe_size(fd, self.capacity) if self.capacity else get_pipe_size(fd)
+        start = time.monotonic()
+        sent = 0
+        try:
+            while sent < total:
+                due = start + max(0, sent - self.prefill) / self.rate
+                delay = due - time.monotonic()
+                if delay > 0:
+                    time.sleep(delay)
+                elif -delay > self.block / self.rate:
+                    self.late += 1
+                n = min(self.block, total - sent)
+                data = self._signal(sent, n, rng).tobytes()
+                t0 = time.monotonic()
+                view = memoryview(data)
+                while view:
+                    view = view[os.write(fd, view):]
+                t1 = time.monotonic()
+                self.blocked += t1 - t0
+                self.log.add(t1, (sent + n) * frame)
+                first = -(-sent // self.interval) * self.interval
+                for m in range(first, sent + n, self.interval):
+                    self.markers.append((m, t1))
+                sent += n
+        except BrokenPipeError:
+            pass
+        finally:
+            os.close(fd)
+
+
+class Relay(threading.Thread):
+    """Middle stage: forwards whatever is readable, blocking on the next pipe"""
+
+    def __init__(self, src, dst, capacity):
+        super().__init__(name="probe-relay", daemon=True)
+        self.src = src
+        self.dst = dst
+        self.capacity = capacity
+        self.log = _Log()
+
+    def run(self):
+        # Blocking opens pair up with the neighbours whatever the start order
+        src = os.open(self.src, os.O_RDONLY)
+        out = os.open(self.dst, os.O_WRONLY)
+        if self.capacity:
+            set_pipe_size(out, self.capacity)
+        offset = 0
+        try:
+            while True:
+                data = os.read(src, 65536)
+                if not data:
+                    return
+                offset += len(data)
+                self.log.add(time.monotonic(), offset)
+                view = memoryview(data)
+                while view:
+                    view = view[os.write(out, view):]
+        finally:
+            os.close(out)
+            os.close(src)
+
+
+class ProbeReader(threading.Thread):
+    """Final reader: one chunk per tick on its own clock, catching up after stalls"""
+
+    def __init__(self, path, rate, channels, chunk_ms=20.0, stall_ms=0.0, stall_every=2.0):
+        super().__init__(name="probe-reader", daemon=True)
+        self.rate = rate
+        self.channels = channels
+        self.chunk = int(rate * chunk_ms / 1000) * 2 * channels
+        self.tick = chunk_ms / 1000.0
+        self.stall = stall_ms / 1000.0
+        self.stall_every = stall_every
+        self.log = _Log()
+        self.dropouts = 0           # ticks that found less than a chunk once data was flowing
+        self.data = bytearray()
+        self.path = path
+
+    def run(self):
+        fd = os.open(self.path, os.O_RDONLY)
+        os.set_blocking(fd, False)
+        start = time.monotonic()
+        next_tick = start
+        next_stall = start + self.stall_every
+        flowing = False
+        try:
+            while True:
+                now = time.monotonic()
+                if self.stall and now >= next_stall:
+                    time.sleep(self.stall)
+                    next_stall += self.stall_every
+                delay = next_tick - time.monotonic()
+                if delay > 0:
+                    time.sleep(delay)
+                next_tick += self.tick
+                try:
+                    data = os.read(fd, self.chunk)
+                except BlockingIOError:
+                    data = None
+                if data == b"":
+                    return
+                got = len(data) if data else 0
+                if got:
+                    flowing = True
+                    self.data += data
+                    self.log.add(time.monotonic(), len(self.data))
+                if flowing and got < self.chunk:
+                    self.dropouts += 1
+        finally:
+            os.close(fd)
+
+
+def _percentile(values, p):
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * p))]
+
+
+def _summary(latencies):
+    if not latencies:
+        return None
+    ms = [v * 1000.0 for v in latencies]
+    return {
+        "mean_ms": statistics.fmean(ms),
+        "p95_ms": _percentile(ms, 0.95),
+        "max_ms": max(ms),
+        "jitter_ms": statistics.pstdev(ms),
+    }
+
+
+def detect_markers(audio, marker, positions, tolerance):
+    """
+    Cross-correlate channel 0 with the marker around each expected position
+
+    Returns:
+        List of detected sample positions (None where no marker was found)
+    """
+    signal_ = audio.astype(np.float64)
+    template = marker.astype(np.float64)
+    n = len(signal_) + len(template)
+    size = 1 << (n - 1).bit_length()
+    corr = np.fft.irfft(np.fft.rfft(signal_, size) * np.conj(np.fft.rfft(template, size)), size)[:len(signal_)]
+    threshold = 0.5 * float(np.dot(template, template))
+    found = []
+    for pos in positions:
+        lo, hi = max(0, pos - tolerance), min(len(corr), pos + tolerance)
+        if lo >= hi:
+            found.append(None)
+            continue
+        i = lo + int(np.argmax(corr[lo:hi]))
+        found.append(i if corr[i] > threshold else None)
+    return found
+
+
+def probe(capacity, hops=1, duration=5.0, rate=48000, channels=6, block_ms=10.0, chunk_ms=20.0,
+          interval=0.25, stall_ms=0.0, stall_every=2.0, prefill_ms=0.0, directory=None):
+    """
+    Measure one FIFO chain at one capacity
+
+    Args:
+        capacity: Pipe size for every hop (bytes, None = kernel default)
+        hops: FIFOs in the chain (hops - 1 relays between them)
+        duration: Seconds of audio written
+        rate, channels: Stream format (s16le)
+        block_ms: Writer block
+        chunk_ms: Reader chunk per tick
+        interval: Seconds between markers
+        stall_ms: Reader stall length (0 = no stalls)
+        stall_every: Seconds between reader stalls
+        prefill_ms: Audio the writer sends ahead of real time at start
+        directory: Where to create the FIFOs (default: a temp dir)
+
+    Returns:
+        dict with the capacity actually set, per-hop and end-to-end latency
+        summaries, reader dropouts, late writer blocks and marker counts
+    """
+    tmp = directory or tempfile.mkdtemp(prefix="sharm-fifo-")
+    paths = [os.path.join(tmp, f"hop{i}") for i in range(hops)]
+    for p in paths:
+        if not os.path.exists(p):
+            os.mkfifo(p)
+    try:
+        reader = ProbeReader(paths[-1], rate, channels, chunk_ms, stall_ms, stall_every)
+        relays = [Relay(paths[i], paths[i + 1], capacity) for i in range(hops - 1)]
+        writer = ProbeWriter(paths[0], capacity, rate, channels, duration, block_ms, interval, prefill_ms)
+        for t in [reader, writer] + relays:
+            t.start()
+        writer.join()
+        for t in relays + [reader]:
+            t.join(timeout=duration + 10)
+    finally:
+        for p in paths:
+            os.unlink(p)
+        if directory is None:
+            os.rmdir(tmp)
+
+    frame = 2 * channels
+    logs = [r.log for r in relays] + [reader.log]
+    hop_latency = [[] for _ in logs]
+    for sample, sent in writer.markers:
+        byte = (sample + 1) * frame - 1
+        previous = sent
+        for i, log in enumerate(logs):
+            t = log.time_of(byte)
+            if t is None:
+                break
+            hop_latency[i].append(t - previous)
+            previous = t
+
+    audio = np.frombuffer(bytes(reader.data), dtype="<i2").reshape(-1, channels)[:, 0]
+    positions = [m for m, _ in writer.markers]
+    found = detect_markers(audio, writer.marker, positions, int(interval * rate / 2))
+    end_to_end = []
+    misaligned = 0
+    for (sample, sent), pos in zip(writer.markers, found):
+        if pos is None:
+            continue
+        if abs(pos - sample) > 1:
+            misaligned += 1
+        t = reader.log.time_of((pos + 1) * frame - 1)
+        if t is not None:
+            end_to_end.append(t - sent)
+
+    return {
+        "capacity": writer.capacity,
+        "capacity_ms": writer.capacity * 1000.0 / (rate * frame),
+        "hops": [_summary(h) for h in hop_latency],
+        "end_to_end": _summary(end_to_end),
+        "dropouts": reader.dropouts,
+        "writer_late": writer.late,
+        "writer_blocked_s": writer.blocked,
+        "markers": len(writer.markers),
+        "detected": sum(p is not None for p in found),
+        "misaligned": misaligned,
+    }
+
+
+def print_report(results):
+    print(f"{'capacity':>9} {'cap ms':>7} {'mean ms':>8} {'p95 ms':>8} {'max ms':>8} {'jitter':>7} "
+          f"{'drops':>6} {'late':>5} {'markers':>9}  per hop mean/p95 ms")
+    for r in results:
+        e = r["end_to_end"] or {"mean_ms": float("nan"), "p95_ms": float("nan"), "max_ms": float("nan"),
+                                "jitter_ms": float("nan")}
+        hops = "  ".join(f"{h['mean_ms']:.1f}/{h['p95_ms']:.1f}" if h else "-" for h in r["hops"])
+        print(f"{r['capacity']:>9} {r['capacity_ms']:>7.1f} {e['mean_ms']:>8.1f} {e['p95_ms']:>8.1f} "
+              f"{e['max_ms']:>8.1f} {e['jitter_ms']:>7.2f} {r['dropouts']:>6} {r['writer_late']:>5} "
+              f"{r['detected']:>4}/{r['markers']:<4}  {hops}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    sub = parser.add_subparsers(dest="cmd", required=True)
+
+    create = sub.add_parser("create", help="Create FIFOs with an explicit capacity")
+    create.add_argument("paths", nargs="+")
+    create.add_argument("--size", type=int, default=65536, help="Pipe capacity in bytes")
+    create.add_argument("--hold", action="store_true", help="Keep the FIFOs open until killed (keeps the capacity)")
+
+    run = sub.add_parser("probe", help="Measure latency and jitter per capacity with local stand-ins")
+    run.add_argument("--sizes", type=int, nargs="+", default=[4096, 16384, 65536, 262144])
+    run.add_argument("--hops", type=int, default=1)
+    run.add_argument("--duration", type=float, default=5.0)
+    run.add_argument("--rate", type=int, default=48000)
+    run.add_argument("--channels", type=int, default=6)
+    run.add_argument("--block", type=float, default=10.0, help="Writer block (ms)")
+    run.add_argument("--chunk", type=float, default=20.0, help="Reader chunk per tick (ms)")
+    run.add_argument("--interval", type=float, default=0.25, help="Seconds between markers")
+    run.add_argument("--stall", type=float, default=0.0, help="Reader stall (ms)")
+    run.add_argument("--stall-every", type=float, default=2.0, help="Seconds between reader stalls")
+    run.add_argument("--prefill", type=float, default=0.0, help="Audio written ahead of real time at start (ms)")
+    args = parser.parse_args()
+
+    if args.cmd == "create":
+        keeper = FifoKeeper(args.paths, args.size)
+        for path, capacity in keeper.capacity.items():
+            print(f"{path}: {capacity} bytes")
+        if args.hold:
+            signal.signal(signal.SIGTERM, lambda *_: sys.exit(0))
+            try:
+                signal.pause()
+            except (KeyboardInterrupt, SystemExit):
+                pass
+        keeper.close()
+        return 0
+
+    print(f"format={args.rate}:16:{args.channels} hops={args.hops} duration={args.duration}s "
+          f"writer={args.block}ms reader={args.chunk}ms stall={args.stall}ms/{args.stall_every}s")
+    results = []
+    for size in args.sizes:
+        results.append(probe(size, hops=args.hops, duration=args.duration, rate=args.rate,
+                             channels=args.channels, block_ms=args.block, chunk_ms=args.chunk,
+                             interval=args.interval, stall_ms=args.stall, stall_every=args.stall_every,
+                             prefill_ms=args.prefill))
+    print_report(results)
+    return 0
+
+
+if __name__ == "__main__":
+    exit(main())
@@ -0,0 +1,309 @@
+#!/usr/bin/env python3
+"""
+Header-only media indexer for the media/ volume.
+
+Reads rate, bit depth, channels and duration straight from the file
+headers through mmap, without decoding audio or running ffprobe:
+- FLAC: STREAMINFO (after an optional ID3v2 tag)
+- AC-3 / E-AC-3: the first syncframe; duration from the frame size
+- WAV: the fmt and data chunks
+
+The index is a compact binary file (path + fixed-size record per track)
+updated incrementally: only files whose mtime or size changed are parsed
+again. Queries run on the in-memory copy; route() picks the snapserver
+stream (Surround for multichannel, Stereo otherwise).
+
+Examples:
+  python3 media_index.py ../media
+  python3 media_index.py ../media --channels 6 --rate 48000
+  python3 media_index.py ../media --codec ac3 --list
+"""
+import argparse
+import mmap
+import os
+import struct
+import sys
+import time
+from collections import namedtuple
+
+CODECS = ("unknown", "flac", "ac3", "eac3", "wav")
+EXTENSIONS = {".flac": "flac", ".ac3": "ac3", ".eac3": "ac3", ".ec3": "ac3", ".wav": "wav"}
+
+Track = namedtuple("Track", "path mtime_ns size codec rate bits channels samples")
+
+_RECORD = struct.Struct("<qqBIBBQ")     # mtime_ns, size, codec, rate, bits, channels, samples
+_MAGIC = b"SHMIDX1\n"
+_LFS_POINTER = b"version https://git-lfs"
+
+
+# Parsers: (mmap) -> (codec, rate, bits, channels, samples)
+
+def _skip_id3(mm):
+    if mm[:3] == b"ID3" and len(mm) >= 10:
+        size = (mm[6] << 21) | (mm[7] << 14) | (mm[8] << 7) | mm[9]
+        return 10 + size + (10 if mm[5] & 0x10 else 0)
+    return 0
+
+
+def parse_flac(mm):
+    pos = _skip_id3(mm)
+    if mm[pos:pos + 4] != b"fLaC" or mm[pos + 4] & 0x7F != 0:
+        raise ValueError("no FLAC STREAMINFO")
+    info = mm[pos + 8:pos + 8 + 34]
+    if len(info) < 34:
+        raise ValueError("truncated STREAMINFO")
+    packed = int.from_bytes(info[10:18], "big")
+    rate = packed >> 44
+    channels = ((packed >> 41) & 0x7) + 1
+    bits = ((packed >> 36) & 0x1F) + 1
+    samples = packed & ((1 << 36) - 1)
+    return "flac", rate, bits, channels, samples
+
+
+_AC3_RATES = (48000, 44100, 32000)
+_AC3_KBPS = (32, 40, 48, 56, 64, 80, 96, 112, 128, 160, 192, 224, 256, 320, 384, 448, 512, 576, 640)
+_ACMOD_CHANNELS = (2, 1, 2, 3, 3, 4, 4, 5)
+
+
+def _ac3_frame_bytes(fscod, frmsizecod):
+    kbps = _AC3_KBPS[frmsizecod >> 1]
+    if fscod == 0:
+        return kbps * 4
+    if fscod == 2:
+        return kbps * 6
+    return (kbps * 320 // 147 + (frmsizecod & 1)) * 2
+
+
+def parse_ac3(mm):
+    pos = mm.find(b"\x0b\x77", 0, 65536)
+    if pos < 0 or pos + 8 > len(mm):
+        raise ValueError("no AC-3 syncword")
+    b = mm[pos + 2:pos + 8]
+    bsid = b[3] >> 3
+    if bsid > 10:
+        # E-AC-3: strmtyp(2) substreamid(3) frmsiz(11) fscod(2) fscod2/numblkscod(2) acmod(3) lfeon(1)
+        frame = ((((b[0] & 0x07) << 8) | b[1]) + 1) * 2
+        fscod = b[2] >> 6
+        if fscod == 3:
+            rate = (24000, 22050, 16000)[(b[2] >> 4) & 0x3]
+            blocks = 6
+        else:
+            rate = _AC3_RATES[fscod]
+            blocks = (1, 2, 3, 6)[(b[2] >> 4) & 0x3]
+        acmod = (b[2] >> 1) & 0x7
+        lfe = b[2] & 0x1
+        frames = (len(mm) - pos) // frame
+        return "eac3", rate, 0, _ACMOD_CHANNELS[acmod] + lfe, frames * blocks * 256
+
+    fscod = b[2] >> 6
+    frmsizecod = b[2] & 0x3F
+    if fscod == 3 or frmsizecod >= 38:
+        raise ValueError("bad AC-3 header")
+    # acmod(3), then the mix levels present for that acmod, then lfeon
+    bits = int.from_bytes(b[4:6], "big")
+    acmod = bits >> 13
+    shift = 12
+    if acmod & 1 and acmod != 1:
+        shift -= 2      # cmixlev
+    if acmod & 4:
+        shift -= 2      # surmixlev
+    if acmod == 2:
+        shift -= 2      # dsurmod
+    lfe = (bits >> shift) & 1
+    frames = (len(mm) - pos) // _ac3_frame_bytes(fscod, frmsizecod)
+    return "ac3", _AC3_RATES[fscod], 0, _ACMOD_CHANNELS[acmod] + lfe, frames * 1536
+
+
+def parse_wav(mm):
+    if mm[:4] != b"RIFF" or mm[8:12] != b"WAVE":
+        raise ValueError("not RIFF/WAVE")
+    pos = 12
+    fmt = None
+    while pos + 8 <= len(mm):
+        chunk, size = mm[pos:pos + 4], struct.unpack_from("<I", mm, pos + 4)[0]
+        if chunk == b"fmt ":
+            _, channels, rate, _, align, bits = struct.unpack_from("<HHIIHH", mm, pos + 8)
+            fmt = (rate, bits, channels, align)
+        elif chunk == b"data" and fmt:
+            rate, bits, channels, align = fmt
+            return "wav", rate, bits, channels, size // align if align else 0
+        pos += 8 + size + (size & 1)
+    raise ValueError("no fmt/data chunk")
+
+
+_PARSERS = {"flac": parse_flac, "ac3": parse_ac3, "wav": parse_wav}
+
+
+def probe_file(path, kind=None):
+    """
+    Read the stream parameters from a file's header
+
+    Returns:
+        (codec, rate, bits, channels, samples); bits is 0 for lossy codecs
+    """
+    kind = kind or EXTENSIONS.get(os.path.splitext(path)[1].lower())
+    if kind is None:
+        raise ValueError("unsupported extension")
+    with open(path, "rb") as f:
+        with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+            if mm[:len(_LFS_POINTER)] == _LFS_POINTER:
+                raise ValueError("git-lfs pointer (run git lfs pull)")
+            return _PARSERS[kind](mm)
+
+
+class MediaIndex:
+    """Incrementally maintained in-memory index of a media tree"""
+
+    def __init__(self, root, index_path=None):
+        """
+        Initialize index (loads the on-disk index if present)
+
+        Args:
+            root: Media directory
+            index_path: Index file (default: <root>/.media_index)
+        """
+        self.root = os.path.abspath(root)
+        self.index_path = index_path or os.path.join(self.root, ".media_index")
+        self.tracks = {}
+        self.errors = {}
+        self._load()
+
+    # Persistence
+    def _load(self):
+        try:
+            with open(self.index_path, "rb") as f:
+                data = f.read()
+        except FileNotFoundError:
+            return
+        if not data.startswith(_MAGIC):
+            print(f"Ignoring {self.index_path}: unknown format", file=sys.stderr)
+            return
+        pos = len(_MAGIC)
+        size = _RECORD.size
+        while pos < len(data):
+            (n,) = struct.unpack_from("<H", data, pos)
+            path = data[pos + 2:pos + 2 + n].decode()
+            mtime, fsize, codec, rate, bits, channels, samples = _RECORD.unpack_from(data, pos + 2 + n)
+            self.tracks[path] = Track(path, mtime, fsize, CODECS[codec], rate, bits, channels, samples)
+            pos += 2 + n + size
+
+    def save(self):
+        """Write the index atomically"""
+        parts = [_MAGIC]
+        for t in self.tracks.values():
+            name = t.path.encode()
+            parts.append(struct.pack("<H", len(name)))
+            parts.append(name)
+            parts.append(_RECORD.pack(t.mtime_ns, t.size, CODECS.index(t.codec), t.rate, t.bits, t.channels,
+                                      t.samples))
+        tmp = self.index_path + ".tmp"
+        with open(tmp, "wb") as f:
+            f.write(b"".join(parts))
+        os.replace(tmp, self.index_path)
+
+    # Scanning
+    def _walk(self, directory):
+        with os.scandir(directory) as it:
+            for entry in it:
+                if entry.name.startswith("."):
+                    continue
+                if entry.is_dir(follow_symlinks=False):
+                    yield from self._walk(entry.path)
+                elif EXTENSIONS.get(os.path.splitext(entry.name)[1].lower()):
+                    yield entry
+
+    def update(self):
+        """
+        Bring the index up to date with the tree
+
+        Returns:
+            dict with files seen, parsed, unchanged, removed, failed and seconds
+        """
+        start = time.monotonic()
+        seen = set()
+        parsed = unchanged = failed = 0
+        for entry in self._walk(self.root):
+            rel = os.path.relpath(entry.path, self.root)
+            seen.add(rel)
+            st = entry.stat()
+            old = self.tracks.get(rel)
+            if old and old.mtime_ns == st.st_mtime_ns and old.size == st.st_size:
+                unchanged += 1
+                continue
+            try:
+                codec, rate, bits, channels, samples = probe_file(entry.path)
+            except (ValueError, OSError, struct.error, IndexError) as e:
+                self.errors[rel] = str(e)
+                self.tracks.pop(rel, None)
+                failed += 1
+                continue
+            self.errors.pop(rel, None)
+            self.tracks[rel] = Track(rel, st.st_mtime_ns, st.st_size, codec, rate, bits, channels, samples)
+            parsed += 1
+        removed = [p for p in self.tracks if p not in seen]
+        for p in removed:
+            del self.tracks[p]
+        if parsed or removed:
+            self.save()
+        return {"files": len(seen), "parsed": parsed, "unchanged": unchanged, "removed": len(removed),
+                "failed": failed, "seconds": time.monotonic() - start}
+
+    # Queries
+    def query(self, channels=None, rate=None, bits=None, codec=None, min_seconds=None):
+        """All tracks matching every given field"""
+        result = []
+        for t in self.tracks.values():
+            if channels is not None and t.channels != channels:
+                continue
+            if rate is not None and t.rate != rate:
+                continue
+            if bits is not None and t.bits != bits:
+                continue
+            if codec is not None and t.codec != codec:
+                continue
+            if min_seconds is not None and duration(t) < min_seconds:
+                continue
+            result.append(t)
+        return result
+
+
+def duration(track):
+    return track.samples / track.rate if track.rate else 0.0
+
+
+def route(track):
+    """snapserver stream for a track"""
+    return "Surround" if track.channels > 2 else "Stereo"
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("root", help="Media directory")
+    parser.add_argument("--index", help="Index file (default: <root>/.media_index)")
+    parser.add_argument("--channels", type=int)
+    parser.add_argument("--rate", type=int)
+    parser.add_argument("--bits", type=int)
+    parser.add_argument("--codec", choices=CODECS[1:])
+    parser.add_argument("--list", action="store_true", help="Print matching tracks")
+    args = parser.parse_args()
+
+    index = MediaIndex(args.root, args.index)
+    stats = index.update()
+    print(f"{stats['files']} files in {stats['seconds'] * 1000:.1f} ms: {stats['parsed']} parsed, "
+          f"{stats['unchanged']} unchanged, {stats['removed']} removed, {stats['failed']} unreadable")
+    for path, error in sorted(index.errors.items()):
+        print(f"  {path}: {error}", file=sys.stderr)
+
+    start = time.perf_counter()
+    tracks = index.query(channels=args.channels, rate=args.rate, bits=args.bits, codec=args.codec)
+    elapsed = time.perf_counter() - start
+    print(f"{len(tracks)} matching tracks ({elapsed * 1000:.2f} ms)")
+    if args.list or len(tracks) <= 50:
+        for t in sorted(tracks):
+            print(f"  {t.codec:<5} {t.rate:>6} {t.bits or '-':>3} {t.channels}ch {duration(t):>8.1f}s "
+                  f"{route(t):<8} {t.path}")
+    return 0
+
+
+if __name__ == "__main__":
+    exit(main())
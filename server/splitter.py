@@ -0,0 +1,387 @@
+#!/usr/bin/env python3
+"""
+Channel splitter: interleaved s16le FIFO -> one mono FIFO per channel.
+Replaces the ffmpeg channelsplit graph in split.sh.
+
+Blocks are read with readinto() into one preallocated buffer, deinterleaved
+with a single transpose of a NumPy view, and written to every output with
+non-blocking I/O. Each output has its own bounded queue, so a slow or
+missing reader only affects its own channel; what happens when its queue
+is full is the policy:
+
+- drop:    discard the oldest queued block (latency stays bounded)
+- silence: discard the backlog and queue one block of silence, so the
+           reader resumes at live audio after a gap instead of a splice
+- block:   stop reading the input until the reader catches up (split.sh
+           behaviour: every channel waits for the slowest one)
+
+Examples:
+  python3 splitter.py --input $FIFO_PATH
+  python3 splitter.py --input /tmp/snap_fifo --policy silence --stats 10
+  python3 splitter.py --input surround.raw --no-follow --outputs /tmp/a /tmp/b ...
+"""
+import argparse
+import errno
+import io
+import json
+import os
+import select
+import stat
+import sys
+import threading
+import time
+from collections import deque
+
+import numpy as np
+
+from fifo_probe import set_pipe_size
+
+POLICIES = ("drop", "silence", "block")
+
+
+class FifoOutput:
+    """One output with its own queue of pending blocks"""
+
+    def __init__(self, path, max_blocks, policy, mkfifo=True, channels=1, pipe_size=None):
+        """
+        Initialize output (opened later, when a reader is there)
+
+        Args:
+            path: FIFO or file to write
+            max_blocks: Blocks queued before the policy applies
+            policy: drop, silence or block
+            mkfifo: Create the FIFO if the path doesn't exist
+            channels: Interleaved s16 channels written (for lag in ms)
+            pipe_size: Pipe capacity to set on open (None = leave as is)
+        """
+        self.path = path
+        self.channels = channels
+        self.pipe_size = pipe_size
+        self.max_blocks = max_blocks
+        self.policy = policy
+        self.fd = None
+        self.queue = deque()
+        self.offset = 0         # bytes of queue[0] already written
+        self.pending = 0        # bytes queued
+        self._retry_at = 0.0
+
+        if mkfifo and not os.path.exists(path):
+            os.mkfifo(path)
+            os.chmod(path, 0o666)
+
+        # Counters
+        self.written = 0
+        self.xruns = 0
+        self.dropped = 0        # bytes dropped on overflow
+        self.discarded = 0      # bytes produced while no reader was connected
+        self.max_pending = 0
+
+    @property
+    def connected(self):
+        return self.fd is not None
+
+    def open(self, now):
+        """Try to open without blocking; FIFOs without a reader fail with ENXIO"""
+        if self.fd is not None or now < self._retry_at:
+            return self.fd is not None
+        try:
+            self.fd = os.open(self.path, os.O_WRONLY | os.O_NONBLOCK | os.O_CREAT, 0o666)
+        except OSError as e:
+            if e.errno not in (errno.ENXIO, errno.ENOENT):
+                print(f"Cannot open {self.path}: {e}", file=sys.stderr)
+            self._retry_at = now + 0.5
+            return False
+        if self.pipe_size and stat.S_ISFIFO(os.fstat(self.fd).st_mode):
+            set_pipe_size(self.fd, self.pipe_size)
+        return True
+
+    def close(self):
+        if self.fd is not None:
+            os.close(self.fd)
+            self.fd = None
+        self.queue.clear()
+        self.offset = 0
+        self.pending = 0
+
+    @property
+    def full(self):
+        return len(self.queue) >= self.max_blocks
+
+    def push(self, block):
+        """Queue a block (memoryview); apply the overflow policy first"""
+        if self.fd is None:
+            self.discarded += len(block)
+            return
+        if self.full:
+            if self.policy == "drop":
+                # A partially written head stays, or the reader would lose frame alignment
+                if not self.offset:
+                    lost = len(self.queue.popleft())
+                elif len(self.queue) > 1:
+                    lost = len(self.queue[1])
+                    del self.queue[1]
+                else:
+                    lost = 0
+                self.pending -= lost
+                self.dropped += lost
+                self.xruns += 1
+            elif self.policy == "silence":
+                # A partially written block is finished to keep the stream sample-aligned
+                head = self.queue[0] if self.offset else None
+                kept = len(head) - self.offset if head is not None else 0
+                self.dropped += self.pending - kept
+                self.xruns += 1
+                self.queue = deque([head] if head is not None else [])
+                self.pending = kept
+                silence = bytes(len(block))
+                self.queue.append(memoryview(silence))
+                self.pending += len(silence)
+        self.queue.append(block)
+        self.pending += len(block)
+        if self.pending > self.max_pending:
+            self.max_pending = self.pending
+
+    def flush(self):
+        """Write as much as the reader takes without blocking"""
+        while self.queue:
+            block = self.queue[0]
+            try:
+                n = os.write(self.fd, block[self.offset:])
+            except BlockingIOError:
+                return
+            except BrokenPipeError:
+                # Reader went away; reopen when one comes back
+                self.close()
+                return
+            self.written += n
+            self.pending -= n
+            self.offset += n
+            if self.offset >= len(block):
+                self.queue.popleft()
+                self.offset = 0
+
+
+class ChannelSplitter:
+    """Splits an interleaved s16le stream into mono outputs"""
+
+    def __init__(self, source, outputs, channels=6, sample_rate=48000, block_frames=1024,
+                 queue_blocks=16, policy="drop", follow=True, mkfifo=True, pipe_size=None):
+        """
+        Initialize splitter
+
+        Args:
+            source: Interleaved input (FIFO or file)
+            outputs: One path per channel (None to skip a channel)
+            channels: Channels in the input
+            sample_rate: Input sample rate (for lag in ms)
+            block_frames: Frames per read; 1024 = 12 KB of 5.1 audio
+            queue_blocks: Blocks queued per output before the policy applies
+            policy: drop, silence or block
+            follow: Reopen the input at EOF (FIFO writer restarted) instead of stopping
+            mkfifo: Create missing output FIFOs
+            pipe_size: Capacity of the output pipes (None = kernel default, see fifo_probe.py)
+        """
+        if policy not in POLICIES:
+            raise ValueError(f"policy must be one of {POLICIES}")
+        self.source = source
+        self.channels = channels
+        self.sample_rate = sample_rate
+        self.block_frames = block_frames
+        self.policy = policy
+        self.follow = follow
+        self.frame_bytes = 2 * channels
+
+        self.outputs = self._make_outputs(outputs, queue_blocks, policy, mkfifo, pipe_size)
+        self._buf = bytearray(block_frames * self.frame_bytes)
+        self._view = memoryview(self._buf)
+        self._filled = 0
+        self._src = None
+        self._running = False
+
+        # Counters
+        self.bytes_in = 0
+        self.frames_out = 0
+        self.blocks = 0
+        self.blocked = 0.0
+        self.cpu = 0.0
+        self._started = None
+
+    def _make_outputs(self, paths, queue_blocks, policy, mkfifo, pipe_size):
+        if len(paths) != self.channels:
+            raise ValueError(f"{self.channels} outputs expected, got {len(paths)}")
+        return [FifoOutput(p, queue_blocks, policy, mkfifo, pipe_size=pipe_size) if p else None for p in paths]
+
+    def _open_source(self):
+        fd = os.open(self.source, os.O_RDONLY)   # blocks until a writer opens a FIFO
+        self._src = io.FileIO(fd, "rb", closefd=True)
+
+    def _split(self, nbytes):
+        """Deinterleave nbytes (whole frames) from the buffer and queue them"""
+        frames = np.frombuffer(self._buf, dtype="<i2", count=nbytes // 2).reshape(-1, self.channels)
+        # One copy for all channels: row c of the transpose is channel c, contiguous
+        planes = frames.T.copy()
+        for c, out in enumerate(self.outputs):
+            if out is not None:
+                out.push(memoryview(planes[c]).cast("B"))
+        self.frames_out += len(frames)
+        self.blocks += 1
+
+    def _read(self):
+        """Read into the free part of the buffer; return False at EOF"""
+        n = self._src.readinto(self._view[self._filled:])
+        if n is None:
+            return True
+        if n == 0:
+            return False
+        self.bytes_in += n
+        self._filled += n
+        usable = self._filled - self._filled % self.frame_bytes
+        if usable:
+            self._split(usable)
+            rest = self._filled - usable
+            if rest:
+                self._buf[:rest] = self._buf[usable:self._filled]
+            self._filled = rest
+        return True
+
+    def _wait_for_readers(self):
+        """block policy: wait until no connected output is full"""
+        start = time.monotonic()
+        while self._running:
+            full = [o for o in self.outputs if o and o.connected and o.full]
+            if not full:
+                break
+            select.select([], [o.fd for o in full], [], 0.5)
+            for o in full:
+                if o.connected:
+                    o.flush()
+        self.blocked += time.monotonic() - start
+
+    def run(self):
+        """Split until stopped (or until EOF with follow=False)"""
+        self._running = True
+        self._started = time.monotonic()
+        cpu_start = time.process_time()
+        self._open_source()
+        eof = False
+        try:
+            while self._running:
+                now = time.monotonic()
+                for o in self.outputs:
+                    if o is not None:
+                        o.open(now)
+                if self.policy == "block":
+                    self._wait_for_readers()
+
+                waiting = [o for o in self.outputs if o and o.queue]
+                rlist = [] if eof else [self._src]
+                if eof and not waiting:
+                    break
+                readable, writable, _ = select.select(rlist, [o.fd for o in waiting], [], 0.5)
+                for o in waiting:
+                    if o.fd in writable:
+                        o.flush()
+                if readable and not self._read():
+                    if self.follow:
+                        self._src.close()
+                        self._open_source()
+                    else:
+                        eof = True
+        finally:
+            self.cpu += time.process_time() - cpu_start
+            if self._src:
+                self._src.close()
+                self._src = None
+
+    def stop(self):
+        self._running = False
+
+    def close(self):
+        for o in self.outputs:
+            if o is not None:
+                o.close()
+
+    def get_stats(self):
+        """
+        Get throughput and per-channel counters
+
+        Returns:
+            dict with input MB/s, speed relative to real time, CPU, time spent
+            blocked, and per output: lag (queued ms), max lag, xruns,
+            dropped and discarded ms and whether a reader is connected
+        """
+        elapsed = time.monotonic() - self._started if self._started else 0.0
+        audio_s = self.frames_out / self.sample_rate
+        outputs = []
+        for o in self.outputs:
+            if o is None:
+                outputs.append(None)
+                continue
+            to_ms = 1000.0 / (2 * o.channels * self.sample_rate)
+            outputs.append({
+                "path": o.path,
+                "connected": o.connected,
+                "lag_ms": o.pending * to_ms,
+                "max_lag_ms": o.max_pending * to_ms,
+                "xruns": o.xruns,
+                "dropped_ms": o.dropped * to_ms,
+                "discarded_ms": o.discarded * to_ms,
+            })
+        return {
+            "audio_s": audio_s,
+            "mb_per_s": self.bytes_in / elapsed / 1e6 if elapsed else None,
+            "realtime_x": audio_s / elapsed if elapsed else None,
+            "cpu_ms_per_s": self.cpu * 1000.0 / audio_s if audio_s else None,
+            "blocked_s": self.blocked,
+            "outputs": outputs,
+        }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--input", default=os.getenv("FIFO_PATH", "/tmp/snap_fifo"))
+    parser.add_argument("--outputs", nargs="+", help="Output paths (default: /tmp/snap_ch1..N)")
+    parser.add_argument("--channels", type=int, default=6)
+    parser.add_argument("--rate", type=int, default=48000)
+    parser.add_argument("--block", type=int, default=1024, help="Frames per read")
+    parser.add_argument("--queue", type=int, default=16, help="Blocks queued per output")
+    parser.add_argument("--pipe-size", type=int, help="Output pipe capacity in bytes (default: kernel default)")
+    parser.add_argument("--policy", choices=POLICIES, default="drop")
+    parser.add_argument("--no-follow", action="store_true", help="Stop at end of input instead of reopening")
+    parser.add_argument("--stats", type=float, default=0.0, help="Print stats every N seconds (0 = at exit only)")
+    args = parser.parse_args()
+
+    outputs = args.outputs or [f"/tmp/snap_ch{i + 1}" for i in range(args.channels)]
+    if not os.path.exists(args.input):
+        os.mkfifo(args.input)
+    elif not stat.S_ISFIFO(os.stat(args.input).st_mode) and not args.no_follow:
+        # A regular file has no writer to wait for
+        args.no_follow = True
+
+    splitter = ChannelSplitter(args.input, outputs, channels=args.channels, sample_rate=args.rate,
+                               block_frames=args.block, queue_blocks=args.queue, policy=args.policy,
+                               follow=not args.no_follow, pipe_size=args.pipe_size)
+
+    def print_stats():
+        print(json.dumps(splitter.get_stats()), flush=True)
+
+    if args.stats:
+        def report():
+            while True:
+                time.sleep(args.stats)
+                print_stats()
+
+        threading.Thread(target=report, name="stats", daemon=True).start()
+
+    try:
+        splitter.run()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        print_stats()
+        splitter.close()
+    return 0
+
+
+if __name__ == "__main__":
+    exit(main())
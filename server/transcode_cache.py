@@ -0,0 +1,397 @@
+#!/usr/bin/env python3
+"""
+Pre-transcode cache: normalizes the music library to 48000:16:6 FLAC once,
+so MPD plays files already in its output format instead of resampling and
+upmixing 44.1/96 kHz, 24-bit, stereo and AC-3 sources on every play.
+
+- objects/<hash>.flac: one converted file per source content hash
+  (changed files are hashed first and identical ones converted once)
+- library/<relative path>.flac: symlinks mirroring the source tree, for
+  MPD's music_directory; sources that differ only by extension (x.wav and
+  x.flac) keep it, as library/x.wav.flac and library/x.flac.flac. Links
+  and index entries of removed sources are pruned at the end of a run.
+- index.jsonl: journal of path, mtime_ns, size, hash and results; a source
+  with unchanged mtime+size is skipped without hashing it. Each finished
+  file is appended immediately and outputs are written to *.part and
+  renamed, so an interrupted run resumes where it stopped.
+
+Conversion runs in a process pool, one ffmpeg per file. The report has
+files/s, transcode CPU, and (with --measure) the CPU MPD would save per
+play: decoding + converting the source vs decoding the cached file.
+
+Examples:
+  python3 transcode_cache.py ../media
+  python3 transcode_cache.py ../media --cache ../media/cache --workers 4 --measure
+"""
+import argparse
+import collections
+import hashlib
+import json
+import os
+import resource
+import shutil
+import subprocess
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+AUDIO_EXTENSIONS = {".flac", ".ac3", ".wav", ".mp3", ".ogg", ".opus", ".m4a", ".aac", ".dts", ".eac3", ".wv", ".ape"}
+
+TARGET = {"rate": 48000, "bits": 16, "channels": 6}
+
+
+def file_hash(path):
+    with open(path, "rb") as f:
+        return hashlib.file_digest(f, "sha256").hexdigest()
+
+
+def _child_cpu():
+    r = resource.getrusage(resource.RUSAGE_CHILDREN)
+    return r.ru_utime + r.ru_stime
+
+
+def _ffmpeg_cpu(cmd):
+    """Run an ffmpeg command; return its CPU seconds"""
+    before = _child_cpu()
+    subprocess.run(cmd, check=True, stdin=subprocess.DEVNULL, stdout=subprocess.DEVNULL, stderr=subprocess.PIPE)
+    return _child_cpu() - before
+
+
+def flac_seconds(path):
+    """Duration from a FLAC file's STREAMINFO (None if not FLAC)"""
+    with open(path, "rb") as f:
+        head = f.read(42)
+    if head[:4] != b"fLaC" or len(head) < 42:
+        return None
+    info = head[8:42]
+    packed = int.from_bytes(info[10:18], "big")
+    rate = packed >> 44
+    samples = packed & ((1 << 36) - 1)
+    return samples / rate if rate else None
+
+
+def convert(path, cache, ffmpeg="ffmpeg", measure=False, compression=5, digest=None):
+    """
+    Convert one file (runs in a worker process)
+
+    Args:
+        path: Source file
+        cache: Cache directory
+        ffmpeg: ffmpeg binary
+        measure: Also time the play-time work (source decode + convert vs cached decode)
+        compression: FLAC compression level
+        digest: Content hash if already known
+
+    Returns:
+        dict with hash, object path (relative to cache), whether it was
+        converted (False = object already there), CPU seconds and duration
+    """
+    start = time.process_time()
+    if digest is None:
+        digest = file_hash(path)
+    hash_cpu = time.process_time() - start
+    rel = os.path.join("objects", digest[:2], digest + ".flac")
+    out = os.path.join(cache, rel)
+    result = {"hash": digest, "object": rel, "converted": False, "hash_cpu": hash_cpu, "cpu": 0.0}
+
+    if not os.path.exists(out):
+        os.makedirs(os.path.dirname(out), exist_ok=True)
+        part = f"{out}.{os.getpid()}.part"
+        try:
+            result["cpu"] = _ffmpeg_cpu([
+                ffmpeg, "-nostdin", "-v", "error", "-y", "-i", path, "-map", "0:a:0", "-map_metadata", "0",
+                "-ar", str(TARGET["rate"]), "-ac", str(TARGET["channels"]), "-sample_fmt", "s16",
+                "-c:a", "flac", "-compression_level", str(compression), "-f", "flac", part])
+            os.replace(part, out)
+        except subprocess.CalledProcessError as e:
+            result["error"] = e.stderr.decode(errors="replace").strip()[-500:]
+            return result
+        finally:
+            if os.path.exists(part):
+                os.unlink(part)
+        result["converted"] = True
+    result["seconds"] = flac_seconds(out)
+
+    if measure:
+        target = ["-ar", str(TARGET["rate"]), "-ac", str(TARGET["channels"]), "-sample_fmt", "s16"]
+        result["play_cpu_source"] = _ffmpeg_cpu([ffmpeg, "-nostdin", "-v", "error", "-i", path] + target +
+                                                ["-f", "null", "-"])
+        result["play_cpu_cached"] = _ffmpeg_cpu([ffmpeg, "-nostdin", "-v", "error", "-i", out, "-f", "null", "-"])
+    return result
+
+
+class TranscodeCache:
+    """Incremental library -> 48000:16:6 FLAC cache"""
+
+    def __init__(self, library, cache, ffmpeg="ffmpeg", workers=None):
+        """
+        Initialize cache
+
+        Args:
+            library: Source music directory
+            cache: Cache directory (skipped when scanning if inside the library)
+            ffmpeg: ffmpeg binary
+            workers: Worker processes (default: CPU count)
+        """
+        self.library = os.path.abspath(library)
+        self.cache = os.path.abspath(cache)
+        self.ffmpeg = ffmpeg
+        self.workers = workers or os.cpu_count() or 1
+        self.index_path = os.path.join(self.cache, "index.jsonl")
+        self.index = {}
+        self.collisions = set()     # library paths without extension shared by several sources
+        os.makedirs(self.cache, exist_ok=True)
+        self._load()
+
+    def _load(self):
+        try:
+            with open(self.index_path) as f:
+                for line in f:
+                    try:
+                        entry = json.loads(line)
+                    except ValueError:
+                        continue    # torn last line of an interrupted run
+                    self.index[entry["path"]] = entry
+        except FileNotFoundError:
+            pass
+
+    def _compact(self):
+        tmp = self.index_path + ".tmp"
+        with open(tmp, "w") as f:
+            for entry in self.index.values():
+                f.write(json.dumps(entry) + "\n")
+        os.replace(tmp, self.index_path)
+
+    def scan(self):
+        """Yield (relative path, stat) of audio files in the library"""
+        for root, dirs, files in os.walk(self.library):
+            dirs[:] = sorted(d for d in dirs if os.path.join(root, d) != self.cache and not d.startswith("."))
+            for name in sorted(files):
+                if os.path.splitext(name)[1].lower() not in AUDIO_EXTENSIONS:
+                    continue
+                path = os.path.join(root, name)
+                yield os.path.relpath(path, self.library), os.stat(path)
+
+    def _link_name(self, rel):
+        base = os.path.splitext(rel)[0]
+        return (rel if base in self.collisions else base) + ".flac"
+
+    def _find_collisions(self, rels):
+        """Note sources that would share a link name"""
+        counts = collections.Counter(os.path.splitext(rel)[0] for rel in rels)
+        self.collisions = {base for base, n in counts.items() if n > 1}
+        for base in sorted(self.collisions):
+            names = ", ".join(rel for rel in rels if os.path.splitext(rel)[0] == base)
+            print(f"{names}: same name without extension, linked as <name>.<ext>.flac", file=sys.stderr)
+        return len(self.collisions)
+
+    def _prune(self, rels):
+        """
+        Drop index entries and library links of sources that are gone (or
+        whose link name changed), so MPD doesn't list them
+
+        Returns:
+            (index entries dropped, links removed)
+        """
+        present = set(rels)
+        gone = [rel for rel in self.index if rel not in present]
+        for rel in gone:
+            del self.index[rel]
+        keep = {self._link_name(rel) for rel in rels}
+        library = os.path.join(self.cache, "library")
+        removed = 0
+        for root, dirs, files in os.walk(library, topdown=False):
+            for name in files:
+                path = os.path.join(root, name)
+                if os.path.islink(path) and os.path.relpath(path, library) not in keep:
+                    os.unlink(path)
+                    removed += 1
+            if root != library and not os.listdir(root):
+                os.rmdir(root)
+        return len(gone), removed
+
+    def _link(self, rel, entry):
+        link = os.path.join(self.cache, "library", self._link_name(rel))
+        os.makedirs(os.path.dirname(link), exist_ok=True)
+        target = os.path.relpath(os.path.join(self.cache, entry["object"]), os.path.dirname(link))
+        if os.path.islink(link) and os.readlink(link) == target:
+            return
+        tmp = link + ".tmp"
+        if os.path.lexists(tmp):
+            os.unlink(tmp)
+        os.symlink(target, tmp)
+        os.replace(tmp, link)
+
+    def _hash(self, pool, todo):
+        """
+        Hash changed files in the pool and group them by content
+
+        Returns:
+            (dict hash -> [(rel, stat)], list of (rel, stat, error))
+        """
+        futures = {pool.submit(file_hash, os.path.join(self.library, rel)): (rel, st) for rel, st in todo}
+        groups = {}
+        failed = []
+        for future in as_completed(futures):
+            rel, st = futures[future]
+            try:
+                groups.setdefault(future.result(), []).append((rel, st))
+            except OSError as e:
+                failed.append((rel, st, str(e)))
+        for files in groups.values():
+            files.sort()
+        return groups, failed
+
+    def _record(self, rel, st, result, journal, stats):
+        entry = dict(result, path=rel, mtime_ns=st.st_mtime_ns, size=st.st_size)
+        if "error" in entry:
+            stats["failed"] += 1
+            print(f"{rel}: {entry['error']}", file=sys.stderr)
+        else:
+            stats["converted" if entry["converted"] else "reused"] += 1
+            stats["cpu"] += entry["cpu"]
+            stats["audio_s"] += entry.get("seconds") or 0.0
+            if "play_cpu_source" in entry:
+                stats["play_cpu_source"] += entry["play_cpu_source"]
+                stats["play_cpu_cached"] += entry["play_cpu_cached"]
+                stats["measured_s"] += entry.get("seconds") or 0.0
+            self._link(rel, entry)
+        # Journal first: an interrupted run resumes after the last line written
+        journal.write(json.dumps(entry) + "\n")
+        journal.flush()
+        self.index[rel] = entry
+        return entry
+
+    def _collect(self, futures, total, journal, stats, progress, done=0):
+        """Record results as workers finish; futures map to the files sharing one hash"""
+        for future in as_completed(futures):
+            files = futures[future]
+            try:
+                result = future.result()
+            except Exception as e:
+                result = {"error": str(e), "hash": None, "object": None}
+            for i, (rel, st) in enumerate(files):
+                if i:
+                    # Same content as files[0]: its object, nothing converted or measured
+                    result = {k: v for k, v in result.items() if not k.startswith("play_cpu")}
+                    result.update(converted=False, cpu=0.0, hash_cpu=0.0)
+                entry = self._record(rel, st, result, journal, stats)
+                done += 1
+                if progress:
+                    progress(done, total, rel, entry)
+
+    def run(self, measure=False, limit=None, progress=None):
+        """
+        Bring the cache up to date
+
+        Args:
+            measure: Time play-time decode/convert for converted files
+            limit: Process at most this many changed files (partial run)
+            progress: Callback(done, total, rel, entry) after each file
+
+        Returns:
+            dict with counts (scanned, skipped, converted, reused, failed, link_collisions,
+            dropped index entries and pruned_links of removed sources),
+            wall time, files/s, transcode CPU and play-time CPU figures
+        """
+        start = time.monotonic()
+        stats = {"scanned": 0, "skipped": 0, "converted": 0, "reused": 0, "failed": 0,
+                 "cpu": 0.0, "audio_s": 0.0, "play_cpu_source": 0.0, "play_cpu_cached": 0.0, "measured_s": 0.0}
+        todo = []
+        scanned = list(self.scan())
+        stats["link_collisions"] = self._find_collisions([rel for rel, _ in scanned])
+        for rel, st in scanned:
+            stats["scanned"] += 1
+            entry = self.index.get(rel)
+            if (entry and entry["mtime_ns"] == st.st_mtime_ns and entry["size"] == st.st_size
+                    and "error" not in entry and os.path.exists(os.path.join(self.cache, entry["object"]))):
+                stats["skipped"] += 1
+                self._link(rel, entry)
+                continue
+            todo.append((rel, st))
+        if limit is not None:
+            todo = todo[:limit]
+        scan_s = time.monotonic() - start
+
+        with open(self.index_path, "a") as journal, ProcessPoolExecutor(self.workers) as pool:
+            try:
+                groups, unreadable = self._hash(pool, todo)
+                for done, (rel, st, error) in enumerate(unreadable, 1):
+                    entry = self._record(rel, st, {"error": error, "hash": None, "object": None}, journal, stats)
+                    if progress:
+                        progress(done, len(todo), rel, entry)
+                futures = {pool.submit(convert, os.path.join(self.library, files[0][0]), self.cache, self.ffmpeg,
+                                       measure, digest=digest): files for digest, files in groups.items()}
+                self._collect(futures, len(todo), journal, stats, progress, len(unreadable))
+            except KeyboardInterrupt:
+                pool.shutdown(wait=False, cancel_futures=True)
+                raise
+        stats["dropped"], stats["pruned_links"] = self._prune([rel for rel, _ in scanned])
+        self._compact()
+
+        elapsed = time.monotonic() - start
+        processed = len(todo)
+        stats.update({
+            "wall_s": elapsed,
+            "files_per_s": processed / elapsed if elapsed else None,
+            "scan_s": scan_s,
+        })
+        return stats
+
+
+def print_report(stats, outputs):
+    print(f"scanned {stats['scanned']} files: {stats['skipped']} unchanged, {stats['converted']} converted, "
+          f"{stats['reused']} reused (same content), {stats['failed']} failed")
+    if stats["dropped"] or stats["pruned_links"]:
+        print(f"{stats['dropped']} removed sources dropped from the index, {stats['pruned_links']} stale links removed")
+    if stats["link_collisions"]:
+        print(f"{stats['link_collisions']} names shared by sources with different extensions (linked with both)")
+    if stats["files_per_s"] is not None:
+        print(f"{stats['wall_s']:.1f}s wall ({stats['scan_s']:.2f}s index check), "
+              f"{stats['files_per_s']:.2f} files/s processed")
+    print(f"transcode CPU {stats['cpu']:.1f}s for {stats['audio_s'] / 60:.1f} min of audio")
+    if stats["measured_s"]:
+        per_play = stats["play_cpu_source"] - stats["play_cpu_cached"]
+        per_hour = per_play * 3600.0 / stats["measured_s"]
+        print(f"play-time CPU: source decode+convert {stats['play_cpu_source']:.1f}s vs cached decode "
+              f"{stats['play_cpu_cached']:.1f}s")
+        print(f"saved per play of these files: {per_play:.1f}s CPU ({per_hour:.1f}s per audio hour); "
+              f"conversion runs per output, x{outputs} outputs: {per_hour * outputs:.1f}s per audio hour")
+        if per_play > 0:
+            print(f"transcode cost is recovered after {stats['cpu'] / (per_play * outputs):.1f} plays")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("library", help="Music directory (e.g. media/)")
+    parser.add_argument("--cache", help="Cache directory (default: <library>/cache)")
+    parser.add_argument("--workers", type=int, help="Worker processes (default: CPU count)")
+    parser.add_argument("--ffmpeg", default="ffmpeg")
+    parser.add_argument("--limit", type=int, help="Convert at most N changed files this run")
+    parser.add_argument("--measure", action="store_true", help="Measure play-time CPU saved (two extra decodes per file)")
+    parser.add_argument("--outputs", type=int, default=3, help="MPD outputs doing the conversion at play time")
+    parser.add_argument("--quiet", action="store_true")
+    args = parser.parse_args()
+
+    if shutil.which(args.ffmpeg) is None:
+        print(f"{args.ffmpeg} not found", file=sys.stderr)
+        return 1
+
+    def progress(done, total, rel, entry):
+        if not args.quiet:
+            state = "failed" if "error" in entry else "converted" if entry["converted"] else "reused"
+            print(f"[{done}/{total}] {state} {rel}", flush=True)
+
+    cache = TranscodeCache(args.library, args.cache or os.path.join(args.library, "cache"), args.ffmpeg,
+                           args.workers)
+    try:
+        stats = cache.run(measure=args.measure, limit=args.limit, progress=progress)
+    except KeyboardInterrupt:
+        print("Interrupted; finished files are in the index, run again to resume", file=sys.stderr)
+        return 130
+    print_report(stats, args.outputs)
+    return 0 if not stats["failed"] else 2
+
+
+if __name__ == "__main__":
+    exit(main())
@@ -3,12 +3,6 @@
 cd $(dirname $0)
 pwd
 
-# Check if ffmpeg is installed
-if ! command -v ffmpeg &> /dev/null; then
-    echo "Error: ffmpeg could not be found"
-    exit 1
-fi
-
 mkfifo /tmp/snap_fifo
 mkfifo /tmp/snap_ch1
 mkfifo /tmp/snap_ch2
@@ -17,6 +11,17 @@ mkfifo /tmp/snap_ch4
 mkfifo /tmp/snap_ch5
 mkfifo /tmp/snap_ch6
 
+# Python splitter: per-channel queues, a slow reader doesn't stall the others
+# (pass --ffmpeg to use the ffmpeg channelsplit graph instead)
+if [ "$1" != "--ffmpeg" ] && python3 -c "import numpy" &> /dev/null; then
+    exec python3 server/splitter.py --input /tmp/snap_fifo --policy drop --stats 60
+fi
+
+# Check if ffmpeg is installed
+if ! command -v ffmpeg &> /dev/null; then
+    echo "Error: ffmpeg could not be found"
+    exit 1
+fi
 
 ffmpeg -f s16le -ac 6 -ar 48000 -i /tmp/snap_fifo \
   -filter_complex "[0:a]channelsplit=channel_layout=5.1[ch1][ch2][ch3][ch4][ch5][ch6]" \
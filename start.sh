@@ -13,16 +13,33 @@ if [ -f .env ]; then
     source .env
 fi
 
-echo "create fifo ${FIFO_PATH} ${FIFO_PATH_STEREO}"
-rm -f ${FIFO_PATH}
-mkfifo ${FIFO_PATH}
-chmod 666 ${FIFO_PATH}
-
-rm -f ${FIFO_PATH_STEREO}
-mkfifo ${FIFO_PATH_STEREO}
-chmod 666 ${FIFO_PATH_STEREO}
+echo "create fifo ${FIFO_PATH} ${FIFO_PATH_STEREO} ${FIFO_PATH_MPD} (pipe size ${FIFO_PIPE_SIZE})"
+rm -f ${FIFO_PATH} ${FIFO_PATH_STEREO} ${FIFO_PATH_MPD}
+# The pipe size only lasts while the FIFO is open. The tee sets it on its own
+# outputs, and must see when snapserver isn't reading them (a held-open output
+# would fill with stale audio instead), so only MPD's FIFO is held open
+# (tune with: python3 /home/server/fifo_probe.py probe --hops 2 --stall 60)
+python3 /home/server/fifo_probe.py create ${FIFO_PATH} ${FIFO_PATH_STEREO}
+python3 /home/server/fifo_probe.py create --size ${FIFO_PIPE_SIZE} --hold ${FIFO_PATH_MPD} &
+FIFO_KEEPER_PID=$!
+while [ ! -p ${FIFO_PATH_MPD} ]; do sleep 0.1; done
 echo "FIFO created"
 
+echo "Starting downmix tee ${FIFO_PATH_MPD} -> ${FIFO_PATH} + ${FIFO_PATH_STEREO}"
+# Both snapserver streams depend on the tee: restart it whenever it exits
+(
+    while true; do
+        python3 /home/server/downmix_tee.py --input ${FIFO_PATH_MPD} --surround ${FIFO_PATH} --stereo ${FIFO_PATH_STEREO} --pipe-size ${FIFO_PIPE_SIZE} --stats 600
+        echo "downmix tee exited with status $?, restarting in 1 s"
+        sleep 1
+    done
+) &
+TEE_PID=$!
+sleep 1
+if [ -z "$(ps aux | grep '[d]ownmix_tee.py' | cat)" ]; then
+    echo "downmix tee failed to start (restart loop PID $TEE_PID)."
+fi
+
 echo "Starting JACK server"
 jackd -R -S -L 6 -d dummy -r48000 -p512 -C6 -P6 &
 # jackd -R -S -d dummy -r48000 -p512 -C6 -P6 & # Increased buffer size to reduce XRuns